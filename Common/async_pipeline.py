@@ -0,0 +1,144 @@
+"""
+async_pipeline.py - Asyncio end-to-end pipeline for many PE accounts at once
+
+Every PE step talks to exactly one backend:
+
+    create_account            -> Integration API (initial_master_sync)
+    fill_daily_load_data      -> MDMS database
+    fill_profile_instant_data -> MDMS database
+    trigger_prepaid_ledger    -> Engine API (trigger_task/daily_ledger_task)
+    generate_excel_report     -> MDMS API (dailyloads / profileinstant)
+
+The pipeline keeps many accounts in flight and runs each blocking step on a
+worker thread while holding that backend's semaphore, so the number of
+concurrent calls against Integration, MDMS, Engine and the database is capped
+independently.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any
+
+from Common.scenarios import load_scenario, new_result, run_db_steps
+
+# ===== CONFIGURATION =====
+
+# Default number of concurrent calls allowed per backend
+DEFAULT_LIMITS = {
+    'integration': 16,
+    'db': 8,
+    'engine': 16,
+    'mdms': 16
+}
+
+RESULT_FOLDER = "Result_File"
+
+logger = logging.getLogger(__name__)
+
+
+# ===== PIPELINE =====
+
+class AccountPipeline:
+    """Runs PE scenarios for many accounts concurrently with per-backend limits"""
+
+    def __init__(self, limits: Dict[str, int] = None, verbose: bool = False):
+        self.limits = dict(DEFAULT_LIMITS)
+        if limits:
+            self.limits.update({key: value for key, value in limits.items() if value})
+        self.verbose = verbose
+        self.semaphores = {}
+        self.executor = None
+
+    async def run(self, scenario_ids: List[str], accounts_per_scenario: int = 1) -> List[Dict[str, Any]]:
+        """
+        Provision, fill, trigger and report accounts for every scenario.
+
+        Args:
+            scenario_ids: Scenarios to run (e.g. ["PE_101", "PE_102"])
+            accounts_per_scenario: Number of independent accounts created per scenario
+
+        Returns:
+            List of result dicts (same shape as Common.scenarios.run_scenario),
+            in scenario / account order
+        """
+        # Semaphores must be created inside the running event loop
+        self.semaphores = {backend: asyncio.Semaphore(limit) for backend, limit in self.limits.items()}
+        self.executor = ThreadPoolExecutor(max_workers=sum(self.limits.values()),
+                                           thread_name_prefix="pe-pipeline")
+        try:
+            modules = {scenario_id: load_scenario(scenario_id, verbose=self.verbose) for scenario_id in scenario_ids}
+
+            tasks = []
+            for scenario_id in scenario_ids:
+                for copy_index in range(1, accounts_per_scenario + 1):
+                    tasks.append(self.run_account(scenario_id, modules[scenario_id], copy_index))
+
+            return await asyncio.gather(*tasks)
+        finally:
+            self.executor.shutdown(wait=True)
+
+    async def run_account(self, scenario_id: str, module, copy_index: int = 1) -> Dict[str, Any]:
+        """Run the five steps for one account of one scenario"""
+        report_file = None
+        if copy_index > 1:
+            report_file = os.path.join(RESULT_FOLDER, f"Report_{scenario_id}_{copy_index}.xlsx")
+
+        result = new_result(scenario_id, report_file)
+        started = time.perf_counter()
+
+        try:
+            account_data = await self._step(result, 'integration', "create_account", module.create_account)
+            if not account_data:
+                return self._finish(result, started, "create_account")
+            result['account_id'] = account_data['accountId']
+            result['meter_number'] = account_data['meterSrno']
+
+            # Both fills run in one executor call so they share a pooled connection
+            failed_step = await self._step(result, 'db', "fill_data",
+                                           lambda: run_db_steps(module, account_data, result))
+            if failed_step:
+                return self._finish(result, started, failed_step)
+
+            steps = [
+                ('engine', "trigger_prepaid_ledger", lambda: module.trigger_prepaid_ledger(account_data['accountId'])),
+                ('mdms', "generate_excel_report", lambda: module.generate_excel_report(account_data, report_file)),
+            ]
+            for backend, step_name, step in steps:
+                if not await self._step(result, backend, step_name, step):
+                    return self._finish(result, started, step_name)
+
+            result['status'] = 'Completed'
+            return self._finish(result, started, None)
+
+        except Exception as e:
+            logger.error(f"{scenario_id} (account {copy_index}): unexpected error: {str(e)}")
+            result['error'] = str(e)
+            return self._finish(result, started, result['failed_step'])
+
+    async def _step(self, result: Dict[str, Any], backend: str, step_name: str, step):
+        """Run a blocking step on the worker pool while holding its backend's semaphore"""
+        result['failed_step'] = step_name
+        async with self.semaphores[backend]:
+            step_started = time.perf_counter()
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self.executor, step)
+            finally:
+                result['step_durations'][step_name] = round(time.perf_counter() - step_started, 3)
+
+    @staticmethod
+    def _finish(result: Dict[str, Any], started: float, failed_step: str) -> Dict[str, Any]:
+        result['failed_step'] = failed_step
+        result['duration'] = round(time.perf_counter() - started, 3)
+        status = "completed" if result['status'] == 'Completed' else f"failed at {failed_step}"
+        logger.info(f"{result['scenario']} (Account: {result['account_id']}) {status} in {result['duration']:.2f}s")
+        return result
+
+
+def run_async_pipeline(scenario_ids: List[str], accounts_per_scenario: int = 1,
+                       limits: Dict[str, int] = None, verbose: bool = False) -> List[Dict[str, Any]]:
+    """Synchronous entry point: run the asyncio pipeline to completion and return the results"""
+    pipeline = AccountPipeline(limits=limits, verbose=verbose)
+    return asyncio.run(pipeline.run(scenario_ids, accounts_per_scenario))
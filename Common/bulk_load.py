@@ -0,0 +1,246 @@
+"""
+bulk_load.py - Bulk loader for dailyload_vee_validated and profile_instant_vee
+
+Rows are streamed to PostgreSQL with COPY ... FROM STDIN (CSV format) instead
+of one INSERT round-trip per row. Where COPY is not permitted, the loader falls
+back to psycopg2.extras.execute_values with paged multi-row INSERTs.
+"""
+
+import csv
+import io
+import logging
+from collections.abc import Mapping
+from datetime import datetime, date
+from typing import Iterable, List, Tuple
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+# ===== CONFIGURATION =====
+
+# "copy" streams rows with COPY FROM STDIN, "values" uses paged INSERT ... VALUES
+BULK_LOAD_METHOD = "copy"
+VALUES_PAGE_SIZE = 1000
+COPY_NULL = r"\N"
+
+# (SQL column, row key) pairs in table insert order
+DAILYLOAD_COLUMNS: List[Tuple[str, str]] = [
+    ('device_id', 'device_id'),
+    ('data_timestamp', 'data_timestamp'),
+    ('dcu_serial', 'dcu_serial'),
+    ('device_identifier', 'device_identifier'),
+    ('data_source', 'data_source'),
+    ('data_type', 'data_type'),
+    ('"import_Wh"', 'import_Wh'),
+    ('"import_VAh"', 'import_VAh'),
+    ('"export_Wh"', 'export_Wh'),
+    ('"export_VAh"', 'export_VAh'),
+    ('exec_datetime', 'exec_datetime'),
+    ('dailyload_datetime', 'dailyload_datetime'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+    ('is_active', 'is_active'),
+    ('is_valid', 'is_valid'),
+    ('is_estimated', 'is_estimated'),
+    ('is_edited', 'is_edited'),
+    ('meter_type', 'meter_type')
+]
+
+PROFILE_INSTANT_COLUMNS: List[Tuple[str, str]] = [
+    ('meter_id', 'meter_id'),
+    ('device_identifier', 'device_identifier'),
+    ('data_timestamp', 'data_timestamp'),
+    ('create_timestamp', 'create_timestamp'),
+    ('exec_datetime', 'exec_datetime'),
+    ('meter_type', 'meter_type'),
+    ('"import_Wh"', 'import_Wh'),
+    ('"export_Wh"', 'export_Wh'),
+    ('"import_VAh"', 'import_VAh'),
+    ('"export_VAh"', 'export_VAh'),
+    ('"cumm_energy_VArh_Q1"', 'cumm_energy_VArh_Q1'),
+    ('"cumm_energy_VArh_Q2"', 'cumm_energy_VArh_Q2'),
+    ('"cumm_energy_VArh_Q3"', 'cumm_energy_VArh_Q3'),
+    ('"cumm_energy_VArh_Q4"', 'cumm_energy_VArh_Q4'),
+    ('"signed_active_power_KVAR"', 'signed_active_power_KVAR'),
+    ('"MD_W"', 'MD_W'),
+    ('"MD_VA"', 'MD_VA'),
+    ('"MD_W_datetime"', 'MD_W_datetime'),
+    ('"MD_VA_datetime"', 'MD_VA_datetime'),
+    ('"PF"', 'PF'),
+    ('"Rphase_signed_PF"', 'Rphase_signed_PF'),
+    ('"Yphase_signed_PF"', 'Yphase_signed_PF'),
+    ('"Bphase_signed_PF"', 'Bphase_signed_PF'),
+    ('voltage', 'voltage'),
+    ('"RN_voltage"', 'RN_voltage'),
+    ('"YN_voltage"', 'YN_voltage'),
+    ('"BN_voltage"', 'BN_voltage'),
+    ('phase_current', 'phase_current'),
+    ('"Rphase_current"', 'Rphase_current'),
+    ('"Yphase_current"', 'Yphase_current'),
+    ('"Bphase_current"', 'Bphase_current'),
+    ('neutral_current', 'neutral_current'),
+    ('frequency', 'frequency'),
+    ('"active_power_W"', 'active_power_W'),
+    ('"apparent_power_VA"', 'apparent_power_VA'),
+    ('load_limit_value', 'load_limit_value'),
+    ('load_limit_func_status', 'load_limit_func_status'),
+    ('cumm_tamper_count', 'cumm_tamper_count'),
+    ('cumm_billing_count', 'cumm_billing_count'),
+    ('cumm_programming_count', 'cumm_programming_count'),
+    ('num_power_fail', 'num_power_fail'),
+    ('num_power_fail_dur', 'num_power_fail_dur'),
+    ('meter_current_datetime', 'meter_current_datetime'),
+    ('last_billing_datetime', 'last_billing_datetime'),
+    ('cumm_power_on_dur_minute', 'cumm_power_on_dur_minute'),
+    ('is_valid', 'is_valid'),
+    ('is_estimated', 'is_estimated'),
+    ('is_edited', 'is_edited'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+    ('device_id', 'device_id'),
+    ('file_log_id', 'file_log_id'),
+    ('dcu_serial', 'dcu_serial'),
+    ('hes_pk', 'hes_pk'),
+    ('hes_msg_id', 'hes_msg_id'),
+    # hes_created_at is filled from the formatted timestamp, as in the original INSERT
+    ('hes_created_at', 'hes_created_at_str')
+]
+
+logger = logging.getLogger(__name__)
+
+# Set once COPY has been refused by the server so later calls go straight to VALUES
+_copy_unavailable = False
+
+
+# ===== ROW HELPERS =====
+
+def _row_values(row, keys: List[str]) -> tuple:
+    """Return a row's values in column order (rows may be dicts or ordered sequences)"""
+    if isinstance(row, Mapping):
+        return tuple(row[key] for key in keys)
+    return tuple(row)
+
+
+def _copy_value(value):
+    """Render a Python value as a COPY CSV field"""
+    if value is None:
+        return COPY_NULL
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+class _CsvRowStream(io.TextIOBase):
+    """Read-only file object that renders rows to CSV lazily, as COPY pulls data"""
+
+    def __init__(self, rows: Iterable, keys: List[str]):
+        self._rows = iter(rows)
+        self._keys = keys
+        self._buffer = ""
+        self.row_count = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size: int = -1) -> str:
+        chunk = io.StringIO()
+        writer = csv.writer(chunk, lineterminator='\n')
+        wanted = None if size is None or size < 0 else size - len(self._buffer)
+
+        while wanted is None or chunk.tell() < wanted:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            writer.writerow([_copy_value(v) for v in _row_values(row, self._keys)])
+            self.row_count += 1
+
+        self._buffer += chunk.getvalue()
+        if wanted is None:
+            data, self._buffer = self._buffer, ""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+# ===== LOADERS =====
+
+def copy_rows(cursor, table: str, columns: List[Tuple[str, str]], rows: Iterable) -> int:
+    """
+    Stream rows into a table with COPY ... FROM STDIN (CSV).
+
+    Args:
+        cursor: psycopg2 cursor
+        table: Target table name
+        columns: (SQL column, row key) pairs
+        rows: Iterable of dicts (looked up by row key) or sequences in column order
+
+    Returns:
+        Number of rows copied
+    """
+    column_sql = ", ".join(sql for sql, _ in columns)
+    keys = [key for _, key in columns]
+    stream = _CsvRowStream(rows, keys)
+    copy_sql = f"COPY {table} ({column_sql}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')"
+    cursor.copy_expert(copy_sql, stream)
+    return stream.row_count
+
+
+def insert_values(cursor, table: str, columns: List[Tuple[str, str]], rows: Iterable,
+                  page_size: int = VALUES_PAGE_SIZE) -> int:
+    """
+    Insert rows with paged multi-row INSERT ... VALUES (psycopg2 execute_values).
+
+    Returns:
+        Number of rows inserted
+    """
+    column_sql = ", ".join(sql for sql, _ in columns)
+    keys = [key for _, key in columns]
+    values = [_row_values(row, keys) for row in rows]
+    insert_sql = f"INSERT INTO {table} ({column_sql}) VALUES %s"
+    execute_values(cursor, insert_sql, values, page_size=page_size)
+    return len(values)
+
+
+def bulk_insert(cursor, table: str, columns: List[Tuple[str, str]], rows, method: str = None,
+                page_size: int = VALUES_PAGE_SIZE) -> int:
+    """
+    Load rows with COPY, falling back to paged execute_values when COPY is refused.
+
+    The fallback is wrapped in a savepoint so a rejected COPY does not abort the
+    caller's transaction; the caller still owns commit/rollback.
+
+    Args:
+        cursor: psycopg2 cursor
+        table: Target table name
+        columns: (SQL column, row key) pairs, e.g. DAILYLOAD_COLUMNS
+        rows: List of dicts or sequences
+        method: "copy" or "values" (default: BULK_LOAD_METHOD)
+        page_size: Rows per INSERT statement for the VALUES path
+
+    Returns:
+        Number of rows loaded
+    """
+    global _copy_unavailable
+    method = method or BULK_LOAD_METHOD
+
+    if method == "copy" and not _copy_unavailable:
+        rows = list(rows)
+        use_savepoint = not cursor.connection.autocommit
+        if use_savepoint:
+            cursor.execute("SAVEPOINT bulk_load_copy")
+        try:
+            count = copy_rows(cursor, table, columns, rows)
+            if use_savepoint:
+                cursor.execute("RELEASE SAVEPOINT bulk_load_copy")
+            return count
+        except (psycopg2.errors.InsufficientPrivilege, psycopg2.NotSupportedError) as e:
+            if use_savepoint:
+                cursor.execute("ROLLBACK TO SAVEPOINT bulk_load_copy")
+            _copy_unavailable = True
+            logger.warning(f"COPY into {table} not permitted ({str(e).strip()}), falling back to INSERT ... VALUES")
+
+    return insert_values(cursor, table, columns, rows, page_size=page_size)
@@ -0,0 +1,165 @@
+"""
+calc_trace.py - Structured per-day calculation trace for the Formula validators
+
+The validators' prose per-day log (10-20 formatted lines per ledger day) is
+fine for one account, but at fleet scale the formatting and file I/O cost more
+than the calculation and the log grows without bound. The trace is the audit
+trail for selected accounts and days instead: one compact JSON object per
+ledger day with the inputs, the expected values and the intermediate state of
+the formulas.
+
+The trace goes through the "calc_trace" logger at DEBUG level and is off until
+enable() attaches a JSON-lines file handler. While it is off, trace_days()
+returns before touching the data. While it is on, only the selected rows are
+converted, and the JSON text is built by the handler when the record is written.
+
+Usage:
+    from Common import calc_trace
+    calc_trace.enable("logs/trace/Formula_103.jsonl", accounts=["2222550013"], days=calc_trace.parse_days("1-10"))
+    PrepaidLedgerComparison(account_id="2222550013").run_comparison()
+"""
+
+import json
+import logging
+import math
+import os
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from Common.ledger_kernels import day_numbers
+
+# ===== CONFIGURATION =====
+
+TRACE_FOLDER = os.path.join("logs", "trace")
+TRACE_LOGGER = "calc_trace"
+TRACE_PRECISION = 4  # decimals kept per value, as in the prose log
+
+logger = logging.getLogger(TRACE_LOGGER)
+logger.propagate = False
+logger.setLevel(logging.WARNING)  # off until enable()
+
+# Accounts (as strings) and (first, last) day range traced; None = all
+_selection = {'accounts': None, 'days': None}
+
+
+# ===== HANDLER =====
+
+class JsonLinesFormatter(logging.Formatter):
+    """Formats a trace record as one JSON object per line (built only when the record is written)"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(record.trace, separators=(',', ':'), default=str)
+
+
+def enable(path: str, accounts: Iterable = None, days: Tuple[Optional[int], Optional[int]] = None) -> logging.Handler:
+    """
+    Start writing the trace to a JSON-lines file (appended to).
+
+    Args:
+        path: Trace file (folders are created)
+        accounts: Account IDs to trace (default: every account)
+        days: (first, last) ledger day, 1-based and inclusive, either end None for open (default: every day)
+
+    Returns:
+        The file handler (closed again by disable())
+    """
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    handler = logging.FileHandler(path, encoding='utf-8')
+    handler.setFormatter(JsonLinesFormatter())
+    logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG)
+    _selection['accounts'] = {str(account) for account in accounts} if accounts else None
+    _selection['days'] = days
+    return handler
+
+
+def disable():
+    """Stop tracing and close the trace files"""
+    logger.setLevel(logging.WARNING)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+    _selection['accounts'] = _selection['days'] = None
+
+
+def enabled() -> bool:
+    return logger.isEnabledFor(logging.DEBUG)
+
+
+def parse_days(text: str) -> Optional[Tuple[Optional[int], Optional[int]]]:
+    """Day range from the command line: "5" -> (5, 5), "1-10" -> (1, 10), "20-" -> (20, None)"""
+    if not text:
+        return None
+    first, separator, last = text.partition('-')
+    first = int(first) if first.strip() else None
+    last = (int(last) if last.strip() else None) if separator else first
+    return first, last
+
+
+# ===== TRACE =====
+
+def _value(value):
+    """JSON-ready value (rounded floats, no NaN / inf)"""
+    if isinstance(value, float):
+        return round(value, TRACE_PRECISION) if math.isfinite(value) else None
+    return value
+
+
+def trace_days(formula: str, account_id, df: pd.DataFrame, expected: Dict[str, np.ndarray],
+               state: Dict[str, np.ndarray] = None, by: str = None):
+    """
+    Write one trace record per selected ledger day.
+
+    Args:
+        formula: Validator ("101", "102", "103")
+        account_id: Account of the ledger (ignored when by is given)
+        df: Ledger rows (start_date_time, daily_consumption and max_demand are traced as inputs)
+        expected: Expected value arrays (traced without the expected_ prefix)
+        state: Intermediate per-day arrays of the formulas (FC branch, EDP state, life line switch, ...)
+        by: Column holding the account of each row for a batch of stacked ledgers
+    """
+    if not enabled():
+        return
+
+    length = len(df)
+    groups = df[by].to_numpy() if by else None
+    days = day_numbers(length, groups)
+    accounts = df[by].astype(str).to_numpy() if by else np.full(length, str(account_id), dtype=object)
+
+    rows = np.ones(length, dtype=bool)
+    if _selection['accounts'] is not None:
+        rows &= np.isin(accounts, list(_selection['accounts']))
+    if _selection['days'] is not None:
+        first, last = _selection['days']
+        if first is not None:
+            rows &= days >= first
+        if last is not None:
+            rows &= days <= last
+    positions = np.flatnonzero(rows)
+    if positions.size == 0:
+        return
+
+    dates = df['start_date_time'].iloc[positions]
+    dates = dates.dt.strftime('%Y-%m-%d') if pd.api.types.is_datetime64_any_dtype(dates) else dates.astype(str).str[:10]
+    columns = {
+        'account_id': accounts[positions].tolist(),
+        'day': days[positions].tolist(),
+        'date': dates.tolist()
+    }
+    for name in ('daily_consumption', 'max_demand'):
+        if name in df.columns:
+            columns[name] = pd.to_numeric(df[name].iloc[positions], errors='coerce').tolist()
+    for name, values in (state or {}).items():
+        columns.setdefault(name, np.asarray(values)[positions].tolist())
+    for name, values in expected.items():
+        columns[name[len('expected_'):] if name.startswith('expected_') else name] = np.asarray(values)[positions].tolist()
+
+    names = list(columns)
+    for row in zip(*columns.values()):
+        record = {'formula': formula}
+        record.update((name, _value(value)) for name, value in zip(names, row))
+        logger.debug("%s day %s", formula, record['day'], extra={'trace': record})
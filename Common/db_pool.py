@@ -0,0 +1,239 @@
+"""
+db_pool.py - Shared, thread-safe psycopg2 connection pool for the PE scenarios
+
+One pool is kept per DB_CONFIG and shared by every scenario running in the
+process, so a suite run reuses a handful of connections to db_mdms instead of
+opening a fresh TLS/auth handshake for each fill step.
+
+An account scope binds one pooled connection to the current thread so that the
+daily load and profile instant inserts of one account go through the same
+connection, and optionally the same transaction.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+# ===== CONFIGURATION =====
+
+DEFAULT_POOL_SIZE = 4
+MAX_CONNECTION_AGE = 1800  # seconds; older connections are closed and replaced on return
+CHECKOUT_TIMEOUT = 300     # seconds to wait for a free connection before giving up
+
+logger = logging.getLogger(__name__)
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pool_size = DEFAULT_POOL_SIZE
+_scope = threading.local()
+
+
+# ===== POOL =====
+
+class ConnectionPool:
+    """Blocking connection pool with checkout/wait/age statistics"""
+
+    def __init__(self, db_config: Dict[str, Any], maxconn: int = DEFAULT_POOL_SIZE,
+                 max_age: float = MAX_CONNECTION_AGE):
+        self.db_config = dict(db_config)
+        self.maxconn = maxconn
+        self.max_age = max_age
+        self._idle = []          # [(connection, created_at)]
+        self._created_at = {}    # id(connection) -> creation time, for every open connection
+        self._in_use = 0
+        self._condition = threading.Condition()
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_seconds': 0.0,
+            'connections_opened': 0,
+            'connections_recycled': 0
+        }
+
+    def getconn(self, timeout: float = CHECKOUT_TIMEOUT):
+        """Check out a connection, blocking while the pool is exhausted"""
+        with self._condition:
+            if not self._idle and self._total() >= self.maxconn:
+                self._stats['waits'] += 1
+                wait_started = time.perf_counter()
+                if not self._condition.wait_for(lambda: self._idle or self._total() < self.maxconn, timeout):
+                    raise PoolError(f"No database connection available after {timeout}s")
+                self._stats['wait_seconds'] += time.perf_counter() - wait_started
+
+            self._stats['checkouts'] += 1
+            self._in_use += 1
+            if self._idle:
+                connection, _ = self._idle.pop()
+                return connection
+
+        # Open new connections outside the lock so slow handshakes do not block other threads
+        try:
+            connection = psycopg2.connect(**self.db_config)
+        except Exception:
+            with self._condition:
+                self._in_use -= 1
+                self._condition.notify()
+            raise
+
+        with self._condition:
+            self._created_at[id(connection)] = time.monotonic()
+            self._stats['connections_opened'] += 1
+        return connection
+
+    def putconn(self, connection):
+        """Return a connection; broken, mid-transaction-failed or expired connections are closed"""
+        created_at = self._created_at.get(id(connection), time.monotonic())
+        keep = not connection.closed and (time.monotonic() - created_at) < self.max_age
+
+        if keep:
+            try:
+                if connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+            except psycopg2.Error:
+                keep = False
+
+        with self._condition:
+            self._in_use -= 1
+            if keep:
+                self._idle.append((connection, created_at))
+            else:
+                self._created_at.pop(id(connection), None)
+                self._stats['connections_recycled'] += 1
+            self._condition.notify()
+
+        if not keep and not connection.closed:
+            connection.close()
+
+    def closeall(self):
+        """Close every idle connection (checked-out connections are closed on return)"""
+        with self._condition:
+            idle, self._idle = self._idle, []
+            for connection, _ in idle:
+                self._created_at.pop(id(connection), None)
+        for connection, _ in idle:
+            connection.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool statistics for tuning: size, usage, waits and connection ages"""
+        now = time.monotonic()
+        with self._condition:
+            ages = [now - created_at for created_at in self._created_at.values()]
+            stats = dict(self._stats)
+            stats.update({
+                'maxconn': self.maxconn,
+                'open_connections': self._total(),
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'oldest_connection_age': round(max(ages), 1) if ages else 0.0,
+                'mean_connection_age': round(sum(ages) / len(ages), 1) if ages else 0.0
+            })
+        stats['wait_seconds'] = round(stats['wait_seconds'], 3)
+        return stats
+
+    def _total(self) -> int:
+        return self._in_use + len(self._idle)
+
+
+# ===== SHARED POOLS =====
+
+def configure(pool_size: int):
+    """Set the pool size (normally the number of workers) for current and future pools"""
+    global _pool_size
+    _pool_size = max(1, pool_size)
+    with _pools_lock:
+        for pool in _pools.values():
+            with pool._condition:
+                pool.maxconn = _pool_size
+                pool._condition.notify_all()
+
+
+def get_pool(db_config: Dict[str, Any]) -> ConnectionPool:
+    """Return the process-wide pool for a DB_CONFIG, creating it on first use"""
+    key = tuple(sorted(db_config.items()))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(db_config, maxconn=_pool_size)
+        return pool
+
+
+def all_stats() -> Dict[str, Dict[str, Any]]:
+    """Statistics for every pool in this process, keyed by host/database"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {f"{p.db_config.get('host')}/{p.db_config.get('database')}": p.stats() for p in pools}
+
+
+def close_all():
+    """Close the idle connections of every pool (call at the end of a run)"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.closeall()
+
+
+# ===== CHECKOUT HELPERS USED BY THE PE STEPS =====
+
+def checkout(db_config: Dict[str, Any]):
+    """Return the account scope's connection if one is bound to this thread, else a pooled one"""
+    bound = getattr(_scope, 'connection', None)
+    if bound is not None:
+        return bound
+    return get_pool(db_config).getconn()
+
+
+def release(connection):
+    """Give a connection from checkout() back (no-op for the account scope's connection)"""
+    if connection is getattr(_scope, 'connection', None):
+        return
+    for pool in list(_pools.values()):
+        if id(connection) in pool._created_at:
+            pool.putconn(connection)
+            return
+    connection.close()
+
+
+def commit(connection):
+    """Commit a step's work, unless the account scope holds everything in one transaction"""
+    if connection is getattr(_scope, 'connection', None) and getattr(_scope, 'single_transaction', False):
+        return
+    connection.commit()
+
+
+@contextmanager
+def account_scope(db_config: Dict[str, Any], single_transaction: bool = False):
+    """
+    Bind one pooled connection to this thread for all DB steps of one account.
+
+    Args:
+        db_config: psycopg2 connection parameters
+        single_transaction: Commit all steps together when the scope exits
+            (rolled back if the scope raises)
+    """
+    if getattr(_scope, 'connection', None) is not None:
+        # Already inside an account scope on this thread
+        yield _scope.connection
+        return
+
+    pool = get_pool(db_config)
+    connection = pool.getconn()
+    _scope.connection = connection
+    _scope.single_transaction = single_transaction
+    try:
+        yield connection
+        if single_transaction and not connection.closed:
+            connection.commit()
+    except Exception:
+        if not connection.closed:
+            connection.rollback()
+        raise
+    finally:
+        _scope.connection = None
+        _scope.single_transaction = False
+        pool.putconn(connection)
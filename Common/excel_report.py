@@ -0,0 +1,144 @@
+"""
+excel_report.py - Streaming Excel writer for the PE scenario reports
+
+generate_excel_report used to build the whole report as an in-memory openpyxl
+Workbook, style the header cells one by one and then size every column by
+re-scanning all of its cells. For a 120-day meter the Profile Instant sheet
+alone has hundreds of thousands of cells, so memory and time grew with the
+data.
+
+ReportWorkbook writes through openpyxl's write-only mode instead. Rows go
+straight to a temporary file per sheet, and the header row uses one shared
+named style. Column widths are measured while the rows arrive.
+
+A write-only sheet has to know its column widths before the first row is
+written. Each sheet therefore holds back its first WIDTH_SAMPLE_ROWS rows,
+sizes the columns from them, and then streams the rest. Small sheets (Summary,
+Consumer Details) fit entirely in the sample and get exact widths. On the
+large sheets the sample stands for the uniformly formatted MDMS records.
+
+When the columnar result store is enabled (Common/result_store.py), the
+Consumer Details, Daily Load and Profile Instant rows are also streamed to
+Parquet. They are published under the report's ID (the file name without
+.xlsx) when the workbook is saved.
+"""
+
+import os
+
+from typing import Any, Iterable, List
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, NamedStyle, PatternFill
+from openpyxl.utils import get_column_letter
+
+from Common import result_store
+
+# ===== CONFIGURATION =====
+
+HEADER_STYLE = "report_header"
+HEADER_FILL = "366092"
+MAX_COLUMN_WIDTH = 50
+WIDTH_SAMPLE_ROWS = 200  # rows held back per sheet to size its columns
+
+# Sheets mirrored to the columnar result store, by dataset
+COLUMNAR_SHEETS = {
+    "Consumer Details": "consumer_details",
+    "Daily Load": "daily_load",
+    "Profile Instant": "profile_instant"
+}
+
+
+# ===== WORKBOOK =====
+
+class ReportWorkbook:
+    """Write-only workbook whose sheets stream their rows to disk"""
+
+    def __init__(self):
+        self.workbook = Workbook(write_only=True)
+        header_style = NamedStyle(name=HEADER_STYLE)
+        header_style.fill = PatternFill(start_color=HEADER_FILL, end_color=HEADER_FILL, fill_type="solid")
+        header_style.font = Font(bold=True, color="FFFFFF")
+        header_style.alignment = Alignment(horizontal="center", vertical="center")
+        self.workbook.add_named_style(header_style)
+        self.sheets: List[ReportSheet] = []
+        self.store = result_store.active()
+
+    def create_sheet(self, title: str) -> "ReportSheet":
+        """Add a sheet after the existing ones"""
+        dataset = COLUMNAR_SHEETS.get(title)
+        columnar = self.store.writer(dataset) if self.store is not None and dataset else None
+        sheet = ReportSheet(self.workbook.create_sheet(title), columnar)
+        self.sheets.append(sheet)
+        return sheet
+
+    def save(self, path: str):
+        """Flush every sheet and write the workbook (it cannot be written to afterwards)"""
+        for sheet in self.sheets:
+            sheet.flush()
+        self.workbook.save(path)
+
+        report_id = os.path.splitext(os.path.basename(path))[0]
+        for sheet in self.sheets:
+            if sheet.columnar is None:
+                continue
+            if sheet.columnar.columns is None:
+                sheet.columnar.discard()  # no header row: the sheet says "No data available"
+            else:
+                sheet.columnar.commit(report_id)
+
+
+class ReportSheet:
+    """One write-only sheet; column widths are taken from the rows seen before the first flush"""
+
+    def __init__(self, worksheet, columnar: "result_store.PartWriter" = None):
+        self.worksheet = worksheet
+        self.columnar = columnar
+        self.widths: List[int] = []
+        self.pending: List[list] = []
+        self.streaming = False
+        self.row_count = 0
+
+    def append_header(self, headers: Iterable[Any]):
+        """Append a row in the shared header style"""
+        headers = list(headers)
+        cells = []
+        for value in headers:
+            cell = WriteOnlyCell(self.worksheet, value=value)
+            cell.style = HEADER_STYLE
+            cells.append(cell)
+        self._append(cells, headers)
+        if self.columnar is not None:
+            self.columnar.set_columns(headers)
+
+    def append(self, values: Iterable[Any]):
+        """Append a data row"""
+        values = list(values)
+        self._append(values, values)
+        if self.columnar is not None and self.columnar.columns is not None:
+            self.columnar.append(values)
+
+    def _append(self, row: list, values: list):
+        self.row_count += 1
+        if self.streaming:
+            self.worksheet.append(row)
+            return
+        for index, value in enumerate(values):
+            length = len(str(value))
+            if index == len(self.widths):
+                self.widths.append(length)
+            elif length > self.widths[index]:
+                self.widths[index] = length
+        self.pending.append(row)
+        if len(self.pending) >= WIDTH_SAMPLE_ROWS:
+            self.flush()
+
+    def flush(self):
+        """Fix the column widths (first call only) and write the held-back rows"""
+        if not self.streaming:
+            for index, width in enumerate(self.widths, start=1):
+                self.worksheet.column_dimensions[get_column_letter(index)].width = min(width + 2, MAX_COLUMN_WIDTH)
+            self.streaming = True
+        for row in self.pending:
+            self.worksheet.append(row)
+        self.pending = []
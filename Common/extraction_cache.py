@@ -0,0 +1,147 @@
+"""
+extraction_cache.py - Cache of the consumer rows extracted from the PE reports
+
+A report never changes once its scenario has finished, yet account.py used to
+parse every Result_File workbook on every run. The cache keeps the extracted
+row of each workbook in a SQLite file, keyed by the workbook's path and
+validated by its size and modification time. A later run only parses new or
+modified reports.
+
+If the size or modification time differs (the file was copied or touched),
+the SHA-1 of the file's content is compared as well. A workbook whose content
+is unchanged is not parsed again. With verify=True the content hash is
+checked on every lookup, so the modification time is not trusted.
+
+The cache is not thread-safe; it is used by the process that collects the
+extraction results.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# ===== CONFIGURATION =====
+
+DEFAULT_CACHE_PATH = os.path.join("Result_File", "consumer_details_cache.sqlite")
+HASH_BLOCK_SIZE = 1 << 20  # bytes read at a time when hashing a workbook
+
+logger = logging.getLogger(__name__)
+
+
+def file_signature(path: str) -> Tuple[int, int]:
+    """(size in bytes, modification time in ns) of a file"""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def content_hash(path: str) -> str:
+    """SHA-1 of a file's content"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# ===== CACHE =====
+
+class ExtractionCache:
+    """SQLite-backed extracted row per report workbook"""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, verify: bool = False):
+        """
+        Args:
+            path: SQLite file (created on first use)
+            verify: Compare content hashes on every lookup instead of trusting size and mtime
+        """
+        self.path = path
+        self.verify = verify
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS report (
+                path            TEXT PRIMARY KEY,
+                size            INTEGER NOT NULL,
+                mtime_ns        INTEGER NOT NULL,
+                content_hash    TEXT NOT NULL,
+                payload         TEXT NOT NULL,
+                extracted_at    TEXT NOT NULL
+            );
+        ''')
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.abspath(path)
+
+    # ----- lookup -----
+
+    def lookup(self, path: str) -> Optional[Dict[str, Any]]:
+        """
+        Cached row of a workbook, or None if it is new or was modified since it was extracted.
+
+        Args:
+            path: Workbook path
+        """
+        row = self.connection.execute(
+            "SELECT size, mtime_ns, content_hash, payload FROM report WHERE path = ?", (self._key(path),)
+        ).fetchone()
+        if row is None:
+            return None
+        size, mtime_ns, cached_hash, payload = row
+
+        signature = file_signature(path)
+        if signature == (size, mtime_ns) and not self.verify:
+            return json.loads(payload)
+        if signature[0] != size or content_hash(path) != cached_hash:
+            return None
+
+        # Same content under a new timestamp: remember it so the next run skips the hash
+        if signature[1] != mtime_ns:
+            with self.connection:
+                self.connection.execute(
+                    "UPDATE report SET mtime_ns = ? WHERE path = ?", (signature[1], self._key(path))
+                )
+        return json.loads(payload)
+
+    # ----- store -----
+
+    def store(self, path: str, record: Dict[str, Any]):
+        """Cache the row extracted from a workbook (replacing an earlier one)"""
+        self.store_many([(path, record)])
+
+    def store_many(self, items: Iterable[Tuple[str, Dict[str, Any]]]):
+        """Cache the rows of several workbooks in one transaction"""
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        rows = []
+        for path, record in items:
+            size, mtime_ns = file_signature(path)
+            rows.append((self._key(path), size, mtime_ns, content_hash(path),
+                         json.dumps(record, default=str), now))
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO report VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def prune(self, paths: Iterable[str]) -> int:
+        """Forget workbooks that are not in paths (deleted reports); returns the number removed"""
+        keep = {self._key(path) for path in paths}
+        stale = [(path,) for (path,) in self.connection.execute("SELECT path FROM report") if path not in keep]
+        with self.connection:
+            self.connection.executemany("DELETE FROM report WHERE path = ?", stale)
+        return len(stale)
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM report").fetchone()[0]
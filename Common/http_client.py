@@ -0,0 +1,227 @@
+"""
+http_client.py - Shared HTTP sessions for the Integration, Engine and MDMS APIs
+
+One keep-alive requests.Session is kept per base URL (scheme + host), so bulk
+runs reuse pooled TCP/TLS connections to integration1, engine-web and
+mdms-api instead of opening a fresh connection for every call.
+
+Every request gets a default (connect, read) timeout. Connection failures are
+retried for all calls (nothing has reached the server yet); timeouts and
+502/503/504 responses are retried with exponential backoff only for calls
+marked idempotent (GETs by default, plus read-only POST queries such as the
+MDMS dailyloads/profileinstant endpoints).
+
+The stage base URLs hard-wired in the scenarios and tools can be redirected
+without touching them: set_base_urls() (or the PE_API_BASE / PE_*_API_BASE
+environment variables, read at import) maps a service's base URL to another
+one, e.g. the local mock server (mock_server.py). Every request is rewritten
+before it is sent.
+"""
+
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from urllib3.util.retry import Retry
+
+# ===== CONFIGURATION =====
+
+POOL_SIZE = 16               # keep-alive connections per base URL
+CONNECT_TIMEOUT = 10         # seconds
+READ_TIMEOUT = 300           # seconds (ledger triggers can run for minutes)
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5         # sleeps 0.5s, 1s, 2s, ... between retries
+RETRY_STATUSES = (502, 503, 504)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+# Stage base URL of each service
+SERVICES = {
+    'integration': "https://integration1.stage.gomatimvvnl.in",
+    'engine': "https://engine-web.stage.gomatimvvnl.in",
+    'mdms': "https://mdms-api.stage.gomatimvvnl.in"
+}
+
+# Environment variables redirecting every service / one service to another base URL
+API_BASE_ENV = "PE_API_BASE"
+SERVICE_BASE_ENV = {service: f"PE_{service.upper()}_API_BASE" for service in SERVICES}
+
+logger = logging.getLogger(__name__)
+
+_settings = {
+    'pool_size': POOL_SIZE,
+    'timeout': (CONNECT_TIMEOUT, READ_TIMEOUT),
+    'max_retries': MAX_RETRIES,
+    'backoff_factor': BACKOFF_FACTOR
+}
+_sessions = {}
+_sessions_lock = threading.Lock()
+_base_urls = {}  # stage base URL -> replacement base URL
+
+
+# ===== SESSIONS =====
+
+def configure(pool_size: int = None, timeout=None, max_retries: int = None, backoff_factor: float = None):
+    """
+    Change pool size, default timeout or retry policy for sessions created from now on.
+
+    Existing sessions are closed so the next call picks up the new settings.
+
+    Args:
+        pool_size: Keep-alive connections per base URL
+        timeout: Default timeout in seconds, or a (connect, read) tuple
+        max_retries: Retries per call (connection errors always, others only if idempotent)
+        backoff_factor: Base of the exponential backoff between retries
+    """
+    updates = {
+        'pool_size': pool_size,
+        'timeout': timeout,
+        'max_retries': max_retries,
+        'backoff_factor': backoff_factor
+    }
+    _settings.update({key: value for key, value in updates.items() if value is not None})
+    close_all()
+
+
+def base_url(url: str) -> str:
+    """Return scheme://host[:port] of a URL, the key sessions are pooled by"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def get_session(url: str) -> requests.Session:
+    """Return the shared session for the URL's base, creating it on first use"""
+    key = base_url(url)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _sessions[key] = _new_session()
+        return session
+
+
+def _new_session() -> requests.Session:
+    # The adapter only retries failed connects, which are safe for every method;
+    # read/status retries are handled in request() so they can depend on idempotency
+    connect_retry = Retry(total=None, connect=_settings['max_retries'], read=0, status=0, redirect=5,
+                          backoff_factor=_settings['backoff_factor'], raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=_settings['pool_size'],
+                          max_retries=connect_retry, pool_block=False)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def close_all():
+    """Close every shared session and its pooled connections"""
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
+
+
+# ===== BASE URLS =====
+
+def set_base_urls(overrides: dict = None, default: str = None):
+    """
+    Redirect services to other base URLs (replacing earlier redirects).
+
+    Args:
+        overrides: Service name ("integration", "engine", "mdms") or stage base
+            URL -> replacement base URL, e.g. {"mdms": "http://127.0.0.1:8765"}
+        default: Replacement base URL for every service not in overrides
+    """
+    redirects = {}
+    if default:
+        redirects.update({base: default for base in SERVICES.values()})
+    for service, url in (overrides or {}).items():
+        redirects[base_url(SERVICES.get(service, service))] = url
+    _base_urls.clear()
+    _base_urls.update({base: url.rstrip('/') for base, url in redirects.items() if url})
+    for base, url in sorted(_base_urls.items()):
+        logger.info(f"Redirecting {base} to {url}")
+
+
+def set_base_urls_from_env(environ=None):
+    """Apply the PE_API_BASE / PE_<SERVICE>_API_BASE environment variables"""
+    environ = os.environ if environ is None else environ
+    overrides = {service: environ.get(name) for service, name in SERVICE_BASE_ENV.items() if environ.get(name)}
+    if overrides or environ.get(API_BASE_ENV):
+        set_base_urls(overrides, default=environ.get(API_BASE_ENV))
+
+
+def resolve(url: str) -> str:
+    """URL with its base replaced when the service is redirected"""
+    if not _base_urls:
+        return url
+    base = base_url(url)
+    replacement = _base_urls.get(base)
+    return url if replacement is None else replacement + url[len(base):]
+
+
+# ===== REQUESTS =====
+
+def request(method: str, url: str, idempotent: bool = None, **kwargs) -> requests.Response:
+    """
+    Send a request through the shared session for the URL's base.
+
+    Args:
+        method: HTTP method
+        url: Full request URL
+        idempotent: Allow retrying timeouts and 502/503/504 responses
+            (default: True for GET/HEAD/OPTIONS/PUT/DELETE, False otherwise)
+        **kwargs: Passed to requests.Session.request; timeout defaults to the configured value
+
+    Returns:
+        The final response (after retries); status codes are not raised
+    """
+    method = method.upper()
+    url = resolve(url)
+    if idempotent is None:
+        idempotent = method in IDEMPOTENT_METHODS
+    kwargs.setdefault('timeout', _settings['timeout'])
+
+    session = get_session(url)
+    retries = _settings['max_retries'] if idempotent else 0
+    attempt = 0
+    while True:
+        try:
+            response = session.request(method, url, **kwargs)
+            if attempt >= retries or response.status_code not in RETRY_STATUSES:
+                return response
+            reason = f"HTTP {response.status_code}"
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            if attempt >= retries or _connect_retries_spent(e):
+                raise
+            reason = type(e).__name__
+
+        delay = _settings['backoff_factor'] * (2 ** attempt)
+        attempt += 1
+        logger.warning(f"{method} {url} failed ({reason}), retry {attempt}/{retries} in {delay:.1f}s")
+        time.sleep(delay)
+
+
+def _connect_retries_spent(error: Exception) -> bool:
+    """True if the error is a failed connect, which the adapter has already retried"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    """GET through the shared session (retried on transient failures)"""
+    return request('GET', url, **kwargs)
+
+
+def post(url: str, idempotent: bool = False, **kwargs) -> requests.Response:
+    """POST through the shared session; pass idempotent=True for read-only queries"""
+    return request('POST', url, idempotent=idempotent, **kwargs)
+
+
+set_base_urls_from_env()
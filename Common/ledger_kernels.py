@@ -0,0 +1,341 @@
+"""
+ledger_kernels.py - Array helpers shared by the vectorized Formula validators
+
+The Formula_1xx validators compute their expected ledger columns for a whole
+ledger (or a batch of ledgers) at once. These helpers keep the vectorized
+results identical to the original row-by-row Python arithmetic.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# ===== CONFIGURATION =====
+
+DECIMALS = 4
+
+# |fraction - 0.5| below which np.round and Python's round() may disagree
+TIE_EPSILON = 1e-6
+
+# Largest |actual - expected| still reported as a match
+COMPARE_TOLERANCE = 0.01
+ALL_MATCH = "All Match"
+
+# A slab table: (upper bound of the slab in kWh, rate in Rs./kWh) per slab in
+# ascending order; the last slab's upper bound is None (no limit)
+Slab = Tuple[Optional[float], float]
+
+
+# ===== ROUNDING =====
+
+def round_values(values, decimals: int = DECIMALS) -> np.ndarray:
+    """
+    Round like Python's round(value, decimals), element-wise.
+
+    np.round scales by 10**decimals before rounding, which can land a value
+    just under or over a .5 tie that Python's correctly rounded round() sees
+    the other way. Those near-tie values are re-rounded with round().
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rounded = np.round(values, decimals)
+    scaled = values * 10.0 ** decimals
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < TIE_EPSILON
+    if near_tie.any():
+        rounded[near_tie] = [round(value, decimals) for value in values[near_tie].tolist()]
+    return rounded
+
+
+# ===== RUNNING TOTALS =====
+
+def group_bounds(groups, length: int):
+    """Start/end row positions of each run of equal group keys (the whole range if groups is None)"""
+    if groups is None:
+        return [0, length]
+    groups = np.asarray(groups)
+    return np.flatnonzero(np.concatenate(([True], groups[1:] != groups[:-1]))).tolist() + [length]
+
+
+def running_totals(daily: Dict[str, np.ndarray], groups=None) -> Dict[str, np.ndarray]:
+    """
+    Cumulative sum of each daily column, restarting for every group.
+
+    Args:
+        daily: Column name -> daily values
+        groups: Optional group key per row (e.g. account_id) for a batch of
+            ledgers stacked in one frame; each group's rows must be contiguous
+            and in day order
+
+    Returns:
+        Column name -> cumulative values (same order of additions as a running total)
+    """
+    totals = {}
+    for name, values in daily.items():
+        values = np.asarray(values, dtype=np.float64)
+        if groups is None:
+            totals[name] = np.cumsum(values)
+            continue
+        # np.cumsum per ledger rather than groupby().cumsum(), which uses
+        # compensated summation and so differs from a plain running total
+        total = np.empty_like(values)
+        bounds = group_bounds(groups, len(values))
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            np.cumsum(values[start:end], out=total[start:end])
+        totals[name] = total
+    return totals
+
+
+def running_balance(opening_balance, charges: np.ndarray, groups=None):
+    """
+    Opening and closing balance per day when each day's charge is deducted in turn.
+
+    Args:
+        opening_balance: Balance before the first day (of every group)
+        charges: Daily charge deducted from the balance
+        groups: Optional group key per row, as in running_totals()
+
+    Returns:
+        (opening, closing) arrays
+    """
+    charges = np.asarray(charges, dtype=np.float64)
+    opening = np.empty_like(charges)
+    closing = np.empty_like(charges)
+
+    # Same order of subtractions as a running balance, so the results are bit-identical
+    bounds = group_bounds(groups, len(charges))
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        balances = np.subtract.accumulate(np.concatenate(([float(opening_balance)], charges[start:end])))
+        opening[start:end] = balances[:-1]
+        closing[start:end] = balances[1:]
+    return opening, closing
+
+
+def day_numbers(length: int, groups=None) -> np.ndarray:
+    """Day of each row within its ledger (1, 2, ...), restarting for every group"""
+    days = np.empty(length, dtype=np.int64)
+    bounds = group_bounds(groups, length)
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        days[start:end] = np.arange(1, end - start + 1)
+    return days
+
+
+def previous_values(values, groups=None, fill: float = 0.0) -> np.ndarray:
+    """Previous day's value of each row (fill on the first day of every group)"""
+    values = np.asarray(values, dtype=np.float64)
+    previous = np.empty_like(values)
+    bounds = group_bounds(groups, len(values))
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        if end > start:
+            previous[start] = fill
+            previous[start + 1:end] = values[start:end - 1]
+    return previous
+
+
+# ===== MAX DEMAND =====
+
+def excess_demand_penalty(max_demand, contracted_load: float, fc_rate, days_in_month: int, edp_percent: float = 100,
+                          groups=None) -> Dict[str, np.ndarray]:
+    """
+    Daily excess demand penalty (EDP) with recalculation on a rising max demand.
+
+    On a day whose max demand exceeds edp_percent of the contracted load, the
+    total penalty (excess demand x FC rate) is spread over the remaining days of
+    the month. When the max demand is at least the previous penalised day's max
+    demand, the penalty already charged this month is deducted from the new
+    total first (no charge if nothing is left); a lower max demand spreads the
+    full new total again.
+
+    Everything but the running total of charged penalty is computed for all
+    days at once; that total feeds back into the next recalculation, so the
+    penalised days alone are walked in order, with plain float arithmetic in
+    the same order as a running loop.
+
+    Args:
+        max_demand: kW per day, in day order
+        contracted_load: kW
+        fc_rate: Rs. per kW, scalar or per day
+        days_in_month: Days the penalty is spread over
+        edp_percent: Max demand (% of contracted load) above which the penalty applies
+        groups: Optional group key per row for a batch of stacked ledgers, as in running_totals()
+
+    Returns:
+        Dict of per-day arrays: edp, day, excess_demand, remaining_days, new_total_penalty,
+        exceeds (above edp_percent), penalised (penalty day), recalculated (penalty reduced by what was already
+        charged), already_charged, remaining_penalty and previous_max_demand (of the
+        last penalised day)
+    """
+    max_demand = np.asarray(max_demand, dtype=np.float64)
+    fc_rate = np.broadcast_to(np.asarray(fc_rate, dtype=np.float64), max_demand.shape)
+    length = len(max_demand)
+    day = day_numbers(length, groups)
+
+    with np.errstate(invalid='ignore'):
+        exceeds = (max_demand / contracted_load) * 100 > edp_percent
+    remaining_days = days_in_month - day + 1
+    penalised = exceeds & (remaining_days > 0)
+    excess_demand = max_demand - contracted_load
+    new_total_penalty = excess_demand * fc_rate
+
+    edp = np.zeros(length, dtype=np.float64)
+    recalculated = np.zeros(length, dtype=bool)
+    already_charged = np.zeros(length, dtype=np.float64)
+    remaining_penalty = np.zeros(length, dtype=np.float64)
+    previous_max_demand = np.zeros(length, dtype=np.float64)
+
+    bounds = group_bounds(groups, length)
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        charged = 0.0
+        previous = 0.0
+        for row in (start + np.flatnonzero(penalised[start:end])).tolist():
+            md = max_demand[row]
+            total = new_total_penalty[row]
+            days_left = remaining_days[row]
+            previous_max_demand[row] = previous
+            if md >= previous and previous > 0:
+                remaining = total - charged
+                already_charged[row] = charged
+                remaining_penalty[row] = remaining
+                recalculated[row] = True
+                daily = remaining / days_left if remaining > 0 else 0
+            else:
+                daily = total / days_left
+            edp[row] = daily
+            charged += daily
+            previous = md
+
+    return {
+        'edp': edp,
+        'day': day,
+        'excess_demand': excess_demand,
+        'remaining_days': remaining_days,
+        'new_total_penalty': new_total_penalty,
+        'exceeds': exceeds,
+        'penalised': penalised,
+        'recalculated': recalculated,
+        'already_charged': already_charged,
+        'remaining_penalty': remaining_penalty,
+        'previous_max_demand': previous_max_demand
+    }
+
+
+# ===== TIERED (SLAB) CHARGES =====
+
+def slab_split(daily_consumption, slabs: Sequence[Slab], cumulative=None) -> np.ndarray:
+    """
+    Split each day's consumption across the slabs of a tiered tariff.
+
+    The cumulative consumption curve before and after each day is clipped
+    against every slab's bounds; the difference is the energy that day billed
+    in that slab. The slab the day ends in gets the day's consumption minus
+    the lower slabs' shares, exactly as the hand-written tier branches did, so
+    a day that stays inside one slab is billed on its consumption as is.
+
+    Args:
+        daily_consumption: kWh per day, in day order
+        slabs: Slab table, see Slab
+        cumulative: Month-to-date consumption after each day (default: cumsum of daily_consumption)
+
+    Returns:
+        Array of shape (days, slabs) with the kWh billed in each slab
+    """
+    daily = np.asarray(daily_consumption, dtype=np.float64)
+    after = np.cumsum(daily) if cumulative is None else np.asarray(cumulative, dtype=np.float64)
+    before = after - daily
+
+    uppers = np.array([np.inf if upper is None else upper for upper, _ in slabs], dtype=np.float64)
+    lowers = np.concatenate(([0.0], uppers[:-1]))
+    if np.any(np.diff(uppers) <= 0):
+        raise ValueError(f"Slab upper bounds must increase: {[upper for upper, _ in slabs]}")
+
+    # Slab each day ends in (a day ending exactly on a bound stays in the lower slab)
+    last_slab = np.minimum(np.searchsorted(uppers, after, side='left'), len(slabs) - 1)
+
+    split = np.zeros((len(daily), len(slabs)), dtype=np.float64)
+    remaining = daily.copy()
+    for slab, (lower, upper) in enumerate(zip(lowers, uppers)):
+        below_last = last_slab > slab
+        share = np.clip(after, lower, upper) - np.clip(before, lower, upper)
+        split[below_last, slab] = share[below_last]
+        remaining[below_last] -= share[below_last]
+        split[last_slab == slab, slab] = remaining[last_slab == slab]
+    return split
+
+
+def slab_charges(daily_consumption, slabs: Sequence[Slab], cumulative=None) -> np.ndarray:
+    """
+    Energy charge per day under a tiered tariff (kWh in each slab x slab rate, summed from the lowest slab).
+
+    Args:
+        daily_consumption: kWh per day, in day order
+        slabs: Slab table, see Slab
+        cumulative: Month-to-date consumption after each day (default: cumsum of daily_consumption)
+
+    Returns:
+        Array of daily energy charges
+    """
+    split = slab_split(daily_consumption, slabs, cumulative)
+    charges = np.zeros(len(split), dtype=np.float64)
+    for slab, (_, rate) in enumerate(slabs):
+        charges += split[:, slab] * rate
+    return charges
+
+
+# ===== ACTUAL VS EXPECTED =====
+
+def to_float(value) -> float:
+    """float(value), or NaN when it cannot be converted"""
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return np.nan
+
+
+def numeric_values(values) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Column as float64 the way float() reads each cell, plus a mask of unreadable cells.
+
+    Missing cells (None / NaN) read as 0. Cells float() cannot convert (e.g.
+    text) are flagged in the mask; their value is 0.
+    """
+    series = pd.Series(values)
+    missing = series.isna().to_numpy()
+    numbers = pd.to_numeric(series, errors='coerce').astype(np.float64)
+    unreadable = numbers.isna().to_numpy() & ~missing
+    if unreadable.any():
+        # pd.to_numeric is stricter than float() for a few spellings; give those cells float() itself
+        numbers[unreadable] = [to_float(value) for value in series[unreadable].tolist()]
+        unreadable = numbers.isna().to_numpy() & ~missing
+    numbers = numbers.to_numpy(dtype=np.float64)
+    return np.where(np.isnan(numbers), 0.0, numbers), unreadable
+
+
+def match_mask(actual, expected, tolerance: float = COMPARE_TOLERANCE) -> np.ndarray:
+    """
+    Per-row match of an actual and an expected column: |actual - expected| <= tolerance.
+
+    Missing values count as 0; a value that is not a number never matches.
+    """
+    actual_values, actual_unreadable = numeric_values(actual)
+    expected_values, expected_unreadable = numeric_values(expected)
+    with np.errstate(invalid='ignore'):
+        matches = np.abs(actual_values - expected_values) <= tolerance
+    return matches & ~actual_unreadable & ~expected_unreadable
+
+
+def row_status(matches: np.ndarray, columns: List[str]) -> np.ndarray:
+    """
+    Status per row from a (rows, columns) match matrix.
+
+    Returns:
+        ALL_MATCH for rows where every column matches, otherwise the
+        mismatching column names joined with ", " in column order
+    """
+    matches = np.asarray(matches, dtype=bool).reshape(-1, len(columns))
+    if not len(matches):
+        return np.array([], dtype=object)
+    # Only distinct mismatch patterns are turned into text; rows index into them
+    patterns, inverse = np.unique(matches, axis=0, return_inverse=True)
+    names = np.array(columns, dtype=object)
+    texts = np.array([", ".join(names[~pattern]) if not pattern.all() else ALL_MATCH for pattern in patterns],
+                     dtype=object)
+    return texts[np.asarray(inverse).reshape(-1)]
@@ -0,0 +1,179 @@
+"""
+ledger_store.py - Local incremental store for daily_prepaid_ledger rows
+
+Ledger rows are kept in a SQLite file keyed by (account_id, meter_number,
+start_date_time), together with a per-account high-water mark (the newest
+start_date_time seen). A later sync only asks the Engine API for the days
+since the watermark minus LOOKBACK_DAYS and merges them in: new days are
+inserted, re-computed days whose content changed are replaced, and untouched
+days are left alone.
+
+The store is not thread-safe; it is owned by the single ledger writer thread.
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+
+import pandas as pd
+
+# ===== CONFIGURATION =====
+
+DEFAULT_STORE_PATH = "ledger_store.sqlite"
+
+# Days before the watermark that are fetched again, because the engine may
+# re-compute the most recent day(s) after late meter data arrives
+LOOKBACK_DAYS = 2
+
+# Query parameter used to ask the ledger API for rows from a date onwards;
+# rows older than the lookback are also dropped locally if the API ignores it
+SINCE_PARAM = "start_date"
+
+logger = logging.getLogger(__name__)
+
+
+# ===== STORE =====
+
+class LedgerStore:
+    """SQLite-backed ledger rows and per-account watermarks"""
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH, fields: List[str] = None):
+        """
+        Args:
+            path: SQLite file (created on first use)
+            fields: Ledger columns kept per row, in report order
+        """
+        self.path = path
+        self.fields = list(fields) if fields else None
+        # Opened by the caller's thread and then handed to the single writer thread
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS ledger (
+                account_id      TEXT NOT NULL,
+                meter_number    TEXT NOT NULL,
+                start_date_time TEXT NOT NULL,
+                row_hash        TEXT NOT NULL,
+                payload         TEXT NOT NULL,
+                synced_at       TEXT NOT NULL,
+                PRIMARY KEY (account_id, meter_number, start_date_time)
+            );
+            CREATE TABLE IF NOT EXISTS watermark (
+                account_id      TEXT NOT NULL,
+                meter_number    TEXT NOT NULL,
+                start_date_time TEXT NOT NULL,
+                synced_at       TEXT NOT NULL,
+                PRIMARY KEY (account_id, meter_number)
+            );
+        ''')
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # ----- watermarks -----
+
+    def watermark(self, account_id: str, meter_number: str) -> Optional[str]:
+        """Newest start_date_time stored for an account, or None if it was never synced"""
+        row = self.connection.execute(
+            "SELECT start_date_time FROM watermark WHERE account_id = ? AND meter_number = ?",
+            (str(account_id), str(meter_number))
+        ).fetchone()
+        return row[0] if row else None
+
+    def since(self, account_id: str, meter_number: str, lookback_days: int = LOOKBACK_DAYS) -> Optional[str]:
+        """First day (YYYY-MM-DD) to fetch for an account, or None for a full download"""
+        watermark = self.watermark(account_id, meter_number)
+        if watermark is None:
+            return None
+        try:
+            return (pd.Timestamp(watermark) - pd.Timedelta(days=lookback_days)).strftime('%Y-%m-%d')
+        except (ValueError, TypeError):
+            logger.warning(f"Unreadable watermark {watermark!r} for account {account_id}; doing a full download")
+            return None
+
+    # ----- merge -----
+
+    def merge(self, account_id: str, meter_number: str, records: List[Dict[str, Any]],
+              since: str = None) -> Tuple[int, int]:
+        """
+        Insert new days and replace changed days for one account.
+
+        Args:
+            account_id: Account ID
+            meter_number: Meter serial number
+            records: Ledger rows as returned by the API (already filtered to the report fields)
+            since: Rows before this day are ignored (they are already stored)
+
+        Returns:
+            (inserted, updated) row counts
+        """
+        account_id, meter_number = str(account_id), str(meter_number)
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        existing = dict(self.connection.execute(
+            "SELECT start_date_time, row_hash FROM ledger WHERE account_id = ? AND meter_number = ?",
+            (account_id, meter_number)
+        ).fetchall())
+
+        inserted = updated = 0
+        newest = None
+        rows = []
+        for record in records:
+            start = record.get('start_date_time')
+            if start is None:
+                continue
+            start = str(start)
+            if since is not None and start[:10] < since:
+                continue
+            newest = start if newest is None or start > newest else newest
+
+            payload = json.dumps(record, sort_keys=True, default=str)
+            row_hash = hashlib.sha1(payload.encode('utf-8')).hexdigest()
+            previous = existing.get(start)
+            if previous == row_hash:
+                continue
+            if previous is None:
+                inserted += 1
+            else:
+                updated += 1
+            rows.append((account_id, meter_number, start, row_hash, payload, now))
+
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO ledger VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            if newest is not None:
+                self.connection.execute('''
+                    INSERT INTO watermark VALUES (?, ?, ?, ?)
+                    ON CONFLICT (account_id, meter_number) DO UPDATE SET
+                        start_date_time = MAX(start_date_time, excluded.start_date_time),
+                        synced_at = excluded.synced_at
+                ''', (account_id, meter_number, newest, now))
+
+        return inserted, updated
+
+    # ----- read back -----
+
+    def accounts(self) -> List[Tuple[str, str]]:
+        """(account_id, meter_number) of every synced account"""
+        return self.connection.execute(
+            "SELECT account_id, meter_number FROM watermark ORDER BY account_id, meter_number"
+        ).fetchall()
+
+    def load(self, account_id: str, meter_number: str) -> pd.DataFrame:
+        """All stored rows of one account, oldest day first"""
+        payloads = self.connection.execute(
+            "SELECT payload FROM ledger WHERE account_id = ? AND meter_number = ? ORDER BY start_date_time",
+            (str(account_id), str(meter_number))
+        ).fetchall()
+        records = [json.loads(payload) for (payload,) in payloads]
+        if not records:
+            return pd.DataFrame(columns=self.fields)
+        return pd.DataFrame(records, columns=self.fields or list(records[0]))
@@ -0,0 +1,116 @@
+"""
+lifeline.py - Vectorized life line switch recovery for the Formula validators
+
+While month-to-date consumption stays within the life line threshold the
+consumer is billed at the life line EC and FC rates. On the first day the
+cumulative consumption crosses the threshold the units and days already billed
+are re-priced at the regular rates, and the difference (the EC and FC life line
+switch charges) is recovered in equal parts over the next recovery_days days,
+starting with the crossing day.
+
+The crossing day is found with one search over the cumulative consumption and
+the recovery columns are filled by slicing, for one ledger or for a batch of
+ledgers stacked in one frame.
+"""
+
+from typing import Dict
+
+import numpy as np
+
+from Common.ledger_kernels import group_bounds
+
+# ===== CONFIGURATION =====
+
+DEFAULT_THRESHOLD = 100      # kWh month-to-date
+DEFAULT_RECOVERY_DAYS = 3
+
+
+# ===== SWITCH =====
+
+def lifeline_switch(daily_consumption, max_demand, ec_rate: float, switch_ec_rate: float, fc_rate: float,
+                    switch_fc_rate: float, contracted_load: float, days_in_month: int,
+                    threshold: float = DEFAULT_THRESHOLD, recovery_days: int = DEFAULT_RECOVERY_DAYS,
+                    groups=None) -> Dict[str, np.ndarray]:
+    """
+    Life line switch charges per day.
+
+    On the crossing day:
+        Total EC switch charge = (previous day cumm consumption x switch_ec_rate)
+                               - (previous day cumm consumption x ec_rate)
+        Total FC switch charge = ((switch_fc_rate x load x days before x MD ratio) / days_in_month)
+                               - ((fc_rate x load x days before x MD ratio) / days_in_month)
+    and each is deducted as total / recovery_days from the crossing day on
+    (fewer days if the ledger ends first). The EC charge is deducted on
+    recovery_days days; the FC charge is checked after that day's EC deduction
+    has been counted and so is deducted on recovery_days - 1 days, leaving one
+    share in remaining_fc.
+
+    Args:
+        daily_consumption: kWh per day, in day order
+        max_demand: kW per day (the crossing day's value sets the MD ratio)
+        ec_rate: Life line EC rate (Rs. per kWh) the units were billed at
+        switch_ec_rate: Regular EC rate the units are re-priced at
+        fc_rate: Life line FC rate (Rs. per kW)
+        switch_fc_rate: Regular FC rate
+        contracted_load: kW
+        days_in_month: Days the monthly FC is spread over
+        threshold: Month-to-date kWh above which the switch happens (inf = never)
+        recovery_days: Days the switch charges are recovered over
+        groups: Optional group key per row for a batch of stacked ledgers (see
+            ledger_kernels.running_totals)
+
+    Returns:
+        Dict of per-day arrays:
+            cumulative           month-to-date consumption
+            switched             cumulative consumption above the threshold that day
+            triggered            crossing day
+            total_ec, total_fc   switch charge totals (on the crossing day, 0 elsewhere)
+            daily_ec, daily_fc   switch charge deducted that day
+            cumm_ec_deducted, remaining_ec, cumm_fc_deducted, remaining_fc
+                                 running deducted / still to deduct (0 before the crossing day)
+    """
+    daily_consumption = np.asarray(daily_consumption, dtype=np.float64)
+    max_demand = np.asarray(max_demand, dtype=np.float64)
+    length = len(daily_consumption)
+
+    columns = {name: np.zeros(length, dtype=np.float64) for name in (
+        'cumulative', 'total_ec', 'total_fc', 'daily_ec', 'daily_fc',
+        'cumm_ec_deducted', 'remaining_ec', 'cumm_fc_deducted', 'remaining_fc'
+    )}
+    triggered = np.zeros(length, dtype=bool)
+
+    bounds = group_bounds(groups, length)
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        cumulative = np.cumsum(daily_consumption[start:end])
+        columns['cumulative'][start:end] = cumulative
+
+        above = cumulative > threshold
+        if not above.any():
+            continue
+        crossing = int(np.argmax(above))
+        day = start + crossing
+        triggered[day] = True
+
+        # Units and days billed at the life line rates before the crossing day
+        previous_cumm_consumption = cumulative[crossing] - daily_consumption[day]
+        total_ec = (previous_cumm_consumption * switch_ec_rate) - (previous_cumm_consumption * ec_rate)
+        days_crossed = crossing
+        max_demand_ratio = max_demand[day] / contracted_load
+        total_fc = ((switch_fc_rate * contracted_load * days_crossed * max_demand_ratio) / days_in_month) \
+            - ((fc_rate * contracted_load * days_crossed * max_demand_ratio) / days_in_month)
+        columns['total_ec'][day] = total_ec
+        columns['total_fc'][day] = total_fc
+
+        after = slice(day, end)
+        for kind, total, days in (('ec', total_ec, recovery_days), ('fc', total_fc, recovery_days - 1)):
+            daily = columns[f'daily_{kind}']
+            if days > 0:
+                daily[day:min(day + days, end)] = total / recovery_days
+            # Running deducted / remaining from the crossing day on (constant once recovered)
+            columns[f'cumm_{kind}_deducted'][after] = np.cumsum(daily[after])
+            columns[f'remaining_{kind}'][after] = np.subtract.accumulate(np.concatenate(([total], daily[after])))[1:]
+
+    with np.errstate(invalid='ignore'):
+        columns['switched'] = columns['cumulative'] > threshold
+    columns['triggered'] = triggered
+    return columns
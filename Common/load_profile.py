@@ -0,0 +1,241 @@
+"""
+load_profile.py - Vectorized daily load register generator for the PE scenarios
+
+Builds cumulative import/export Wh and VAh trajectories for one meter or a
+whole batch of meters as NumPy arrays in a single shot. Each day's increment
+is a random share of the average daily consumption (between MIN_FACTOR and
+MAX_FACTOR times the average), and the final day always lands exactly on the
+configured end value, as in the original day-by-day loop.
+"""
+
+from datetime import datetime
+from typing import Dict, List, Any
+
+import numpy as np
+
+# ===== CONFIGURATION =====
+
+MIN_FACTOR = 0.3
+MAX_FACTOR = 1.7
+
+POWER_FACTOR = 0.90         # VAh = Wh / POWER_FACTOR
+DEFAULT_END_EXPORT_WH = 750
+
+REGISTER_NAMES = ('import_Wh', 'import_VAh', 'export_Wh', 'export_VAh')
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+# ===== REGISTER GENERATION =====
+
+def cumulative_profile(end_values, total_days: int, min_factor: float = MIN_FACTOR,
+                       max_factor: float = MAX_FACTOR, rng: np.random.Generator = None) -> np.ndarray:
+    """
+    Generate non-decreasing cumulative register values ending exactly at end_values.
+
+    Args:
+        end_values: End value(s) on the final day; scalar or array of any shape
+        total_days: Number of daily readings
+        min_factor: Smallest daily increment as a fraction of the average
+        max_factor: Largest daily increment as a fraction of the average
+        rng: NumPy random generator (default: a fresh default_rng())
+
+    Returns:
+        int64 array of shape end_values.shape + (total_days,)
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    end_values = np.asarray(end_values, dtype=np.float64)
+    if total_days <= 0:
+        return np.zeros(end_values.shape + (0,), dtype=np.int64)
+
+    # float32 halves memory traffic; the scaled series is only floored to whole Wh/VAh
+    weights = rng.random(end_values.shape + (total_days,), dtype=np.float32)
+    weights *= max_factor - min_factor
+    weights += min_factor
+    np.cumsum(weights, axis=-1, out=weights)
+    weights *= (end_values / weights[..., -1]).astype(np.float32)[..., np.newaxis]
+
+    # Truncating a non-decreasing positive series keeps it non-decreasing; the final
+    # day is pinned exactly and earlier days are capped at it against rounding
+    profile = weights.astype(np.int64)
+    profile[..., -1] = end_values.astype(np.int64)
+    np.minimum(profile, profile[..., -1:], out=profile)
+    return profile
+
+
+def daily_load_registers(end_wh, total_days: int, end_export_wh=DEFAULT_END_EXPORT_WH,
+                         power_factor: float = POWER_FACTOR,
+                         rng: np.random.Generator = None) -> Dict[str, np.ndarray]:
+    """
+    Generate import/export Wh and VAh trajectories for one meter or a batch.
+
+    Args:
+        end_wh: Final import Wh (END_WH); scalar, or one value per meter
+        total_days: Number of daily readings
+        end_export_wh: Final export Wh; scalar or one value per meter
+        power_factor: Ratio used to derive VAh from Wh
+        rng: NumPy random generator
+
+    Returns:
+        Dict of register name -> int64 array shaped (total_days,) for a scalar
+        end_wh, or (meters, total_days) for a batch
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    end_wh = np.asarray(end_wh, dtype=np.float64)
+    end_export_wh = np.broadcast_to(np.asarray(end_export_wh, dtype=np.float64), end_wh.shape)
+
+    end_values = {
+        'import_Wh': end_wh,
+        'import_VAh': end_wh / power_factor,
+        'export_Wh': end_export_wh,
+        'export_VAh': end_export_wh / power_factor
+    }
+    # One register at a time keeps peak memory at a single (meters, days) array
+    return {name: cumulative_profile(end_values[name], total_days, rng=rng) for name in REGISTER_NAMES}
+
+
+# ===== ROW BUILDING =====
+
+def daily_timestamps(start_date: datetime, total_days: int) -> List[str]:
+    """Return 'YYYY-MM-DD HH:MM:SS' strings for total_days consecutive days from start_date"""
+    days = np.datetime64(start_date, 's') + np.arange(total_days) * np.timedelta64(1, 'D')
+    return [value.replace('T', ' ') for value in np.datetime_as_string(days, unit='s').tolist()]
+
+
+def daily_load_rows(meter_srno: str, start_date: datetime, registers: Dict[str, np.ndarray],
+                    meter_type: str = '1-ph') -> List[Dict[str, Any]]:
+    """
+    Build dailyload_vee_validated rows for one meter from generated registers.
+
+    Args:
+        meter_srno: Meter serial number (device identifier)
+        start_date: Timestamp of the first reading
+        registers: One meter's registers from daily_load_registers()
+        meter_type: Meter type column value
+
+    Returns:
+        List of row dicts in the DAILYLOAD_COLUMNS layout
+    """
+    total_days = len(registers['import_Wh'])
+    timestamps = daily_timestamps(start_date, total_days)
+    now = datetime.now().strftime(TIMESTAMP_FORMAT)
+    dcu_serial = f'DCU{meter_srno[-6:]}'
+
+    # tolist() turns the NumPy values into plain ints that psycopg2 can adapt
+    columns = {name: registers[name].tolist() for name in REGISTER_NAMES}
+
+    return [
+        {
+            'device_id': None,
+            'data_timestamp': timestamp,
+            'dcu_serial': dcu_serial,
+            'device_identifier': meter_srno,
+            'data_source': 'PUSH',
+            'data_type': 'DLFV',
+            'import_Wh': columns['import_Wh'][day],
+            'import_VAh': columns['import_VAh'][day],
+            'export_Wh': columns['export_Wh'][day],
+            'export_VAh': columns['export_VAh'][day],
+            'exec_datetime': timestamp,
+            'dailyload_datetime': timestamp,
+            'created_at': now,
+            'updated_at': now,
+            'is_active': True,
+            'is_valid': True,
+            'is_estimated': False,
+            'is_edited': False,
+            'meter_type': meter_type
+        }
+        for day, timestamp in enumerate(timestamps)
+    ]
+
+
+def progress_days(total_days: int, every: int = 10) -> List[int]:
+    """Day indices to log progress for: first day, every Nth day and the last day"""
+    if total_days <= 0:
+        return []
+    return sorted(set(range(0, total_days, every)) | {total_days - 1})
+
+
+def profile_instant_rows(meter_srno: str, start_date: datetime, md_w, md_va,
+                         meter_type: str = '1-ph') -> List[Dict[str, Any]]:
+    """
+    Build profile_instant_vee rows for one meter from daily MD_W / MD_VA series.
+
+    Args:
+        meter_srno: Meter serial number (device identifier)
+        start_date: Timestamp of the first reading
+        md_w: MD_W per day
+        md_va: MD_VA per day
+        meter_type: Meter type column value
+
+    Returns:
+        List of row dicts in the PROFILE_INSTANT_COLUMNS layout
+    """
+    md_w = np.asarray(md_w).tolist()
+    md_va = np.asarray(md_va).tolist()
+    timestamps = daily_timestamps(start_date, len(md_w))
+    now = datetime.now().strftime(TIMESTAMP_FORMAT)
+    dcu_serial = f'DCU{meter_srno[-6:]}'
+
+    return [
+        {
+            'meter_id': 0,
+            'device_identifier': meter_srno,
+            'data_timestamp': timestamp,
+            'create_timestamp': timestamp,
+            'exec_datetime': timestamp,
+            'meter_type': meter_type,
+            'import_Wh': 0,
+            'export_Wh': 0,
+            'import_VAh': 0,
+            'export_VAh': 0,
+            'cumm_energy_VArh_Q1': 0,
+            'cumm_energy_VArh_Q2': 0,
+            'cumm_energy_VArh_Q3': 0,
+            'cumm_energy_VArh_Q4': 0,
+            'signed_active_power_KVAR': 0,
+            'MD_W': md_w[day],
+            'MD_VA': md_va[day],
+            'MD_W_datetime': timestamp,
+            'MD_VA_datetime': timestamp,
+            'PF': 1,
+            'Rphase_signed_PF': 0,
+            'Yphase_signed_PF': 0,
+            'Bphase_signed_PF': 0,
+            'voltage': 230,
+            'RN_voltage': 0,
+            'YN_voltage': 0,
+            'BN_voltage': 0,
+            'phase_current': 0,
+            'Rphase_current': 0,
+            'Yphase_current': 0,
+            'Bphase_current': 0,
+            'neutral_current': 0,
+            'frequency': 50.0,
+            'active_power_W': 0,
+            'apparent_power_VA': 0,
+            'load_limit_value': 0,
+            'load_limit_func_status': False,
+            'cumm_tamper_count': 0,
+            'cumm_billing_count': 0,
+            'cumm_programming_count': 0,
+            'num_power_fail': 0,
+            'num_power_fail_dur': 0,
+            'meter_current_datetime': timestamp,
+            'last_billing_datetime': timestamp,
+            'cumm_power_on_dur_minute': 0,
+            'is_valid': True,
+            'is_estimated': False,
+            'is_edited': False,
+            'created_at': now,
+            'updated_at': now,
+            'device_id': None,
+            'file_log_id': 0,
+            'dcu_serial': dcu_serial,
+            'hes_pk': '0',
+            'hes_msg_id': None,
+            'hes_created_at': 0,
+            'hes_created_at_str': timestamp
+        }
+        for day, timestamp in enumerate(timestamps)
+    ]
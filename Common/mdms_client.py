@@ -0,0 +1,232 @@
+"""
+mdms_client.py - Paginated readback from the MDMS dailyloads / profileinstant APIs
+
+The MDMS db-service endpoints return one page per request. The first page is
+fetched to discover the total; the remaining pages are then fetched
+concurrently and their records are yielded page by page, in order, so report
+writers can stream rows instead of holding every page in memory.
+
+When a response carries no total, pages are fetched in windows of
+PAGE_WORKERS until a short (or empty) page marks the end.
+
+The badge_numbers payload takes a list, so many meters can be read back with
+one paged query: fetch_batched() sends the meters in chunks of BATCH_SIZE and
+splits the combined records back out per meter. prefetch() stores such a
+batch so the per-meter report fetches of a suite run are served from memory.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Any, Optional
+
+from Common import http_client
+
+# ===== CONFIGURATION =====
+
+PAGE_SIZE = 100
+PAGE_WORKERS = 4
+MAX_PAGES = 10000  # safety stop for endpoints that never return a short page
+BATCH_SIZE = 50    # meters per badge_numbers list in batched readback
+
+MDMS_HEADERS = {'accept': 'application/json', 'Content-Type': 'application/json'}
+
+# Where a page response may report the overall size (top level or nested)
+# ('count' is left out: many APIs use it for the records in the current page)
+TOTAL_KEYS = ('total', 'total_count', 'totalCount', 'total_records', 'totalRecords')
+PAGES_KEYS = ('total_pages', 'totalPages', 'pages', 'num_pages')
+NESTED_KEYS = ('pagination', 'meta', 'page_info')
+
+# Record fields that identify the meter a record belongs to, in order of preference
+METER_KEYS = ('badge_number', 'meter_serial_number', 'device_identifier')
+
+logger = logging.getLogger(__name__)
+
+_prefetched = {}   # (url, meter) -> records, filled by prefetch()
+_prefetched_lock = threading.Lock()
+
+
+# ===== PAGES =====
+
+def fetch_page(url: str, badge_numbers: List[str], page: int, limit: int = PAGE_SIZE) -> Dict[str, Any]:
+    """
+    Fetch one page for the given meters.
+
+    Raises:
+        requests.HTTPError: If the API does not answer 200
+    """
+    payload = {
+        "badge_numbers": list(badge_numbers),
+        "page": page,
+        "limit": limit
+    }
+    response = http_client.post(url, json=payload, headers=MDMS_HEADERS, idempotent=True)
+    response.raise_for_status()
+    return response.json()
+
+
+def page_records(body: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Records of one page response (empty list when there are none)"""
+    if isinstance(body, dict) and body.get('data'):
+        return body['data']
+    return []
+
+
+def page_count(body: Dict[str, Any], limit: int) -> Optional[int]:
+    """Total number of pages reported by a page response, or None if it does not say"""
+    if not isinstance(body, dict):
+        return None
+    sources = [body] + [body[key] for key in NESTED_KEYS if isinstance(body.get(key), dict)]
+    for source in sources:
+        for key in PAGES_KEYS:
+            if isinstance(source.get(key), int):
+                return source[key]
+        for key in TOTAL_KEYS:
+            if isinstance(source.get(key), int):
+                return -(-source[key] // limit)
+    return None
+
+
+def iter_records(url: str, badge_numbers: List[str], page_size: int = PAGE_SIZE,
+                 max_workers: int = PAGE_WORKERS) -> Iterator[Dict[str, Any]]:
+    """
+    Yield every record for the given meters across all pages, in page order.
+
+    A failed first page is logged and yields nothing (as the single-page
+    fetch did); a failure on a later page raises, so a report is never
+    silently truncated.
+
+    A single meter that was prefetched is served from the prefetch store
+    (once) without calling the API.
+
+    Args:
+        url: MDMS endpoint (DAILYLOAD_API_URL or PROFILE_INSTANT_API_URL)
+        badge_numbers: Meter serial numbers to query
+        page_size: Records requested per page
+        max_workers: Pages fetched concurrently after the first one
+    """
+    if len(badge_numbers) == 1:
+        with _prefetched_lock:
+            prefetched = _prefetched.pop((url, str(badge_numbers[0])), None)
+        if prefetched is not None:
+            yield from prefetched
+            return
+
+    try:
+        first = fetch_page(url, badge_numbers, 1, page_size)
+    except Exception as e:
+        logger.warning(f"Failed to fetch {url} page 1 for {len(badge_numbers)} meter(s): {str(e)}")
+        return
+
+    records = page_records(first)
+    yield from records
+    if len(records) < page_size:
+        return
+
+    total_pages = page_count(first, page_size)
+    last_page = min(total_pages, MAX_PAGES) if total_pages is not None else MAX_PAGES
+    if total_pages is not None and total_pages > MAX_PAGES:
+        logger.warning(f"{url} reports {total_pages} pages for {len(badge_numbers)} meter(s); "
+                       f"only the first {MAX_PAGES} are read")
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mdms-page") as executor:
+        next_page = 2
+        while next_page <= last_page:
+            window = range(next_page, min(next_page + max_workers, last_page + 1))
+            futures = [executor.submit(fetch_page, url, badge_numbers, page, page_size) for page in window]
+            for future in futures:
+                records = page_records(future.result())
+                yield from records
+                if total_pages is None and len(records) < page_size:
+                    # Short page: this was the last one; later speculative pages are empty
+                    return
+            next_page = window.stop
+
+    if total_pages is None:
+        logger.warning(f"{url} returned {MAX_PAGES} full pages for {len(badge_numbers)} meter(s) "
+                       f"without a short page; stopped at MAX_PAGES")
+
+
+# ===== BATCHED READBACK =====
+
+def record_meter(record: Dict[str, Any], meters: Optional[Iterable[str]] = None) -> Optional[str]:
+    """
+    Meter a record belongs to (see METER_KEYS), or None.
+
+    The badge number of a meter is not its serial number ("GPMPO..." vs
+    "PO..."), so with meters given the record is matched on whichever of its
+    METER_KEYS values was requested; otherwise the first non-empty one is returned.
+    """
+    values = [str(record[key]) for key in METER_KEYS if record.get(key) not in (None, '')]
+    if meters is None:
+        return values[0] if values else None
+    requested = meters if isinstance(meters, (set, frozenset, dict)) else set(meters)
+    for value in values:
+        if value in requested:
+            return value
+    return None
+
+
+def chunked(meters: Iterable[str], chunk_size: int = BATCH_SIZE) -> List[List[str]]:
+    """Split meters into badge_numbers lists of at most chunk_size, dropping blanks and duplicates"""
+    unique = list(dict.fromkeys(str(meter).strip() for meter in meters if meter and str(meter).strip()))
+    chunk_size = max(1, chunk_size)
+    return [unique[i:i + chunk_size] for i in range(0, len(unique), chunk_size)]
+
+
+def fetch_batched(url: str, meters: Iterable[str], chunk_size: int = BATCH_SIZE, page_size: int = PAGE_SIZE,
+                  max_workers: int = PAGE_WORKERS) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Read back many meters with one paged query per chunk and split the records per meter.
+
+    Args:
+        url: MDMS endpoint (DAILYLOAD_API_URL or PROFILE_INSTANT_API_URL)
+        meters: Meter serial numbers (blanks and duplicates are ignored)
+        chunk_size: Meters per badge_numbers list
+        page_size: Records requested per page
+        max_workers: Pages fetched concurrently within a chunk
+
+    Returns:
+        Dict of meter -> records in API order; meters without data map to []
+    """
+    chunks = chunked(meters, chunk_size)
+    by_meter = {meter: [] for chunk in chunks for meter in chunk}
+    unmatched = 0
+
+    for number, chunk in enumerate(chunks, start=1):
+        logger.info(f"Batched readback {url}: chunk {number}/{len(chunks)} ({len(chunk)} meters)")
+        requested = set(chunk)
+        for record in iter_records(url, chunk, page_size, max_workers):
+            records = by_meter.get(record_meter(record, requested))
+            if records is None:
+                unmatched += 1
+            else:
+                records.append(record)
+
+    if unmatched:
+        logger.warning(f"Batched readback {url}: {unmatched} record(s) did not match a requested meter")
+    return by_meter
+
+
+def prefetch(url: str, meters: Iterable[str], chunk_size: int = BATCH_SIZE, **kwargs) -> int:
+    """
+    Batch-read meters and keep their records for the next iter_records(url, [meter]) call.
+
+    Meters that came back empty are not stored, so a failed chunk falls back to
+    the per-meter query instead of producing an empty report.
+
+    Returns:
+        Number of records stored
+    """
+    by_meter = fetch_batched(url, meters, chunk_size, **kwargs)
+    with _prefetched_lock:
+        for meter, records in by_meter.items():
+            if records:
+                _prefetched[(url, meter)] = records
+    return sum(len(records) for records in by_meter.values())
+
+
+def clear_prefetched():
+    """Drop every prefetched record that was not consumed"""
+    with _prefetched_lock:
+        _prefetched.clear()
@@ -0,0 +1,183 @@
+"""
+month_targets.py - Piecewise multi-month target engine for the PE scenarios
+
+A multi-month scenario is described by a list of (month, cumulative END Wh,
+MD_W) segments and the meter install date. The month boundaries and the day
+index of every month end are computed once; the daily load registers and the
+profile instant MD series for all months are then produced as NumPy arrays.
+
+Daily load:      import Wh/VAh reach each month's cumulative target exactly on
+                 the month end; export Wh/VAh grow across the whole horizon.
+Profile instant: MD_W/MD_VA restart at 0 on the first day of every month and
+                 ramp linearly to that month's MD target on its last day.
+"""
+
+from calendar import monthrange
+from datetime import datetime
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from Common.load_profile import (
+    MIN_FACTOR, MAX_FACTOR, POWER_FACTOR, DEFAULT_END_EXPORT_WH, cumulative_profile
+)
+
+# ===== CONFIGURATION =====
+
+# (month number starting at 1, cumulative END Wh at month end, MD_W target for the month)
+MonthTarget = Tuple[int, float, float]
+
+# "anniversary": each month ends on the install day of the next month (chained)
+# "calendar":    each month ends on the last day of its calendar month
+BOUNDARY_MODES = ("anniversary", "calendar")
+
+
+# ===== MONTH BOUNDARIES =====
+
+def add_months(dt: datetime, months: int) -> datetime:
+    """Same day `months` months later, clamped to the last day of a shorter month"""
+    month_index = dt.month - 1 + months
+    year, month = dt.year + month_index // 12, month_index % 12 + 1
+    day = min(dt.day, monthrange(year, month)[1])
+    return datetime(year, month, day, 0, 0, 0)
+
+
+def month_boundaries(start_date: datetime, months: int, boundary: str = "anniversary") -> List[datetime]:
+    """
+    End date of each of the next `months` months.
+
+    Args:
+        start_date: First day of month 1
+        months: Number of months
+        boundary: "anniversary" (step one month at a time from the install day)
+            or "calendar" (last day of each calendar month, starting with the install month)
+    """
+    if boundary not in BOUNDARY_MODES:
+        raise ValueError(f"Unknown month boundary mode: {boundary} (expected one of {BOUNDARY_MODES})")
+
+    boundaries = []
+    current = start_date
+    for month in range(months):
+        if boundary == "calendar":
+            first_of_month = add_months(start_date.replace(day=1), month)
+            last_day = monthrange(first_of_month.year, first_of_month.month)[1]
+            boundaries.append(first_of_month.replace(day=last_day, hour=0, minute=0, second=0))
+        else:
+            current = add_months(current, 1)
+            boundaries.append(current)
+    return boundaries
+
+
+# ===== TARGET PLAN =====
+
+class MonthlyTargetPlan:
+    """Month boundaries and per-day month indices for a piecewise target schedule"""
+
+    def __init__(self, start_date: datetime, segments: Sequence[MonthTarget], boundary: str = "anniversary"):
+        """
+        Args:
+            start_date: Meter install date (first day of month 1)
+            segments: (month, cumulative END Wh, MD_W) per month, months numbered 1..N
+            boundary: Month end convention, see BOUNDARY_MODES
+
+        Raises:
+            ValueError: If months are not numbered 1..N, the Wh targets decrease
+                or the boundary mode is unknown
+        """
+        segments = sorted(segments, key=lambda segment: segment[0])
+        if [segment[0] for segment in segments] != list(range(1, len(segments) + 1)):
+            raise ValueError(f"Month targets must be numbered 1..N without gaps: {[s[0] for s in segments]}")
+
+        self.segments = segments
+        self.wh_targets = np.array([segment[1] for segment in segments], dtype=np.float64)
+        self.md_targets = np.array([segment[2] for segment in segments], dtype=np.float64)
+        if np.any(np.diff(self.wh_targets) < 0):
+            raise ValueError(f"Cumulative Wh targets must not decrease: {self.wh_targets.tolist()}")
+
+        self.start_date = start_date
+        self.boundaries = month_boundaries(start_date, len(segments), boundary)
+        self.end_date = add_months(start_date, len(segments))
+        self.total_days = (self.end_date - start_date).days + 1
+
+        # Day index of each month's last day; the last month runs on to the end of the
+        # horizon, which can lie past its calendar month end
+        self.boundary_indices = np.array([(month_end - start_date).days for month_end in self.boundaries])
+        self.end_indices = self.boundary_indices.copy()
+        self.end_indices[-1] = self.total_days - 1
+        self.start_indices = np.concatenate(([0], self.end_indices[:-1] + 1))
+        self.month_of_day = np.repeat(np.arange(len(segments)), self.end_indices - self.start_indices + 1)
+
+    @property
+    def months(self) -> int:
+        return len(self.segments)
+
+    def is_month_end(self) -> np.ndarray:
+        """Boolean mask of days that close a month (the final day included)"""
+        mask = np.zeros(self.total_days, dtype=bool)
+        mask[self.end_indices] = True
+        return mask
+
+    def daily_load_registers(self, end_export_wh=DEFAULT_END_EXPORT_WH, power_factor: float = POWER_FACTOR,
+                             rng: np.random.Generator = None) -> Dict[str, np.ndarray]:
+        """
+        Import/export Wh and VAh trajectories that hit every month-end target exactly.
+
+        Returns:
+            Dict of register name -> int64 array of shape (total_days,)
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        return {
+            'import_Wh': self.piecewise_cumulative(self.wh_targets, rng),
+            'import_VAh': self.piecewise_cumulative(self.wh_targets / power_factor, rng),
+            'export_Wh': cumulative_profile(end_export_wh, self.total_days, rng=rng),
+            'export_VAh': cumulative_profile(end_export_wh / power_factor, self.total_days, rng=rng)
+        }
+
+    def md_series(self, power_factor: float = POWER_FACTOR) -> Dict[str, np.ndarray]:
+        """
+        MD_W and MD_VA that restart at 0 each month and reach the month's target on its last day.
+
+        Returns:
+            Dict with 'MD_W' and 'MD_VA' int64 arrays of shape (total_days,)
+        """
+        month = self.month_of_day
+        elapsed = np.arange(self.total_days) - self.start_indices[month]
+        # The ramp spans the month up to its boundary; days after it (last month only) stay at the target
+        length = (self.boundary_indices - self.start_indices + 1)[month]
+        ratio = np.minimum(np.where(length > 1, elapsed / np.maximum(length - 1, 1), 1.0), 1.0)
+        return {
+            'MD_W': (self.md_targets[month] * ratio).astype(np.int64),
+            'MD_VA': ((self.md_targets / power_factor)[month] * ratio).astype(np.int64)
+        }
+
+    def piecewise_cumulative(self, targets, rng: np.random.Generator = None,
+                             min_factor: float = MIN_FACTOR, max_factor: float = MAX_FACTOR) -> np.ndarray:
+        """
+        Random non-decreasing cumulative series pinned to a target at every month end.
+
+        Args:
+            targets: Cumulative target per month, shape (months,) or (meters, months)
+
+        Returns:
+            int64 array of shape targets.shape[:-1] + (total_days,)
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        targets = np.asarray(targets, dtype=np.float64)
+        month = self.month_of_day
+
+        weights = rng.uniform(min_factor, max_factor, size=targets.shape[:-1] + (self.total_days,))
+        np.cumsum(weights, axis=-1, out=weights)
+
+        # Cumulative weight before each month starts and the weight spent inside each month
+        before = np.where(self.start_indices > 0, weights[..., self.start_indices - 1], 0.0)
+        spent = weights[..., self.end_indices] - before
+        previous = np.concatenate((np.zeros(targets.shape[:-1] + (1,)), targets[..., :-1]), axis=-1)
+
+        fraction = (weights - before[..., month]) / spent[..., month]
+        values = previous[..., month] + fraction * (targets - previous)[..., month]
+
+        pinned = targets.astype(np.int64)
+        profile = np.floor(values).astype(np.int64)
+        profile[..., self.end_indices] = pinned
+        np.minimum(profile, pinned[..., month], out=profile)
+        return profile
@@ -0,0 +1,263 @@
+"""
+result_store.py - Optional columnar (Parquet) store for the pipeline's data frames
+
+Every stage used to hand its data to the next one through Excel: the PE
+reports are read back by account.py, Download_Ledger.py writes one sheet per
+consumer and the Formula validators write Formula_10x.xlsx. xlsx is the
+slowest format pandas reads or writes. With the columnar store turned on, the
+same frames are also written as Parquet (via pyarrow), and the downstream tools
+read them from there. The Excel files are still written for people to look at.
+
+Layout (hive-style partitions, one folder per run and report):
+    <root>/<dataset>/run_id=<run>/report_id=<report>/part-00000.parquet
+
+Datasets:
+    consumer_details   Parameter / Value rows of each PE report's Consumer Details sheet
+    daily_load         Daily Load sheet rows (MDMS daily load records)
+    profile_instant    Profile Instant sheet rows (MDMS profile instant records)
+    ledger             Prepaid ledger rows per consumer (Download_Ledger.py)
+    comparison         Actual vs expected ledger frames (Formula validators, validate_fleet.py)
+
+Large frames are written in parts as rows stream in, so memory stays bounded.
+A report's parts are written under a hidden staging folder and moved into place
+when the report is committed, so readers never see half a report. pyarrow is
+optional: without it the store reports itself unavailable and the tools keep
+to Excel.
+"""
+
+import logging
+import os
+import shutil
+import uuid
+from datetime import datetime
+from typing import Any, Iterable, List, Optional
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency
+    pa = pq = None
+
+# ===== CONFIGURATION =====
+
+RESULT_STORE_ROOT = os.path.join("Result_File", "columnar")
+DATASETS = ("consumer_details", "daily_load", "profile_instant", "ledger", "comparison")
+RUN_ID_FORMAT = "%Y%m%d_%H%M%S"
+PART_ROWS = 50000       # rows per Parquet part file when streaming
+COMPRESSION = "snappy"
+
+logger = logging.getLogger(__name__)
+
+_active = {'store': None}  # store enabled for this process (see enable())
+
+
+def available() -> bool:
+    """True when pyarrow is installed"""
+    return pa is not None
+
+
+def new_run_id() -> str:
+    return datetime.now().strftime(RUN_ID_FORMAT)
+
+
+def _partition(key: str, value: str) -> str:
+    return f"{key}={value}"
+
+
+def _value(folder: str) -> str:
+    return folder.split("=", 1)[1]
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def to_arrow(df: pd.DataFrame):
+    """
+    Arrow table of a frame with consistent column types.
+
+    Object columns holding numbers plus empty placeholders (MDMS records use ""
+    for a missing reading) are stored as numbers; any other object column is
+    stored as text, so IDs such as meter numbers keep their leading zeros.
+    """
+    columns = {}
+    for name in df.columns:
+        values = df[name]
+        if values.dtype == object:
+            empty = values.isna() | values.map(lambda value: value == "")
+            if (~empty).any() and values[~empty].map(_is_number).all():
+                values = pd.to_numeric(values.where(~empty), errors='coerce')
+            else:
+                values = values.where(values.isna(), values.astype(str)).where(values.notna(), None)
+        columns[str(name)] = values
+    return pa.Table.from_pandas(pd.DataFrame(columns, index=df.index), preserve_index=False)
+
+
+# ===== STORE =====
+
+class ResultStore:
+    """Parquet datasets of one run under a root folder"""
+
+    def __init__(self, root: str = RESULT_STORE_ROOT, run_id: str = None):
+        if not available():
+            raise RuntimeError("The columnar result store needs pyarrow (pip install pyarrow)")
+        self.root = root
+        self.run_id = run_id or new_run_id()
+
+    def report_folder(self, dataset: str, report_id: str, run_id: str = None) -> str:
+        return os.path.join(self.root, dataset, _partition("run_id", run_id or self.run_id),
+                            _partition("report_id", report_id))
+
+    # ----- write -----
+
+    def writer(self, dataset: str, report_id: str = None) -> "PartWriter":
+        """Streaming writer for one report of a dataset (commit() publishes it; the report ID can wait until then)"""
+        if dataset not in DATASETS:
+            raise ValueError(f"Unknown dataset {dataset!r} (expected one of {', '.join(DATASETS)})")
+        return PartWriter(self, dataset, report_id)
+
+    def write(self, dataset: str, report_id: str, df: pd.DataFrame) -> str:
+        """Write a whole frame as one report of a dataset (replacing it within this run)"""
+        writer = self.writer(dataset, report_id)
+        writer.append_frame(df)
+        return writer.commit()
+
+    # ----- read -----
+
+    def runs(self, dataset: str) -> List[str]:
+        """Run IDs of a dataset, oldest first"""
+        folder = os.path.join(self.root, dataset)
+        if not os.path.isdir(folder):
+            return []
+        return sorted(_value(name) for name in os.listdir(folder) if name.startswith("run_id="))
+
+    def latest_run(self, dataset: str) -> Optional[str]:
+        runs = self.runs(dataset)
+        return runs[-1] if runs else None
+
+    def report_ids(self, dataset: str, run_id: str = None) -> List[str]:
+        """Report IDs of a dataset in a run (default: the latest run)"""
+        run_id = run_id or self.latest_run(dataset)
+        if run_id is None:
+            return []
+        folder = os.path.join(self.root, dataset, _partition("run_id", run_id))
+        return sorted(_value(name) for name in os.listdir(folder) if name.startswith("report_id="))
+
+    def read(self, dataset: str, report_id: str = None, run_id: str = None,
+             columns: List[str] = None) -> pd.DataFrame:
+        """
+        One report of a dataset, or every report of the run with a report_id column.
+
+        Args:
+            dataset: Dataset name
+            report_id: Report to read (default: all reports)
+            run_id: Run to read (default: the dataset's latest run)
+            columns: Columns to read (default: all)
+        """
+        run_id = run_id or self.latest_run(dataset)
+        if run_id is None:
+            return pd.DataFrame(columns=columns)
+        if report_id is not None:
+            return self._read_report(self.report_folder(dataset, report_id, run_id), columns)
+
+        frames = []
+        for report in self.report_ids(dataset, run_id):
+            frame = self._read_report(self.report_folder(dataset, report, run_id), columns)
+            frame.insert(0, 'report_id', report)
+            frames.append(frame)
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+    def iter_reports(self, dataset: str, run_id: str = None, columns: List[str] = None):
+        """(report_id, DataFrame) of every report in a run, one report in memory at a time"""
+        run_id = run_id or self.latest_run(dataset)
+        for report in self.report_ids(dataset, run_id):
+            yield report, self._read_report(self.report_folder(dataset, report, run_id), columns)
+
+    @staticmethod
+    def _read_report(folder: str, columns: List[str] = None) -> pd.DataFrame:
+        if not os.path.isdir(folder):
+            return pd.DataFrame(columns=columns)
+        # Parts are read one by one: a column can be numeric in one part and text in another
+        parts = [pq.read_table(os.path.join(folder, name), columns=columns).to_pandas()
+                 for name in sorted(os.listdir(folder)) if name.endswith(".parquet")]
+        if not parts:
+            return pd.DataFrame(columns=columns)
+        return parts[0] if len(parts) == 1 else pd.concat(parts, ignore_index=True)
+
+
+class PartWriter:
+    """Rows of one report, buffered and written as Parquet parts into a staging folder"""
+
+    def __init__(self, store: ResultStore, dataset: str, report_id: str = None):
+        self.store = store
+        self.dataset = dataset
+        self.report_id = report_id
+        # Hidden folder next to the report folders (same file system, so commit() is a rename)
+        self.staging = os.path.join(store.root, dataset, _partition("run_id", store.run_id), f".staging-{uuid.uuid4().hex}")
+        self.columns: Optional[List[str]] = None
+        self.rows: List[list] = []
+        self.parts = 0
+        self.row_count = 0
+
+    def set_columns(self, columns: Iterable[Any]):
+        self.columns = [str(column) for column in columns]
+
+    def append(self, values: Iterable[Any]):
+        self.rows.append(list(values))
+        self.row_count += 1
+        if len(self.rows) >= PART_ROWS:
+            self.flush()
+
+    def append_frame(self, df: pd.DataFrame):
+        if self.columns is None:
+            self.set_columns(df.columns)
+        self._write(df)
+
+    def flush(self):
+        if not self.rows:
+            return
+        columns = self.columns or [f"column_{index + 1}" for index in range(max(len(row) for row in self.rows))]
+        self._write(pd.DataFrame(self.rows, columns=columns))
+        self.rows = []
+
+    def _write(self, df: pd.DataFrame):
+        os.makedirs(self.staging, exist_ok=True)
+        pq.write_table(to_arrow(df), os.path.join(self.staging, f"part-{self.parts:05d}.parquet"),
+                       compression=COMPRESSION)
+        self.parts += 1
+
+    def commit(self, report_id: str = None) -> str:
+        """Publish the report (replaces an earlier copy of it in the same run) and return its folder"""
+        folder = self.store.report_folder(self.dataset, report_id or self.report_id)
+        self.flush()
+        if self.parts == 0 and self.columns is not None:
+            self._write(pd.DataFrame(columns=self.columns))
+        if os.path.isdir(folder):
+            shutil.rmtree(folder)
+        if self.parts:
+            os.replace(self.staging, folder)
+        return folder
+
+    def discard(self):
+        shutil.rmtree(self.staging, ignore_errors=True)
+
+
+# ===== PROCESS-WIDE STORE =====
+
+def enable(root: str = RESULT_STORE_ROOT, run_id: str = None) -> ResultStore:
+    """Turn on columnar output for this process (used by the report writers that have no CLI of their own)"""
+    store = ResultStore(root, run_id)
+    _active['store'] = store
+    logger.info(f"Columnar result store: {os.path.abspath(root)} (run {store.run_id})")
+    return store
+
+
+def disable():
+    _active['store'] = None
+
+
+def active() -> Optional[ResultStore]:
+    """Store enabled with enable(), or None"""
+    return _active['store']
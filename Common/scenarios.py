@@ -0,0 +1,259 @@
+"""
+scenarios.py - Discover, select and run Test_Plan/PE_*.py scenarios in-process
+
+Each PE scenario module is imported once per process and its step functions
+(create_account -> fill_daily_load_data -> fill_profile_instant_data ->
+trigger_prepaid_ledger -> generate_excel_report) are called directly, so a
+suite run does not pay for a cold interpreter start per scenario.
+"""
+
+import importlib
+import logging
+import os
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Any
+
+from Common import db_pool
+
+# ===== CONFIGURATION =====
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+TEST_PLAN_FOLDER = PROJECT_ROOT / "Test_Plan"
+TEST_PLAN_PACKAGE = "Test_Plan"
+LOG_FOLDER = "logs"
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+SCENARIO_PATTERN = re.compile(r"^PE_(\d+)$")
+
+logger = logging.getLogger(__name__)
+
+
+# ===== DISCOVERY AND SELECTION =====
+
+def discover_scenarios() -> List[str]:
+    """Return all scenario IDs (PE_101, PE_102, ...) found in Test_Plan, in numeric order"""
+    scenario_ids = []
+    for script in TEST_PLAN_FOLDER.glob("PE_*.py"):
+        if SCENARIO_PATTERN.match(script.stem):
+            scenario_ids.append(script.stem)
+    return sorted(scenario_ids, key=scenario_number)
+
+
+def scenario_number(scenario_id: str) -> int:
+    """Extract the numeric part of a scenario ID (PE_101 -> 101)"""
+    match = SCENARIO_PATTERN.match(scenario_id.strip().upper())
+    if not match:
+        raise ValueError(f"Invalid scenario ID: {scenario_id} (expected PE_<number>)")
+    return int(match.group(1))
+
+
+def select_scenarios(expressions: List[str] = None) -> List[str]:
+    """
+    Resolve --select expressions into a list of scenario IDs.
+
+    Supported forms (comma separated, may be repeated):
+        PE_101               single scenario
+        PE_101..PE_140       inclusive range
+        101..140             inclusive range without prefix
+
+    Args:
+        expressions: Selection expressions; None or empty selects every scenario
+
+    Returns:
+        Matching scenario IDs in numeric order
+    """
+    available = discover_scenarios()
+    if not expressions:
+        return available
+
+    wanted = set()
+    for expression in expressions:
+        for part in expression.split(","):
+            part = part.strip().upper()
+            if not part:
+                continue
+            if ".." in part:
+                low, high = (_normalize_id(p) for p in part.split("..", 1))
+                low_num, high_num = scenario_number(low), scenario_number(high)
+                wanted.update(s for s in available if low_num <= scenario_number(s) <= high_num)
+            else:
+                scenario_id = _normalize_id(part)
+                if scenario_id not in available:
+                    raise ValueError(f"Scenario not found in {TEST_PLAN_FOLDER.name}: {scenario_id}")
+                wanted.add(scenario_id)
+
+    return sorted(wanted, key=scenario_number)
+
+
+def _normalize_id(value: str) -> str:
+    """Accept both 'PE_101' and '101'"""
+    value = value.strip().upper()
+    return value if value.startswith("PE_") else f"PE_{value}"
+
+
+# ===== LOADING =====
+
+def load_scenario(scenario_id: str, verbose: bool = False):
+    """
+    Import a scenario module once and route its logger to logs/<scenario_id>.log.
+
+    Args:
+        scenario_id: Scenario ID such as PE_101
+        verbose: Also propagate scenario log lines to the suite's console output
+
+    Returns:
+        The imported module
+    """
+    module = importlib.import_module(f"{TEST_PLAN_PACKAGE}.{scenario_id}")
+
+    scenario_logger = logging.getLogger(module.__name__)
+    if not getattr(scenario_logger, "_suite_handler_attached", False):
+        os.makedirs(LOG_FOLDER, exist_ok=True)
+        handler = logging.FileHandler(os.path.join(LOG_FOLDER, f"{scenario_id}.log"))
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        scenario_logger.addHandler(handler)
+        scenario_logger.setLevel(logging.INFO)
+        scenario_logger._suite_handler_attached = True
+    scenario_logger.propagate = verbose
+
+    return module
+
+
+# ===== EXECUTION =====
+
+def new_result(scenario_id: str, report_file: str = None) -> Dict[str, Any]:
+    """Return an empty (Failed) result record for one scenario run"""
+    return {
+        'scenario': scenario_id,
+        'report_file': report_file,
+        'status': 'Failed',
+        'failed_step': None,
+        'account_id': None,
+        'meter_number': None,
+        'duration': 0.0,
+        'step_durations': {},
+        'error': None
+    }
+
+
+def run_scenario(scenario_id: str, verbose: bool = False, report: bool = True) -> Dict[str, Any]:
+    """
+    Run one scenario's five steps in order, timing each of them.
+
+    Args:
+        scenario_id: Scenario ID such as PE_101
+        verbose: Echo the scenario's log lines to the console
+        report: Run generate_excel_report; with False the scenario stops after the
+            ledger trigger with status 'Triggered' and keeps its account_data for
+            a later run_report() (used by the batched MDMS readback)
+
+    Returns:
+        Result dict with scenario, status, failed_step, account_id, meter_number,
+        duration (seconds) and step_durations (step name -> seconds)
+    """
+    result = new_result(scenario_id)
+    started = time.perf_counter()
+
+    try:
+        module = _timed_step(result, "load_scenario", lambda: load_scenario(scenario_id, verbose=verbose))
+
+        account_data = _timed_step(result, "create_account", module.create_account)
+        if not account_data:
+            return _finish(result, started, "create_account")
+        result['account_id'] = account_data['accountId']
+        result['meter_number'] = account_data['meterSrno']
+
+        failed_step = run_db_steps(module, account_data, result)
+        if failed_step:
+            return _finish(result, started, failed_step)
+
+        steps = [
+            ("trigger_prepaid_ledger", lambda: module.trigger_prepaid_ledger(account_data['accountId'])),
+            ("generate_excel_report", lambda: module.generate_excel_report(account_data)),
+        ]
+        if not report:
+            steps = steps[:1]
+        for step_name, step in steps:
+            if not _timed_step(result, step_name, step):
+                return _finish(result, started, step_name)
+
+        if not report:
+            result['status'] = 'Triggered'
+            result['account_data'] = account_data
+            return _finish(result, started, None)
+
+        result['status'] = 'Completed'
+        return _finish(result, started, None)
+
+    except Exception as e:
+        logger.error(f"{scenario_id}: unexpected error: {str(e)}")
+        result['error'] = str(e)
+        return _finish(result, started, result['failed_step'])
+
+
+def run_report(result: Dict[str, Any], verbose: bool = False) -> Dict[str, Any]:
+    """
+    Generate the Excel report of a scenario run with report=False.
+
+    The report step's duration is added to the result's total duration.
+
+    Returns:
+        The same result dict, now 'Completed' or failed at generate_excel_report
+    """
+    module = load_scenario(result['scenario'], verbose=verbose)
+    account_data = result.pop('account_data')
+    started = time.perf_counter() - result['duration']
+
+    try:
+        if _timed_step(result, "generate_excel_report", lambda: module.generate_excel_report(account_data)):
+            result['status'] = 'Completed'
+            return _finish(result, started, None)
+        result['status'] = 'Failed'
+        return _finish(result, started, "generate_excel_report")
+
+    except Exception as e:
+        logger.error(f"{result['scenario']}: unexpected error: {str(e)}")
+        result['status'] = 'Failed'
+        result['error'] = str(e)
+        return _finish(result, started, "generate_excel_report")
+
+
+def run_db_steps(module, account_data: Dict[str, Any], result: Dict[str, Any]):
+    """
+    Run the daily load and profile instant fills on one pooled connection.
+
+    Both steps execute inside a db_pool account scope on the calling thread, so
+    they share a connection (and a transaction when the scenario sets
+    SINGLE_DB_TRANSACTION).
+
+    Returns:
+        Name of the failed step, or None if both steps succeeded
+    """
+    steps = [
+        ("fill_daily_load_data", lambda: module.fill_daily_load_data(account_data)),
+        ("fill_profile_instant_data", lambda: module.fill_profile_instant_data(account_data)),
+    ]
+    single_transaction = getattr(module, "SINGLE_DB_TRANSACTION", False)
+    with db_pool.account_scope(module.DB_CONFIG, single_transaction=single_transaction):
+        for step_name, step in steps:
+            if not _timed_step(result, step_name, step):
+                return step_name
+    return None
+
+
+def _timed_step(result: Dict[str, Any], step_name: str, step):
+    """Call a step and record its wall-clock duration in the result"""
+    result['failed_step'] = step_name
+    step_started = time.perf_counter()
+    try:
+        return step()
+    finally:
+        result['step_durations'][step_name] = round(time.perf_counter() - step_started, 3)
+
+
+def _finish(result: Dict[str, Any], started: float, failed_step: str) -> Dict[str, Any]:
+    result['failed_step'] = failed_step
+    result['duration'] = round(time.perf_counter() - started, 3)
+    return result
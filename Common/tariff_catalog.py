@@ -0,0 +1,177 @@
+"""
+tariff_catalog.py - Tariff rule sets keyed by applied_supply_type_code
+
+The Formula validators used to carry their rates as hard-coded attributes, so
+each tariff needed its own Formula_1xx script. The rates, EC slabs, FC rules,
+max demand thresholds and life line rules now live in tariff_catalog.json,
+which is read once per process and cached; a validator looks up the rule set
+for the supply type code found in the ledger. Each rule set also names the
+Formula validator whose rules it follows ("formula"), which validate_fleet.py
+uses to pick the validator per account.
+
+Catalog layout:
+    defaults                  Complete rule set used as the base of every tariff
+    tariffs[code]             Overrides for one supply type code
+    tariffs[code].load_units  Further overrides per load unit (KW / KVA / BHP)
+
+Overrides are merged key by key (nested dicts too); "lifeline": null turns the
+life line switch off for a tariff. A code missing from the catalog raises
+UnsupportedTariffError: its rates are not known, so validating it against the
+defaults would give a verdict against the wrong tariff. Add the code to
+tariff_catalog.json to validate it.
+"""
+
+import copy
+import json
+import logging
+import os
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
+
+from Common.ledger_kernels import Slab
+
+# ===== CONFIGURATION =====
+
+CATALOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tariff_catalog.json")
+DEFAULT_LOAD_UNIT = "KW"
+DEFAULT_FORMULA = "103"
+
+logger = logging.getLogger(__name__)
+
+
+class UnsupportedTariffError(LookupError):
+    """Supply type code without a rule set in the catalog"""
+
+    def __init__(self, supply_type_code: str):
+        super().__init__(f"Supply type {supply_type_code} is not in the tariff catalog")
+        self.supply_type_code = supply_type_code
+
+
+# ===== RULE SET =====
+
+class Tariff:
+    """One resolved rule set (defaults <- supply type <- load unit overrides)"""
+
+    def __init__(self, supply_type_code: str, load_unit: str, rules: Dict[str, Any]):
+        self.supply_type_code = supply_type_code
+        self.load_unit = load_unit
+        self.name = rules.get('name', '')
+
+        # Validator whose rules the tariff follows (Formula_101 flat EC, Formula_102 plus
+        # max demand billing, Formula_103 plus EC slabs and life line switch)
+        self.formula = str(rules.get('formula', DEFAULT_FORMULA))
+
+        # EC slab table and flat FC rate (Rs. per kW per month)
+        self.ec_slabs: List[Slab] = [(upper, rate) for upper, rate in rules['ec_slabs']]
+        self.fc_rate = rules['fc_rate']
+        self.ed_rate = rules['ed_rate']
+        self.rebate_rate = rules['rebate_rate']
+
+        # Max demand as % of contracted load: FC is billed on at least fc_floor_percent,
+        # above edp_percent an excess demand penalty applies
+        self.md_fc_floor_percent = rules['md_thresholds']['fc_floor_percent']
+        self.md_edp_percent = rules['md_thresholds']['edp_percent']
+
+        # Life line switch: once month-to-date consumption crosses threshold_kwh, FC is
+        # billed at the lifeline fc_rate and the units already billed at the first slab
+        # rate are re-billed at the lifeline ec_rate, recovered over recovery_days
+        lifeline = rules.get('lifeline')
+        self.lifeline = lifeline is not None
+        self.lifeline_threshold = lifeline['threshold_kwh'] if lifeline else float('inf')
+        self.lifeline_recovery_days = lifeline['recovery_days'] if lifeline else 0
+        self.lifeline_ec_rate = lifeline['ec_rate'] if lifeline else self.ec_slabs[0][1]
+        self.lifeline_fc_rate = lifeline['fc_rate'] if lifeline else self.fc_rate
+
+        self.load_factor = rules['load_unit_factors'].get(load_unit, 1.0)
+
+    def contracted_load_kw(self, sanctioned_load: float) -> float:
+        """Sanctioned load in the account's load unit converted to kW"""
+        if self.load_factor == 1:
+            return sanctioned_load
+        return sanctioned_load * self.load_factor
+
+    def __repr__(self):
+        return f"Tariff({self.supply_type_code!r}, {self.load_unit!r}, {self.name!r})"
+
+
+# ===== CATALOG =====
+
+def merge_rules(base: Dict[str, Any], overrides: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of base with overrides applied key by key (nested dicts are merged, not replaced)"""
+    merged = copy.deepcopy(base)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_rules(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
+@lru_cache(maxsize=None)
+def load_catalog(path: str = CATALOG_FILE) -> Dict[str, Any]:
+    """Read the catalog file (once per path and process)"""
+    with open(path, encoding='utf-8') as catalog_file:
+        catalog = json.load(catalog_file)
+    logger.info(f"Loaded {len(catalog.get('tariffs', {}))} tariff(s) from {path}")
+    return catalog
+
+
+def normalize_code(supply_type_code) -> Optional[str]:
+    """Supply type code as the catalog key ("10", "24B"; 10.0 from a numeric column -> "10")"""
+    if supply_type_code is None:
+        return None
+    if isinstance(supply_type_code, float):
+        if supply_type_code != supply_type_code:  # NaN
+            return None
+        if supply_type_code.is_integer():
+            supply_type_code = int(supply_type_code)
+    code = str(supply_type_code).strip().upper()
+    return code or None
+
+
+@lru_cache(maxsize=None)
+def lookup(supply_type_code, load_unit: str = DEFAULT_LOAD_UNIT, path: str = CATALOG_FILE) -> Tariff:
+    """
+    Rule set for a supply type code and load unit.
+
+    Args:
+        supply_type_code: applied_supply_type_code of the ledger (None for the catalog default)
+        load_unit: KW, KVA or BHP
+        path: Catalog file
+
+    Returns:
+        Tariff (cached, shared between callers; treat as read-only)
+
+    Raises:
+        UnsupportedTariffError: The supply type code is not in the catalog
+    """
+    catalog = load_catalog(path)
+    tariffs = catalog.get('tariffs', {})
+    code = normalize_code(supply_type_code) or catalog['default_supply_type_code']
+    load_unit = (load_unit or DEFAULT_LOAD_UNIT).strip().upper()
+
+    if code not in tariffs:
+        raise UnsupportedTariffError(code)
+
+    overrides = dict(tariffs[code])
+    unit_overrides = overrides.pop('load_units', {}).get(load_unit, {})
+    rules = merge_rules(merge_rules(catalog['defaults'], overrides), unit_overrides)
+    return Tariff(code, load_unit, rules)
+
+
+def ledger_supply_type(df) -> Optional[str]:
+    """
+    Supply type code of a ledger (first non-empty applied_supply_type_code).
+
+    A ledger whose code changes within the period is validated against its
+    first code; the change is logged.
+    """
+    if 'applied_supply_type_code' not in df.columns:
+        return None
+    codes = [code for code in (normalize_code(value) for value in df['applied_supply_type_code'].tolist()) if code]
+    if not codes:
+        return None
+    distinct = list(dict.fromkeys(codes))
+    if len(distinct) > 1:
+        logger.warning(f"applied_supply_type_code changes within the ledger ({', '.join(distinct)}); using {distinct[0]}")
+    return distinct[0]
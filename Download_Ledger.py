@@ -1,9 +1,16 @@
 import requests
 import pandas as pd
+import glob
 import os
 import sys
 import json
-from datetime import datetime
+import argparse
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from Common import http_client, result_store
+from Common.ledger_store import LedgerStore, DEFAULT_STORE_PATH, SINCE_PARAM
 
 # Ensure openpyxl is installed for Excel writing
 try:
@@ -18,6 +25,20 @@ API_URL = "https://engine-web.stage.gomatimvvnl.in/daily_prepaid_ledger/"
 # CSV file path
 CSV_FILE = "Consumer_details.csv"
 
+# Output layouts: "long" streams one row per account-day into a consolidated CSV
+# (optionally sharded by account range), "sheets" writes one Excel sheet per consumer
+LAYOUTS = ("long", "sheets")
+DEFAULT_LAYOUT = "long"
+LEDGER_CSV = "Prepaid_Ledger.csv"
+LEDGER_SHARD_FOLDER = "Prepaid_Ledger"
+LEDGER_SHARD_PREFIX = "Prepaid_Ledger_"   # + <first account>_<last account>.csv
+LEDGER_ERRORS_CSV = "Prepaid_Ledger_Errors.csv"
+LEDGER_WORKBOOK = "Prepaid_Ledger_Report.xlsx"
+
+# Ledger requests in flight at once (override with --concurrency)
+DEFAULT_CONCURRENCY = 8
+REQUEST_TIMEOUT = 30  # seconds
+
 # Required fields for Excel
 REQUIRED_FIELDS = [
     "start_date_time", 
@@ -74,6 +95,11 @@ REQUIRED_FIELDS = [
     "closing_balance"
 ]
 
+# Columns of the long-format ledger (one row per account-day)
+LEDGER_COLUMNS = ["Report_ID", "account_id", "meter_number"] + [
+    field for field in REQUIRED_FIELDS if field not in ("account_id", "meter_number")
+]
+
 
 def read_consumer_details():
     """Read account IDs, meter numbers, and Report IDs from CSV file."""
@@ -115,8 +141,356 @@ def read_consumer_details():
         return []
 
 
-def fetch_and_save_data():
-    """Fetch data from API for all consumers in CSV and save to Excel."""
+def fetch_ledger(report_id, account_id, meter_number, since=None):
+    """
+    Fetch the ledger of one consumer.
+
+    Args:
+        since: Only ask for days from this date (YYYY-MM-DD) onwards (incremental sync)
+
+    Returns:
+        (DataFrame, None) on success, or (None, error_row) for the Errors sheet
+    """
+    url = f"{API_URL}{account_id}/?meter_number={meter_number}"
+    if since:
+        url += f"&{SINCE_PARAM}={since}"
+    headers = {"accept": "application/json"}
+    error_row = {
+        'Report_ID': report_id,
+        'Account_ID': account_id,
+        'Meter_Number': meter_number
+    }
+
+    try:
+        response = http_client.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        data = response.json()
+        
+        if not isinstance(data, list):
+            data = [data]
+        
+        filtered_data = [{key: item.get(key, None) for key in REQUIRED_FIELDS} for item in data]
+        df = pd.DataFrame(filtered_data)
+        
+        if not df.empty:
+            return df, None
+        error_row.update({
+            'Error_Type': 'No Data',
+            'Error_Message': 'API returned empty data',
+            'Status_Code': '200',
+            'API_Response': json.dumps(data, indent=2) if data else 'Empty response'
+        })
+    
+    except requests.exceptions.HTTPError as e:
+        # Try to get the API response body
+        api_response = ""
+        try:
+            if e.response is not None:
+                api_response = e.response.text
+                # Try to parse as JSON for better formatting
+                try:
+                    json_response = e.response.json()
+                    api_response = json.dumps(json_response, indent=2)
+                except:
+                    # If not JSON, use text as is (truncate if too long)
+                    if len(api_response) > 1000:
+                        api_response = api_response[:1000] + "... (truncated)"
+        except:
+            api_response = "Unable to retrieve response"
+        
+        error_msg = f"HTTP {e.response.status_code}: {str(e)}"
+        if e.response.status_code == 404:
+            error_msg = "Account not found (404)"
+        
+        error_row.update({
+            'Error_Type': 'HTTP Error',
+            'Error_Message': error_msg,
+            'Status_Code': str(e.response.status_code),
+            'API_Response': api_response
+        })
+    except requests.exceptions.Timeout:
+        error_row.update({
+            'Error_Type': 'Timeout',
+            'Error_Message': f'Request timeout after {REQUEST_TIMEOUT} seconds',
+            'Status_Code': 'N/A',
+            'API_Response': 'N/A - Request timed out before response'
+        })
+    except requests.exceptions.RequestException as e:
+        error_row.update({
+            'Error_Type': 'Request Error',
+            'Error_Message': str(e),
+            'Status_Code': 'N/A',
+            'API_Response': 'N/A - Request failed before response'
+        })
+    except Exception as e:
+        error_row.update({
+            'Error_Type': 'Unexpected Error',
+            'Error_Message': str(e),
+            'Status_Code': 'N/A',
+            'API_Response': 'N/A - Unexpected error occurred'
+        })
+    
+    return None, error_row
+
+
+def read_long_ledger(path=LEDGER_CSV, columns=None):
+    """
+    Read the consolidated ledger back in one scan.
+
+    Args:
+        path: Consolidated CSV, or the shard folder (all its shards are read)
+        columns: Columns to read (default: all)
+
+    Returns:
+        DataFrame with one row per account-day (IDs kept as text)
+    """
+    files = sorted(glob.glob(os.path.join(path, f"{LEDGER_SHARD_PREFIX}*.csv"))) if os.path.isdir(path) else [path]
+    ids = {'Report_ID': str, 'account_id': str, 'meter_number': str}
+    frames = [pd.read_csv(file, usecols=columns, dtype=ids, encoding='utf-8-sig') for file in files]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns or LEDGER_COLUMNS)
+
+
+def account_order(consumer):
+    """Sort key of a (Report_ID, account ID, meter number) consumer: numeric account IDs by value"""
+    _, account_id, meter_number = consumer
+    return (0, int(account_id), '', meter_number) if account_id.isdigit() else (1, 0, account_id, meter_number)
+
+
+class LongLedgerOutput:
+    """
+    Consolidated long-format ledger: one row per account-day, streamed to CSV.
+
+    Each account's rows are appended to the open file as soon as they are
+    written, so memory holds one ledger at a time. The Report_ID, account_id
+    and meter_number columns come first, and the whole fleet can be read in
+    one scan. With a shard size, every shard_size accounts go to their own
+    file in LEDGER_SHARD_FOLDER, named after the first and last account ID
+    it holds. Files are written under a .part name and renamed when complete.
+    """
+
+    description = "Consolidated ledger"
+
+    def __init__(self, path=LEDGER_CSV, shard_size=None, shard_folder=LEDGER_SHARD_FOLDER,
+                 errors_path=LEDGER_ERRORS_CSV):
+        self.path = path
+        self.shard_size = shard_size
+        self.shard_folder = shard_folder
+        self.errors_path = errors_path
+        self.errors_location = errors_path
+        self.paths = []  # completed files
+        self.handle = None
+        self.part_path = None
+        self.accounts = []  # account IDs in the open file
+        self.rows = 0
+
+    def _open(self):
+        if self.shard_size:
+            os.makedirs(self.shard_folder, exist_ok=True)
+            self.part_path = os.path.join(self.shard_folder, f"{LEDGER_SHARD_PREFIX}{len(self.paths):05d}.csv.part")
+        else:
+            self.part_path = f"{self.path}.part"
+        self.handle = open(self.part_path, 'w', newline='', encoding='utf-8-sig')
+        pd.DataFrame(columns=LEDGER_COLUMNS).to_csv(self.handle, index=False)
+
+    def _close(self):
+        self.handle.close()
+        self.handle = None
+        if self.shard_size:
+            path = os.path.join(self.shard_folder,
+                                f"{LEDGER_SHARD_PREFIX}{self.accounts[0]}_{self.accounts[-1]}.csv")
+        else:
+            path = self.path
+        os.replace(self.part_path, path)
+        self.paths.append(path)
+        self.accounts = []
+
+    def write(self, consumer, df):
+        """Append one account's ledger rows"""
+        report_id, account_id, meter_number = consumer
+        if self.handle is not None and self.shard_size and len(self.accounts) >= self.shard_size:
+            self._close()
+        if self.handle is None:
+            self._open()
+
+        rows = df.reindex(columns=LEDGER_COLUMNS)
+        rows['Report_ID'] = report_id
+        rows['account_id'] = rows['account_id'].fillna(account_id)
+        rows['meter_number'] = rows['meter_number'].fillna(meter_number)
+        rows.to_csv(self.handle, header=False, index=False)
+        self.accounts.append(account_id)
+        self.rows += len(rows)
+
+    def write_errors(self, error_list):
+        if error_list:
+            pd.DataFrame(error_list).to_csv(self.errors_path, index=False, encoding='utf-8-sig')
+        elif os.path.exists(self.errors_path):
+            os.remove(self.errors_path)  # errors of an earlier run
+
+    def finish(self, processed, success_count, error_count):
+        """Publish the open file; an unsharded ledger is written (header only) even without data"""
+        if self.handle is None and not self.shard_size:
+            self._open()
+        if self.handle is not None:
+            self._close()
+        if self.shard_size:
+            # Shards of an earlier run would be read twice by a folder scan
+            for path in glob.glob(os.path.join(self.shard_folder, f"{LEDGER_SHARD_PREFIX}*.csv")):
+                if path not in self.paths:
+                    os.remove(path)
+
+    def discard(self):
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+        if self.part_path and os.path.exists(self.part_path):
+            os.remove(self.part_path)
+
+
+class SheetLedgerOutput:
+    """Ledger workbook with one sheet per consumer (the original layout)"""
+
+    description = "Excel file"
+    errors_location = "'Errors' sheet in Excel file"
+
+    def __init__(self, path=LEDGER_WORKBOOK):
+        self.path = path
+        self.paths = [path]
+        self.writer = pd.ExcelWriter(path, engine="openpyxl")
+        self.has_data = False
+
+    def write(self, consumer, df):
+        # Use Report_ID for sheet name (Excel sheet names are limited to 31 characters)
+        sheet_name = str(consumer[0])[:31]
+        df.to_excel(self.writer, sheet_name=sheet_name, index=False)
+        self.has_data = True
+
+    def write_errors(self, error_list):
+        if error_list:
+            pd.DataFrame(error_list).to_excel(self.writer, sheet_name='Errors', index=False)
+            self.has_data = True
+
+    def finish(self, processed, success_count, error_count):
+        # If no data was found, create a summary sheet to avoid "no visible sheets" error
+        if not self.has_data:
+            summary_df = pd.DataFrame({
+                'Status': ['No data found'],
+                'Message': [f'Processed {processed} consumer(s) but no data was retrieved.'],
+                'Total Processed': [processed],
+                'Successful': [success_count],
+                'Errors': [error_count]
+            })
+            summary_df.to_excel(self.writer, sheet_name='Summary', index=False)
+        self.writer.close()
+
+    def discard(self):
+        # If file was partially created, try to remove it
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+        if os.path.exists(self.path):
+            try:
+                os.remove(self.path)
+                print(f"Removed incomplete file: {self.path}")
+            except OSError:
+                pass
+
+
+class LedgerWriter(threading.Thread):
+    """
+    Single writer thread that owns the ledger output.
+
+    Fetch workers hand over (index, consumer, DataFrame, error_row) results in
+    completion order; the writer buffers them and writes ledgers in CSV order
+    (rows of the consolidated CSV or sheets of the workbook).
+    With a ledger store the fetched days are merged into it first and each
+    ledger is written from the account's full stored history. With a columnar
+    result store each ledger is also written there as Parquet.
+    """
+
+    def __init__(self, output, total, store=None, since=None, columnar=None):
+        super().__init__(name="ledger-writer", daemon=True)
+        self.output = output
+        self.total = total
+        self.store = store
+        self.columnar = columnar
+        self.since = since or {}
+        self.inserted = 0
+        self.updated = 0
+        self.results = queue.Queue()
+        self.has_data = False
+        self.success_count = 0
+        self.error_count = 0
+        self.error_list = []  # List to store error details
+        self.exception = None
+
+    def run(self):
+        pending = {}
+        next_index = 0
+        try:
+            while next_index < self.total:
+                index, consumer, df, error_row = self.results.get()
+                pending[index] = (consumer, df, error_row)
+                while next_index in pending:
+                    self.write(*pending.pop(next_index))
+                    next_index += 1
+        except Exception as e:
+            self.exception = e
+
+    def write(self, consumer, df, error_row):
+        report_id, account_id, meter_number = consumer
+        print(f"Processing {report_id} (Account: {account_id}, Meter: {meter_number})...")
+        if self.store is not None:
+            df, error_row = self.sync(consumer, df, error_row)
+        if df is not None:
+            self.output.write(consumer, df)
+            if self.columnar is not None:
+                self.columnar.write("ledger", str(report_id), df)
+            self.has_data = True
+            self.success_count += 1
+            print(f"  [OK] Data fetched successfully")
+        else:
+            self.error_count += 1
+            self.error_list.append(error_row)
+            if error_row['Error_Type'] == 'No Data':
+                print(f"  [WARNING] No data returned")
+            # Other errors are not printed to the console, they'll be in the errors output
+        sys.stdout.flush()
+
+    def sync(self, consumer, df, error_row):
+        """Merge fetched days into the store and return the account's stored history"""
+        _, account_id, meter_number = consumer
+        since = self.since.get(consumer)
+        if df is not None:
+            records = df.astype(object).where(df.notna(), None).to_dict('records')
+            inserted, updated = self.store.merge(account_id, meter_number, records, since=since)
+            self.inserted += inserted
+            self.updated += updated
+            print(f"  {inserted} new / {updated} changed day(s) since {since or 'the beginning'}")
+
+        # An incremental fetch with nothing new is not an error when history is stored
+        if df is not None or (since and error_row['Error_Type'] == 'No Data'):
+            stored = self.store.load(account_id, meter_number)
+            if not stored.empty:
+                return stored, None
+        return df, error_row
+
+
+def fetch_and_save_data(concurrency=DEFAULT_CONCURRENCY, store_path=None, full=False, columnar_root=None,
+                        layout=DEFAULT_LAYOUT, shard_size=None):
+    """
+    Fetch data from API for all consumers in CSV and save the ledgers.
+
+    Args:
+        concurrency: Ledger requests in flight at once
+        store_path: Local ledger store for incremental sync (None downloads everything)
+        full: With a store, ignore the watermarks and re-download every account
+        columnar_root: Also write every ledger to this columnar result store (Parquet)
+        layout: "long" (consolidated CSV, one row per account-day) or "sheets"
+            (one Excel sheet per consumer)
+        shard_size: With the long layout, accounts per file; the consumers are
+            then written in account ID order so every file covers an account range
+    """
     # Read consumer details from CSV
     consumer_data = read_consumer_details()
     
@@ -124,170 +498,114 @@ def fetch_and_save_data():
         print("ERROR: No valid consumer data found in CSV file.")
         return
     
-    print(f"Found {len(consumer_data)} consumer(s) to process...")
-    
-    # Generate output file name with timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    file_path = f"Prepaid_Ledger_Report.xlsx"
+    concurrency = max(1, concurrency)
+    print(f"Found {len(consumer_data)} consumer(s) to process ({concurrency} concurrent request(s))...")
+    http_client.configure(pool_size=concurrency)
     
-    has_data = False
-    success_count = 0
-    error_count = 0
-    error_list = []  # List to store error details
+    if layout == "long" and shard_size:
+        consumer_data = sorted(consumer_data, key=account_order)
 
+    # Watermarks are read up front; from here on only the writer thread touches the store
+    store = LedgerStore(store_path, fields=REQUIRED_FIELDS) if store_path else None
+    since = {}
+    if store is not None and not full:
+        since = {consumer: store.since(consumer[1], consumer[2]) for consumer in consumer_data}
+        incremental = sum(1 for value in since.values() if value)
+        print(f"Incremental sync: {incremental} account(s) from their watermark, "
+              f"{len(consumer_data) - incremental} in full (store: {store_path})")
+
+    columnar = result_store.ResultStore(columnar_root) if columnar_root else None
+    if columnar is not None:
+        print(f"Columnar output: {os.path.abspath(columnar_root)} (run {columnar.run_id})")
+
+    output = None
     try:
-        with pd.ExcelWriter(file_path, engine="openpyxl") as writer:
-            for report_id, account_id, meter_number in consumer_data:
-                url = f"{API_URL}{account_id}/?meter_number={meter_number}"
-                headers = {"accept": "application/json"}
+        output = SheetLedgerOutput() if layout == "sheets" else LongLedgerOutput(shard_size=shard_size)
+        ledger_writer = LedgerWriter(output, len(consumer_data), store=store, since=since, columnar=columnar)
+        ledger_writer.start()
 
-                try:
-                    print(f"Processing {report_id} (Account: {account_id}, Meter: {meter_number})...")
-                    sys.stdout.flush()
-                    response = requests.get(url, headers=headers, timeout=30)
-                    response.raise_for_status()
-                    data = response.json()
-                    
-                    if not isinstance(data, list):
-                        data = [data]
-                    
-                    filtered_data = [{key: item.get(key, None) for key in REQUIRED_FIELDS} for item in data]
-                    df = pd.DataFrame(filtered_data)
-                    
-                    if not df.empty:
-                        # Use Report_ID for sheet name (Excel sheet names are limited to 31 characters)
-                        sheet_name = str(report_id)[:31]
-                        df.to_excel(writer, sheet_name=sheet_name, index=False)
-                        has_data = True
-                        success_count += 1
-                        print(f"  [OK] Data fetched successfully")
-                    else:
-                        error_count += 1
-                        error_list.append({
-                            'Report_ID': report_id,
-                            'Account_ID': account_id,
-                            'Meter_Number': meter_number,
-                            'Error_Type': 'No Data',
-                            'Error_Message': 'API returned empty data',
-                            'Status_Code': '200',
-                            'API_Response': json.dumps(data, indent=2) if data else 'Empty response'
-                        })
-                        print(f"  [WARNING] No data returned")
-                    sys.stdout.flush()
-                
-                except requests.exceptions.HTTPError as e:
-                    error_count += 1
-                    # Try to get the API response body
-                    api_response = ""
-                    try:
-                        if e.response is not None:
-                            api_response = e.response.text
-                            # Try to parse as JSON for better formatting
-                            try:
-                                json_response = e.response.json()
-                                api_response = json.dumps(json_response, indent=2)
-                            except:
-                                # If not JSON, use text as is (truncate if too long)
-                                if len(api_response) > 1000:
-                                    api_response = api_response[:1000] + "... (truncated)"
-                    except:
-                        api_response = "Unable to retrieve response"
-                    
-                    error_msg = f"HTTP {e.response.status_code}: {str(e)}"
-                    if e.response.status_code == 404:
-                        error_msg = "Account not found (404)"
-                    
-                    error_list.append({
-                        'Report_ID': report_id,
-                        'Account_ID': account_id,
-                        'Meter_Number': meter_number,
-                        'Error_Type': 'HTTP Error',
-                        'Error_Message': error_msg,
-                        'Status_Code': str(e.response.status_code),
-                        'API_Response': api_response
-                    })
-                    # Don't print errors to console, they'll be in Excel
-                    sys.stdout.flush()
-                except requests.exceptions.Timeout:
-                    error_count += 1
-                    error_list.append({
-                        'Report_ID': report_id,
-                        'Account_ID': account_id,
-                        'Meter_Number': meter_number,
-                        'Error_Type': 'Timeout',
-                        'Error_Message': 'Request timeout after 30 seconds',
-                        'Status_Code': 'N/A',
-                        'API_Response': 'N/A - Request timed out before response'
-                    })
-                    sys.stdout.flush()
-                except requests.exceptions.RequestException as e:
-                    error_count += 1
-                    error_list.append({
-                        'Report_ID': report_id,
-                        'Account_ID': account_id,
-                        'Meter_Number': meter_number,
-                        'Error_Type': 'Request Error',
-                        'Error_Message': str(e),
-                        'Status_Code': 'N/A',
-                        'API_Response': 'N/A - Request failed before response'
-                    })
-                    sys.stdout.flush()
-                except Exception as e:
-                    error_count += 1
-                    error_list.append({
-                        'Report_ID': report_id,
-                        'Account_ID': account_id,
-                        'Meter_Number': meter_number,
-                        'Error_Type': 'Unexpected Error',
-                        'Error_Message': str(e),
-                        'Status_Code': 'N/A',
-                        'API_Response': 'N/A - Unexpected error occurred'
-                    })
-                    sys.stdout.flush()
-            
-            # Add errors sheet if there are any errors
-            if error_list:
-                error_df = pd.DataFrame(error_list)
-                error_df.to_excel(writer, sheet_name='Errors', index=False)
-                has_data = True
-            
-            # If no data was found, create a summary sheet to avoid "no visible sheets" error
-            if not has_data:
-                summary_df = pd.DataFrame({
-                    'Status': ['No data found'],
-                    'Message': [f'Processed {len(consumer_data)} consumer(s) but no data was retrieved.'],
-                    'Total Processed': [len(consumer_data)],
-                    'Successful': [success_count],
-                    'Errors': [error_count]
-                })
-                summary_df.to_excel(writer, sheet_name='Summary', index=False)
-                has_data = True  # Set to True so file is created
+        def fetch(index, consumer):
+            try:
+                df, error_row = fetch_ledger(*consumer, since=since.get(consumer))
+            except Exception as e:
+                df, error_row = None, {
+                    'Report_ID': consumer[0],
+                    'Account_ID': consumer[1],
+                    'Meter_Number': consumer[2],
+                    'Error_Type': 'Unexpected Error',
+                    'Error_Message': str(e),
+                    'Status_Code': 'N/A',
+                    'API_Response': 'N/A - Unexpected error occurred'
+                }
+            ledger_writer.results.put((index, consumer, df, error_row))
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="ledger-fetch") as executor:
+            for index, consumer in enumerate(consumer_data):
+                executor.submit(fetch, index, consumer)
+
+        ledger_writer.join()
+        if ledger_writer.exception is not None:
+            raise ledger_writer.exception
+
+        success_count = ledger_writer.success_count
+        error_count = ledger_writer.error_count
+        
+        # Errors sheet / errors CSV if there are any errors
+        output.write_errors(ledger_writer.error_list)
+        output.finish(len(consumer_data), success_count, error_count)
         
         print("\n" + "="*50)
-        if has_data:
-            print(f"SUCCESS: Excel file saved successfully!")
-            print(f"Location: {os.path.abspath(file_path)}")
-            print(f"Total processed: {len(consumer_data)}")
-            print(f"Successful: {success_count}")
-            if error_count > 0:
-                print(f"Errors: {error_count} (see 'Errors' sheet in Excel file)")
-            else:
-                print(f"Errors: {error_count}")
+        print(f"SUCCESS: {output.description} saved successfully!")
+        for path in output.paths:
+            print(f"Location: {os.path.abspath(path)}")
+        if layout == "long":
+            print(f"Ledger rows: {output.rows}")
+        print(f"Total processed: {len(consumer_data)}")
+        print(f"Successful: {success_count}")
+        if error_count > 0:
+            print(f"Errors: {error_count} (see {output.errors_location})")
         else:
-            print("WARNING: No valid data found. Excel file not created.")
+            print(f"Errors: {error_count}")
+        if store is not None:
+            print(f"Ledger store: {ledger_writer.inserted} new / {ledger_writer.updated} changed day(s) merged")
     
     except Exception as e:
-        print(f"\n[ERROR] Failed to create Excel file: {e}")
-        # If file was partially created, try to remove it
-        if os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-                print(f"Removed incomplete file: {file_path}")
-            except:
-                pass
+        print(f"\n[ERROR] Failed to save the ledger: {e}")
+        if output is not None:
+            output.discard()
+    finally:
+        if store is not None:
+            store.close()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download prepaid ledger data for the consumers in Consumer_details.csv")
+    parser.add_argument("--concurrency", "-c", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Ledger requests in flight at once (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--incremental", "-i", action="store_true",
+                        help="Only fetch days after each account's watermark and merge them into the local store")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH,
+                        help=f"Local ledger store used with --incremental (default: {DEFAULT_STORE_PATH})")
+    parser.add_argument("--full", action="store_true",
+                        help="With --incremental, re-download every account and refresh the store")
+    parser.add_argument("--layout", choices=LAYOUTS, default=DEFAULT_LAYOUT,
+                        help=f"long: one row per account-day in {LEDGER_CSV} (default); "
+                             f"sheets: one sheet per consumer in {LEDGER_WORKBOOK}")
+    parser.add_argument("--shard-size", type=int,
+                        help=f"With --layout long, accounts per file (files go to {LEDGER_SHARD_FOLDER}/, "
+                             "one per account range)")
+    parser.add_argument("--columnar", action="store_true",
+                        help="Also write every ledger as Parquet (read by validate_fleet.py --source columnar)")
+    parser.add_argument("--columnar-root", default=result_store.RESULT_STORE_ROOT,
+                        help=f"Columnar result store folder (default: {result_store.RESULT_STORE_ROOT})")
+    args = parser.parse_args()
+
+    if args.columnar and not result_store.available():
+        print("ERROR: --columnar needs pyarrow. Install it using: pip install pyarrow")
+        sys.exit(2)
+
     print("Starting ledger data download...")
     print("="*50)
-    fetch_and_save_data()
+    fetch_and_save_data(concurrency=args.concurrency, store_path=args.store if args.incremental else None,
+                        full=args.full, columnar_root=args.columnar_root if args.columnar else None,
+                        layout=args.layout, shard_size=args.shard_size)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Download_MDMS.py - Batched MDMS readback for every meter in Consumer_details.csv
+
+Reads the meters listed in Consumer_details.csv (written by account.py), reads
+back their daily load and profile instant data from the MDMS db-service in
+large badge_numbers batches, splits the combined response per meter and saves
+everything to one Excel file.
+
+Usage:
+    python Download_MDMS.py
+    python Download_MDMS.py --chunk-size 100 --output MDMS_Readback_Report.xlsx
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+from Common import mdms_client
+from Download_Ledger import CSV_FILE, read_consumer_details
+
+# MDMS API endpoints (same as the Test_Plan scenarios)
+MDMS_API_BASE = "https://mdms-api.stage.gomatimvvnl.in/db-service"
+DAILYLOAD_API_URL = f"{MDMS_API_BASE}/dailyloads"
+PROFILE_INSTANT_API_URL = f"{MDMS_API_BASE}/profileinstant"
+
+OUTPUT_FILE = "MDMS_Readback_Report.xlsx"
+
+# Fields kept per record (same columns as the Daily Load / Profile Instant report sheets)
+DAILY_LOAD_FIELDS = [
+    "dailyload_datetime",
+    "badge_number",
+    "meter_serial_number",
+    "data_source",
+    "data_type",
+    "export_Wh",
+    "import_Wh",
+    "export_VAh",
+    "import_VAh"
+]
+
+PROFILE_INSTANT_FIELDS = [
+    "data_timestamp",
+    "badge_number",
+    "meter_serial_number",
+    "meter_type",
+    "MD_W",
+    "MD_VA",
+    "MD_W_datetime",
+    "MD_VA_datetime",
+    "voltage",
+    "frequency"
+]
+
+
+def build_rows(consumer_data, records_by_meter, fields):
+    """Flatten per-meter records into rows tagged with Report_ID and accountId."""
+    rows = []
+    for report_id, account_id, meter_number in consumer_data:
+        for record in records_by_meter.get(meter_number, []):
+            row = {"Report_ID": report_id, "accountId": account_id}
+            row.update({key: record.get(key, "") for key in fields})
+            rows.append(row)
+    return rows
+
+
+def download_mdms_data(chunk_size=mdms_client.BATCH_SIZE, output_file=OUTPUT_FILE):
+    """Read back MDMS data for all consumers in the CSV and save it to Excel."""
+    consumer_data = read_consumer_details()
+
+    if not consumer_data:
+        print("ERROR: No valid consumer data found in CSV file.")
+        return
+
+    meters = [meter_number for _, _, meter_number in consumer_data]
+    chunks = mdms_client.chunked(meters, chunk_size)
+    print(f"Found {len(consumer_data)} consumer(s) in {CSV_FILE}")
+    print(f"Reading back {sum(len(chunk) for chunk in chunks)} meter(s) in {len(chunks)} batch(es) of up to {chunk_size}...")
+    sys.stdout.flush()
+
+    started = time.perf_counter()
+    daily_load = mdms_client.fetch_batched(DAILYLOAD_API_URL, meters, chunk_size)
+    profile_instant = mdms_client.fetch_batched(PROFILE_INSTANT_API_URL, meters, chunk_size)
+    print(f"Readback finished in {time.perf_counter() - started:.2f}s")
+
+    # Meters that came back without any daily load or profile instant records
+    error_list = []
+    for report_id, account_id, meter_number in consumer_data:
+        missing = [name for name, records in (("Daily Load", daily_load), ("Profile Instant", profile_instant))
+                   if not records.get(meter_number)]
+        if missing:
+            error_list.append({
+                'Report_ID': report_id,
+                'Account_ID': account_id,
+                'Meter_Number': meter_number,
+                'Error_Type': 'No Data',
+                'Error_Message': f"No {' / '.join(missing)} records returned"
+            })
+
+    try:
+        with pd.ExcelWriter(output_file, engine="openpyxl") as writer:
+            sheets = [
+                ("Daily Load", build_rows(consumer_data, daily_load, DAILY_LOAD_FIELDS), DAILY_LOAD_FIELDS),
+                ("Profile Instant", build_rows(consumer_data, profile_instant, PROFILE_INSTANT_FIELDS), PROFILE_INSTANT_FIELDS)
+            ]
+            for sheet_name, rows, fields in sheets:
+                df = pd.DataFrame(rows, columns=["Report_ID", "accountId"] + fields)
+                df.to_excel(writer, sheet_name=sheet_name, index=False)
+                print(f"  [OK] {sheet_name}: {len(df)} record(s)")
+
+            if error_list:
+                pd.DataFrame(error_list).to_excel(writer, sheet_name='Errors', index=False)
+
+        print("\n" + "="*50)
+        print(f"SUCCESS: Excel file saved successfully!")
+        print(f"Location: {os.path.abspath(output_file)}")
+        print(f"Total meters: {len(consumer_data)}")
+        print(f"Meters with missing data: {len(error_list)}" + (" (see 'Errors' sheet in Excel file)" if error_list else ""))
+
+    except Exception as e:
+        print(f"\n[ERROR] Failed to create Excel file: {e}")
+        if os.path.exists(output_file):
+            try:
+                os.remove(output_file)
+                print(f"Removed incomplete file: {output_file}")
+            except OSError:
+                pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batched MDMS readback for the meters in Consumer_details.csv")
+    parser.add_argument("--chunk-size", type=int, default=mdms_client.BATCH_SIZE,
+                        help=f"Meters per badge_numbers query (default: {mdms_client.BATCH_SIZE})")
+    parser.add_argument("--output", default=OUTPUT_FILE,
+                        help=f"Output Excel file (default: {OUTPUT_FILE})")
+    args = parser.parse_args()
+
+    print("Starting batched MDMS readback...")
+    print("="*50)
+    download_mdms_data(chunk_size=max(1, args.chunk_size), output_file=args.output)
@@ -1,4 +1,3 @@
-import requests
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
@@ -7,8 +6,18 @@ from typing import Dict, List, Tuple
 import warnings
 import logging
 import os
+import sys
 warnings.filterwarnings('ignore')
 
+# Make the shared Common package importable when run as python Formula/Formula_101.py
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from Common import calc_trace, http_client, result_store, tariff_catalog
+from Common.ledger_kernels import match_mask, round_values, row_status, running_balance, running_totals
+from Common.tariff_catalog import Tariff
+
 # Create logs folder if it doesn't exist
 os.makedirs('logs', exist_ok=True)
 
@@ -23,27 +32,50 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+LEDGER_API_BASE = "https://engine-web.stage.gomatimvvnl.in/daily_prepaid_ledger"
+
 class PrepaidLedgerComparison:
-    def __init__(self):
+    def __init__(self, account_id: str = None, start_date: str = None, end_date: str = None,
+                 tariff: Tariff = None, contracted_load: float = None, load_unit: str = "KW",
+                 opening_balance: float = None):
+        """
+        Args:
+            account_id: Account whose ledger is validated (default: the built-in test account)
+            start_date: First day of the period (default: 2025-11-01)
+            end_date: Exclusive end of the period (default: 2025-12-01)
+            tariff: Rule set to validate against (default: looked up from the ledger's
+                applied_supply_type_code in the tariff catalog); this flat-rate
+                validator uses its first EC slab rate and its FC rate
+            contracted_load: Sanctioned load in load_unit (default: 1)
+            load_unit: KW, KVA or BHP
+            opening_balance: Balance before the first day (default: 5000)
+        """
         # Configuration parameters
-        self.contracted_load = 1  # kW
-        self.fc_rate = 50  # Per kW FC Rate
-        self.ed_rate = 0.05  # 5%
-        self.rebate_rate = 0.02  # 2%
-        self.opening_balance = 5000
-        self.ec_rate = 3  # Fixed EC rate
-        self.days_in_month = 31
+        self.load_unit = load_unit
+        self.sanctioned_load = contracted_load if contracted_load is not None else 1
+        self.contracted_load = self.sanctioned_load  # kW
+        self.opening_balance = opening_balance if opening_balance is not None else 5000
+        
+        # Rates and MD thresholds from the tariff catalog; replaced by the ledger's own
+        # supply type in run_comparison() unless a tariff was passed in
+        self.tariff_fixed = tariff is not None
+        self.apply_tariff(tariff or tariff_catalog.lookup(None, load_unit))
+        
+        # Log the day-by-day formula breakdown (set False for bulk/benchmark runs)
+        self.log_daily_details = True
         
         # API configuration
-        self.api_url = "https://engine-web.stage.gomatimvvnl.in/daily_prepaid_ledger/3276464172/"
+        self.account_id = str(account_id) if account_id else "3276464172"
+        self.api_url = f"{LEDGER_API_BASE}/{self.account_id}/"
         
         # Log account information
         logger.info("Test Case ID : Formula_101 - Prepaid Ledger Comparison")
-        logger.info("Account ID: 2222550011")
+        logger.info(f"Account ID: {self.account_id}")
         
         # Date range for energy consumption calculation
-        self.start_date = "2025-11-01T00:00:00"
-        self.end_date = "2025-12-01T00:00:00"  # End date is exclusive, covers all of October 2025
+        self.start_date = start_date or "2025-11-01T00:00:00"
+        self.end_date = end_date or "2025-12-01T00:00:00"  # End date is exclusive, covers all of October 2025
+        self.days_in_month = pd.Timestamp(self.start_date).days_in_month if start_date else 31
         logger.info(f"Date Range: {self.start_date} to {self.end_date} (exclusive end date)")
         
         
@@ -93,10 +125,30 @@ class PrepaidLedgerComparison:
             'closing_balance'
         ]
     
+    def apply_tariff(self, tariff: Tariff):
+        """Take rates and MD thresholds from a catalog rule set"""
+        self.tariff = tariff
+        self.contracted_load = tariff.contracted_load_kw(self.sanctioned_load)  # kW
+        self.fc_rate = tariff.fc_rate  # Per kW FC Rate
+        self.ed_rate = tariff.ed_rate
+        self.rebate_rate = tariff.rebate_rate
+        self.ec_rate = tariff.ec_slabs[0][1]  # Fixed EC rate
+        self.md_fc_floor_percent = tariff.md_fc_floor_percent
+        self.md_edp_percent = tariff.md_edp_percent
+    
+    def select_tariff(self, df: pd.DataFrame):
+        """Use the catalog rule set of the ledger's applied_supply_type_code (unless a tariff was passed in)"""
+        if self.tariff_fixed:
+            return
+        code = tariff_catalog.ledger_supply_type(df)
+        if code is not None:
+            self.apply_tariff(tariff_catalog.lookup(code, self.load_unit))
+        logger.info(f"Tariff: supply type {self.tariff.supply_type_code} ({self.tariff.name}), load unit {self.load_unit}")
+    
     def fetch_prepaid_ledger_data(self) -> pd.DataFrame:
         """Fetch prepaid ledger data from API"""
         try:
-            response = requests.get(self.api_url, timeout=30)
+            response = http_client.get(self.api_url, timeout=30)
             response.raise_for_status()
             
             data = response.json()
@@ -108,173 +160,145 @@ class PrepaidLedgerComparison:
             else:
                 raise ValueError("Unexpected API response format")
             
-            # Filter data for the specified date range
-            df['start_date_time'] = pd.to_datetime(df['start_date_time'], utc=True)
-            df['end_date_time'] = pd.to_datetime(df['end_date_time'], utc=True)
-            
-            start_dt = pd.to_datetime(self.start_date, utc=True)
-            end_dt = pd.to_datetime(self.end_date, utc=True)
-            
-            df_filtered = df[
-                (df['start_date_time'] >= start_dt) & 
-                (df['start_date_time'] < end_dt)
-            ].copy()
-            
-            # Sort by start_date_time to ensure proper order for cumulative calculations
-            df_filtered = df_filtered.sort_values('start_date_time').reset_index(drop=True)
-            
-            logger.info(f"Fetched {len(df_filtered)} records for date range {self.start_date} to {self.end_date}")
-            
-            return df_filtered
+            return self.filter_ledger_data(df)
             
         except Exception as e:
             return pd.DataFrame()
     
-    def calculate_expected_values(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Calculate expected values based on our formulas"""
-        df_calc = df.copy()
-        
-        # Initialize running balance and cumulative values
-        running_balance = self.opening_balance
-        cumm_daily_consumption = 0
-        cumm_daily_consumption_rupees = 0
-        cumm_daily_fixed_charges = 0
-        cumm_daily_ec_plus_fc_charge = 0
-        cumm_daily_ed_charge = 0
-        cumm_daily_final_rebate = 0
-        cumm_daily_final_charge = 0
-        
-        # Calculate expected values for each row
-        for idx, row in df_calc.iterrows():
-            daily_consumption = row['daily_consumption']
-            date_str = row['start_date_time'].strftime('%Y-%m-%d') if hasattr(row['start_date_time'], 'strftime') else str(row['start_date_time'])[:10]
-            
-            logger.info(f"**********DAY {idx + 1} - {date_str}************")
-            
-            logger.info(f"Daily Consumption: {daily_consumption:.4f} kWh")
-            
-            # Calculate Expected Daily Energy Charges (EC) = daily_consumption * EC rate
-            expected_daily_ec = daily_consumption * self.ec_rate
-            logger.info(f"Daily EC: {daily_consumption} x {self.ec_rate} = {expected_daily_ec:.4f} Rs.")
-            
-            # Calculate Expected Daily Fixed Charges (FC) = (0.75 x Contracted Load x Per kW FC Rate) / No. of days of the month
-            expected_daily_fc = (0.75 * self.contracted_load * self.fc_rate) / self.days_in_month
-            logger.info(f"Daily FC: (0.75 x {self.contracted_load} x {self.fc_rate}) / {self.days_in_month} = {expected_daily_fc:.4f} Rs.")
-            
-            # Calculate Expected Daily EC + FC
-            expected_daily_ec_plus_fc = expected_daily_ec + expected_daily_fc
-            logger.info(f"Daily EC + FC: {expected_daily_ec:.4f} + {expected_daily_fc:.4f} = {expected_daily_ec_plus_fc:.4f} Rs.")
-            
-            # Calculate Expected Daily Electricity Duty (ED) = (EC + FC) * ED rate
-            expected_daily_ed = expected_daily_ec_plus_fc * self.ed_rate
-            logger.info(f"Daily ED: {expected_daily_ec_plus_fc:.4f} x {self.ed_rate} = {expected_daily_ed:.4f} Rs.")
-            
-            # Calculate Expected Daily Rebate = (EC + FC) * Rebate rate
-            expected_daily_rebate = expected_daily_ec_plus_fc * self.rebate_rate
-            logger.info(f"Daily Rebate: {expected_daily_ec_plus_fc:.4f} x {self.rebate_rate} = {expected_daily_rebate:.4f} Rs.")
-            
-            # Calculate Expected Daily Final charge = (EC + FC + ED) - Rebate
-            expected_daily_final_charge = expected_daily_ec_plus_fc + expected_daily_ed - expected_daily_rebate
-            logger.info(f"Daily Final Charge: ({expected_daily_ec_plus_fc:.4f} + {expected_daily_ed:.4f}) - {expected_daily_rebate:.4f} = {expected_daily_final_charge:.4f} Rs.")
-            
-            # Update cumulative values
-            cumm_daily_consumption += daily_consumption
-            cumm_daily_consumption_rupees += expected_daily_ec
-            cumm_daily_fixed_charges += expected_daily_fc
-            cumm_daily_ec_plus_fc_charge += expected_daily_ec_plus_fc
-            cumm_daily_ed_charge += expected_daily_ed
-            cumm_daily_final_rebate += expected_daily_rebate
-            cumm_daily_final_charge += expected_daily_final_charge
-            
-            
-            # Calculate Expected Opening and Closing Balance
-            if idx == 0:
-                expected_opening_balance = self.opening_balance
-            else:
-                expected_opening_balance = running_balance
-            
-            expected_closing_balance = expected_opening_balance - expected_daily_final_charge
-            
-            logger.info(f"Opening Balance: {expected_opening_balance:.4f} Rs.")
-            logger.info(f"Daily Final Charge: {expected_daily_final_charge:.4f} Rs.")
-            logger.info(f"Closing Balance: {expected_opening_balance:.4f} - {expected_daily_final_charge:.4f} = {expected_closing_balance:.4f} Rs.")
-            
-            # Update running balance for next iteration
-            running_balance = expected_closing_balance
-            
-            # Store expected calculated values (rounded to 4 decimal places)
-            df_calc.loc[idx, 'expected_daily_consumption_in_rupees'] = round(expected_daily_ec, 4)
-            df_calc.loc[idx, 'expected_daily_fixed_charges'] = round(expected_daily_fc, 4)
-            df_calc.loc[idx, 'expected_daily_ec_plus_fc_charge'] = round(expected_daily_ec_plus_fc, 4)
-            df_calc.loc[idx, 'expected_daily_ed_charge'] = round(expected_daily_ed, 4)
-            df_calc.loc[idx, 'expected_daily_final_rebate'] = round(expected_daily_rebate, 4)
-            df_calc.loc[idx, 'expected_daily_final_charge'] = round(expected_daily_final_charge, 4)
-            df_calc.loc[idx, 'expected_opening_balance'] = round(expected_opening_balance, 4)
-            df_calc.loc[idx, 'expected_closing_balance'] = round(expected_closing_balance, 4)
-            
-            # Store expected cumulative values (rounded to 4 decimal places)
-            df_calc.loc[idx, 'expected_cumm_daily_consumption_rupees_mtd'] = round(cumm_daily_consumption_rupees, 4)
-            df_calc.loc[idx, 'expected_cumm_daily_fixed_charges_mtd'] = round(cumm_daily_fixed_charges, 4)
-            df_calc.loc[idx, 'expected_cumm_daily_ec_plus_fc_charge_mtd'] = round(cumm_daily_ec_plus_fc_charge, 4)
-            df_calc.loc[idx, 'expected_cumm_ed_charges_mtd'] = round(cumm_daily_ed_charge, 4)
-            df_calc.loc[idx, 'expected_cumm_daily_final_rebate_mtd'] = round(cumm_daily_final_rebate, 4)
-            df_calc.loc[idx, 'expected_cumm_daily_final_charge_mtd'] = round(cumm_daily_final_charge, 4)
+    def filter_ledger_data(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Keep the ledger rows of the date range in day order (API response or stored rows)"""
+        # Filter data for the specified date range
+        df['start_date_time'] = pd.to_datetime(df['start_date_time'], utc=True)
+        df['end_date_time'] = pd.to_datetime(df['end_date_time'], utc=True)
+        
+        start_dt = pd.to_datetime(self.start_date, utc=True)
+        end_dt = pd.to_datetime(self.end_date, utc=True)
+        
+        df_filtered = df[
+            (df['start_date_time'] >= start_dt) & 
+            (df['start_date_time'] < end_dt)
+        ].copy()
+        
+        # Sort by start_date_time to ensure proper order for cumulative calculations
+        df_filtered = df_filtered.sort_values('start_date_time').reset_index(drop=True)
+        
+        logger.info(f"Fetched {len(df_filtered)} records for date range {self.start_date} to {self.end_date}")
+        
+        return df_filtered
+    
+    def calculate_expected_values(self, df: pd.DataFrame, by: str = None) -> pd.DataFrame:
+        """
+        Calculate expected values based on our formulas (whole ledger at once)
+        
+        Args:
+            df: Ledger rows in day order
+            by: Optional column (e.g. 'account_id') for a batch of ledgers stacked in
+                one frame; running totals and balances restart for every value
+        """
+        daily_consumption = df['daily_consumption'].to_numpy(dtype=np.float64)
+        groups = df[by].to_numpy() if by else None
+        
+        # Daily Energy Charges (EC) = daily_consumption * EC rate
+        expected_daily_ec = daily_consumption * self.ec_rate
+        
+        # Daily Fixed Charges (FC) = (0.75 x Contracted Load x Per kW FC Rate) / No. of days of the month
+        expected_daily_fc = np.full(len(df), (self.md_fc_floor_percent / 100 * self.contracted_load * self.fc_rate) / self.days_in_month)
+        
+        # Daily EC + FC, ED = (EC + FC) * ED rate, Rebate = (EC + FC) * Rebate rate
+        expected_daily_ec_plus_fc = expected_daily_ec + expected_daily_fc
+        expected_daily_ed = expected_daily_ec_plus_fc * self.ed_rate
+        expected_daily_rebate = expected_daily_ec_plus_fc * self.rebate_rate
+        
+        # Daily Final charge = (EC + FC + ED) - Rebate
+        expected_daily_final_charge = expected_daily_ec_plus_fc + expected_daily_ed - expected_daily_rebate
+        
+        # Closing Balance = Opening Balance - Daily Final charge, carried day to day
+        expected_opening_balance, expected_closing_balance = running_balance(
+            self.opening_balance, expected_daily_final_charge, groups
+        )
+        
+        cumulative = running_totals({
+            'expected_cumm_daily_consumption_rupees_mtd': expected_daily_ec,
+            'expected_cumm_daily_fixed_charges_mtd': expected_daily_fc,
+            'expected_cumm_daily_ec_plus_fc_charge_mtd': expected_daily_ec_plus_fc,
+            'expected_cumm_ed_charges_mtd': expected_daily_ed,
+            'expected_cumm_daily_final_rebate_mtd': expected_daily_rebate,
+            'expected_cumm_daily_final_charge_mtd': expected_daily_final_charge
+        }, groups)
+        
+        expected_columns = {
+            'expected_daily_consumption_in_rupees': expected_daily_ec,
+            'expected_daily_fixed_charges': expected_daily_fc,
+            'expected_daily_ec_plus_fc_charge': expected_daily_ec_plus_fc,
+            'expected_daily_ed_charge': expected_daily_ed,
+            'expected_daily_final_rebate': expected_daily_rebate,
+            'expected_daily_final_charge': expected_daily_final_charge,
+            'expected_opening_balance': expected_opening_balance,
+            'expected_closing_balance': expected_closing_balance,
+            **cumulative
+        }
+        
+        # Store expected calculated and cumulative values (rounded to 4 decimal places)
+        expected_df = pd.DataFrame({column: round_values(values, 4) for column, values in expected_columns.items()},
+                                   index=df.index)
+        df_calc = pd.concat([df.drop(columns=list(expected_columns), errors='ignore'), expected_df], axis=1)
+        
+        # Prose per-day breakdown (skipped unless INFO is on) and the opt-in JSON-lines trace (see Common/calc_trace.py)
+        if self.log_daily_details and logger.isEnabledFor(logging.INFO):
+            self.log_daily_calculations(df_calc, expected_columns)
+        calc_trace.trace_days("101", self.account_id, df, expected_columns, by=by)
         
         return df_calc
     
+    def log_daily_calculations(self, df: pd.DataFrame, expected: Dict[str, np.ndarray]):
+        """Log the day-by-day formula breakdown (unrounded values, as calculated)"""
+        fc_floor = self.md_fc_floor_percent / 100
+        expected_daily_fc = (fc_floor * self.contracted_load * self.fc_rate) / self.days_in_month
+        dates = df['start_date_time']
+        dates = dates.dt.strftime('%Y-%m-%d') if hasattr(dates, 'dt') and pd.api.types.is_datetime64_any_dtype(dates) else dates.astype(str).str[:10]
+        
+        daily = zip(
+            dates.tolist(),
+            df['daily_consumption'].tolist(),
+            expected['expected_daily_consumption_in_rupees'].tolist(),
+            expected['expected_daily_ec_plus_fc_charge'].tolist(),
+            expected['expected_daily_ed_charge'].tolist(),
+            expected['expected_daily_final_rebate'].tolist(),
+            expected['expected_daily_final_charge'].tolist(),
+            expected['expected_opening_balance'].tolist(),
+            expected['expected_closing_balance'].tolist()
+        )
+        for idx, (date_str, daily_consumption, ec, ec_plus_fc, ed, rebate, final_charge, opening, closing) in enumerate(daily):
+            logger.info(f"**********DAY {idx + 1} - {date_str}************")
+            logger.info(f"Daily Consumption: {daily_consumption:.4f} kWh")
+            logger.info(f"Daily EC: {daily_consumption} x {self.ec_rate} = {ec:.4f} Rs.")
+            logger.info(f"Daily FC: ({fc_floor} x {self.contracted_load} x {self.fc_rate}) / {self.days_in_month} = {expected_daily_fc:.4f} Rs.")
+            logger.info(f"Daily EC + FC: {ec:.4f} + {expected_daily_fc:.4f} = {ec_plus_fc:.4f} Rs.")
+            logger.info(f"Daily ED: {ec_plus_fc:.4f} x {self.ed_rate} = {ed:.4f} Rs.")
+            logger.info(f"Daily Rebate: {ec_plus_fc:.4f} x {self.rebate_rate} = {rebate:.4f} Rs.")
+            logger.info(f"Daily Final Charge: ({ec_plus_fc:.4f} + {ed:.4f}) - {rebate:.4f} = {final_charge:.4f} Rs.")
+            logger.info(f"Opening Balance: {opening:.4f} Rs.")
+            logger.info(f"Daily Final Charge: {final_charge:.4f} Rs.")
+            logger.info(f"Closing Balance: {opening:.4f} - {final_charge:.4f} = {closing:.4f} Rs.")
+    
     def compare_values(self, df: pd.DataFrame) -> pd.DataFrame:
         """Compare calculated vs expected values and generate status"""
-        df_compare = df.copy()
-        
-        # Tolerance for floating point comparison
-        tolerance = 0.01
+        # Match within COMPARE_TOLERANCE (0.01) per compared column, for all rows at once;
+        # missing values count as 0, values that are not numbers never match
+        columns = [col for col in self.comparison_columns if f"expected_{col}" in df.columns]
+        matches = np.column_stack([match_mask(df[col], df[f"expected_{col}"]) for col in columns]) \
+            if columns else np.ones((len(df), 0), dtype=bool)
         
-        def check_match(actual_val, expected_val, col_name):
-            """Check if actual and expected values match within tolerance"""
-            try:
-                actual = float(actual_val) if pd.notna(actual_val) else 0
-                expected = float(expected_val) if pd.notna(expected_val) else 0
-                return abs(actual - expected) <= tolerance
-            except (ValueError, TypeError):
-                return False
+        match_df = pd.DataFrame(matches, columns=[f"{col}_match" for col in columns], index=df.index)
+        df_compare = pd.concat([df.drop(columns=list(match_df.columns) + ['Status'], errors='ignore'), match_df], axis=1)
         
-        # Compare each column and generate status
-        mismatch_columns = []
+        # Columns with at least one mismatching row
+        mismatch_columns = [col for col, column_matches in zip(columns, matches.T) if not column_matches.all()]
         
-        for col in self.comparison_columns:
-            expected_col = f"expected_{col}"
-            
-            if expected_col in df_compare.columns:
-                # Create comparison column
-                df_compare[f"{col}_match"] = df_compare.apply(
-                    lambda row: check_match(row[col], row[expected_col], col), 
-                    axis=1
-                )
-                
-                # Check if all values match for this column
-                all_match = df_compare[f"{col}_match"].all()
-                if not all_match:
-                    mismatch_columns.append(col)
-            else:
-                pass
-        
-        # Generate overall status for each row
-        def generate_row_status(row):
-            row_mismatches = []
-            for col in self.comparison_columns:
-                match_col = f"{col}_match"
-                if match_col in df_compare.columns:
-                    if not row[match_col]:
-                        row_mismatches.append(col)
-            
-            if not row_mismatches:
-                return "All Match"
-            else:
-                return ", ".join(row_mismatches)
-        
-        df_compare['Status'] = df_compare.apply(generate_row_status, axis=1)
+        # Generate overall status for each row ("All Match" or the mismatching columns)
+        df_compare['Status'] = row_status(matches, columns)
         
-        all_match_count = len(df_compare[df_compare['Status'] == 'All Match'])
+        all_match_count = int(matches.all(axis=1).sum())
         
         # Log comprehensive comparison summary
         
@@ -293,9 +317,9 @@ class PrepaidLedgerComparison:
             logger.info("DETAILED MISMATCH ANALYSIS")
             
             mismatch_records = df_compare[df_compare['Status'] != 'All Match']
-            for idx, row in mismatch_records.iterrows():
-                date_str = row['start_date_time'].strftime('%Y-%m-%d') if hasattr(row['start_date_time'], 'strftime') else str(row['start_date_time'])[:10]
-                logger.info(f"Date: {date_str} - Status: {row['Status']}")
+            for start, status in zip(mismatch_records['start_date_time'].tolist(), mismatch_records['Status'].tolist()):
+                date_str = start.strftime('%Y-%m-%d') if hasattr(start, 'strftime') else str(start)[:10]
+                logger.info(f"Date: {date_str} - Status: {status}")
         
         return df_compare
     
@@ -377,7 +401,8 @@ class PrepaidLedgerComparison:
         if df.empty:
             return
         
-        # Step 2: Calculate expected values
+        # Step 2: Calculate expected values (with the rule set of the ledger's supply type)
+        self.select_tariff(df)
         df_with_expected = self.calculate_expected_values(df)
         
         # Step 3: Compare values
@@ -386,6 +411,11 @@ class PrepaidLedgerComparison:
         # Step 4: Generate comparison report
         self.generate_comparison_report(df_comparison)
         
+        # Columnar copy of the comparison (only when the result store is enabled)
+        store = result_store.active()
+        if store is not None:
+            store.write("comparison", f"Formula_101_{self.account_id}", df_comparison)
+        
         all_match_count = len(df_comparison[df_comparison['Status'] == 'All Match'])
         mismatch_count = len(df_comparison[df_comparison['Status'] != 'All Match'])
         
@@ -1,4 +1,3 @@
-import requests
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
@@ -7,8 +6,19 @@ from typing import Dict, List, Tuple
 import warnings
 import logging
 import os
+import sys
 warnings.filterwarnings('ignore')
 
+# Make the shared Common package importable when run as python Formula/Formula_102.py
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from Common import calc_trace, http_client, result_store, tariff_catalog
+from Common.ledger_kernels import (excess_demand_penalty, match_mask, previous_values, round_values, row_status,
+                                   running_balance, running_totals)
+from Common.tariff_catalog import Tariff
+
 # Create logs folder if it doesn't exist
 os.makedirs('logs', exist_ok=True)
 
@@ -23,28 +33,50 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+LEDGER_API_BASE = "https://engine-web.stage.gomatimvvnl.in/daily_prepaid_ledger"
+
 class PrepaidLedgerComparison:
-    def __init__(self):
+    def __init__(self, account_id: str = None, start_date: str = None, end_date: str = None,
+                 tariff: Tariff = None, contracted_load: float = None, load_unit: str = "KW",
+                 opening_balance: float = None):
+        """
+        Args:
+            account_id: Account whose ledger is validated (default: the built-in test account)
+            start_date: First day of the period (default: 2025-10-01)
+            end_date: Exclusive end of the period (default: 2025-11-01)
+            tariff: Rule set to validate against (default: looked up from the ledger's
+                applied_supply_type_code in the tariff catalog); this flat-rate
+                validator uses its first EC slab rate and its FC rate
+            contracted_load: Sanctioned load in load_unit (default: 1)
+            load_unit: KW, KVA or BHP
+            opening_balance: Balance before the first day (default: 5000)
+        """
         # Configuration parameters
-        self.contracted_load = 1  # kW
-        self.fc_rate = 50  # Per kW FC Rate
-        self.ed_rate = 0.05  # 5%
-        self.rebate_rate = 0.02  # 2%
-        self.opening_balance = 5000
-        self.ec_rate = 3  # Fixed EC rate
-        self.days_in_month = 31
+        self.load_unit = load_unit
+        self.sanctioned_load = contracted_load if contracted_load is not None else 1
+        self.contracted_load = self.sanctioned_load  # kW
+        self.opening_balance = opening_balance if opening_balance is not None else 5000
+        
+        # Rates and MD thresholds from the tariff catalog; replaced by the ledger's own
+        # supply type in run_comparison() unless a tariff was passed in
+        self.tariff_fixed = tariff is not None
+        self.apply_tariff(tariff or tariff_catalog.lookup(None, load_unit))
+        
+        # Log the day-by-day formula breakdown (set False for bulk/benchmark runs)
+        self.log_daily_details = True
         
-    
         # API configuration
-        self.api_url = "https://engine-web.stage.gomatimvvnl.in/daily_prepaid_ledger/3276464172/"
+        self.account_id = str(account_id) if account_id else "3276464172"
+        self.api_url = f"{LEDGER_API_BASE}/{self.account_id}/"
         
         # Log account information
         logger.info("Test Case ID : Formula_102 - Prepaid Ledger Comparison")
-        logger.info("Account ID: 2222550011")
+        logger.info(f"Account ID: {self.account_id}")
         
         # Date range for energy consumption calculation
-        self.start_date = "2025-10-01T00:00:00"
-        self.end_date = "2025-11-01T00:00:00"  # End date is exclusive, covers all of October 2025
+        self.start_date = start_date or "2025-10-01T00:00:00"
+        self.end_date = end_date or "2025-11-01T00:00:00"  # End date is exclusive, covers all of October 2025
+        self.days_in_month = pd.Timestamp(self.start_date).days_in_month if start_date else 31
         logger.info(f"Date Range: {self.start_date} to {self.end_date} (exclusive end date)")
         
         
@@ -110,10 +142,30 @@ class PrepaidLedgerComparison:
             "closing_balance"
         ]
     
+    def apply_tariff(self, tariff: Tariff):
+        """Take rates and MD thresholds from a catalog rule set"""
+        self.tariff = tariff
+        self.contracted_load = tariff.contracted_load_kw(self.sanctioned_load)  # kW
+        self.fc_rate = tariff.fc_rate  # Per kW FC Rate
+        self.ed_rate = tariff.ed_rate
+        self.rebate_rate = tariff.rebate_rate
+        self.ec_rate = tariff.ec_slabs[0][1]  # Fixed EC rate
+        self.md_fc_floor_percent = tariff.md_fc_floor_percent
+        self.md_edp_percent = tariff.md_edp_percent
+    
+    def select_tariff(self, df: pd.DataFrame):
+        """Use the catalog rule set of the ledger's applied_supply_type_code (unless a tariff was passed in)"""
+        if self.tariff_fixed:
+            return
+        code = tariff_catalog.ledger_supply_type(df)
+        if code is not None:
+            self.apply_tariff(tariff_catalog.lookup(code, self.load_unit))
+        logger.info(f"Tariff: supply type {self.tariff.supply_type_code} ({self.tariff.name}), load unit {self.load_unit}")
+    
     def fetch_prepaid_ledger_data(self) -> pd.DataFrame:
         """Fetch prepaid ledger data from API"""
         try:
-            response = requests.get(self.api_url, timeout=30)
+            response = http_client.get(self.api_url, timeout=30)
             response.raise_for_status()
             
             data = response.json()
@@ -125,302 +177,243 @@ class PrepaidLedgerComparison:
             else:
                 raise ValueError("Unexpected API response format")
             
-            # Filter data for the specified date range
-            df['start_date_time'] = pd.to_datetime(df['start_date_time'], utc=True)
-            df['end_date_time'] = pd.to_datetime(df['end_date_time'], utc=True)
-            
-            start_dt = pd.to_datetime(self.start_date, utc=True)
-            end_dt = pd.to_datetime(self.end_date, utc=True)
-            
-            df_filtered = df[
-                (df['start_date_time'] >= start_dt) & 
-                (df['start_date_time'] < end_dt)
-            ].copy()
-            
-            # Sort by start_date_time to ensure proper order for cumulative calculations
-            df_filtered = df_filtered.sort_values('start_date_time').reset_index(drop=True)
-            
-            logger.info(f"Fetched {len(df_filtered)} records for date range {self.start_date} to {self.end_date}")
-            
-            return df_filtered
+            return self.filter_ledger_data(df)
             
         except Exception as e:
             return pd.DataFrame()
     
-    def calculate_expected_values(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Calculate expected values based on our formulas"""
-        df_calc = df.copy()
-        
-        # Initialize running balance and cumulative values
-        running_balance = self.opening_balance
-        cumm_daily_consumption = 0
-        cumm_daily_consumption_rupees = 0
-        cumm_daily_max_demand_penalty = 0
-        cumm_daily_fixed_charge_adjustment = 0
-        cumm_daily_fixed_charges = 0
-        cumm_ec_final_charges = 0
-        cumm_fc_final_charges = 0
-        cumm_daily_ec_plus_fc_charge = 0
-        cumm_daily_ed_charge = 0
-        cumm_daily_final_rebate = 0
-        cumm_daily_final_charge = 0
-        
-        # Track previous day's max demand for fixed charge adjustment calculation
-        previous_max_demand = 0
-        previous_max_demand_percentage = 0
-        previous_day = 0
-        
-        # Track EDP calculation variables for dynamic recalculation
-        previous_max_demand_for_edp = 0
-        previous_edp_daily_rate = 0
-        days_with_previous_edp = 0
-        total_edp_charged_so_far = 0
-        
-        # Calculate expected values for each row
-        for idx, row in df_calc.iterrows():
-            daily_consumption = row['daily_consumption']
-            max_demand = row.get('max_demand', 0)
-            current_day = idx + 1
-            date_str = row['start_date_time'].strftime('%Y-%m-%d') if hasattr(row['start_date_time'], 'strftime') else str(row['start_date_time'])[:10]
+    def filter_ledger_data(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Keep the ledger rows of the date range in day order (API response or stored rows)"""
+        # Filter data for the specified date range
+        df['start_date_time'] = pd.to_datetime(df['start_date_time'], utc=True)
+        df['end_date_time'] = pd.to_datetime(df['end_date_time'], utc=True)
+        
+        start_dt = pd.to_datetime(self.start_date, utc=True)
+        end_dt = pd.to_datetime(self.end_date, utc=True)
+        
+        df_filtered = df[
+            (df['start_date_time'] >= start_dt) & 
+            (df['start_date_time'] < end_dt)
+        ].copy()
+        
+        # Sort by start_date_time to ensure proper order for cumulative calculations
+        df_filtered = df_filtered.sort_values('start_date_time').reset_index(drop=True)
+        
+        logger.info(f"Fetched {len(df_filtered)} records for date range {self.start_date} to {self.end_date}")
+        
+        return df_filtered
+    
+    def calculate_expected_values(self, df: pd.DataFrame, by: str = None) -> pd.DataFrame:
+        """
+        Calculate expected values based on our formulas (whole ledger at once)
+        
+        Args:
+            df: Ledger rows in day order
+            by: Optional column (e.g. 'account_id') for a batch of ledgers stacked in
+                one frame; days, running totals, balances and the EDP state restart
+                for every value
+        """
+        daily_consumption = df['daily_consumption'].to_numpy(dtype=np.float64)
+        max_demand = df['max_demand'].to_numpy(dtype=np.float64) if 'max_demand' in df.columns else np.zeros(len(df))
+        groups = df[by].to_numpy() if by else None
+        fc_floor = self.md_fc_floor_percent / 100
+        
+        # Calculate Expected Daily Energy Charges (EC) = daily_consumption * EC rate
+        expected_daily_ec = daily_consumption * self.ec_rate
+        
+        # Daily Fixed Charges (FC) based on max demand percentage: the 75% floor, else the actual max demand
+        max_demand_percentage = (max_demand / self.contracted_load) * 100
+        with np.errstate(invalid='ignore'):
+            at_floor = max_demand_percentage <= self.md_fc_floor_percent
+        expected_daily_fc = np.where(at_floor,
+                                     (fc_floor * self.contracted_load * self.fc_rate) / self.days_in_month,
+                                     (self.fc_rate * self.contracted_load * (max_demand / self.contracted_load)) / self.days_in_month)
+        
+        # Fixed Charge Adjustment (if md is greater than 75% of contracted load, from the second day):
+        # ((FC Rate × Load × Current Day % × (Current Day − 1)) ÷ Days) − ((FC Rate × Load × Previous Day % × (Current Day − 1)) ÷ Days)
+        # where a previous day at or below 75% counts as 0.75, and an unchanged max demand adjusts nothing
+        edp = excess_demand_penalty(max_demand, self.contracted_load, self.fc_rate, self.days_in_month,
+                                    self.md_edp_percent, groups)
+        current_day = edp['day']
+        previous_max_demand = previous_values(max_demand, groups)
+        previous_max_demand_percentage = previous_values(max_demand_percentage, groups)
+        with np.errstate(invalid='ignore'):
+            adjusted = (max_demand_percentage > self.md_fc_floor_percent) & (current_day > 1)
+            previous_at_floor = previous_max_demand_percentage <= self.md_fc_floor_percent
+            unchanged = np.abs(max_demand - previous_max_demand) < 0.0001
+        current_day_percentage = max_demand / self.contracted_load
+        previous_day_percentage = np.where(previous_at_floor, fc_floor, previous_max_demand / self.contracted_load)
+        current_adjustment = (self.fc_rate * self.contracted_load * current_day_percentage * (current_day - 1)) / self.days_in_month
+        previous_adjustment = (self.fc_rate * self.contracted_load * previous_day_percentage * (current_day - 1)) / self.days_in_month
+        expected_daily_fc_adjustment = np.where(adjusted & ~unchanged, current_adjustment - previous_adjustment, 0.0)
+        
+        # Final FC = FC + fixed charge adjustment; Daily EC + final FC
+        expected_daily_fc_final = expected_daily_fc + expected_daily_fc_adjustment
+        expected_daily_ec_plus_fc = expected_daily_ec + expected_daily_fc_final
+        
+        # Daily Excess Demand Penalty (EDP) (if md is greater than 100% of contracted load)
+        expected_daily_edp = edp['edp']
+        
+        # ED = (EC + final FC + EDP) * ED rate, Rebate = (EC + FC) * Rebate rate
+        expected_daily_ed = (expected_daily_ec + expected_daily_fc_final + expected_daily_edp) * self.ed_rate
+        expected_daily_rebate = expected_daily_ec_plus_fc * self.rebate_rate
+        
+        # Daily Final charge = (EC + FC + ED + EDP) - Rebate
+        expected_daily_final_charge = expected_daily_ec_plus_fc + expected_daily_ed + expected_daily_edp - expected_daily_rebate
+        
+        # Closing Balance = Opening Balance - Daily Final charge, carried day to day
+        expected_opening_balance, expected_closing_balance = running_balance(
+            self.opening_balance, expected_daily_final_charge, groups
+        )
+        
+        cumulative = running_totals({
+            'expected_cumm_daily_consumption_rupees_mtd': expected_daily_ec,
+            'expected_cumm_daily_max_demand_penalty_mtd': expected_daily_edp,
+            'expected_cumm_daily_fixed_charge_adjustment_mtd': expected_daily_fc_adjustment,
+            'expected_cumm_daily_fixed_charges_mtd': expected_daily_fc_final,
+            'expected_cumm_ec_final_charges_mtd': expected_daily_ec,
+            'expected_cumm_fc_final_charges_mtd': expected_daily_fc_final,
+            'expected_cumm_daily_ec_plus_fc_charge_mtd': expected_daily_ec_plus_fc,
+            'expected_cumm_ed_charges_mtd': expected_daily_ed,
+            'expected_cumm_daily_final_rebate_mtd': expected_daily_rebate,
+            'expected_cumm_daily_final_charge_mtd': expected_daily_final_charge
+        }, groups)
+        
+        expected_columns = {
+            'expected_daily_consumption_in_rupees': expected_daily_ec,
+            'expected_daily_max_demand_penalty': expected_daily_edp,
+            'expected_daily_fixed_charge_adjustment': expected_daily_fc_adjustment,
+            'expected_daily_fixed_charges': expected_daily_fc,
+            'expected_daily_ec_final_charge': expected_daily_ec,
+            'expected_daily_fc_final_charge': expected_daily_fc_final,
+            'expected_daily_ec_plus_fc_charge': expected_daily_ec_plus_fc,
+            'expected_daily_ed_charge': expected_daily_ed,
+            'expected_daily_final_rebate': expected_daily_rebate,
+            'expected_daily_final_charge': expected_daily_final_charge,
+            'expected_opening_balance': expected_opening_balance,
+            'expected_closing_balance': expected_closing_balance,
+            **cumulative
+        }
+        
+        # Store expected calculated and cumulative values (rounded to 4 decimal places)
+        expected_df = pd.DataFrame({column: round_values(values, 4) for column, values in expected_columns.items()},
+                                   index=df.index)
+        df_calc = pd.concat([df.drop(columns=list(expected_columns), errors='ignore'), expected_df], axis=1)
+        
+        # Intermediate per-day values for the log and the trace
+        state = {
+            'max_demand': max_demand,
+            'max_demand_percentage': max_demand_percentage,
+            'at_floor': at_floor,
+            'adjusted': adjusted,
+            'previous_at_floor': previous_at_floor,
+            'unchanged': unchanged,
+            'previous_day_max_demand': previous_max_demand,
+            'current_day_percentage': current_day_percentage,
+            'previous_day_percentage': previous_day_percentage,
+            **edp
+        }
+        
+        # Prose per-day breakdown (skipped unless INFO is on) and the opt-in JSON-lines trace (see Common/calc_trace.py)
+        if self.log_daily_details and logger.isEnabledFor(logging.INFO):
+            self.log_daily_calculations(df_calc, expected_columns, state)
+        calc_trace.trace_days("102", self.account_id, df, expected_columns, state, by)
+        
+        return df_calc
+    
+    def log_daily_calculations(self, df: pd.DataFrame, expected: Dict[str, np.ndarray], state: Dict[str, np.ndarray]):
+        """Log the day-by-day formula breakdown (unrounded values, as calculated)"""
+        fc_floor = self.md_fc_floor_percent / 100
+        dates = df['start_date_time']
+        dates = dates.dt.strftime('%Y-%m-%d') if hasattr(dates, 'dt') and pd.api.types.is_datetime64_any_dtype(dates) else dates.astype(str).str[:10]
+        columns = {name: values.tolist() for name, values in state.items()}
+        columns.update({name: values.tolist() for name, values in expected.items()})
+        daily_consumption = df['daily_consumption'].tolist()
+        
+        for i, date_str in enumerate(dates.tolist()):
+            day = {name: values[i] for name, values in columns.items()}
+            current_day = day['day']
+            max_demand = day['max_demand']
+            ec = day['expected_daily_consumption_in_rupees']
+            fc = day['expected_daily_fixed_charges']
+            adjustment = day['expected_daily_fixed_charge_adjustment']
+            fc_final = day['expected_daily_fc_final_charge']
+            ec_plus_fc = day['expected_daily_ec_plus_fc_charge']
+            edp = day['expected_daily_max_demand_penalty']
+            ed = day['expected_daily_ed_charge']
+            rebate = day['expected_daily_final_rebate']
+            final_charge = day['expected_daily_final_charge']
             
             logger.info(f"**********DAY {current_day} - {date_str}************")
-            
-            logger.info(f"Daily Consumption: {daily_consumption:.4f} kWh")
+            logger.info(f"Daily Consumption: {daily_consumption[i]:.4f} kWh")
             logger.info(f"Max Demand: {max_demand:.4f} kW")
+            logger.info(f"Daily EC: {daily_consumption[i]:.4f} x {self.ec_rate} = {ec:.4f} Rs.")
+            logger.info(f"Max Demand Percentage: ({max_demand:.4f} / {self.contracted_load}) x 100 = {day['max_demand_percentage']:.4f}%")
             
-            # Calculate Expected Daily Energy Charges (EC) = daily_consumption * EC rate
-            expected_daily_ec = daily_consumption * self.ec_rate
-            logger.info(f"Daily EC: {daily_consumption:.4f} x {self.ec_rate} = {expected_daily_ec:.4f} Rs.")
-            
-            # Calculate Daily Fixed Charges (FC) based on max demand percentage
-            max_demand_percentage = (max_demand / self.contracted_load) * 100
-            logger.info(f"Max Demand Percentage: ({max_demand:.4f} / {self.contracted_load}) x 100 = {max_demand_percentage:.4f}%")
-            
-            if max_demand_percentage <= 75:
-                # FC (if max_Demand less than and equal to 75% of contracted load)
-                expected_daily_fc = (0.75 * self.contracted_load * self.fc_rate) / self.days_in_month
-                logger.info(f"Daily FC (<=75%): (0.75 x {self.contracted_load} x {self.fc_rate}) / {self.days_in_month} = {expected_daily_fc:.4f} Rs.")
-            elif max_demand_percentage <= 100:
-                # FC (if max_Demand between 75% to 100% of contracted load)
-                expected_daily_fc = (self.fc_rate * self.contracted_load * (max_demand / self.contracted_load)) / self.days_in_month
-                logger.info(f"Daily FC (75-100%): ({self.fc_rate} x {self.contracted_load} x ({max_demand:.4f} / {self.contracted_load})) / {self.days_in_month} = {expected_daily_fc:.4f} Rs.")
+            if day['at_floor']:
+                logger.info(f"Daily FC (<={self.md_fc_floor_percent}%): ({fc_floor} x {self.contracted_load} x {self.fc_rate}) / {self.days_in_month} = {fc:.4f} Rs.")
+            elif day['max_demand_percentage'] <= self.md_edp_percent:
+                logger.info(f"Daily FC ({self.md_fc_floor_percent}-{self.md_edp_percent}%): ({self.fc_rate} x {self.contracted_load} x ({max_demand:.4f} / {self.contracted_load})) / {self.days_in_month} = {fc:.4f} Rs.")
             else:
-                # FC (if max_Demand greater than 100% of contracted load)
-                expected_daily_fc = (self.fc_rate * self.contracted_load * (max_demand / self.contracted_load)) / self.days_in_month
-                logger.info(f"Daily FC (>100%): ({self.fc_rate} x {self.contracted_load} x ({max_demand:.4f} / {self.contracted_load})) / {self.days_in_month} = {expected_daily_fc:.4f} Rs.")
+                logger.info(f"Daily FC (>{self.md_edp_percent}%): ({self.fc_rate} x {self.contracted_load} x ({max_demand:.4f} / {self.contracted_load})) / {self.days_in_month} = {fc:.4f} Rs.")
             
-            # Calculate Fixed Charge Adjustment (if md is greater than 75% of contracted load)
-            expected_daily_fc_adjustment = 0
-            if max_demand_percentage > 75 and previous_day > 0:
-                # Fixed Charge Adjustment = ((FC Rate × Sanctioned Load × % of Contracted Load for Current Day × (Current Day − 1)) ÷ Total Number of Days in the Month) − ((FC Rate × Sanctioned Load × % of Contracted Load for Previous Day × (Current Day − 1)) ÷ Total Number of Days in the Month)
-                current_day_percentage = max_demand / self.contracted_load
-                
-                # If previous max_demand was <= 75%, use 0.75 (75%) in the formula
-                if previous_max_demand_percentage <= 75:
-                    previous_day_percentage = 0.75
-                    logger.info(f"Previous MD was <= 75%, using 0.75 in adjustment calculation")
-                else:
-                    previous_day_percentage = previous_max_demand / self.contracted_load
-                
-                # If current max_demand equals previous max_demand, adjustment is 0
-                if abs(max_demand - previous_max_demand) < 0.0001:  # Using small tolerance for floating point comparison
-                    expected_daily_fc_adjustment = 0
-                    logger.info(f"Daily FC Adjustment: 0.0000 Rs. (Current MD {max_demand:.4f} equals previous MD {previous_max_demand:.4f})")
+            if day['adjusted']:
+                if day['previous_at_floor']:
+                    logger.info(f"Previous MD was <= {self.md_fc_floor_percent}%, using {fc_floor} in adjustment calculation")
+                if day['unchanged']:
+                    logger.info(f"Daily FC Adjustment: 0.0000 Rs. (Current MD {max_demand:.4f} equals previous MD {day['previous_day_max_demand']:.4f})")
                 else:
-                    current_adjustment = (self.fc_rate * self.contracted_load * current_day_percentage * (current_day - 1)) / self.days_in_month
-                    previous_adjustment = (self.fc_rate * self.contracted_load * previous_day_percentage * (current_day - 1)) / self.days_in_month
-                    
-                    expected_daily_fc_adjustment = current_adjustment - previous_adjustment
-                    logger.info(f"Daily FC Adjustment: ({self.fc_rate} x {self.contracted_load} x {current_day_percentage:.4f} x {current_day - 1}) / {self.days_in_month} - ({self.fc_rate} x {self.contracted_load} x {previous_day_percentage:.4f} x {current_day - 1}) / {self.days_in_month} = {expected_daily_fc_adjustment:.4f} Rs.")
+                    logger.info(f"Daily FC Adjustment: ({self.fc_rate} x {self.contracted_load} x {day['current_day_percentage']:.4f} x {current_day - 1}) / {self.days_in_month} - ({self.fc_rate} x {self.contracted_load} x {day['previous_day_percentage']:.4f} x {current_day - 1}) / {self.days_in_month} = {adjustment:.4f} Rs.")
             else:
-                logger.info(f"Daily FC Adjustment: 0.0000 Rs. (Max demand <= 75% or first day)")
-            
-            # Calculate final FC = FC + fixed charge adjustment
-            expected_daily_fc_final = expected_daily_fc + expected_daily_fc_adjustment
-            logger.info(f"Daily FC Final: {expected_daily_fc:.4f} + {expected_daily_fc_adjustment:.4f} = {expected_daily_fc_final:.4f} Rs.")
+                logger.info(f"Daily FC Adjustment: 0.0000 Rs. (Max demand <= {self.md_fc_floor_percent}% or first day)")
             
-            # Calculate Daily EC + final FC
-            expected_daily_ec_plus_fc = expected_daily_ec + expected_daily_fc_final
-            logger.info(f"Daily EC + FC: {expected_daily_ec:.4f} + {expected_daily_fc_final:.4f} = {expected_daily_ec_plus_fc:.4f} Rs.")
+            logger.info(f"Daily FC Final: {fc:.4f} + {adjustment:.4f} = {fc_final:.4f} Rs.")
+            logger.info(f"Daily EC + FC: {ec:.4f} + {fc_final:.4f} = {ec_plus_fc:.4f} Rs.")
             
-            # Calculate Daily Excess Demand Penalty (EDP) (if md is greater than 100% of contracted load)
-            expected_daily_edp = 0
-            if max_demand_percentage > 100:
-                excess_demand = max_demand - self.contracted_load
-                remaining_days = self.days_in_month - current_day + 1
-                logger.info(f"Excess Demand: {max_demand:.4f} - {self.contracted_load} = {excess_demand:.4f} kW")
+            if day['exceeds']:
+                remaining_days = day['remaining_days']
+                logger.info(f"Excess Demand: {max_demand:.4f} - {self.contracted_load} = {day['excess_demand']:.4f} kW")
                 logger.info(f"Remaining Days: {self.days_in_month} - {current_day} + 1 = {remaining_days}")
-                
-                if remaining_days > 0:
-                    # Calculate new total penalty based on current max demand
-                    new_total_penalty = excess_demand * self.fc_rate
-                    logger.info(f"New Total Penalty: {excess_demand:.4f} x {self.fc_rate} = {new_total_penalty:.4f} Rs.")
-                    
-                    # Check if max demand has increased from previous value
-                    if max_demand >= previous_max_demand_for_edp and previous_max_demand_for_edp > 0:
-                        # Max demand has increased - need to recalculate
-                        # Use previous day's cumulative EDP already charged
-                        edp_already_charged = cumm_daily_max_demand_penalty
-                        logger.info(f"EDP already charged: {edp_already_charged:.4f} Rs.")
-                        
-                        # Calculate remaining penalty to be distributed
-                        remaining_penalty = new_total_penalty - edp_already_charged
-                        logger.info(f"Remaining penalty calculation: {new_total_penalty:.4f} - {edp_already_charged:.4f} = {remaining_penalty:.4f} Rs.")
-                        
-                        if remaining_penalty > 0:
-                            expected_daily_edp = remaining_penalty / remaining_days
-                        else:
-                            expected_daily_edp = 0
-                        
-                        logger.info(f"Max demand increased from {previous_max_demand_for_edp:.4f} to {max_demand:.4f}")
-                        logger.info(f"Daily EDP: {remaining_penalty:.4f} / {remaining_days} = {expected_daily_edp:.4f} Rs.")
+                if day['penalised']:
+                    new_total_penalty = day['new_total_penalty']
+                    logger.info(f"New Total Penalty: {day['excess_demand']:.4f} x {self.fc_rate} = {new_total_penalty:.4f} Rs.")
+                    if day['recalculated']:
+                        logger.info(f"EDP already charged: {day['already_charged']:.4f} Rs.")
+                        logger.info(f"Remaining penalty calculation: {new_total_penalty:.4f} - {day['already_charged']:.4f} = {day['remaining_penalty']:.4f} Rs.")
+                        logger.info(f"Max demand increased from {day['previous_max_demand']:.4f} to {max_demand:.4f}")
+                        logger.info(f"Daily EDP: {day['remaining_penalty']:.4f} / {remaining_days} = {edp:.4f} Rs.")
                     else:
-                        # First time or max demand hasn't increased - normal calculation
-                        expected_daily_edp = new_total_penalty / remaining_days
-                        logger.info(f"Daily EDP: {new_total_penalty:.4f} / {remaining_days} = {expected_daily_edp:.4f} Rs.")
-                    
-                    # Update tracking variables
-                    previous_max_demand_for_edp = max_demand
-                    previous_edp_daily_rate = expected_daily_edp
-                    days_with_previous_edp = 0  # Reset for new calculation
-                    total_edp_charged_so_far = 0  # Reset for new calculation
+                        logger.info(f"Daily EDP: {new_total_penalty:.4f} / {remaining_days} = {edp:.4f} Rs.")
                 else:
-                    expected_daily_edp = 0
                     logger.info(f"Daily EDP: 0.0000 Rs. (No remaining days)")
             else:
-                logger.info(f"Daily EDP: 0.0000 Rs. (Max demand <= 100%)")
-                # If max demand is not > 100%, reset tracking variables
-                if previous_max_demand_for_edp > 0:
-                    # Update days with previous EDP
-                    days_with_previous_edp += 1
-                    total_edp_charged_so_far += previous_edp_daily_rate
-            
-            # Calculate Daily Electricity Duty (ED) = (EC + final FC + EDP) * ED rate
-            expected_daily_ed = (expected_daily_ec + expected_daily_fc_final + expected_daily_edp) * self.ed_rate
-            logger.info(f"Daily ED: ({expected_daily_ec:.4f} + {expected_daily_fc_final:.4f} + {expected_daily_edp:.4f}) x {self.ed_rate} = {expected_daily_ed:.4f} Rs.")
-            
-            # Calculate Expected Daily Rebate = (EC + FC) * Rebate rate
-            expected_daily_rebate = expected_daily_ec_plus_fc * self.rebate_rate
-            logger.info(f"Daily Rebate: {expected_daily_ec_plus_fc:.4f} x {self.rebate_rate} = {expected_daily_rebate:.4f} Rs.")
-            
-            # Calculate Expected Daily Final charge = (EC + FC + ED + EDP) - Rebate
-            expected_daily_final_charge = expected_daily_ec_plus_fc + expected_daily_ed + expected_daily_edp - expected_daily_rebate
-            logger.info(f"Daily Final Charge: ({expected_daily_ec_plus_fc:.4f} + {expected_daily_ed:.4f} + {expected_daily_edp:.4f}) - {expected_daily_rebate:.4f} = {expected_daily_final_charge:.4f} Rs.")
-            
-            # Update cumulative values
-            cumm_daily_consumption += daily_consumption
-            cumm_daily_consumption_rupees += expected_daily_ec
-            cumm_daily_max_demand_penalty += expected_daily_edp
-            cumm_daily_fixed_charge_adjustment += expected_daily_fc_adjustment
-            cumm_daily_fixed_charges += expected_daily_fc + expected_daily_fc_adjustment
-            cumm_ec_final_charges += expected_daily_ec
-            cumm_fc_final_charges += expected_daily_fc_final
-            cumm_daily_ec_plus_fc_charge += expected_daily_ec_plus_fc
-            cumm_daily_ed_charge += expected_daily_ed
-            cumm_daily_final_rebate += expected_daily_rebate
-            cumm_daily_final_charge += expected_daily_final_charge
-            
-            # Update tracking variables for next iteration
-            previous_max_demand = max_demand
-            previous_max_demand_percentage = max_demand_percentage
-            previous_day = current_day
-            
-            # Calculate Expected Opening and Closing Balance
-            if idx == 0:
-                expected_opening_balance = self.opening_balance
-            else:
-                expected_opening_balance = running_balance
-            
-            expected_closing_balance = expected_opening_balance - expected_daily_final_charge
-            
-            logger.info(f"Opening Balance: {expected_opening_balance:.4f} Rs.")
-            logger.info(f"Daily Final Charge: {expected_daily_final_charge:.4f} Rs.")
-            logger.info(f"Closing Balance: {expected_opening_balance:.4f} - {expected_daily_final_charge:.4f} = {expected_closing_balance:.4f} Rs.")
-            
-            # Update running balance for next iteration
-            running_balance = expected_closing_balance
-            
-            # Store expected calculated values (rounded to 4 decimal places)
-            df_calc.loc[idx, 'expected_daily_consumption_in_rupees'] = round(expected_daily_ec, 4)
-            df_calc.loc[idx, 'expected_daily_max_demand_penalty'] = round(expected_daily_edp, 4)
-            df_calc.loc[idx, 'expected_daily_fixed_charge_adjustment'] = round(expected_daily_fc_adjustment, 4)
-            df_calc.loc[idx, 'expected_daily_fixed_charges'] = round(expected_daily_fc, 4)
-            df_calc.loc[idx, 'expected_daily_ec_final_charge'] = round(expected_daily_ec, 4)
-            df_calc.loc[idx, 'expected_daily_fc_final_charge'] = round(expected_daily_fc_final, 4)
-            df_calc.loc[idx, 'expected_daily_ec_plus_fc_charge'] = round(expected_daily_ec_plus_fc, 4)
-            df_calc.loc[idx, 'expected_daily_ed_charge'] = round(expected_daily_ed, 4)
-            df_calc.loc[idx, 'expected_daily_final_rebate'] = round(expected_daily_rebate, 4)
-            df_calc.loc[idx, 'expected_daily_final_charge'] = round(expected_daily_final_charge, 4)
-            df_calc.loc[idx, 'expected_opening_balance'] = round(expected_opening_balance, 4)
-            df_calc.loc[idx, 'expected_closing_balance'] = round(expected_closing_balance, 4)
-            
-            # Store expected cumulative values (rounded to 4 decimal places)
-            df_calc.loc[idx, 'expected_cumm_daily_consumption_rupees_mtd'] = round(cumm_daily_consumption_rupees, 4)
-            df_calc.loc[idx, 'expected_cumm_daily_max_demand_penalty_mtd'] = round(cumm_daily_max_demand_penalty, 4)
-            df_calc.loc[idx, 'expected_cumm_daily_fixed_charge_adjustment_mtd'] = round(cumm_daily_fixed_charge_adjustment, 4)
-            df_calc.loc[idx, 'expected_cumm_daily_fixed_charges_mtd'] = round(cumm_daily_fixed_charges, 4)
-            df_calc.loc[idx, 'expected_cumm_ec_final_charges_mtd'] = round(cumm_ec_final_charges, 4)
-            df_calc.loc[idx, 'expected_cumm_fc_final_charges_mtd'] = round(cumm_fc_final_charges, 4)
-            df_calc.loc[idx, 'expected_cumm_daily_ec_plus_fc_charge_mtd'] = round(cumm_daily_ec_plus_fc_charge, 4)
-            df_calc.loc[idx, 'expected_cumm_ed_charges_mtd'] = round(cumm_daily_ed_charge, 4)
-            df_calc.loc[idx, 'expected_cumm_daily_final_rebate_mtd'] = round(cumm_daily_final_rebate, 4)
-            df_calc.loc[idx, 'expected_cumm_daily_final_charge_mtd'] = round(cumm_daily_final_charge, 4)
-        
-        return df_calc
+                logger.info(f"Daily EDP: 0.0000 Rs. (Max demand <= {self.md_edp_percent}%)")
+            
+            logger.info(f"Daily ED: ({ec:.4f} + {fc_final:.4f} + {edp:.4f}) x {self.ed_rate} = {ed:.4f} Rs.")
+            logger.info(f"Daily Rebate: {ec_plus_fc:.4f} x {self.rebate_rate} = {rebate:.4f} Rs.")
+            logger.info(f"Daily Final Charge: ({ec_plus_fc:.4f} + {ed:.4f} + {edp:.4f}) - {rebate:.4f} = {final_charge:.4f} Rs.")
+            logger.info(f"Opening Balance: {day['expected_opening_balance']:.4f} Rs.")
+            logger.info(f"Daily Final Charge: {final_charge:.4f} Rs.")
+            logger.info(f"Closing Balance: {day['expected_opening_balance']:.4f} - {final_charge:.4f} = {day['expected_closing_balance']:.4f} Rs.")
     
     def compare_values(self, df: pd.DataFrame) -> pd.DataFrame:
         """Compare calculated vs expected values and generate status"""
-        df_compare = df.copy()
-        
-        # Tolerance for floating point comparison
-        tolerance = 0.01
+        # Match within COMPARE_TOLERANCE (0.01) per compared column, for all rows at once;
+        # missing values count as 0, values that are not numbers never match
+        columns = [col for col in self.comparison_columns if f"expected_{col}" in df.columns]
+        matches = np.column_stack([match_mask(df[col], df[f"expected_{col}"]) for col in columns]) \
+            if columns else np.ones((len(df), 0), dtype=bool)
         
-        def check_match(actual_val, expected_val, col_name):
-            """Check if actual and expected values match within tolerance"""
-            try:
-                actual = float(actual_val) if pd.notna(actual_val) else 0
-                expected = float(expected_val) if pd.notna(expected_val) else 0
-                return abs(actual - expected) <= tolerance
-            except (ValueError, TypeError):
-                return False
+        match_df = pd.DataFrame(matches, columns=[f"{col}_match" for col in columns], index=df.index)
+        df_compare = pd.concat([df.drop(columns=list(match_df.columns) + ['Status'], errors='ignore'), match_df], axis=1)
         
-        # Compare each column and generate status
-        mismatch_columns = []
+        # Columns with at least one mismatching row
+        mismatch_columns = [col for col, column_matches in zip(columns, matches.T) if not column_matches.all()]
         
-        for col in self.comparison_columns:
-            expected_col = f"expected_{col}"
-            
-            if expected_col in df_compare.columns:
-                # Create comparison column
-                df_compare[f"{col}_match"] = df_compare.apply(
-                    lambda row: check_match(row[col], row[expected_col], col), 
-                    axis=1
-                )
-                
-                # Check if all values match for this column
-                all_match = df_compare[f"{col}_match"].all()
-                if not all_match:
-                    mismatch_columns.append(col)
-            else:
-                pass
-        
-        # Generate overall status for each row
-        def generate_row_status(row):
-            row_mismatches = []
-            for col in self.comparison_columns:
-                match_col = f"{col}_match"
-                if match_col in df_compare.columns:
-                    if not row[match_col]:
-                        row_mismatches.append(col)
-            
-            if not row_mismatches:
-                return "All Match"
-            else:
-                return ", ".join(row_mismatches)
-        
-        df_compare['Status'] = df_compare.apply(generate_row_status, axis=1)
+        # Generate overall status for each row ("All Match" or the mismatching columns)
+        df_compare['Status'] = row_status(matches, columns)
         
-        all_match_count = len(df_compare[df_compare['Status'] == 'All Match'])
+        all_match_count = int(matches.all(axis=1).sum())
         
         # Log comprehensive comparison summary
         
@@ -439,9 +432,9 @@ class PrepaidLedgerComparison:
             logger.info("DETAILED MISMATCH ANALYSIS")
             
             mismatch_records = df_compare[df_compare['Status'] != 'All Match']
-            for idx, row in mismatch_records.iterrows():
-                date_str = row['start_date_time'].strftime('%Y-%m-%d') if hasattr(row['start_date_time'], 'strftime') else str(row['start_date_time'])[:10]
-                logger.info(f"Date: {date_str} - Status: {row['Status']}")
+            for start, status in zip(mismatch_records['start_date_time'].tolist(), mismatch_records['Status'].tolist()):
+                date_str = start.strftime('%Y-%m-%d') if hasattr(start, 'strftime') else str(start)[:10]
+                logger.info(f"Date: {date_str} - Status: {status}")
         
         return df_compare
     
@@ -531,7 +524,8 @@ class PrepaidLedgerComparison:
         if df.empty:
             return
         
-        # Step 2: Calculate expected values
+        # Step 2: Calculate expected values (with the rule set of the ledger's supply type)
+        self.select_tariff(df)
         df_with_expected = self.calculate_expected_values(df)
         
         # Step 3: Compare values
@@ -540,6 +534,11 @@ class PrepaidLedgerComparison:
         # Step 4: Generate comparison report
         self.generate_comparison_report(df_comparison)
         
+        # Columnar copy of the comparison (only when the result store is enabled)
+        store = result_store.active()
+        if store is not None:
+            store.write("comparison", f"Formula_102_{self.account_id}", df_comparison)
+        
         all_match_count = len(df_comparison[df_comparison['Status'] == 'All Match'])
         mismatch_count = len(df_comparison[df_comparison['Status'] != 'All Match'])
         
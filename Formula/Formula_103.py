@@ -1,4 +1,3 @@
-import requests
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
@@ -7,8 +6,20 @@ from typing import Dict, List, Tuple
 import warnings
 import logging
 import os
+import sys
 warnings.filterwarnings('ignore')
 
+# Make the shared Common package importable when run as python Formula/Formula_103.py
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from Common import calc_trace, http_client, result_store, tariff_catalog
+from Common.ledger_kernels import (excess_demand_penalty, match_mask, previous_values, row_status, running_balance,
+                                   running_totals, slab_charges)
+from Common.lifeline import lifeline_switch
+from Common.tariff_catalog import Tariff
+
 # Create logs folder if it doesn't exist
 os.makedirs('logs', exist_ok=True)
 
@@ -23,32 +34,49 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+LEDGER_API_BASE = "https://engine-web.stage.gomatimvvnl.in/daily_prepaid_ledger"
+
 class PrepaidLedgerComparison:
-    def __init__(self):
+    def __init__(self, account_id: str = None, start_date: str = None, end_date: str = None,
+                 tariff: Tariff = None, contracted_load: float = None, load_unit: str = "KW",
+                 opening_balance: float = None):
+        """
+        Args:
+            account_id: Account whose ledger is validated (default: the built-in test account)
+            start_date: First day of the period (default: 2025-10-01)
+            end_date: Exclusive end of the period (default: 2025-11-01)
+            tariff: Rule set to validate against (default: looked up from the ledger's
+                applied_supply_type_code in the tariff catalog)
+            contracted_load: Sanctioned load in load_unit (default: 1)
+            load_unit: KW, KVA or BHP
+            opening_balance: Balance before the first day (default: 0)
+        """
         # Configuration parameters - Updated with new rates
-        self.contracted_load = 1  # kW
-        self.fc_rate_0 = 50  # Rs. per kW (if cumm_daily_consumption_mtd <= 100 kWh)
-        self.fc_rate_1 = 110  # Rs. per kW (if cumm_daily_consumption_mtd > 100 kWh)
-        self.ed_rate = 0.05  # 5%
-        self.rebate_rate = 0.02  # 2%
-        self.opening_balance = 0
-        self.ec_rate_0 = 3  # Rs. per kWh (upto 100 kWh)
-        self.ec_rate_1 = 5.5  # Rs. per kWh (0 to 100 kWh when consumption crosses 100)
-        self.ec_rate_2 = 5.5  # Rs. per kWh (101 to 150 kWh)
-        self.ec_rate_3 = 6  # Rs. per kWh (151 to 300 kWh)
-        self.ec_rate_4 = 6.5  # Rs. per kWh (above 301 kWh)
-        self.days_in_month = 31
+        self.load_unit = load_unit
+        self.sanctioned_load = contracted_load if contracted_load is not None else 1
+        self.contracted_load = self.sanctioned_load  # kW
+        self.opening_balance = opening_balance if opening_balance is not None else 0
+        
+        # Rates, EC slabs, MD thresholds and life line rules from the tariff catalog; replaced
+        # by the ledger's own supply type in run_comparison() unless a tariff was passed in
+        self.tariff_fixed = tariff is not None
+        self.apply_tariff(tariff or tariff_catalog.lookup(None, load_unit))
+        
+        # Log the day-by-day formula breakdown (set False for bulk/benchmark runs)
+        self.log_daily_details = True
         
         # API configuration
-        self.api_url = "https://engine-web.stage.gomatimvvnl.in/daily_prepaid_ledger/2222550013/"
+        self.account_id = str(account_id) if account_id else "2222550013"
+        self.api_url = f"{LEDGER_API_BASE}/{self.account_id}/"
         
         # Log account information
         logger.info("Test Case ID : Formula_103 - Prepaid Ledger Comparison")
-        logger.info("Account ID: 2222550011")
+        logger.info(f"Account ID: {self.account_id}")
         
         # Date range for energy consumption calculation
-        self.start_date = "2025-10-01T00:00:00"
-        self.end_date = "2025-11-01T00:00:00"  # End date is exclusive, covers all of October 2025
+        self.start_date = start_date or "2025-10-01T00:00:00"
+        self.end_date = end_date or "2025-11-01T00:00:00"  # End date is exclusive, covers all of October 2025
+        self.days_in_month = pd.Timestamp(self.start_date).days_in_month if start_date else 31
         logger.info(f"Date Range: {self.start_date} to {self.end_date} (exclusive end date)")
         
         
@@ -123,10 +151,39 @@ class PrepaidLedgerComparison:
             "closing_balance"
         ]
     
+    def apply_tariff(self, tariff: Tariff):
+        """Take rates, EC slabs, MD thresholds and life line rules from a catalog rule set"""
+        self.tariff = tariff
+        self.contracted_load = tariff.contracted_load_kw(self.sanctioned_load)  # kW
+        self.fc_rate_0 = tariff.fc_rate  # Rs. per kW (if cumm_daily_consumption_mtd <= lifeline threshold)
+        self.fc_rate_1 = tariff.lifeline_fc_rate  # Rs. per kW (if cumm_daily_consumption_mtd > lifeline threshold)
+        self.ed_rate = tariff.ed_rate
+        self.rebate_rate = tariff.rebate_rate
+        
+        # EC slab table: (upper bound of the slab in cumulative kWh, Rs. per kWh); None = no limit
+        self.ec_slabs = list(tariff.ec_slabs)
+        self.ec_rate_0 = tariff.ec_slabs[0][1]  # Rs. per kWh in the first (life line) slab
+        self.ec_rate_1 = tariff.lifeline_ec_rate  # Rs. per kWh the life line units are re-billed at on a switch
+        
+        # Max demand thresholds (% of contracted load) and life line switch rules
+        self.md_fc_floor_percent = tariff.md_fc_floor_percent
+        self.md_edp_percent = tariff.md_edp_percent
+        self.lifeline_threshold = tariff.lifeline_threshold  # kWh month-to-date
+        self.lifeline_recovery_days = tariff.lifeline_recovery_days
+    
+    def select_tariff(self, df: pd.DataFrame):
+        """Use the catalog rule set of the ledger's applied_supply_type_code (unless a tariff was passed in)"""
+        if self.tariff_fixed:
+            return
+        code = tariff_catalog.ledger_supply_type(df)
+        if code is not None:
+            self.apply_tariff(tariff_catalog.lookup(code, self.load_unit))
+        logger.info(f"Tariff: supply type {self.tariff.supply_type_code} ({self.tariff.name}), load unit {self.load_unit}")
+    
     def fetch_prepaid_ledger_data(self) -> pd.DataFrame:
         """Fetch prepaid ledger data from API"""
         try:
-            response = requests.get(self.api_url, timeout=30)
+            response = http_client.get(self.api_url, timeout=30)
             response.raise_for_status()
             
             data = response.json()
@@ -138,400 +195,236 @@ class PrepaidLedgerComparison:
             else:
                 raise ValueError("Unexpected API response format")
             
-            # Filter data for the specified date range
-            df['start_date_time'] = pd.to_datetime(df['start_date_time'], utc=True)
-            df['end_date_time'] = pd.to_datetime(df['end_date_time'], utc=True)
-            
-            start_dt = pd.to_datetime(self.start_date, utc=True)
-            end_dt = pd.to_datetime(self.end_date, utc=True)
-            
-            df_filtered = df[
-                (df['start_date_time'] >= start_dt) & 
-                (df['start_date_time'] < end_dt)
-            ].copy()
-            
-            # Sort by start_date_time to ensure proper order for cumulative calculations
-            df_filtered = df_filtered.sort_values('start_date_time').reset_index(drop=True)
-            
-            logger.info(f"Fetched {len(df_filtered)} records for date range {self.start_date} to {self.end_date}")
-            
-            return df_filtered
+            return self.filter_ledger_data(df)
             
         except Exception as e:
             return pd.DataFrame()
     
-    def calculate_expected_values(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Calculate expected values based on our formulas"""
-        df_calc = df.copy()
-        
-        # Initialize running balance and cumulative values
-        running_balance = self.opening_balance
-        cumm_daily_consumption = 0
-        cumm_daily_consumption_rupees = 0
-        cumm_daily_max_demand_penalty = 0
-        cumm_daily_fixed_charge_adjustment = 0
-        cumm_daily_fixed_charges = 0
-        cumm_ec_final_charges = 0
-        cumm_fc_final_charges = 0
-        cumm_daily_ec_plus_fc_charge = 0
-        cumm_daily_ed_charge = 0
-        cumm_daily_final_rebate = 0
-        cumm_daily_final_charge = 0
-        
-        # Life line switch tracking variables
-        cumm_ec_life_line_switch_charge_deducted = 0
-        remaining_ec_life_line_switch_charge = 0
-        cumm_fc_life_line_switch_charge_deducted = 0
-        remaining_fc_life_line_switch_charge = 0
-        life_line_switch_triggered = False
-        days_since_life_line_switch = 0
-        total_ec_life_line_switch_charge = 0
-        total_fc_life_line_switch_charge = 0
-        
-        # Track previous day's max demand for fixed charge adjustment calculation
-        previous_max_demand = 0
-        previous_max_demand_percentage = 0
-        previous_day = 0
-        
-        # Track EDP calculation variables for dynamic recalculation
-        previous_max_demand_for_edp = 0
-        previous_edp_daily_rate = 0
-        days_with_previous_edp = 0
-        total_edp_charged_so_far = 0
-        
-        # Calculate expected values for each row
-        for idx, row in df_calc.iterrows():
-            daily_consumption = row['daily_consumption']
-            max_demand = row.get('max_demand', 0)
-            current_day = idx + 1
-            date_str = row['start_date_time'].strftime('%Y-%m-%d') if hasattr(row['start_date_time'], 'strftime') else str(row['start_date_time'])[:10]
+    def filter_ledger_data(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Keep the ledger rows of the date range in day order (API response or stored rows)"""
+        # Filter data for the specified date range
+        df['start_date_time'] = pd.to_datetime(df['start_date_time'], utc=True)
+        df['end_date_time'] = pd.to_datetime(df['end_date_time'], utc=True)
+        
+        start_dt = pd.to_datetime(self.start_date, utc=True)
+        end_dt = pd.to_datetime(self.end_date, utc=True)
+        
+        df_filtered = df[
+            (df['start_date_time'] >= start_dt) & 
+            (df['start_date_time'] < end_dt)
+        ].copy()
+        
+        # Sort by start_date_time to ensure proper order for cumulative calculations
+        df_filtered = df_filtered.sort_values('start_date_time').reset_index(drop=True)
+        
+        logger.info(f"Fetched {len(df_filtered)} records for date range {self.start_date} to {self.end_date}")
+        
+        return df_filtered
+    
+    def calculate_expected_values(self, df: pd.DataFrame, by: str = None) -> pd.DataFrame:
+        """
+        Calculate expected values based on our formulas (whole ledger at once)
+        
+        Args:
+            df: Ledger rows in day order
+            by: Optional column (e.g. 'account_id') for a batch of ledgers stacked in
+                one frame; days, running totals, balances, the life line switch and
+                the EDP state restart for every value
+        """
+        daily_consumption = df['daily_consumption'].to_numpy(dtype=np.float64)
+        max_demand = df['max_demand'].to_numpy(dtype=np.float64) if 'max_demand' in df.columns else np.zeros(len(df))
+        groups = df[by].to_numpy() if by else None
+        fc_floor = self.md_fc_floor_percent / 100
+        
+        # Life line switch: first day the cumulative consumption crosses the threshold, and the
+        # EC / FC switch charges recovered over the following recovery days
+        lifeline = lifeline_switch(daily_consumption, max_demand, self.ec_rate_0, self.ec_rate_1,
+                                   self.fc_rate_0, self.fc_rate_1, self.contracted_load, self.days_in_month,
+                                   self.lifeline_threshold, self.lifeline_recovery_days, groups)
+        
+        # Daily EC: the month-to-date consumption curve split across the EC slabs, each slab's share billed at its rate
+        expected_daily_ec = slab_charges(daily_consumption, self.ec_slabs, lifeline['cumulative'])
+        
+        # Daily EC Final Charge = Daily EC - Daily EC Life Line Switch Charge
+        expected_daily_ec_final_charge = expected_daily_ec - lifeline['daily_ec']
+        
+        # FC rate based on consumption (regular rate once above the life line threshold)
+        fc_rate = np.where(lifeline['switched'], self.fc_rate_1, self.fc_rate_0)
+        
+        # Daily Fixed Charges (FC) based on max demand percentage: the 75% floor, else the actual max demand
+        max_demand_percentage = (max_demand / self.contracted_load) * 100
+        with np.errstate(invalid='ignore'):
+            at_floor = max_demand_percentage <= self.md_fc_floor_percent
+        expected_daily_fc = np.where(at_floor,
+                                     (fc_floor * self.contracted_load * fc_rate) / self.days_in_month,
+                                     (fc_rate * self.contracted_load * (max_demand / self.contracted_load)) / self.days_in_month)
+        
+        # Fixed Charge Adjustment (if md is greater than 75% of contracted load, from the second day):
+        # ((FC Rate × Load × Current Day % × (Current Day − 1)) ÷ Days) − ((FC Rate × Load × Previous Day % × (Current Day − 1)) ÷ Days)
+        edp = excess_demand_penalty(max_demand, self.contracted_load, fc_rate, self.days_in_month,
+                                    self.md_edp_percent, groups)
+        current_day = edp['day']
+        with np.errstate(invalid='ignore'):
+            adjusted = (max_demand_percentage > self.md_fc_floor_percent) & (current_day > 1)
+        current_adjustment = (fc_rate * self.contracted_load * (max_demand / self.contracted_load) * (current_day - 1)) / self.days_in_month
+        previous_adjustment = (fc_rate * self.contracted_load * (previous_values(max_demand, groups) / self.contracted_load) * (current_day - 1)) / self.days_in_month
+        expected_daily_fc_adjustment = np.where(adjusted, current_adjustment - previous_adjustment, 0.0)
+        
+        # Final FC = FC + fixed charge adjustment - Daily FC Life Line Switch Charge; Daily EC + final FC
+        expected_daily_fc_final_charge = expected_daily_fc + expected_daily_fc_adjustment - lifeline['daily_fc']
+        expected_daily_ec_plus_fc = expected_daily_ec_final_charge + expected_daily_fc_final_charge
+        
+        # Daily Excess Demand Penalty (EDP) (if md is greater than 100% of contracted load)
+        expected_daily_edp = edp['edp']
+        
+        # ED = (EC final + FC final + EDP) * ED rate, Rebate = (EC final + FC final) * Rebate rate
+        expected_daily_ed = (expected_daily_ec_final_charge + expected_daily_fc_final_charge + expected_daily_edp) * self.ed_rate
+        expected_daily_rebate = (expected_daily_ec_final_charge + expected_daily_fc_final_charge) * self.rebate_rate
+        
+        # Daily Final charge = (EC final + FC final + ED + EDP) - Rebate
+        expected_daily_final_charge = (expected_daily_ec_final_charge + expected_daily_fc_final_charge + expected_daily_ed + expected_daily_edp) - expected_daily_rebate
+        
+        # Closing Balance = Opening Balance - Daily Final charge, carried day to day
+        expected_opening_balance, expected_closing_balance = running_balance(
+            self.opening_balance, expected_daily_final_charge, groups
+        )
+        
+        cumulative = running_totals({
+            'expected_cumm_daily_consumption_rupees_mtd': expected_daily_ec,
+            'expected_cumm_ec_final_charges_mtd': expected_daily_ec_final_charge,
+            'expected_cumm_daily_max_demand_penalty_mtd': expected_daily_edp,
+            'expected_cumm_daily_fixed_charge_adjustment_mtd': expected_daily_fc_adjustment,
+            'expected_cumm_daily_fixed_charges_mtd': expected_daily_fc,
+            'expected_cumm_fc_final_charges_mtd': expected_daily_fc_final_charge,
+            'expected_cumm_daily_ec_plus_fc_charge_mtd': expected_daily_ec_plus_fc,
+            'expected_cumm_ed_charges_mtd': expected_daily_ed,
+            'expected_cumm_daily_final_rebate_mtd': expected_daily_rebate,
+            'expected_cumm_daily_final_charge_mtd': expected_daily_final_charge
+        }, groups)
+        
+        expected_columns = {
+            'expected_daily_consumption_in_rupees': expected_daily_ec,
+            'expected_cumm_ec_life_line_switch_charge_deducted': lifeline['cumm_ec_deducted'],
+            'expected_remaining_ec_life_line_switch_charge': lifeline['remaining_ec'],
+            'expected_daily_ec_final_charge': expected_daily_ec_final_charge,
+            'expected_daily_max_demand_penalty': expected_daily_edp,
+            'expected_daily_fixed_charge_adjustment': expected_daily_fc_adjustment,
+            'expected_daily_fixed_charges': expected_daily_fc,
+            'expected_cumm_fc_life_line_switch_charge_deducted': lifeline['cumm_fc_deducted'],
+            'expected_remaining_fc_life_line_switch_charge': lifeline['remaining_fc'],
+            'expected_daily_fc_final_charge': expected_daily_fc_final_charge,
+            'expected_daily_ec_plus_fc_charge': expected_daily_ec_plus_fc,
+            'expected_daily_ed_charge': expected_daily_ed,
+            'expected_daily_final_rebate': expected_daily_rebate,
+            'expected_daily_final_charge': expected_daily_final_charge,
+            'expected_opening_balance': expected_opening_balance,
+            'expected_closing_balance': expected_closing_balance,
+            **cumulative
+        }
+        
+        # Store expected calculated and cumulative values
+        expected_df = pd.DataFrame(expected_columns, index=df.index)
+        df_calc = pd.concat([df.drop(columns=list(expected_columns), errors='ignore'), expected_df], axis=1)
+        
+        # Intermediate per-day values for the log and the trace
+        state = {
+            'max_demand': max_demand,
+            'max_demand_percentage': max_demand_percentage,
+            'fc_rate': fc_rate,
+            'at_floor': at_floor,
+            'adjusted': adjusted,
+            'triggered': lifeline['triggered'],
+            'total_ec_switch': lifeline['total_ec'],
+            'total_fc_switch': lifeline['total_fc'],
+            'daily_fc_switch': lifeline['daily_fc'],
+            **edp
+        }
+        
+        # Prose per-day breakdown (skipped unless INFO is on) and the opt-in JSON-lines trace (see Common/calc_trace.py)
+        if self.log_daily_details and logger.isEnabledFor(logging.INFO):
+            self.log_daily_calculations(df_calc, expected_columns, state)
+        calc_trace.trace_days("103", self.account_id, df, expected_columns, state, by)
+        
+        return df_calc
+    
+    def log_daily_calculations(self, df: pd.DataFrame, expected: Dict[str, np.ndarray], state: Dict[str, np.ndarray]):
+        """Log the day-by-day formula breakdown (values as calculated)"""
+        fc_floor = self.md_fc_floor_percent / 100
+        dates = df['start_date_time']
+        dates = dates.dt.strftime('%Y-%m-%d') if hasattr(dates, 'dt') and pd.api.types.is_datetime64_any_dtype(dates) else dates.astype(str).str[:10]
+        columns = {name: values.tolist() for name, values in state.items()}
+        columns.update({name: values.tolist() for name, values in expected.items()})
+        daily_consumption = df['daily_consumption'].tolist()
+        
+        for i, date_str in enumerate(dates.tolist()):
+            day = {name: values[i] for name, values in columns.items()}
+            current_day = day['day']
+            max_demand = day['max_demand']
+            fc_rate = day['fc_rate']
+            fc = day['expected_daily_fixed_charges']
+            adjustment = day['expected_daily_fixed_charge_adjustment']
+            ec_final = day['expected_daily_ec_final_charge']
+            fc_final = day['expected_daily_fc_final_charge']
+            edp = day['expected_daily_max_demand_penalty']
+            ed = day['expected_daily_ed_charge']
+            rebate = day['expected_daily_final_rebate']
+            final_charge = day['expected_daily_final_charge']
             
             logger.info(f"**********DAY {current_day} - {date_str}************")
-            
-            logger.info(f"Daily Consumption: {daily_consumption:.4f} kWh")
+            logger.info(f"Daily Consumption: {daily_consumption[i]:.4f} kWh")
             logger.info(f"Max Demand: {max_demand:.4f} kW")
-            
-            # Update cumulative consumption
-            cumm_daily_consumption += daily_consumption
-            
-            # Check if life line switch should be triggered (consumption crosses 100 kWh)
-            if cumm_daily_consumption > 100 and not life_line_switch_triggered:
-                life_line_switch_triggered = True
-                days_since_life_line_switch = 0
-                
-                # Calculate total EC life line switch charge
-                # = ((previous day cumm_daily_consumption_mtd * ec_rate_1) - (previous day cumm_daily_consumption_mtd * ec_rate_0))
-                previous_cumm_consumption = cumm_daily_consumption - daily_consumption
-                total_ec_life_line_switch_charge = (previous_cumm_consumption * self.ec_rate_1) - (previous_cumm_consumption * self.ec_rate_0)
-                remaining_ec_life_line_switch_charge = total_ec_life_line_switch_charge
-                
-                # Calculate total FC life line switch charge
-                # = {(fc_rate_1 * contracted_load * (total no of days crossed - 1) * (max_demand / contracted_load)) / days_in_month } - { (fc_rate_0 * contracted_load * (total no of days crossed - 1) * (max_demand / contracted_load)) / days_in_month }
-                days_crossed = current_day - 1
-                max_demand_ratio = max_demand / self.contracted_load
-                total_fc_life_line_switch_charge = ((self.fc_rate_1 * self.contracted_load * days_crossed * max_demand_ratio) / self.days_in_month) - ((self.fc_rate_0 * self.contracted_load * days_crossed * max_demand_ratio) / self.days_in_month)
-                remaining_fc_life_line_switch_charge = total_fc_life_line_switch_charge
-                
-                logger.info(f"Day {current_day}: Life line switch triggered! Total EC switch charge: {total_ec_life_line_switch_charge:.4f}, Total FC switch charge: {total_fc_life_line_switch_charge:.4f}")
-            
-            # Calculate Daily EC with tiered rates
-            expected_daily_ec = 0
-            if cumm_daily_consumption <= 100:
-                # Use ec_rate_0 for consumption up to 100 kWh
-                expected_daily_ec = daily_consumption * self.ec_rate_0
-            elif cumm_daily_consumption <= 150:
-                # 101-150 kWh range: use ec_rate_2
-                if cumm_daily_consumption - daily_consumption <= 100:
-                    # Part of consumption is in 0-100 range, part in 101-150 range
-                    consumption_in_0_100 = 100 - (cumm_daily_consumption - daily_consumption)
-                    consumption_in_101_150 = daily_consumption - consumption_in_0_100
-                    expected_daily_ec = (consumption_in_0_100 * self.ec_rate_0) + (consumption_in_101_150 * self.ec_rate_2)
-                else:
-                    # All consumption is in 101-150 range
-                    expected_daily_ec = daily_consumption * self.ec_rate_2
-            elif cumm_daily_consumption <= 300:
-                # 151-300 kWh range: use ec_rate_3
-                if cumm_daily_consumption - daily_consumption <= 100:
-                    # Consumption spans multiple ranges
-                    consumption_in_0_100 = 100 - (cumm_daily_consumption - daily_consumption)
-                    consumption_in_101_150 = 50  # 101-150 range
-                    consumption_in_151_300 = daily_consumption - consumption_in_0_100 - consumption_in_101_150
-                    expected_daily_ec = (consumption_in_0_100 * self.ec_rate_0) + (consumption_in_101_150 * self.ec_rate_2) + (consumption_in_151_300 * self.ec_rate_3)
-                elif cumm_daily_consumption - daily_consumption <= 150:
-                    # Consumption spans 101-150 and 151-300 ranges
-                    consumption_in_101_150 = 150 - (cumm_daily_consumption - daily_consumption)
-                    consumption_in_151_300 = daily_consumption - consumption_in_101_150
-                    expected_daily_ec = (consumption_in_101_150 * self.ec_rate_2) + (consumption_in_151_300 * self.ec_rate_3)
-                else:
-                    # All consumption is in 151-300 range
-                    expected_daily_ec = daily_consumption * self.ec_rate_3
-            else:
-                # Above 300 kWh: use ec_rate_4
-                if cumm_daily_consumption - daily_consumption <= 100:
-                    # Consumption spans multiple ranges
-                    consumption_in_0_100 = 100 - (cumm_daily_consumption - daily_consumption)
-                    consumption_in_101_150 = 50  # 101-150 range
-                    consumption_in_151_300 = 150  # 151-300 range
-                    consumption_above_300 = daily_consumption - consumption_in_0_100 - consumption_in_101_150 - consumption_in_151_300
-                    expected_daily_ec = (consumption_in_0_100 * self.ec_rate_0) + (consumption_in_101_150 * self.ec_rate_2) + (consumption_in_151_300 * self.ec_rate_3) + (consumption_above_300 * self.ec_rate_4)
-                elif cumm_daily_consumption - daily_consumption <= 150:
-                    # Consumption spans 101-150, 151-300, and above 300 ranges
-                    consumption_in_101_150 = 150 - (cumm_daily_consumption - daily_consumption)
-                    consumption_in_151_300 = 150  # 151-300 range
-                    consumption_above_300 = daily_consumption - consumption_in_101_150 - consumption_in_151_300
-                    expected_daily_ec = (consumption_in_101_150 * self.ec_rate_2) + (consumption_in_151_300 * self.ec_rate_3) + (consumption_above_300 * self.ec_rate_4)
-                elif cumm_daily_consumption - daily_consumption <= 300:
-                    # Consumption spans 151-300 and above 300 ranges
-                    consumption_in_151_300 = 300 - (cumm_daily_consumption - daily_consumption)
-                    consumption_above_300 = daily_consumption - consumption_in_151_300
-                    expected_daily_ec = (consumption_in_151_300 * self.ec_rate_3) + (consumption_above_300 * self.ec_rate_4)
-                else:
-                    # All consumption is above 300 kWh
-                    expected_daily_ec = daily_consumption * self.ec_rate_4
-            
-            logger.info(f"Daily EC: {expected_daily_ec:.4f} Rs.")
-            
-            # Calculate Daily EC Life Line Switch Charge (if applicable)
-            daily_ec_life_line_switch_charge = 0
-            if life_line_switch_triggered and days_since_life_line_switch < 3:
-                daily_ec_life_line_switch_charge = total_ec_life_line_switch_charge / 3
-                cumm_ec_life_line_switch_charge_deducted += daily_ec_life_line_switch_charge
-                remaining_ec_life_line_switch_charge -= daily_ec_life_line_switch_charge
-                days_since_life_line_switch += 1
-            
-            # Calculate Daily EC Final Charge = Daily EC - Daily EC Life Line Switch Charge
-            expected_daily_ec_final_charge = expected_daily_ec - daily_ec_life_line_switch_charge
-            
-            # Determine FC rate based on consumption
-            fc_rate = self.fc_rate_1 if cumm_daily_consumption > 100 else self.fc_rate_0
-            
-            # Calculate Daily Fixed Charges (FC) based on max demand percentage
-            max_demand_percentage = (max_demand / self.contracted_load) * 100
-            logger.info(f"Max Demand Percentage: ({max_demand:.4f} / {self.contracted_load}) x 100 = {max_demand_percentage:.4f}%")
-            
-            if max_demand_percentage <= 75:
-                # FC (if max_Demand less than and equal to 75% of contracted load)
-                expected_daily_fc = (0.75 * self.contracted_load * fc_rate) / self.days_in_month
-                logger.info(f"Daily FC (<=75%): (0.75 x {self.contracted_load} x {fc_rate}) / {self.days_in_month} = {expected_daily_fc:.4f} Rs.")
-            elif max_demand_percentage <= 100:
-                # FC (if max_Demand between 75% to 100% of contracted load)
-                expected_daily_fc = (fc_rate * self.contracted_load * (max_demand / self.contracted_load)) / self.days_in_month
-                logger.info(f"Daily FC (75-100%): ({fc_rate} x {self.contracted_load} x ({max_demand:.4f} / {self.contracted_load})) / {self.days_in_month} = {expected_daily_fc:.4f} Rs.")
-            else:
-                # FC (if max_Demand greater than 100% of contracted load)
-                expected_daily_fc = (fc_rate * self.contracted_load * (max_demand / self.contracted_load)) / self.days_in_month
-                logger.info(f"Daily FC (>100%): ({fc_rate} x {self.contracted_load} x ({max_demand:.4f} / {self.contracted_load})) / {self.days_in_month} = {expected_daily_fc:.4f} Rs.")
-            
-            # Calculate Daily FC Life Line Switch Charge (if applicable)
-            daily_fc_life_line_switch_charge = 0
-            if life_line_switch_triggered and days_since_life_line_switch < 3:
-                daily_fc_life_line_switch_charge = total_fc_life_line_switch_charge / 3
-                cumm_fc_life_line_switch_charge_deducted += daily_fc_life_line_switch_charge
-                remaining_fc_life_line_switch_charge -= daily_fc_life_line_switch_charge
-            
-            # Calculate Fixed Charge Adjustment (if md is greater than 75% of contracted load)
-            expected_daily_fc_adjustment = 0
-            if max_demand_percentage > 75 and previous_day > 0:
-                # Fixed Charge Adjustment = ((FC Rate × Sanctioned Load × % of Contracted Load for Current Day × (Current Day − 1)) ÷ Total Number of Days in the Month) − ((FC Rate × Sanctioned Load × % of Contracted Load for Previous Day × (Current Day − 1)) ÷ Total Number of Days in the Month)
-                current_day_percentage = max_demand / self.contracted_load
-                previous_day_percentage = previous_max_demand / self.contracted_load
-                
-                current_adjustment = (fc_rate * self.contracted_load * current_day_percentage * (current_day - 1)) / self.days_in_month
-                previous_adjustment = (fc_rate * self.contracted_load * previous_day_percentage * (current_day - 1)) / self.days_in_month
-                
-                expected_daily_fc_adjustment = current_adjustment - previous_adjustment
-                logger.info(f"Daily FC Adjustment: {expected_daily_fc_adjustment:.4f} Rs.")
+            if day['triggered']:
+                logger.info(f"Day {current_day}: Life line switch triggered! Total EC switch charge: {day['total_ec_switch']:.4f}, Total FC switch charge: {day['total_fc_switch']:.4f}")
+            logger.info(f"Daily EC: {day['expected_daily_consumption_in_rupees']:.4f} Rs.")
+            logger.info(f"Max Demand Percentage: ({max_demand:.4f} / {self.contracted_load}) x 100 = {day['max_demand_percentage']:.4f}%")
+            
+            if day['at_floor']:
+                logger.info(f"Daily FC (<={self.md_fc_floor_percent}%): ({fc_floor} x {self.contracted_load} x {fc_rate}) / {self.days_in_month} = {fc:.4f} Rs.")
+            elif day['max_demand_percentage'] <= self.md_edp_percent:
+                logger.info(f"Daily FC ({self.md_fc_floor_percent}-{self.md_edp_percent}%): ({fc_rate} x {self.contracted_load} x ({max_demand:.4f} / {self.contracted_load})) / {self.days_in_month} = {fc:.4f} Rs.")
             else:
-                logger.info(f"Daily FC Adjustment: 0.0000 Rs. (Max demand <= 75% or first day)")
-            
-            # Calculate final FC = FC + fixed charge adjustment - Daily FC Life Line Switch Charge
-            expected_daily_fc_final_charge = expected_daily_fc + expected_daily_fc_adjustment - daily_fc_life_line_switch_charge
-            logger.info(f"Daily FC Final: {expected_daily_fc:.4f} + {expected_daily_fc_adjustment:.4f} - {daily_fc_life_line_switch_charge:.4f} = {expected_daily_fc_final_charge:.4f} Rs.")
-            
-            # Calculate Daily EC + final FC
-            expected_daily_ec_plus_fc = expected_daily_ec_final_charge + expected_daily_fc_final_charge
-            logger.info(f"Daily EC + FC: {expected_daily_ec_final_charge:.4f} + {expected_daily_fc_final_charge:.4f} = {expected_daily_ec_plus_fc:.4f} Rs.")
+                logger.info(f"Daily FC (>{self.md_edp_percent}%): ({fc_rate} x {self.contracted_load} x ({max_demand:.4f} / {self.contracted_load})) / {self.days_in_month} = {fc:.4f} Rs.")
             
-            # Calculate Daily Excess Demand Penalty (EDP) (if md is greater than 100% of contracted load)
-            expected_daily_edp = 0
-            if max_demand_percentage > 100:
-                excess_demand = max_demand - self.contracted_load
-                remaining_days = self.days_in_month - current_day + 1
-                
-                if remaining_days > 0:
-                    # Calculate new total penalty based on current max demand
-                    new_total_penalty = excess_demand * fc_rate
-                    
-                    # Check if max demand has increased from previous value
-                    if max_demand >= previous_max_demand_for_edp and previous_max_demand_for_edp > 0:
-                        # Max demand has increased - need to recalculate
-                        # Use previous day's cumulative EDP already charged
-                        edp_already_charged = cumm_daily_max_demand_penalty
-                        
-                        # Calculate remaining penalty to be distributed
-                        remaining_penalty = new_total_penalty - edp_already_charged
-                        
-                        if remaining_penalty > 0:
-                            expected_daily_edp = remaining_penalty / remaining_days
-                        else:
-                            expected_daily_edp = 0
-                        
-                        logger.info(f"Day {current_day}: Max demand increased from {previous_max_demand_for_edp:.4f} to {max_demand:.4f}")
-                        logger.info(f"  New total penalty: {new_total_penalty:.4f}")
-                        logger.info(f"  Previous day cumm EDP already charged: {edp_already_charged:.4f}")
-                        logger.info(f"  Remaining penalty: {remaining_penalty:.4f}")
-                        logger.info(f"  Daily EDP: {expected_daily_edp:.4f}")
-                    else:
-                        # First time or max demand hasn't increased - normal calculation
-                        expected_daily_edp = new_total_penalty / remaining_days
-                    
-                    # Update tracking variables
-                    previous_max_demand_for_edp = max_demand
-                    previous_edp_daily_rate = expected_daily_edp
-                    days_with_previous_edp = 0  # Reset for new calculation
-                    total_edp_charged_so_far = 0  # Reset for new calculation
-                else:
-                    expected_daily_edp = 0
+            if day['adjusted']:
+                logger.info(f"Daily FC Adjustment: {adjustment:.4f} Rs.")
             else:
-                # If max demand is not > 100%, reset tracking variables
-                if previous_max_demand_for_edp > 0:
-                    # Update days with previous EDP
-                    days_with_previous_edp += 1
-                    total_edp_charged_so_far += previous_edp_daily_rate
-            
-            # Calculate Daily Electricity Duty (ED) = (EC final + FC final + EDP) * ED rate
-            expected_daily_ed = (expected_daily_ec_final_charge + expected_daily_fc_final_charge + expected_daily_edp) * self.ed_rate
-            logger.info(f"Daily ED: ({expected_daily_ec_final_charge:.4f} + {expected_daily_fc_final_charge:.4f} + {expected_daily_edp:.4f}) x {self.ed_rate} = {expected_daily_ed:.4f} Rs.")
-            
-            # Calculate Daily Rebate = (EC final + FC final) * Rebate rate
-            expected_daily_rebate = (expected_daily_ec_final_charge + expected_daily_fc_final_charge) * self.rebate_rate
-            logger.info(f"Daily Rebate: ({expected_daily_ec_final_charge:.4f} + {expected_daily_fc_final_charge:.4f}) x {self.rebate_rate} = {expected_daily_rebate:.4f} Rs.")
-            
-            # Calculate Daily Final charge = (EC final + FC final + ED + EDP) - Rebate
-            expected_daily_final_charge = (expected_daily_ec_final_charge + expected_daily_fc_final_charge + expected_daily_ed + expected_daily_edp) - expected_daily_rebate
-            logger.info(f"Daily Final Charge: ({expected_daily_ec_final_charge:.4f} + {expected_daily_fc_final_charge:.4f} + {expected_daily_ed:.4f} + {expected_daily_edp:.4f}) - {expected_daily_rebate:.4f} = {expected_daily_final_charge:.4f} Rs.")
-            
-            # Update cumulative values
-            cumm_daily_consumption_rupees += expected_daily_ec
-            cumm_daily_max_demand_penalty += expected_daily_edp
-            cumm_daily_fixed_charge_adjustment += expected_daily_fc_adjustment
-            cumm_daily_fixed_charges += expected_daily_fc
-            cumm_ec_final_charges += expected_daily_ec_final_charge
-            cumm_fc_final_charges += expected_daily_fc_final_charge
-            cumm_daily_ec_plus_fc_charge += expected_daily_ec_plus_fc
-            cumm_daily_ed_charge += expected_daily_ed
-            cumm_daily_final_rebate += expected_daily_rebate
-            cumm_daily_final_charge += expected_daily_final_charge
-            
-            # Calculate Expected Opening and Closing Balance
-            if idx == 0:
-                expected_opening_balance = self.opening_balance
-            else:
-                expected_opening_balance = running_balance
-            
-            expected_closing_balance = expected_opening_balance - expected_daily_final_charge
-            
-            # Update running balance for next iteration
-            running_balance = expected_closing_balance
-            
-            # Update previous values for next iteration
-            previous_max_demand = max_demand
-            previous_day = current_day
-            
-            # Update EDP tracking for next iteration
-            if max_demand_percentage > 100:
-                days_with_previous_edp += 1
-                total_edp_charged_so_far += expected_daily_edp
-            
-            logger.info(f"Opening Balance: {expected_opening_balance:.4f} Rs.")
-            logger.info(f"Daily Final Charge: {expected_daily_final_charge:.4f} Rs.")
-            logger.info(f"Closing Balance: {expected_opening_balance:.4f} - {expected_daily_final_charge:.4f} = {expected_closing_balance:.4f} Rs.")
-            
-            # Store expected calculated values
-            df_calc.loc[idx, 'expected_daily_consumption_in_rupees'] = expected_daily_ec
-            df_calc.loc[idx, 'expected_cumm_ec_life_line_switch_charge_deducted'] = cumm_ec_life_line_switch_charge_deducted
-            df_calc.loc[idx, 'expected_remaining_ec_life_line_switch_charge'] = remaining_ec_life_line_switch_charge
-            df_calc.loc[idx, 'expected_daily_ec_final_charge'] = expected_daily_ec_final_charge
-            df_calc.loc[idx, 'expected_daily_max_demand_penalty'] = expected_daily_edp
-            df_calc.loc[idx, 'expected_daily_fixed_charge_adjustment'] = expected_daily_fc_adjustment
-            df_calc.loc[idx, 'expected_daily_fixed_charges'] = expected_daily_fc
-            df_calc.loc[idx, 'expected_cumm_fc_life_line_switch_charge_deducted'] = cumm_fc_life_line_switch_charge_deducted
-            df_calc.loc[idx, 'expected_remaining_fc_life_line_switch_charge'] = remaining_fc_life_line_switch_charge
-            df_calc.loc[idx, 'expected_daily_fc_final_charge'] = expected_daily_fc_final_charge
-            df_calc.loc[idx, 'expected_daily_ec_plus_fc_charge'] = expected_daily_ec_plus_fc
-            df_calc.loc[idx, 'expected_daily_ed_charge'] = expected_daily_ed
-            df_calc.loc[idx, 'expected_daily_final_rebate'] = expected_daily_rebate
-            df_calc.loc[idx, 'expected_daily_final_charge'] = expected_daily_final_charge
-            df_calc.loc[idx, 'expected_opening_balance'] = expected_opening_balance
-            df_calc.loc[idx, 'expected_closing_balance'] = expected_closing_balance
-            
-            # Store expected cumulative values
-            df_calc.loc[idx, 'expected_cumm_daily_consumption_rupees_mtd'] = cumm_daily_consumption_rupees
-            df_calc.loc[idx, 'expected_cumm_ec_final_charges_mtd'] = cumm_ec_final_charges
-            df_calc.loc[idx, 'expected_cumm_daily_max_demand_penalty_mtd'] = cumm_daily_max_demand_penalty
-            df_calc.loc[idx, 'expected_cumm_daily_fixed_charge_adjustment_mtd'] = cumm_daily_fixed_charge_adjustment
-            df_calc.loc[idx, 'expected_cumm_daily_fixed_charges_mtd'] = cumm_daily_fixed_charges
-            df_calc.loc[idx, 'expected_cumm_fc_final_charges_mtd'] = cumm_fc_final_charges
-            df_calc.loc[idx, 'expected_cumm_daily_ec_plus_fc_charge_mtd'] = cumm_daily_ec_plus_fc_charge
-            df_calc.loc[idx, 'expected_cumm_ed_charges_mtd'] = cumm_daily_ed_charge
-            df_calc.loc[idx, 'expected_cumm_daily_final_rebate_mtd'] = cumm_daily_final_rebate
-            df_calc.loc[idx, 'expected_cumm_daily_final_charge_mtd'] = cumm_daily_final_charge
-        
-        return df_calc
+                logger.info(f"Daily FC Adjustment: 0.0000 Rs. (Max demand <= {self.md_fc_floor_percent}% or first day)")
+            
+            logger.info(f"Daily FC Final: {fc:.4f} + {adjustment:.4f} - {day['daily_fc_switch']:.4f} = {fc_final:.4f} Rs.")
+            logger.info(f"Daily EC + FC: {ec_final:.4f} + {fc_final:.4f} = {day['expected_daily_ec_plus_fc_charge']:.4f} Rs.")
+            
+            if day['recalculated']:
+                logger.info(f"Day {current_day}: Max demand increased from {day['previous_max_demand']:.4f} to {max_demand:.4f}")
+                logger.info(f"  New total penalty: {day['new_total_penalty']:.4f}")
+                logger.info(f"  Previous day cumm EDP already charged: {day['already_charged']:.4f}")
+                logger.info(f"  Remaining penalty: {day['remaining_penalty']:.4f}")
+                logger.info(f"  Daily EDP: {edp:.4f}")
+            
+            logger.info(f"Daily ED: ({ec_final:.4f} + {fc_final:.4f} + {edp:.4f}) x {self.ed_rate} = {ed:.4f} Rs.")
+            logger.info(f"Daily Rebate: ({ec_final:.4f} + {fc_final:.4f}) x {self.rebate_rate} = {rebate:.4f} Rs.")
+            logger.info(f"Daily Final Charge: ({ec_final:.4f} + {fc_final:.4f} + {ed:.4f} + {edp:.4f}) - {rebate:.4f} = {final_charge:.4f} Rs.")
+            logger.info(f"Opening Balance: {day['expected_opening_balance']:.4f} Rs.")
+            logger.info(f"Daily Final Charge: {final_charge:.4f} Rs.")
+            logger.info(f"Closing Balance: {day['expected_opening_balance']:.4f} - {final_charge:.4f} = {day['expected_closing_balance']:.4f} Rs.")
     
     def compare_values(self, df: pd.DataFrame) -> pd.DataFrame:
         """Compare calculated vs expected values and generate status"""
-        df_compare = df.copy()
+        # Match within COMPARE_TOLERANCE (0.01) per compared column, for all rows at once;
+        # missing values count as 0, values that are not numbers never match
+        columns = [col for col in self.comparison_columns if f"expected_{col}" in df.columns]
+        matches = np.column_stack([match_mask(df[col], df[f"expected_{col}"]) for col in columns]) \
+            if columns else np.ones((len(df), 0), dtype=bool)
         
-        # Tolerance for floating point comparison
-        tolerance = 0.01
+        match_df = pd.DataFrame(matches, columns=[f"{col}_match" for col in columns], index=df.index)
+        df_compare = pd.concat([df.drop(columns=list(match_df.columns) + ['Status'], errors='ignore'), match_df], axis=1)
         
-        def check_match(actual_val, expected_val, col_name):
-            """Check if actual and expected values match within tolerance"""
-            try:
-                actual = float(actual_val) if pd.notna(actual_val) else 0
-                expected = float(expected_val) if pd.notna(expected_val) else 0
-                return abs(actual - expected) <= tolerance
-            except (ValueError, TypeError):
-                return False
+        # Columns with at least one mismatching row
+        mismatch_columns = [col for col, column_matches in zip(columns, matches.T) if not column_matches.all()]
         
-        # Compare each column and generate status
-        mismatch_columns = []
+        # Generate overall status for each row ("All Match" or the mismatching columns)
+        df_compare['Status'] = row_status(matches, columns)
         
-        for col in self.comparison_columns:
-            expected_col = f"expected_{col}"
-            
-            if expected_col in df_compare.columns:
-                # Create comparison column
-                df_compare[f"{col}_match"] = df_compare.apply(
-                    lambda row: check_match(row[col], row[expected_col], col), 
-                    axis=1
-                )
-                
-                # Check if all values match for this column
-                all_match = df_compare[f"{col}_match"].all()
-                if not all_match:
-                    mismatch_columns.append(col)
-            else:
-                pass
-        
-        # Generate overall status for each row
-        def generate_row_status(row):
-            row_mismatches = []
-            for col in self.comparison_columns:
-                match_col = f"{col}_match"
-                if match_col in df_compare.columns:
-                    if not row[match_col]:
-                        row_mismatches.append(col)
-            
-            if not row_mismatches:
-                return "All Match"
-            else:
-                return ", ".join(row_mismatches)
-        
-        df_compare['Status'] = df_compare.apply(generate_row_status, axis=1)
-        
-        all_match_count = len(df_compare[df_compare['Status'] == 'All Match'])
+        all_match_count = int(matches.all(axis=1).sum())
         
         # Log comprehensive comparison summary
         
@@ -550,9 +443,9 @@ class PrepaidLedgerComparison:
             logger.info("DETAILED MISMATCH ANALYSIS")
             
             mismatch_records = df_compare[df_compare['Status'] != 'All Match']
-            for idx, row in mismatch_records.iterrows():
-                date_str = row['start_date_time'].strftime('%Y-%m-%d') if hasattr(row['start_date_time'], 'strftime') else str(row['start_date_time'])[:10]
-                logger.info(f"Date: {date_str} - Status: {row['Status']}")
+            for start, status in zip(mismatch_records['start_date_time'].tolist(), mismatch_records['Status'].tolist()):
+                date_str = start.strftime('%Y-%m-%d') if hasattr(start, 'strftime') else str(start)[:10]
+                logger.info(f"Date: {date_str} - Status: {status}")
         
         return df_compare
     
@@ -646,7 +539,8 @@ class PrepaidLedgerComparison:
         if df.empty:
             return
         
-        # Step 2: Calculate expected values
+        # Step 2: Calculate expected values (with the rule set of the ledger's supply type)
+        self.select_tariff(df)
         df_with_expected = self.calculate_expected_values(df)
         
         # Step 3: Compare values
@@ -655,6 +549,11 @@ class PrepaidLedgerComparison:
         # Step 4: Generate comparison report
         self.generate_comparison_report(df_comparison)
         
+        # Columnar copy of the comparison (only when the result store is enabled)
+        store = result_store.active()
+        if store is not None:
+            store.write("comparison", f"Formula_103_{self.account_id}", df_comparison)
+        
         all_match_count = len(df_comparison[df_comparison['Status'] == 'All Match'])
         mismatch_count = len(df_comparison[df_comparison['Status'] != 'All Match'])
         
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+benchmark_formula_101.py - Row loop vs vectorized calculate_expected_values
+
+Builds synthetic ledgers, runs the original iterrows implementation and the
+vectorized PrepaidLedgerComparison.calculate_expected_values on the same
+data, checks that all 14 expected columns agree and prints the timings.
+
+Three cases are measured:
+    long ledger   one ledger with many days
+    large batch   many 31-day ledgers, one call per account
+    stacked batch the same ledgers in one frame, one call with by='account_id'
+
+Usage:
+    python Formula/benchmark_formula_101.py
+    python Formula/benchmark_formula_101.py --days 20000 --accounts 1000
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from Formula_101 import PrepaidLedgerComparison, logger
+
+# ===== CONFIGURATION =====
+
+DEFAULT_DAYS = 5000
+DEFAULT_ACCOUNTS = 200
+DEFAULT_REPEAT = 5
+SEED = 101
+
+EXPECTED_COLUMNS = [
+    'expected_daily_consumption_in_rupees',
+    'expected_daily_fixed_charges',
+    'expected_daily_ec_plus_fc_charge',
+    'expected_daily_ed_charge',
+    'expected_daily_final_rebate',
+    'expected_daily_final_charge',
+    'expected_opening_balance',
+    'expected_closing_balance',
+    'expected_cumm_daily_consumption_rupees_mtd',
+    'expected_cumm_daily_fixed_charges_mtd',
+    'expected_cumm_daily_ec_plus_fc_charge_mtd',
+    'expected_cumm_ed_charges_mtd',
+    'expected_cumm_daily_final_rebate_mtd',
+    'expected_cumm_daily_final_charge_mtd'
+]
+
+
+# ===== REFERENCE (ROW LOOP) IMPLEMENTATION =====
+
+def calculate_expected_values_loop(self: PrepaidLedgerComparison, df: pd.DataFrame) -> pd.DataFrame:
+    """The original iterrows implementation, without its per-day logging"""
+    df_calc = df.copy()
+    running_balance = self.opening_balance
+    cumm_daily_consumption_rupees = 0
+    cumm_daily_fixed_charges = 0
+    cumm_daily_ec_plus_fc_charge = 0
+    cumm_daily_ed_charge = 0
+    cumm_daily_final_rebate = 0
+    cumm_daily_final_charge = 0
+
+    for idx, row in df_calc.iterrows():
+        daily_consumption = row['daily_consumption']
+        expected_daily_ec = daily_consumption * self.ec_rate
+        expected_daily_fc = (0.75 * self.contracted_load * self.fc_rate) / self.days_in_month
+        expected_daily_ec_plus_fc = expected_daily_ec + expected_daily_fc
+        expected_daily_ed = expected_daily_ec_plus_fc * self.ed_rate
+        expected_daily_rebate = expected_daily_ec_plus_fc * self.rebate_rate
+        expected_daily_final_charge = expected_daily_ec_plus_fc + expected_daily_ed - expected_daily_rebate
+
+        cumm_daily_consumption_rupees += expected_daily_ec
+        cumm_daily_fixed_charges += expected_daily_fc
+        cumm_daily_ec_plus_fc_charge += expected_daily_ec_plus_fc
+        cumm_daily_ed_charge += expected_daily_ed
+        cumm_daily_final_rebate += expected_daily_rebate
+        cumm_daily_final_charge += expected_daily_final_charge
+
+        expected_opening_balance = self.opening_balance if idx == 0 else running_balance
+        expected_closing_balance = expected_opening_balance - expected_daily_final_charge
+        running_balance = expected_closing_balance
+
+        df_calc.loc[idx, 'expected_daily_consumption_in_rupees'] = round(expected_daily_ec, 4)
+        df_calc.loc[idx, 'expected_daily_fixed_charges'] = round(expected_daily_fc, 4)
+        df_calc.loc[idx, 'expected_daily_ec_plus_fc_charge'] = round(expected_daily_ec_plus_fc, 4)
+        df_calc.loc[idx, 'expected_daily_ed_charge'] = round(expected_daily_ed, 4)
+        df_calc.loc[idx, 'expected_daily_final_rebate'] = round(expected_daily_rebate, 4)
+        df_calc.loc[idx, 'expected_daily_final_charge'] = round(expected_daily_final_charge, 4)
+        df_calc.loc[idx, 'expected_opening_balance'] = round(expected_opening_balance, 4)
+        df_calc.loc[idx, 'expected_closing_balance'] = round(expected_closing_balance, 4)
+        df_calc.loc[idx, 'expected_cumm_daily_consumption_rupees_mtd'] = round(cumm_daily_consumption_rupees, 4)
+        df_calc.loc[idx, 'expected_cumm_daily_fixed_charges_mtd'] = round(cumm_daily_fixed_charges, 4)
+        df_calc.loc[idx, 'expected_cumm_daily_ec_plus_fc_charge_mtd'] = round(cumm_daily_ec_plus_fc_charge, 4)
+        df_calc.loc[idx, 'expected_cumm_ed_charges_mtd'] = round(cumm_daily_ed_charge, 4)
+        df_calc.loc[idx, 'expected_cumm_daily_final_rebate_mtd'] = round(cumm_daily_final_rebate, 4)
+        df_calc.loc[idx, 'expected_cumm_daily_final_charge_mtd'] = round(cumm_daily_final_charge, 4)
+
+    return df_calc
+
+
+# ===== SYNTHETIC DATA =====
+
+def synthetic_ledger(days: int, rng: np.random.Generator, account_id: int = 2222550011) -> pd.DataFrame:
+    """A ledger with random daily consumption (kWh, 3 decimals) starting 2025-11-01"""
+    start = pd.Timestamp("2025-11-01T00:00:00", tz="UTC")
+    start_date_time = start + pd.to_timedelta(np.arange(days), unit="D")
+    return pd.DataFrame({
+        'start_date_time': start_date_time,
+        'end_date_time': start_date_time + pd.Timedelta(days=1),
+        'account_id': account_id,
+        'daily_consumption': np.round(rng.uniform(0, 25, days), 3)
+    })
+
+
+# ===== BENCHMARK =====
+
+def best_of(repeat: int, function, *args):
+    """Smallest wall-clock time over `repeat` runs, and the last result"""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def max_difference(expected: pd.DataFrame, actual: pd.DataFrame) -> float:
+    """Largest absolute difference over the expected_* columns"""
+    return float(max(np.max(np.abs(expected[column].to_numpy(dtype=float) - actual[column].to_numpy(dtype=float)),
+                            initial=0.0) for column in EXPECTED_COLUMNS))
+
+
+def run_case(name: str, ledgers, comparator: PrepaidLedgerComparison, repeat: int, stacked: bool = False):
+    """Time both implementations over a list of ledgers and print the result"""
+    # The row loop is timed once; it runs for seconds, so repeats add nothing but wait
+    loop_time, loop_results = best_of(1, lambda: [calculate_expected_values_loop(comparator, df) for df in ledgers])
+    if stacked:
+        stacked_df = pd.concat(ledgers, ignore_index=True)
+        vector_time, vector_result = best_of(repeat, comparator.calculate_expected_values, stacked_df, 'account_id')
+        loop_results = [pd.concat(loop_results, ignore_index=True)]
+        vector_results = [vector_result]
+    else:
+        vector_time, vector_results = best_of(repeat, lambda: [comparator.calculate_expected_values(df) for df in ledgers])
+
+    difference = max(max_difference(a, b) for a, b in zip(loop_results, vector_results))
+    rows = sum(len(df) for df in ledgers)
+    print(f"{name:<12} {len(ledgers):>6} ledger(s) {rows:>9} rows   "
+          f"loop {loop_time:>9.3f}s   vectorized {vector_time:>8.4f}s   "
+          f"speed-up {loop_time / vector_time:>8.0f}x   max |diff| {difference:.1e}")
+    return difference
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Formula_101 calculate_expected_values")
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS, help=f"Days in the long ledger (default: {DEFAULT_DAYS})")
+    parser.add_argument("--accounts", type=int, default=DEFAULT_ACCOUNTS,
+                        help=f"31-day ledgers in the batch (default: {DEFAULT_ACCOUNTS})")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help=f"Runs per vectorized timing, best one kept (default: {DEFAULT_REPEAT})")
+    args = parser.parse_args(argv)
+
+    logger.setLevel(logging.WARNING)
+    comparator = PrepaidLedgerComparison()
+    comparator.log_daily_details = False
+    rng = np.random.default_rng(SEED)
+
+    long_ledger = [synthetic_ledger(args.days, rng)]
+    batch = [synthetic_ledger(31, rng, account_id=account) for account in range(args.accounts)]
+
+    differences = [
+        run_case("long ledger", long_ledger, comparator, args.repeat),
+        run_case("large batch", batch, comparator, args.repeat),
+        run_case("stacked", batch, comparator, args.repeat, stacked=True)
+    ]
+    return 0 if max(differences) == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
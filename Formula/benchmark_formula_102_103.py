@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+"""
+benchmark_formula_102_103.py - Row loop vs vectorized calculate_expected_values (Formula_102 / Formula_103)
+
+Builds synthetic ledgers, runs the original iterrows implementations of
+Formula_102 and Formula_103 and the vectorized
+PrepaidLedgerComparison.calculate_expected_values on the same data, checks
+that every expected column agrees and prints the timings.
+
+Both rewrites replace path-dependent state (the FC adjustment's previous day,
+the excess demand penalty recalculation, the life line switch recovery), so
+the ledgers are shaped to reach those branches:
+    rising MD     max demand climbs from below 75% to above 100% of the
+                  contracted load, with unchanged and falling days
+    life line     month-to-date consumption crosses the life line threshold
+                  on a random day (or never), including day 1
+    long ledger   one ledger longer than the month (no remaining days for the EDP)
+    stacked       the batch in one frame, one call with by='account_id'
+
+Usage:
+    python Formula/benchmark_formula_102_103.py
+    python Formula/benchmark_formula_102_103.py --days 2000 --accounts 500
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import Formula_102
+import Formula_103
+from benchmark_formula_101 import best_of
+
+# ===== CONFIGURATION =====
+
+DEFAULT_DAYS = 400
+DEFAULT_ACCOUNTS = 100
+DEFAULT_REPEAT = 5
+SEED = 102
+
+
+# ===== REFERENCE (ROW LOOP) IMPLEMENTATIONS =====
+
+def calculate_expected_values_loop_102(self: Formula_102.PrepaidLedgerComparison, df: pd.DataFrame) -> pd.DataFrame:
+    """The original Formula_102 iterrows implementation, without its per-day logging"""
+    df_calc = df.copy()
+    running_balance = self.opening_balance
+    cumm_daily_consumption_rupees = 0
+    cumm_daily_max_demand_penalty = 0
+    cumm_daily_fixed_charge_adjustment = 0
+    cumm_daily_fixed_charges = 0
+    cumm_ec_final_charges = 0
+    cumm_fc_final_charges = 0
+    cumm_daily_ec_plus_fc_charge = 0
+    cumm_daily_ed_charge = 0
+    cumm_daily_final_rebate = 0
+    cumm_daily_final_charge = 0
+    previous_max_demand = 0
+    previous_max_demand_percentage = 0
+    previous_day = 0
+    previous_max_demand_for_edp = 0
+
+    for idx, row in df_calc.iterrows():
+        daily_consumption = row['daily_consumption']
+        max_demand = row.get('max_demand', 0)
+        current_day = idx + 1
+
+        expected_daily_ec = daily_consumption * self.ec_rate
+        max_demand_percentage = (max_demand / self.contracted_load) * 100
+        if max_demand_percentage <= 75:
+            expected_daily_fc = (0.75 * self.contracted_load * self.fc_rate) / self.days_in_month
+        else:
+            expected_daily_fc = (self.fc_rate * self.contracted_load * (max_demand / self.contracted_load)) / self.days_in_month
+
+        expected_daily_fc_adjustment = 0
+        if max_demand_percentage > 75 and previous_day > 0:
+            current_day_percentage = max_demand / self.contracted_load
+            if previous_max_demand_percentage <= 75:
+                previous_day_percentage = 0.75
+            else:
+                previous_day_percentage = previous_max_demand / self.contracted_load
+            if abs(max_demand - previous_max_demand) < 0.0001:
+                expected_daily_fc_adjustment = 0
+            else:
+                current_adjustment = (self.fc_rate * self.contracted_load * current_day_percentage * (current_day - 1)) / self.days_in_month
+                previous_adjustment = (self.fc_rate * self.contracted_load * previous_day_percentage * (current_day - 1)) / self.days_in_month
+                expected_daily_fc_adjustment = current_adjustment - previous_adjustment
+
+        expected_daily_fc_final = expected_daily_fc + expected_daily_fc_adjustment
+        expected_daily_ec_plus_fc = expected_daily_ec + expected_daily_fc_final
+
+        expected_daily_edp = 0
+        if max_demand_percentage > 100:
+            excess_demand = max_demand - self.contracted_load
+            remaining_days = self.days_in_month - current_day + 1
+            if remaining_days > 0:
+                new_total_penalty = excess_demand * self.fc_rate
+                if max_demand >= previous_max_demand_for_edp and previous_max_demand_for_edp > 0:
+                    remaining_penalty = new_total_penalty - cumm_daily_max_demand_penalty
+                    expected_daily_edp = remaining_penalty / remaining_days if remaining_penalty > 0 else 0
+                else:
+                    expected_daily_edp = new_total_penalty / remaining_days
+                previous_max_demand_for_edp = max_demand
+
+        expected_daily_ed = (expected_daily_ec + expected_daily_fc_final + expected_daily_edp) * self.ed_rate
+        expected_daily_rebate = expected_daily_ec_plus_fc * self.rebate_rate
+        expected_daily_final_charge = expected_daily_ec_plus_fc + expected_daily_ed + expected_daily_edp - expected_daily_rebate
+
+        cumm_daily_consumption_rupees += expected_daily_ec
+        cumm_daily_max_demand_penalty += expected_daily_edp
+        cumm_daily_fixed_charge_adjustment += expected_daily_fc_adjustment
+        cumm_daily_fixed_charges += expected_daily_fc + expected_daily_fc_adjustment
+        cumm_ec_final_charges += expected_daily_ec
+        cumm_fc_final_charges += expected_daily_fc_final
+        cumm_daily_ec_plus_fc_charge += expected_daily_ec_plus_fc
+        cumm_daily_ed_charge += expected_daily_ed
+        cumm_daily_final_rebate += expected_daily_rebate
+        cumm_daily_final_charge += expected_daily_final_charge
+
+        previous_max_demand = max_demand
+        previous_max_demand_percentage = max_demand_percentage
+        previous_day = current_day
+
+        expected_opening_balance = self.opening_balance if idx == 0 else running_balance
+        expected_closing_balance = expected_opening_balance - expected_daily_final_charge
+        running_balance = expected_closing_balance
+
+        df_calc.loc[idx, 'expected_daily_consumption_in_rupees'] = round(expected_daily_ec, 4)
+        df_calc.loc[idx, 'expected_daily_max_demand_penalty'] = round(expected_daily_edp, 4)
+        df_calc.loc[idx, 'expected_daily_fixed_charge_adjustment'] = round(expected_daily_fc_adjustment, 4)
+        df_calc.loc[idx, 'expected_daily_fixed_charges'] = round(expected_daily_fc, 4)
+        df_calc.loc[idx, 'expected_daily_ec_final_charge'] = round(expected_daily_ec, 4)
+        df_calc.loc[idx, 'expected_daily_fc_final_charge'] = round(expected_daily_fc_final, 4)
+        df_calc.loc[idx, 'expected_daily_ec_plus_fc_charge'] = round(expected_daily_ec_plus_fc, 4)
+        df_calc.loc[idx, 'expected_daily_ed_charge'] = round(expected_daily_ed, 4)
+        df_calc.loc[idx, 'expected_daily_final_rebate'] = round(expected_daily_rebate, 4)
+        df_calc.loc[idx, 'expected_daily_final_charge'] = round(expected_daily_final_charge, 4)
+        df_calc.loc[idx, 'expected_opening_balance'] = round(expected_opening_balance, 4)
+        df_calc.loc[idx, 'expected_closing_balance'] = round(expected_closing_balance, 4)
+        df_calc.loc[idx, 'expected_cumm_daily_consumption_rupees_mtd'] = round(cumm_daily_consumption_rupees, 4)
+        df_calc.loc[idx, 'expected_cumm_daily_max_demand_penalty_mtd'] = round(cumm_daily_max_demand_penalty, 4)
+        df_calc.loc[idx, 'expected_cumm_daily_fixed_charge_adjustment_mtd'] = round(cumm_daily_fixed_charge_adjustment, 4)
+        df_calc.loc[idx, 'expected_cumm_daily_fixed_charges_mtd'] = round(cumm_daily_fixed_charges, 4)
+        df_calc.loc[idx, 'expected_cumm_ec_final_charges_mtd'] = round(cumm_ec_final_charges, 4)
+        df_calc.loc[idx, 'expected_cumm_fc_final_charges_mtd'] = round(cumm_fc_final_charges, 4)
+        df_calc.loc[idx, 'expected_cumm_daily_ec_plus_fc_charge_mtd'] = round(cumm_daily_ec_plus_fc_charge, 4)
+        df_calc.loc[idx, 'expected_cumm_ed_charges_mtd'] = round(cumm_daily_ed_charge, 4)
+        df_calc.loc[idx, 'expected_cumm_daily_final_rebate_mtd'] = round(cumm_daily_final_rebate, 4)
+        df_calc.loc[idx, 'expected_cumm_daily_final_charge_mtd'] = round(cumm_daily_final_charge, 4)
+
+    return df_calc
+
+
+def calculate_expected_values_loop_103(self: Formula_103.PrepaidLedgerComparison, df: pd.DataFrame) -> pd.DataFrame:
+    """
+    The original Formula_103 iterrows implementation, without its per-day logging.
+
+    Its hard-coded 100 / 150 / 300 kWh slab bounds, 100 kWh life line threshold
+    and 3 recovery days are the catalog defaults; the slab rates come from the
+    comparator's EC slab table.
+    """
+    ec_rate_2, ec_rate_3, ec_rate_4 = (rate for _, rate in self.ec_slabs[1:4])
+    df_calc = df.copy()
+    running_balance = self.opening_balance
+    cumm_daily_consumption = 0
+    cumm_daily_consumption_rupees = 0
+    cumm_daily_max_demand_penalty = 0
+    cumm_daily_fixed_charge_adjustment = 0
+    cumm_daily_fixed_charges = 0
+    cumm_ec_final_charges = 0
+    cumm_fc_final_charges = 0
+    cumm_daily_ec_plus_fc_charge = 0
+    cumm_daily_ed_charge = 0
+    cumm_daily_final_rebate = 0
+    cumm_daily_final_charge = 0
+    cumm_ec_life_line_switch_charge_deducted = 0
+    remaining_ec_life_line_switch_charge = 0
+    cumm_fc_life_line_switch_charge_deducted = 0
+    remaining_fc_life_line_switch_charge = 0
+    life_line_switch_triggered = False
+    days_since_life_line_switch = 0
+    total_ec_life_line_switch_charge = 0
+    total_fc_life_line_switch_charge = 0
+    previous_max_demand = 0
+    previous_day = 0
+    previous_max_demand_for_edp = 0
+
+    for idx, row in df_calc.iterrows():
+        daily_consumption = row['daily_consumption']
+        max_demand = row.get('max_demand', 0)
+        current_day = idx + 1
+
+        cumm_daily_consumption += daily_consumption
+
+        if cumm_daily_consumption > 100 and not life_line_switch_triggered:
+            life_line_switch_triggered = True
+            days_since_life_line_switch = 0
+            previous_cumm_consumption = cumm_daily_consumption - daily_consumption
+            total_ec_life_line_switch_charge = (previous_cumm_consumption * self.ec_rate_1) - (previous_cumm_consumption * self.ec_rate_0)
+            remaining_ec_life_line_switch_charge = total_ec_life_line_switch_charge
+            days_crossed = current_day - 1
+            max_demand_ratio = max_demand / self.contracted_load
+            total_fc_life_line_switch_charge = ((self.fc_rate_1 * self.contracted_load * days_crossed * max_demand_ratio) / self.days_in_month) - ((self.fc_rate_0 * self.contracted_load * days_crossed * max_demand_ratio) / self.days_in_month)
+            remaining_fc_life_line_switch_charge = total_fc_life_line_switch_charge
+
+        previous_cumm = cumm_daily_consumption - daily_consumption
+        if cumm_daily_consumption <= 100:
+            expected_daily_ec = daily_consumption * self.ec_rate_0
+        elif cumm_daily_consumption <= 150:
+            if previous_cumm <= 100:
+                consumption_in_0_100 = 100 - previous_cumm
+                consumption_in_101_150 = daily_consumption - consumption_in_0_100
+                expected_daily_ec = (consumption_in_0_100 * self.ec_rate_0) + (consumption_in_101_150 * ec_rate_2)
+            else:
+                expected_daily_ec = daily_consumption * ec_rate_2
+        elif cumm_daily_consumption <= 300:
+            if previous_cumm <= 100:
+                consumption_in_0_100 = 100 - previous_cumm
+                consumption_in_101_150 = 50
+                consumption_in_151_300 = daily_consumption - consumption_in_0_100 - consumption_in_101_150
+                expected_daily_ec = (consumption_in_0_100 * self.ec_rate_0) + (consumption_in_101_150 * ec_rate_2) + (consumption_in_151_300 * ec_rate_3)
+            elif previous_cumm <= 150:
+                consumption_in_101_150 = 150 - previous_cumm
+                consumption_in_151_300 = daily_consumption - consumption_in_101_150
+                expected_daily_ec = (consumption_in_101_150 * ec_rate_2) + (consumption_in_151_300 * ec_rate_3)
+            else:
+                expected_daily_ec = daily_consumption * ec_rate_3
+        else:
+            if previous_cumm <= 100:
+                consumption_in_0_100 = 100 - previous_cumm
+                consumption_above_300 = daily_consumption - consumption_in_0_100 - 50 - 150
+                expected_daily_ec = (consumption_in_0_100 * self.ec_rate_0) + (50 * ec_rate_2) + (150 * ec_rate_3) + (consumption_above_300 * ec_rate_4)
+            elif previous_cumm <= 150:
+                consumption_in_101_150 = 150 - previous_cumm
+                consumption_above_300 = daily_consumption - consumption_in_101_150 - 150
+                expected_daily_ec = (consumption_in_101_150 * ec_rate_2) + (150 * ec_rate_3) + (consumption_above_300 * ec_rate_4)
+            elif previous_cumm <= 300:
+                consumption_in_151_300 = 300 - previous_cumm
+                consumption_above_300 = daily_consumption - consumption_in_151_300
+                expected_daily_ec = (consumption_in_151_300 * ec_rate_3) + (consumption_above_300 * ec_rate_4)
+            else:
+                expected_daily_ec = daily_consumption * ec_rate_4
+
+        daily_ec_life_line_switch_charge = 0
+        if life_line_switch_triggered and days_since_life_line_switch < 3:
+            daily_ec_life_line_switch_charge = total_ec_life_line_switch_charge / 3
+            cumm_ec_life_line_switch_charge_deducted += daily_ec_life_line_switch_charge
+            remaining_ec_life_line_switch_charge -= daily_ec_life_line_switch_charge
+            days_since_life_line_switch += 1
+        expected_daily_ec_final_charge = expected_daily_ec - daily_ec_life_line_switch_charge
+
+        fc_rate = self.fc_rate_1 if cumm_daily_consumption > 100 else self.fc_rate_0
+        max_demand_percentage = (max_demand / self.contracted_load) * 100
+        if max_demand_percentage <= 75:
+            expected_daily_fc = (0.75 * self.contracted_load * fc_rate) / self.days_in_month
+        else:
+            expected_daily_fc = (fc_rate * self.contracted_load * (max_demand / self.contracted_load)) / self.days_in_month
+
+        # Deducted while days_since_life_line_switch < 3 after the EC step incremented it
+        daily_fc_life_line_switch_charge = 0
+        if life_line_switch_triggered and days_since_life_line_switch < 3:
+            daily_fc_life_line_switch_charge = total_fc_life_line_switch_charge / 3
+            cumm_fc_life_line_switch_charge_deducted += daily_fc_life_line_switch_charge
+            remaining_fc_life_line_switch_charge -= daily_fc_life_line_switch_charge
+
+        expected_daily_fc_adjustment = 0
+        if max_demand_percentage > 75 and previous_day > 0:
+            current_adjustment = (fc_rate * self.contracted_load * (max_demand / self.contracted_load) * (current_day - 1)) / self.days_in_month
+            previous_adjustment = (fc_rate * self.contracted_load * (previous_max_demand / self.contracted_load) * (current_day - 1)) / self.days_in_month
+            expected_daily_fc_adjustment = current_adjustment - previous_adjustment
+
+        expected_daily_fc_final_charge = expected_daily_fc + expected_daily_fc_adjustment - daily_fc_life_line_switch_charge
+        expected_daily_ec_plus_fc = expected_daily_ec_final_charge + expected_daily_fc_final_charge
+
+        expected_daily_edp = 0
+        if max_demand_percentage > 100:
+            excess_demand = max_demand - self.contracted_load
+            remaining_days = self.days_in_month - current_day + 1
+            if remaining_days > 0:
+                new_total_penalty = excess_demand * fc_rate
+                if max_demand >= previous_max_demand_for_edp and previous_max_demand_for_edp > 0:
+                    remaining_penalty = new_total_penalty - cumm_daily_max_demand_penalty
+                    expected_daily_edp = remaining_penalty / remaining_days if remaining_penalty > 0 else 0
+                else:
+                    expected_daily_edp = new_total_penalty / remaining_days
+                previous_max_demand_for_edp = max_demand
+
+        expected_daily_ed = (expected_daily_ec_final_charge + expected_daily_fc_final_charge + expected_daily_edp) * self.ed_rate
+        expected_daily_rebate = (expected_daily_ec_final_charge + expected_daily_fc_final_charge) * self.rebate_rate
+        expected_daily_final_charge = (expected_daily_ec_final_charge + expected_daily_fc_final_charge + expected_daily_ed + expected_daily_edp) - expected_daily_rebate
+
+        cumm_daily_consumption_rupees += expected_daily_ec
+        cumm_daily_max_demand_penalty += expected_daily_edp
+        cumm_daily_fixed_charge_adjustment += expected_daily_fc_adjustment
+        cumm_daily_fixed_charges += expected_daily_fc
+        cumm_ec_final_charges += expected_daily_ec_final_charge
+        cumm_fc_final_charges += expected_daily_fc_final_charge
+        cumm_daily_ec_plus_fc_charge += expected_daily_ec_plus_fc
+        cumm_daily_ed_charge += expected_daily_ed
+        cumm_daily_final_rebate += expected_daily_rebate
+        cumm_daily_final_charge += expected_daily_final_charge
+
+        expected_opening_balance = self.opening_balance if idx == 0 else running_balance
+        expected_closing_balance = expected_opening_balance - expected_daily_final_charge
+        running_balance = expected_closing_balance
+
+        previous_max_demand = max_demand
+        previous_day = current_day
+
+        df_calc.loc[idx, 'expected_daily_consumption_in_rupees'] = expected_daily_ec
+        df_calc.loc[idx, 'expected_cumm_ec_life_line_switch_charge_deducted'] = cumm_ec_life_line_switch_charge_deducted
+        df_calc.loc[idx, 'expected_remaining_ec_life_line_switch_charge'] = remaining_ec_life_line_switch_charge
+        df_calc.loc[idx, 'expected_daily_ec_final_charge'] = expected_daily_ec_final_charge
+        df_calc.loc[idx, 'expected_daily_max_demand_penalty'] = expected_daily_edp
+        df_calc.loc[idx, 'expected_daily_fixed_charge_adjustment'] = expected_daily_fc_adjustment
+        df_calc.loc[idx, 'expected_daily_fixed_charges'] = expected_daily_fc
+        df_calc.loc[idx, 'expected_cumm_fc_life_line_switch_charge_deducted'] = cumm_fc_life_line_switch_charge_deducted
+        df_calc.loc[idx, 'expected_remaining_fc_life_line_switch_charge'] = remaining_fc_life_line_switch_charge
+        df_calc.loc[idx, 'expected_daily_fc_final_charge'] = expected_daily_fc_final_charge
+        df_calc.loc[idx, 'expected_daily_ec_plus_fc_charge'] = expected_daily_ec_plus_fc
+        df_calc.loc[idx, 'expected_daily_ed_charge'] = expected_daily_ed
+        df_calc.loc[idx, 'expected_daily_final_rebate'] = expected_daily_rebate
+        df_calc.loc[idx, 'expected_daily_final_charge'] = expected_daily_final_charge
+        df_calc.loc[idx, 'expected_opening_balance'] = expected_opening_balance
+        df_calc.loc[idx, 'expected_closing_balance'] = expected_closing_balance
+        df_calc.loc[idx, 'expected_cumm_daily_consumption_rupees_mtd'] = cumm_daily_consumption_rupees
+        df_calc.loc[idx, 'expected_cumm_ec_final_charges_mtd'] = cumm_ec_final_charges
+        df_calc.loc[idx, 'expected_cumm_daily_max_demand_penalty_mtd'] = cumm_daily_max_demand_penalty
+        df_calc.loc[idx, 'expected_cumm_daily_fixed_charge_adjustment_mtd'] = cumm_daily_fixed_charge_adjustment
+        df_calc.loc[idx, 'expected_cumm_daily_fixed_charges_mtd'] = cumm_daily_fixed_charges
+        df_calc.loc[idx, 'expected_cumm_fc_final_charges_mtd'] = cumm_fc_final_charges
+        df_calc.loc[idx, 'expected_cumm_daily_ec_plus_fc_charge_mtd'] = cumm_daily_ec_plus_fc_charge
+        df_calc.loc[idx, 'expected_cumm_ed_charges_mtd'] = cumm_daily_ed_charge
+        df_calc.loc[idx, 'expected_cumm_daily_final_rebate_mtd'] = cumm_daily_final_rebate
+        df_calc.loc[idx, 'expected_cumm_daily_final_charge_mtd'] = cumm_daily_final_charge
+
+    return df_calc
+
+
+# ===== SYNTHETIC DATA =====
+
+def synthetic_ledger(days: int, rng: np.random.Generator, account_id: int = 2222550013,
+                     lifeline_day: int = None, md_peak: float = 1.6) -> pd.DataFrame:
+    """
+    A ledger starting 2025-10-01 (contracted load 1 kW).
+
+    Args:
+        days: Ledger days
+        rng: Random generator
+        account_id: Account ID column value
+        lifeline_day: Day around which the month-to-date consumption crosses 100 kWh
+            (None: about 2 kWh a day, so a 31-day ledger never crosses)
+        md_peak: Max demand (kW) the ramp climbs to; above 1 the last days are over 100%
+    """
+    start = pd.Timestamp("2025-10-01T00:00:00", tz="UTC")
+    start_date_time = start + pd.to_timedelta(np.arange(days), unit="D")
+    daily_kwh = 105 / lifeline_day if lifeline_day else 2.0
+    daily_consumption = np.round(daily_kwh * rng.uniform(0.8, 1.2, days), 3)
+
+    # Max demand rising from 40% to md_peak with noise; every 5th day repeats the previous
+    # day (unchanged MD) and every 7th dips (falling MD after an EDP recalculation)
+    max_demand = np.linspace(0.4, md_peak, days) + rng.normal(0, 0.05, days)
+    max_demand[::7] *= 0.7
+    repeated = np.arange(5, days, 5)
+    max_demand[repeated] = max_demand[repeated - 1]
+    return pd.DataFrame({
+        'start_date_time': start_date_time,
+        'end_date_time': start_date_time + pd.Timedelta(days=1),
+        'account_id': account_id,
+        'daily_consumption': daily_consumption,
+        'max_demand': np.round(np.maximum(max_demand, 0), 3)
+    })
+
+
+def batch_ledgers(accounts: int, rng: np.random.Generator):
+    """31-day ledgers with a life line crossing on a random day (1-31) or none, and MD peaks around 100%"""
+    ledgers = []
+    for account in range(accounts):
+        lifeline_day = int(rng.integers(1, 32)) if account % 4 else None
+        ledgers.append(synthetic_ledger(31, rng, account_id=account, lifeline_day=lifeline_day,
+                                        md_peak=float(rng.uniform(0.7, 2.0))))
+    return ledgers
+
+
+def coverage(ledgers, comparator) -> str:
+    """How many ledgers cross the (default) 100 kWh life line and reach MD above 100% within the month"""
+    crossing = sum(1 for df in ledgers if df['daily_consumption'].head(31).sum() > 100)
+    over_edp = sum(1 for df in ledgers if ((df['max_demand'].head(31) / comparator.contracted_load) * 100 > 100).any())
+    return f"{crossing} crossing the life line, {over_edp} with MD > 100%"
+
+
+# ===== BENCHMARK =====
+
+def max_difference(expected: pd.DataFrame, actual: pd.DataFrame) -> float:
+    """Largest absolute difference over the expected_* columns of the row loop"""
+    columns = [column for column in expected.columns if column.startswith('expected_')]
+    return float(max(np.max(np.abs(expected[column].to_numpy(dtype=float) - actual[column].to_numpy(dtype=float)),
+                            initial=0.0) for column in columns))
+
+
+def run_case(name: str, loop, ledgers, comparator, repeat: int, stacked: bool = False):
+    """Time the row loop and the vectorized implementation over a list of ledgers and print the result"""
+    # The row loop is timed once; it runs for seconds, so repeats add nothing but wait
+    loop_time, loop_results = best_of(1, lambda: [loop(comparator, df) for df in ledgers])
+    if stacked:
+        stacked_df = pd.concat(ledgers, ignore_index=True)
+        vector_time, vector_result = best_of(repeat, comparator.calculate_expected_values, stacked_df, 'account_id')
+        loop_results = [pd.concat(loop_results, ignore_index=True)]
+        vector_results = [vector_result]
+    else:
+        vector_time, vector_results = best_of(repeat, lambda: [comparator.calculate_expected_values(df) for df in ledgers])
+
+    difference = max(max_difference(a, b) for a, b in zip(loop_results, vector_results))
+    rows = sum(len(df) for df in ledgers)
+    print(f"{name:<12} {len(ledgers):>6} ledger(s) {rows:>9} rows   "
+          f"loop {loop_time:>9.3f}s   vectorized {vector_time:>8.4f}s   "
+          f"speed-up {loop_time / vector_time:>8.0f}x   max |diff| {difference:.1e}")
+    return difference
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check and benchmark Formula_102 / Formula_103 calculate_expected_values")
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS, help=f"Days in the long ledger (default: {DEFAULT_DAYS})")
+    parser.add_argument("--accounts", type=int, default=DEFAULT_ACCOUNTS,
+                        help=f"31-day ledgers in the batch (default: {DEFAULT_ACCOUNTS})")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help=f"Runs per vectorized timing, best one kept (default: {DEFAULT_REPEAT})")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(SEED)
+    long_ledger = [synthetic_ledger(args.days, rng, lifeline_day=12)]
+    batch = batch_ledgers(args.accounts, rng)
+
+    differences = []
+    for module, loop in ((Formula_102, calculate_expected_values_loop_102),
+                         (Formula_103, calculate_expected_values_loop_103)):
+        module.logger.setLevel(logging.WARNING)
+        comparator = module.PrepaidLedgerComparison(opening_balance=5000)
+        comparator.log_daily_details = False
+        print(f"{module.__name__}: batch with {coverage(batch, comparator)}")
+        differences += [
+            run_case("long ledger", loop, long_ledger, comparator, args.repeat),
+            run_case("large batch", loop, batch, comparator, args.repeat),
+            run_case("stacked", loop, batch, comparator, args.repeat, stacked=True)
+        ]
+    return 0 if max(differences) == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
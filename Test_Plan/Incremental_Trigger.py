@@ -3,9 +3,16 @@
 Incremental_Trigger.py - Trigger incremental_task API
 """
 
-import requests
 import logging
 import os
+import sys
+
+# Make the shared Common package importable when run as python Test_Plan/Incremental_Trigger.py
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from Common import http_client
 
 # ===== CONFIGURATION =====
 
@@ -39,9 +46,10 @@ def trigger_incremental_task():
         url2 = f"{LEDGER_API_BASE}/trigger_task/incremental_task/"
         logger.info(f"Calling API 2: {url2}")
         
-        response2 = requests.get(
+        response2 = http_client.get(
             url2,
-            headers={'accept': 'application/json'}
+            headers={'accept': 'application/json'},
+            idempotent=False  # triggers a ledger run, never retried
         )
         
         logger.info(f"API 2 Response Status: {response2.status_code}")
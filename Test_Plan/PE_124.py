@@ -10,19 +10,25 @@ Step 3: Fill profile instant data
 Step 4: Trigger prepaid ledger APIs
 """
 
-import requests
 import random
 import string
-import psycopg2
 import logging
 from datetime import datetime, timedelta
 import os
+import sys
 from typing import List, Dict, Any
 from urllib.parse import quote
-import pandas as pd
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
-from calendar import monthrange
+
+# Make the shared Common package importable when run as python Test_Plan/PE_xxx.py
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from Common.bulk_load import bulk_insert, DAILYLOAD_COLUMNS, PROFILE_INSTANT_COLUMNS
+from Common import db_pool, http_client, mdms_client
+from Common.excel_report import ReportWorkbook
+from Common.load_profile import daily_load_rows, profile_instant_rows, progress_days
+from Common.month_targets import MonthlyTargetPlan
 
 # ===== CONFIGURATION =====
 
@@ -41,13 +47,15 @@ ED_APPLICABLE = "1"
 
 # Daily load and profile instant configuration
 END_WH = 580000 
-MONTH1_END_WH = 400000
-MONTH2_END_WH = 490000
-MONTH3_END_WH = 580000
-# Profile instant MD_W monthly targets (restart at beginning of each month)
-MONTH1_MD_W = 1200
-MONTH2_MD_W = 770
-MONTH3_MD_W = 1100
+# Monthly targets: (month, cumulative END Wh at month end, MD_W for the month).
+# Profile instant MD_W restarts at the beginning of each month.
+MONTH_TARGETS = [
+    (1, 400000, 1200),
+    (2, 490000, 770),
+    (3, 580000, 1100),
+]
+# Month boundaries: "calendar" = months end on the last day of each calendar month
+MONTH_BOUNDARY = "calendar"
 
 
 # API Configuration
@@ -78,6 +86,9 @@ DB_CONFIG = {
 DAILYLOAD_TABLE = 'dailyload_vee_validated'
 PROFILE_INSTANT_TABLE = 'profile_instant_vee'
 
+# Insert daily load and profile instant rows of one account in a single transaction
+SINGLE_DB_TRANSACTION = False
+
 # Logging Configuration
 os.makedirs("logs", exist_ok=True)
 logging.basicConfig(
@@ -147,63 +158,11 @@ def get_month_end_date(start_date_str: str) -> str:
         logger.error(f"Error calculating month end date from {start_date_str}: {e}")
         return None
 
-def get_three_months_later_date(start_date_str: str) -> str:
-    """Calculate the date 3 months later from the given start date."""
-    try:
-        dt = datetime.strptime(start_date_str, '%Y-%m-%d %H:%M:%S')
-        # Add 3 months
-        if dt.month <= 9:
-            target_month = dt.month + 3
-            target_year = dt.year
-        else:
-            target_month = dt.month + 3 - 12
-            target_year = dt.year + 1
-        # Use the same day of the month, or the last day of the month if it doesn't exist
-        try:
-            three_months_later = datetime(target_year, target_month, dt.day, 0, 0, 0)
-        except ValueError:
-            # If the day doesn't exist in the target month (e.g., Feb 31), use the last day of the month
-            last_day = monthrange(target_year, target_month)[1]
-            three_months_later = datetime(target_year, target_month, last_day, 0, 0, 0)
-        return three_months_later.strftime('%Y-%m-%d %H:%M:%S')
-    except Exception as e:
-        logger.error(f"Error calculating 3 months later date from {start_date_str}: {e}")
-        return None
-
-def get_month_boundaries(start_date_str: str):
-    """Calculate the end dates for each of the 3 months (last day of each calendar month)."""
+def get_month_plan(start_date_str: str):
+    """Precompute the month boundaries and per-day month indices for MONTH_TARGETS."""
     try:
-        dt = datetime.strptime(start_date_str, '%Y-%m-%d %H:%M:%S')
-        
-        # Month 1 end: last day of the first month (same month as start date)
-        last_day_month1 = monthrange(dt.year, dt.month)[1]
-        month1_end = datetime(dt.year, dt.month, last_day_month1, 0, 0, 0)
-        
-        # Month 2 end: last day of the second month (1 month after start)
-        if dt.month == 12:
-            month2_year = dt.year + 1
-            month2_month = 1
-        else:
-            month2_year = dt.year
-            month2_month = dt.month + 1
-        last_day_month2 = monthrange(month2_year, month2_month)[1]
-        month2_end = datetime(month2_year, month2_month, last_day_month2, 0, 0, 0)
-        
-        # Month 3 end: last day of the third month (2 months after start)
-        if month2_month == 12:
-            month3_year = month2_year + 1
-            month3_month = 1
-        else:
-            month3_year = month2_year
-            month3_month = month2_month + 1
-        last_day_month3 = monthrange(month3_year, month3_month)[1]
-        month3_end = datetime(month3_year, month3_month, last_day_month3, 0, 0, 0)
-        
-        return {
-            'month1_end': month1_end.strftime('%Y-%m-%d %H:%M:%S'),
-            'month2_end': month2_end.strftime('%Y-%m-%d %H:%M:%S'),
-            'month3_end': month3_end.strftime('%Y-%m-%d %H:%M:%S')
-        }
+        return MonthlyTargetPlan(datetime.strptime(start_date_str, '%Y-%m-%d %H:%M:%S'), MONTH_TARGETS,
+                                 boundary=MONTH_BOUNDARY)
     except Exception as e:
         logger.error(f"Error calculating month boundaries from {start_date_str}: {e}")
         return None
@@ -297,7 +256,7 @@ def create_account():
     
     try:
         logger.info(f"Creating account with Account ID: {account_id}, Meter Serial No: {meter_srno}")
-        response = requests.post(ACCOUNT_API_URL, headers=ACCOUNT_API_HEADERS, json=payload)
+        response = http_client.post(ACCOUNT_API_URL, headers=ACCOUNT_API_HEADERS, json=payload)
         logger.info(f"Account creation response: {response.status_code}")
         logger.info(f"Response text: {response.text}")
         
@@ -328,244 +287,65 @@ def fill_daily_load_data(account_data):
     meter_srno = account_data['meterSrno']
     meter_install_date = account_data['meterInstalldate']
     
-    # Parse dates
+    # Parse dates and get month boundaries
     start_date_str = parse_install_date(meter_install_date)
-    end_date_str = get_three_months_later_date(start_date_str)
-    
-    logger.info(f"Device Identifier: {meter_srno}")
-    logger.info(f"Start Date: {start_date_str}")
-    logger.info(f"End Date: {end_date_str}")
-    logger.info(f"Monthly targets - Month 1: {MONTH1_END_WH}, Month 2: {MONTH2_END_WH}, Month 3: {MONTH3_END_WH}")
-    
-    # Get month boundaries
-    month_boundaries = get_month_boundaries(start_date_str)
-    if not month_boundaries:
+    month_plan = get_month_plan(start_date_str)
+    if not month_plan:
         logger.error("Failed to calculate month boundaries")
         return False
     
-    month1_end = datetime.strptime(month_boundaries['month1_end'], '%Y-%m-%d %H:%M:%S')
-    month2_end = datetime.strptime(month_boundaries['month2_end'], '%Y-%m-%d %H:%M:%S')
-    month3_end = datetime.strptime(month_boundaries['month3_end'], '%Y-%m-%d %H:%M:%S')
-    
-    logger.info(f"Month 1 end: {month_boundaries['month1_end']}")
-    logger.info(f"Month 2 end: {month_boundaries['month2_end']}")
-    logger.info(f"Month 3 end: {month_boundaries['month3_end']}")
+    logger.info(f"Device Identifier: {meter_srno}")
+    logger.info(f"Start Date: {start_date_str}")
+    logger.info(f"End Date: {month_plan.end_date.strftime('%Y-%m-%d %H:%M:%S')}")
+    logger.info("Monthly targets - " + ", ".join(f"Month {month}: {end_wh}" for month, end_wh, md_w in MONTH_TARGETS))
+    for month, month_end in enumerate(month_plan.boundaries, start=1):
+        logger.info(f"Month {month} end: {month_end.strftime('%Y-%m-%d %H:%M:%S')}")
     
     # Connect to database
     try:
-        connection = psycopg2.connect(**DB_CONFIG)
+        connection = db_pool.checkout(DB_CONFIG)
         cursor = connection.cursor()
         logger.info("Connected to database")
         
         # Parse dates for calculation
-        start_date = datetime.strptime(start_date_str, '%Y-%m-%d %H:%M:%S') - timedelta(hours=5, minutes=30)
-        end_date = datetime.strptime(end_date_str, '%Y-%m-%d %H:%M:%S') - timedelta(hours=5, minutes=30)
-        month1_end_adj = month1_end - timedelta(hours=5, minutes=30)
-        month2_end_adj = month2_end - timedelta(hours=5, minutes=30)
-        month3_end_adj = month3_end - timedelta(hours=5, minutes=30)
-        total_days = (end_date - start_date).days + 1
+        start_date = month_plan.start_date - timedelta(hours=5, minutes=30)
+        total_days = month_plan.total_days
+        month_end_days = set(month_plan.end_indices[:-1].tolist())
         
         logger.info(f"Total days to process: {total_days}")
         
-        # Generate data
-        data_list = []
-        current_wh = 0
-        current_vah = 0
-        current_export_wh = 0
-        current_export_vah = 0
+        # Generate data (all months in one vectorized pass; each month end hits its target exactly)
         end_export_wh = 750
-        end_export_vah = end_export_wh / 0.90
         
         logger.info(f"Starting data generation with monthly targets")
         
-        for day in range(total_days):
-            current_date = start_date + timedelta(days=day)
-            current_date_utc = current_date + timedelta(hours=5, minutes=30)  # Convert back to UTC for comparison
-            
-            # Determine which month we're in and set target
-            if current_date_utc <= month1_end:
-                # Month 1: target is MONTH1_END_WH
-                target_wh = MONTH1_END_WH
-                month_end_date = month1_end_adj
-                month_start_date = start_date
-                month_num = 1
-            elif current_date_utc <= month2_end:
-                # Month 2: target is MONTH2_END_WH
-                target_wh = MONTH2_END_WH
-                month_end_date = month2_end_adj
-                month_start_date = month1_end_adj + timedelta(days=1)
-                month_num = 2
-            else:
-                # Month 3: target is MONTH3_END_WH
-                target_wh = MONTH3_END_WH
-                month_end_date = month3_end_adj
-                month_start_date = month2_end_adj + timedelta(days=1)
-                month_num = 3
-            
-            # Calculate days elapsed and remaining in current month
-            days_elapsed = (current_date - month_start_date).days
-            days_in_month = (month_end_date - month_start_date).days + 1
-            remaining_days_in_month = days_in_month - days_elapsed - 1
-            
-            # Calculate previous month's end value for cumulative calculation
-            if month_num == 1:
-                previous_month_end_wh = 0
-            elif month_num == 2:
-                previous_month_end_wh = MONTH1_END_WH
-            else:  # month_num == 3
-                previous_month_end_wh = MONTH2_END_WH
-            
-            # Calculate wh needed for this month
-            wh_needed_for_month = target_wh - previous_month_end_wh
-            wh_needed = target_wh - current_wh
-            
-            # Check if this is the last day of a month or the last day overall
-            is_month_end = (current_date_utc == month1_end) or (current_date_utc == month2_end)
-            is_final_day = (day == total_days - 1)
-            
-            if is_final_day:
-                # Last day overall: set to final target
-                current_wh = int(MONTH3_END_WH)
-                current_vah = int(MONTH3_END_WH / 0.90)
-                current_export_wh = int(end_export_wh)
-                current_export_vah = int(end_export_vah)
-            elif is_month_end:
-                # End of month 1 or 2: set to exact target for that month
-                current_wh = int(target_wh)
-                current_vah = int(target_wh / 0.90)
-                # Continue incrementing export values
-                export_wh_needed = end_export_wh - current_export_wh
-                export_vah_needed = end_export_vah - current_export_vah
-                total_remaining_days = total_days - day - 1
-                if total_remaining_days > 0:
-                    avg_increment_export_wh = export_wh_needed / total_remaining_days
-                    avg_increment_export_vah = export_vah_needed / total_remaining_days
-                else:
-                    avg_increment_export_wh = export_wh_needed
-                    avg_increment_export_vah = export_vah_needed
-                
-                min_factor = 0.3
-                max_factor = 1.7
-                
-                min_increment_export_wh = max(0, int(avg_increment_export_wh * min_factor))
-                max_increment_export_wh = min(int(avg_increment_export_wh * max_factor), int(export_wh_needed))
-                increment_export_wh = random.randint(min_increment_export_wh, max_increment_export_wh) if max_increment_export_wh > min_increment_export_wh else min_increment_export_wh
-                current_export_wh += increment_export_wh
-                
-                min_increment_export_vah = max(0, int(avg_increment_export_vah * min_factor))
-                max_increment_export_vah = min(int(avg_increment_export_vah * max_factor), int(export_vah_needed))
-                increment_export_vah = random.randint(min_increment_export_vah, max_increment_export_vah) if max_increment_export_vah > min_increment_export_vah else min_increment_export_vah
-                current_export_vah += increment_export_vah
-            else:
-                # Calculate increments based on remaining days in month
-                if remaining_days_in_month > 0:
-                    avg_increment_wh = wh_needed / remaining_days_in_month
-                else:
-                    avg_increment_wh = wh_needed
-                
-                vah_needed = (target_wh / 0.90) - current_vah
-                if remaining_days_in_month > 0:
-                    avg_increment_vah = vah_needed / remaining_days_in_month
-                else:
-                    avg_increment_vah = vah_needed
-                
-                export_wh_needed = end_export_wh - current_export_wh
-                export_vah_needed = end_export_vah - current_export_vah
-                total_remaining_days = total_days - day - 1
-                
-                if total_remaining_days > 0:
-                    avg_increment_export_wh = export_wh_needed / total_remaining_days
-                    avg_increment_export_vah = export_vah_needed / total_remaining_days
-                else:
-                    avg_increment_export_wh = export_wh_needed
-                    avg_increment_export_vah = export_vah_needed
-                
-                min_factor = 0.3
-                max_factor = 1.7
-                
-                min_increment_wh = max(0, int(avg_increment_wh * min_factor))
-                max_increment_wh = min(int(avg_increment_wh * max_factor), int(wh_needed))
-                increment_wh = random.randint(min_increment_wh, max_increment_wh) if max_increment_wh > min_increment_wh else min_increment_wh
-                current_wh += increment_wh
-                
-                min_increment_vah = max(0, int(avg_increment_vah * min_factor))
-                max_increment_vah = min(int(avg_increment_vah * max_factor), int(vah_needed))
-                increment_vah = random.randint(min_increment_vah, max_increment_vah) if max_increment_vah > min_increment_vah else min_increment_vah
-                current_vah += increment_vah
-                
-                min_increment_export_wh = max(0, int(avg_increment_export_wh * min_factor))
-                max_increment_export_wh = min(int(avg_increment_export_wh * max_factor), int(export_wh_needed))
-                increment_export_wh = random.randint(min_increment_export_wh, max_increment_export_wh) if max_increment_export_wh > min_increment_export_wh else min_increment_export_wh
-                current_export_wh += increment_export_wh
-                
-                min_increment_export_vah = max(0, int(avg_increment_export_vah * min_factor))
-                max_increment_export_vah = min(int(avg_increment_export_vah * max_factor), int(export_vah_needed))
-                increment_export_vah = random.randint(min_increment_export_vah, max_increment_export_vah) if max_increment_export_vah > min_increment_export_vah else min_increment_export_vah
-                current_export_vah += increment_export_vah
-            
-            data = {
-                'device_id': None,
-                'data_timestamp': current_date.strftime('%Y-%m-%d %H:%M:%S'),
-                'dcu_serial': f'DCU{meter_srno[-6:]}',
-                'device_identifier': meter_srno,
-                'data_source': 'PUSH',
-                'data_type': 'DLFV',
-                'import_Wh': current_wh,
-                'import_VAh': current_vah,
-                'export_Wh': current_export_wh,
-                'export_VAh': current_export_vah,
-                'exec_datetime': current_date.strftime('%Y-%m-%d %H:%M:%S'),
-                'dailyload_datetime': current_date.strftime('%Y-%m-%d %H:%M:%S'),
-                'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'updated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'is_active': True,
-                'is_valid': True,
-                'is_estimated': False,
-                'is_edited': False,
-                'meter_type': '1-ph'
-            }
-            data_list.append(data)
-            
-            # Log progress every 10 days or on first/last day or at month boundaries
-            if day == 0 or day == total_days - 1 or day % 10 == 0:
-                logger.info(f"Day {day + 1}/{total_days} (Month {month_num}): {current_date.strftime('%Y-%m-%d')} - Wh: {current_wh} (Target: {target_wh}), VAh: {current_vah:.2f}")
-            
-            # Log at month boundaries
-            if current_date_utc == month1_end or current_date_utc == month2_end:
-                logger.info(f"Month {month_num} completed - Wh: {current_wh}, Target was: {target_wh}")
+        registers = month_plan.daily_load_registers(end_export_wh=end_export_wh, power_factor=0.90)
+        data_list = daily_load_rows(meter_srno, start_date, registers)
+        
+        # Log progress every 10 days or on first/last day or at month boundaries
+        for day in sorted(set(progress_days(total_days)) | month_end_days):
+            row = data_list[day]
+            month_num, target_wh, _ = month_plan.segments[month_plan.month_of_day[day]]
+            logger.info(f"Day {day + 1}/{total_days} (Month {month_num}): {row['data_timestamp'][:10]} - Wh: {row['import_Wh']} (Target: {target_wh}), VAh: {row['import_VAh']:.2f}")
+            if day in month_end_days:
+                logger.info(f"Month {month_num} completed - Wh: {row['import_Wh']}, Target was: {target_wh}")
         
         logger.info(f"Generated {len(data_list)} daily load records")
         
-        # Insert data
-        insert_query = f"""
-            INSERT INTO {DAILYLOAD_TABLE} (
-                device_id, data_timestamp, dcu_serial, device_identifier,
-                data_source, data_type, "import_Wh", "import_VAh",
-                "export_Wh", "export_VAh", exec_datetime, dailyload_datetime,
-                created_at, updated_at, is_active, is_valid,
-                is_estimated, is_edited, meter_type
-            ) VALUES (
-                %(device_id)s, %(data_timestamp)s, %(dcu_serial)s, %(device_identifier)s,
-                %(data_source)s, %(data_type)s, %(import_Wh)s, %(import_VAh)s,
-                %(export_Wh)s, %(export_VAh)s, %(exec_datetime)s, %(dailyload_datetime)s,
-                %(created_at)s, %(updated_at)s, %(is_active)s, %(is_valid)s,
-                %(is_estimated)s, %(is_edited)s, %(meter_type)s
-            )
-        """
-        
-        cursor.executemany(insert_query, data_list)
-        connection.commit()
+        # Insert data (COPY ... FROM STDIN, falls back to paged INSERT ... VALUES)
+        bulk_insert(cursor, DAILYLOAD_TABLE, DAILYLOAD_COLUMNS, data_list)
+        db_pool.commit(connection)
         
         logger.info(f"Successfully inserted {len(data_list)} daily load records into {DAILYLOAD_TABLE}")
         cursor.close()
-        connection.close()
+        db_pool.release(connection)
         return True
         
     except Exception as e:
         logger.error(f"Error filling daily load data: {str(e)}")
         if 'connection' in locals():
             connection.rollback()
-            connection.close()
+            db_pool.release(connection)
         return False
 
 # ===== STEP 3: FILL PROFILE INSTANT DATA =====
@@ -579,230 +359,63 @@ def fill_profile_instant_data(account_data):
     meter_srno = account_data['meterSrno']
     meter_install_date = account_data['meterInstalldate']
     
-    # Parse dates
+    # Parse dates and get month boundaries
     start_date_str = parse_install_date(meter_install_date)
-    end_date_str = get_three_months_later_date(start_date_str)
-    
-    logger.info(f"Device Identifier: {meter_srno}")
-    logger.info(f"Start Date: {start_date_str}")
-    logger.info(f"End Date: {end_date_str}")
-    logger.info(f"Monthly MD_W targets - Month 1: {MONTH1_MD_W}, Month 2: {MONTH2_MD_W}, Month 3: {MONTH3_MD_W}")
-    
-    # Get month boundaries
-    month_boundaries = get_month_boundaries(start_date_str)
-    if not month_boundaries:
+    month_plan = get_month_plan(start_date_str)
+    if not month_plan:
         logger.error("Failed to calculate month boundaries")
         return False
     
-    month1_end = datetime.strptime(month_boundaries['month1_end'], '%Y-%m-%d %H:%M:%S')
-    month2_end = datetime.strptime(month_boundaries['month2_end'], '%Y-%m-%d %H:%M:%S')
-    month3_end = datetime.strptime(month_boundaries['month3_end'], '%Y-%m-%d %H:%M:%S')
-    
-    logger.info(f"Month 1 end: {month_boundaries['month1_end']}")
-    logger.info(f"Month 2 end: {month_boundaries['month2_end']}")
-    logger.info(f"Month 3 end: {month_boundaries['month3_end']}")
+    logger.info(f"Device Identifier: {meter_srno}")
+    logger.info(f"Start Date: {start_date_str}")
+    logger.info(f"End Date: {month_plan.end_date.strftime('%Y-%m-%d %H:%M:%S')}")
+    logger.info("Monthly MD_W targets - " + ", ".join(f"Month {month}: {md_w}" for month, end_wh, md_w in MONTH_TARGETS))
+    for month, month_end in enumerate(month_plan.boundaries, start=1):
+        logger.info(f"Month {month} end: {month_end.strftime('%Y-%m-%d %H:%M:%S')}")
     
     # Connect to database
     try:
-        connection = psycopg2.connect(**DB_CONFIG)
+        connection = db_pool.checkout(DB_CONFIG)
         cursor = connection.cursor()
         logger.info("Connected to database")
         
         # Parse dates for calculation
-        start_date = datetime.strptime(start_date_str, '%Y-%m-%d %H:%M:%S') - timedelta(hours=5, minutes=30)
-        end_date = datetime.strptime(end_date_str, '%Y-%m-%d %H:%M:%S') - timedelta(hours=5, minutes=30)
-        month1_end_adj = month1_end - timedelta(hours=5, minutes=30)
-        month2_end_adj = month2_end - timedelta(hours=5, minutes=30)
-        month3_end_adj = month3_end - timedelta(hours=5, minutes=30)
-        total_days = (end_date - start_date).days + 1
+        start_date = month_plan.start_date - timedelta(hours=5, minutes=30)
+        total_days = month_plan.total_days
+        month_end_days = set(month_plan.end_indices[:-1].tolist())
         
         logger.info(f"Total days to process: {total_days}")
         
-        # Generate data
-        data_list = []
-        
+        # Generate data (MD restarts at 0 each month and ramps to the month's target)
         logger.info(f"Starting data generation with monthly MD_W targets")
         
-        for day in range(total_days):
-            current_date = start_date + timedelta(days=day)
-            current_date_utc = current_date + timedelta(hours=5, minutes=30)  # Convert back to UTC for comparison
-            
-            # Determine which month we're in and set target
-            if current_date_utc <= month1_end:
-                # Month 1: target is MONTH1_MD_W
-                target_md_w = MONTH1_MD_W
-                month_end_date = month1_end_adj
-                month_start_date = start_date
-                month_num = 1
-            elif current_date_utc <= month2_end:
-                # Month 2: target is MONTH2_MD_W
-                target_md_w = MONTH2_MD_W
-                month_end_date = month2_end_adj
-                month_start_date = month1_end_adj + timedelta(days=1)
-                month_num = 2
-            else:
-                # Month 3: target is MONTH3_MD_W
-                target_md_w = MONTH3_MD_W
-                month_end_date = month3_end_adj
-                month_start_date = month2_end_adj + timedelta(days=1)
-                month_num = 3
-            
-            # Calculate days elapsed and total days in current month
-            days_elapsed = (current_date - month_start_date).days
-            days_in_month = (month_end_date - month_start_date).days + 1
-            
-            # Check if this is the last day of a month or the last day overall
-            # Compare dates (not full datetimes) to handle month boundaries correctly
-            is_month_end = (current_date_utc.date() == month1_end.date()) or (current_date_utc.date() == month2_end.date())
-            is_final_day = (day == total_days - 1)
-            
-            # Calculate progress ratio within the month (0 to 1)
-            if is_final_day:
-                # Last day overall: set to final target
-                current_md_w = int(MONTH3_MD_W)
-                current_md_va = int(MONTH3_MD_W / 0.90)
-            elif is_month_end:
-                # End of month 1 or 2: set to exact target for that month
-                current_md_w = int(target_md_w)
-                current_md_va = int(target_md_w / 0.90)
-            elif days_elapsed == 0:
-                # First day of the month: MD_W starts at 0 (restart)
-                current_md_w = 0
-                current_md_va = 0
-            else:
-                # Calculate progress ratio within the month (0 to 1)
-                if days_in_month > 1:
-                    progress_ratio = days_elapsed / (days_in_month - 1)
-                else:
-                    progress_ratio = 1
-                
-                # Calculate current MD_W and MD_VA for this month (incrementing from 0 to target)
-                current_md_w = int(target_md_w * progress_ratio)
-                current_md_va = int((target_md_w / 0.90) * progress_ratio)
-            
-            data = {
-                'meter_id': 0,
-                'device_identifier': meter_srno,
-                'data_timestamp': current_date.strftime('%Y-%m-%d %H:%M:%S'),
-                'create_timestamp': current_date.strftime('%Y-%m-%d %H:%M:%S'),
-                'exec_datetime': current_date.strftime('%Y-%m-%d %H:%M:%S'),
-                'meter_type': '1-ph',
-                'import_Wh': 0,
-                'export_Wh': 0,
-                'import_VAh': 0,
-                'export_VAh': 0,
-                'cumm_energy_VArh_Q1': 0,
-                'cumm_energy_VArh_Q2': 0,
-                'cumm_energy_VArh_Q3': 0,
-                'cumm_energy_VArh_Q4': 0,
-                'signed_active_power_KVAR': 0,
-                'MD_W': current_md_w,
-                'MD_VA': current_md_va,
-                'MD_W_datetime': current_date.strftime('%Y-%m-%d %H:%M:%S'),
-                'MD_VA_datetime': current_date.strftime('%Y-%m-%d %H:%M:%S'),
-                'PF': 1,
-                'Rphase_signed_PF': 0,
-                'Yphase_signed_PF': 0,
-                'Bphase_signed_PF': 0,
-                'voltage': 230,
-                'RN_voltage': 0,
-                'YN_voltage': 0,
-                'BN_voltage': 0,
-                'phase_current': 0,
-                'Rphase_current': 0,
-                'Yphase_current': 0,
-                'Bphase_current': 0,
-                'neutral_current': 0,
-                'frequency': 50.0,
-                'active_power_W': 0,
-                'apparent_power_VA': 0,
-                'load_limit_value': 0,
-                'load_limit_func_status': False,
-                'cumm_tamper_count': 0,
-                'cumm_billing_count': 0,
-                'cumm_programming_count': 0,
-                'num_power_fail': 0,
-                'num_power_fail_dur': 0,
-                'meter_current_datetime': current_date.strftime('%Y-%m-%d %H:%M:%S'),
-                'last_billing_datetime': current_date.strftime('%Y-%m-%d %H:%M:%S'),
-                'cumm_power_on_dur_minute': 0,
-                'is_valid': True,
-                'is_estimated': False,
-                'is_edited': False,
-                'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'updated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'device_id': None,
-                'file_log_id': 0,
-                'dcu_serial': f'DCU{meter_srno[-6:]}',
-                'hes_pk': '0',
-                'hes_msg_id': None,
-                'hes_created_at': 0,
-                'hes_created_at_str': current_date.strftime('%Y-%m-%d %H:%M:%S')
-            }
-            data_list.append(data)
-            
-            # Log progress every 10 days or on first/last day or at month boundaries
-            if day == 0 or day == total_days - 1 or day % 10 == 0:
-                logger.info(f"Day {day + 1}/{total_days} (Month {month_num}): {current_date.strftime('%Y-%m-%d')} - MD_W: {current_md_w} (Target: {target_md_w}), MD_VA: {current_md_va:.2f}")
-            
-            # Log at month boundaries
-            if current_date_utc.date() == month1_end.date() or current_date_utc.date() == month2_end.date():
-                logger.info(f"Month {month_num} completed - MD_W: {current_md_w}, Target was: {target_md_w}")
+        md = month_plan.md_series(power_factor=0.90)
+        data_list = profile_instant_rows(meter_srno, start_date, md['MD_W'], md['MD_VA'])
+        
+        # Log progress every 10 days or on first/last day or at month boundaries
+        for day in sorted(set(progress_days(total_days)) | month_end_days):
+            row = data_list[day]
+            month_num, _, target_md_w = month_plan.segments[month_plan.month_of_day[day]]
+            logger.info(f"Day {day + 1}/{total_days} (Month {month_num}): {row['data_timestamp'][:10]} - MD_W: {row['MD_W']} (Target: {target_md_w}), MD_VA: {row['MD_VA']:.2f}")
+            if day in month_end_days:
+                logger.info(f"Month {month_num} completed - MD_W: {row['MD_W']}, Target was: {target_md_w}")
         
         logger.info(f"Generated {len(data_list)} profile instant records")
         
-        # Insert data
-        insert_query = f"""
-            INSERT INTO {PROFILE_INSTANT_TABLE} (
-                meter_id, device_identifier, data_timestamp, create_timestamp, exec_datetime, meter_type,
-                "import_Wh", "export_Wh", "import_VAh", "export_VAh",
-                "cumm_energy_VArh_Q1", "cumm_energy_VArh_Q2", "cumm_energy_VArh_Q3", "cumm_energy_VArh_Q4",
-                "signed_active_power_KVAR", "MD_W", "MD_VA", "MD_W_datetime", "MD_VA_datetime",
-                "PF", "Rphase_signed_PF", "Yphase_signed_PF", "Bphase_signed_PF",
-                voltage, "RN_voltage", "YN_voltage", "BN_voltage",
-                phase_current, "Rphase_current", "Yphase_current", "Bphase_current",
-                neutral_current, frequency, "active_power_W", "apparent_power_VA",
-                load_limit_value, load_limit_func_status,
-                cumm_tamper_count, cumm_billing_count, cumm_programming_count,
-                num_power_fail, num_power_fail_dur,
-                meter_current_datetime, last_billing_datetime, cumm_power_on_dur_minute,
-                is_valid, is_estimated, is_edited,
-                created_at, updated_at,
-                device_id, file_log_id, dcu_serial,
-                hes_pk, hes_msg_id, hes_created_at
-            ) VALUES (
-                %(meter_id)s, %(device_identifier)s, %(data_timestamp)s, %(create_timestamp)s, %(exec_datetime)s, %(meter_type)s,
-                %(import_Wh)s, %(export_Wh)s, %(import_VAh)s, %(export_VAh)s,
-                %(cumm_energy_VArh_Q1)s, %(cumm_energy_VArh_Q2)s, %(cumm_energy_VArh_Q3)s, %(cumm_energy_VArh_Q4)s,
-                %(signed_active_power_KVAR)s, %(MD_W)s, %(MD_VA)s, %(MD_W_datetime)s, %(MD_VA_datetime)s,
-                %(PF)s, %(Rphase_signed_PF)s, %(Yphase_signed_PF)s, %(Bphase_signed_PF)s,
-                %(voltage)s, %(RN_voltage)s, %(YN_voltage)s, %(BN_voltage)s,
-                %(phase_current)s, %(Rphase_current)s, %(Yphase_current)s, %(Bphase_current)s,
-                %(neutral_current)s, %(frequency)s, %(active_power_W)s, %(apparent_power_VA)s,
-                %(load_limit_value)s, %(load_limit_func_status)s,
-                %(cumm_tamper_count)s, %(cumm_billing_count)s, %(cumm_programming_count)s,
-                %(num_power_fail)s, %(num_power_fail_dur)s,
-                %(meter_current_datetime)s, %(last_billing_datetime)s, %(cumm_power_on_dur_minute)s,
-                %(is_valid)s, %(is_estimated)s, %(is_edited)s,
-                %(created_at)s, %(updated_at)s,
-                %(device_id)s, %(file_log_id)s, %(dcu_serial)s,
-                %(hes_pk)s, %(hes_msg_id)s, %(hes_created_at_str)s
-            )
-        """
-        
-        cursor.executemany(insert_query, data_list)
-        connection.commit()
+        # Insert data (COPY ... FROM STDIN, falls back to paged INSERT ... VALUES)
+        bulk_insert(cursor, PROFILE_INSTANT_TABLE, PROFILE_INSTANT_COLUMNS, data_list)
+        db_pool.commit(connection)
         
         logger.info(f"Successfully inserted {len(data_list)} profile instant records into {PROFILE_INSTANT_TABLE}")
         cursor.close()
-        connection.close()
+        db_pool.release(connection)
         return True
         
     except Exception as e:
         logger.error(f"Error filling profile instant data: {str(e)}")
         if 'connection' in locals():
             connection.rollback()
-            connection.close()
+            db_pool.release(connection)
         return False
 
 # ===== STEP 4: TRIGGER PREPAID LEDGER APIs =====
@@ -828,9 +441,10 @@ def trigger_prepaid_ledger(account_id):
         url1 = f"{LEDGER_API_BASE}/trigger_task/daily_ledger_task/{date_encoded}?wallet_balance_sync_flag=False&account_id={account_id}"
         logger.info(f"Calling API 1: {url1}")
         
-        response1 = requests.get(
+        response1 = http_client.get(
             url1,
-            headers={'accept': 'application/json'}
+            headers={'accept': 'application/json'},
+            idempotent=False  # triggers a ledger run, never retried
         )
         
         logger.info(f"API 1 Response Status: {response1.status_code}")
@@ -850,46 +464,14 @@ def trigger_prepaid_ledger(account_id):
 # ===== STEP 5: GENERATE EXCEL REPORT =====
 
 def fetch_daily_load_data(meter_srno):
-    '''Fetch daily load data from MDMS API'''
-    try:
-        payload = {
-            "badge_numbers": [meter_srno],
-            "page": 1,
-            "limit": 100
-        }
-        response = requests.post(DAILYLOAD_API_URL, json=payload, headers={'accept': 'application/json', 'Content-Type': 'application/json'})
-        
-        if response.status_code == 200:
-            data = response.json()
-            if 'data' in data and data['data']:
-                return data['data']
-        logger.warning(f"Failed to fetch daily load data: {response.status_code}")
-        return []
-    except Exception as e:
-        logger.error(f"Error fetching daily load data: {str(e)}")
-        return []
+    '''Fetch daily load data from MDMS API (all pages, streamed page by page)'''
+    return mdms_client.iter_records(DAILYLOAD_API_URL, [meter_srno])
 
 def fetch_profile_instant_data(meter_srno):
-    '''Fetch profile instant data from MDMS API'''
-    try:
-        payload = {
-            "badge_numbers": [meter_srno],
-            "page": 1,
-            "limit": 100
-        }
-        response = requests.post(PROFILE_INSTANT_API_URL, json=payload, headers={'accept': 'application/json', 'Content-Type': 'application/json'})
-        
-        if response.status_code == 200:
-            data = response.json()
-            if 'data' in data and data['data']:
-                return data['data']
-        logger.warning(f"Failed to fetch profile instant data: {response.status_code}")
-        return []
-    except Exception as e:
-        logger.error(f"Error fetching profile instant data: {str(e)}")
-        return []
+    '''Fetch profile instant data from MDMS API (all pages, streamed page by page)'''
+    return mdms_client.iter_records(PROFILE_INSTANT_API_URL, [meter_srno])
 
-def generate_excel_report(account_data):
+def generate_excel_report(account_data, excel_file=None):
     '''Step 5: Generate Excel report with all test data'''
     logger.info("=" * 60)
     logger.info("STEP 5: Generating Excel Report")
@@ -901,18 +483,15 @@ def generate_excel_report(account_data):
     logger.info(f"Created/Verified folder: {result_folder}")
     
     # Excel file path - will be set dynamically
-    excel_file = os.path.join(result_folder, "Report_PE_124.xlsx")
+    if excel_file is None:
+        excel_file = os.path.join(result_folder, "Report_PE_124.xlsx")
     
     try:
-        # Create a new workbook
-        wb = Workbook()
-        
-        # Remove default sheet
-        if 'Sheet' in wb.sheetnames:
-            wb.remove(wb['Sheet'])
+        # Write-only workbook: rows stream to disk, widths are measured as they arrive
+        report = ReportWorkbook()
         
         # ===== SHEET 1: SUMMARY =====
-        ws_summary = wb.create_sheet("Summary", 0)
+        ws_summary = report.create_sheet("Summary")
         
         # Test case information - will be extracted from file
         test_case_id = "PE_124"
@@ -924,191 +503,97 @@ def generate_excel_report(account_data):
         
         # Headers
         headers = ["Test Case ID", "Test Case Description", "Account ID", "Meter Number", "Badge Number", "Status"]
-        ws_summary.append(headers)
-        
-        # Style headers
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF")
-        for cell in ws_summary[1]:
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal="center", vertical="center")
+        ws_summary.append_header(headers)
         
         # Data row
         data_row = [test_case_id, test_case_description, account_id, meter_number, badge_number, status]
         ws_summary.append(data_row)
         
-        # Auto-adjust column widths
-        for column in ws_summary.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws_summary.column_dimensions[column_letter].width = adjusted_width
-        
         logger.info("Summary sheet created")
         
         # ===== SHEET 2: CONSUMER DETAILS =====
-        ws_consumer = wb.create_sheet("Consumer Details", 1)
+        ws_consumer = report.create_sheet("Consumer Details")
         
         payload = account_data['payload']
         
         # Write headers first
-        ws_consumer.append(["Parameter", "Value"])
+        ws_consumer.append_header(["Parameter", "Value"])
         
         # Convert payload to rows (key-value pairs) and write data
         for key, value in payload.items():
             ws_consumer.append([key, str(value)])
         
-        # Style headers
-        for cell in ws_consumer[1]:
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-        
-        # Auto-adjust column widths
-        for column in ws_consumer.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws_consumer.column_dimensions[column_letter].width = adjusted_width
-        
         logger.info("Consumer Details sheet created")
         
         # ===== SHEET 3: DAILY LOAD =====
-        ws_daily = wb.create_sheet("Daily Load", 2)
+        ws_daily = report.create_sheet("Daily Load")
         
-        # Fetch daily load data
+        # Fetch daily load data (all pages, streamed into the sheet)
         logger.info(f"Fetching daily load data for meter: {meter_number}")
-        daily_load_data = fetch_daily_load_data(meter_number)
-        
-        if daily_load_data:
+        daily_load_count = 0
+        for record in fetch_daily_load_data(meter_number):
             # Extract only required fields
-            daily_load_filtered = []
-            for record in daily_load_data:
-                filtered_record = {
-                    "dailyload_datetime": record.get("dailyload_datetime", ""),
-                    "badge_number": record.get("badge_number", ""),
-                    "meter_serial_number": record.get("meter_serial_number", ""),
-                    "data_source": record.get("data_source", ""),
-                    "data_type": record.get("data_type", ""),
-                    "export_Wh": record.get("export_Wh", ""),
-                    "import_Wh": record.get("import_Wh", ""),
-                    "export_VAh": record.get("export_VAh", ""),
-                    "import_VAh": record.get("import_VAh", "")
-                }
-                daily_load_filtered.append(filtered_record)
-            
-            df_daily = pd.DataFrame(daily_load_filtered)
-            
-            # Write headers first
-            headers = list(df_daily.columns)
-            ws_daily.append(headers)
-            
-            # Write data rows
-            for row in df_daily.itertuples(index=False):
-                ws_daily.append(list(row))
-            
-            # Style headers
-            for cell in ws_daily[1]:
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-            
-            logger.info(f"Added {len(daily_load_filtered)} daily load records")
+            filtered_record = {
+                "dailyload_datetime": record.get("dailyload_datetime", ""),
+                "badge_number": record.get("badge_number", ""),
+                "meter_serial_number": record.get("meter_serial_number", ""),
+                "data_source": record.get("data_source", ""),
+                "data_type": record.get("data_type", ""),
+                "export_Wh": record.get("export_Wh", ""),
+                "import_Wh": record.get("import_Wh", ""),
+                "export_VAh": record.get("export_VAh", ""),
+                "import_VAh": record.get("import_VAh", "")
+            }
+            if daily_load_count == 0:
+                # Write headers first
+                ws_daily.append_header(list(filtered_record.keys()))
+            ws_daily.append(list(filtered_record.values()))
+            daily_load_count += 1
+        
+        if daily_load_count:
+            logger.info(f"Added {daily_load_count} daily load records")
         else:
             ws_daily.append(["No data available"])
             logger.warning("No daily load data found")
         
-        # Auto-adjust column widths
-        for column in ws_daily.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws_daily.column_dimensions[column_letter].width = adjusted_width
-        
         logger.info("Daily Load sheet created")
         
         # ===== SHEET 4: PROFILE INSTANT =====
-        ws_profile = wb.create_sheet("Profile Instant", 3)
+        ws_profile = report.create_sheet("Profile Instant")
         
-        # Fetch profile instant data
+        # Fetch profile instant data (all pages, streamed into the sheet)
         logger.info(f"Fetching profile instant data for meter: {meter_number}")
-        profile_instant_data = fetch_profile_instant_data(meter_number)
-        
-        if profile_instant_data:
+        profile_count = 0
+        for record in fetch_profile_instant_data(meter_number):
             # Extract only required fields
-            profile_filtered = []
-            for record in profile_instant_data:
-                filtered_record = {
-                    "data_timestamp": record.get("data_timestamp", ""),
-                    "badge_number": record.get("badge_number", ""),
-                    "meter_serial_number": record.get("meter_serial_number", ""),
-                    "meter_type": record.get("meter_type", ""),
-                    "MD_W": record.get("MD_W", ""),
-                    "MD_VA": record.get("MD_VA", ""),
-                    "MD_W_datetime": record.get("MD_W_datetime", ""),
-                    "MD_VA_datetime": record.get("MD_VA_datetime", ""),
-                    "voltage": record.get("voltage", ""),
-                    "frequency": record.get("frequency", "")
-                }
-                profile_filtered.append(filtered_record)
-            
-            df_profile = pd.DataFrame(profile_filtered)
-            
-            # Write headers first
-            headers = list(df_profile.columns)
-            ws_profile.append(headers)
-            
-            # Write data rows
-            for row in df_profile.itertuples(index=False):
-                ws_profile.append(list(row))
-            
-            # Style headers
-            for cell in ws_profile[1]:
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-            
-            logger.info(f"Added {len(profile_filtered)} profile instant records")
+            filtered_record = {
+                "data_timestamp": record.get("data_timestamp", ""),
+                "badge_number": record.get("badge_number", ""),
+                "meter_serial_number": record.get("meter_serial_number", ""),
+                "meter_type": record.get("meter_type", ""),
+                "MD_W": record.get("MD_W", ""),
+                "MD_VA": record.get("MD_VA", ""),
+                "MD_W_datetime": record.get("MD_W_datetime", ""),
+                "MD_VA_datetime": record.get("MD_VA_datetime", ""),
+                "voltage": record.get("voltage", ""),
+                "frequency": record.get("frequency", "")
+            }
+            if profile_count == 0:
+                # Write headers first
+                ws_profile.append_header(list(filtered_record.keys()))
+            ws_profile.append(list(filtered_record.values()))
+            profile_count += 1
+        
+        if profile_count:
+            logger.info(f"Added {profile_count} profile instant records")
         else:
             ws_profile.append(["No data available"])
             logger.warning("No profile instant data found")
         
-        # Auto-adjust column widths
-        for column in ws_profile.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws_profile.column_dimensions[column_letter].width = adjusted_width
-        
         logger.info("Profile Instant sheet created")
         
         # Save workbook
-        wb.save(excel_file)
+        report.save(excel_file)
         logger.info(f"Excel report saved successfully: {excel_file}")
         return True
         
@@ -1120,46 +605,14 @@ def generate_excel_report(account_data):
 # ===== STEP 5: GENERATE EXCEL REPORT =====
 
 def fetch_daily_load_data(meter_srno):
-    '''Fetch daily load data from MDMS API'''
-    try:
-        payload = {
-            "badge_numbers": [meter_srno],
-            "page": 1,
-            "limit": 100
-        }
-        response = requests.post(DAILYLOAD_API_URL, json=payload, headers={'accept': 'application/json', 'Content-Type': 'application/json'})
-        
-        if response.status_code == 200:
-            data = response.json()
-            if 'data' in data and data['data']:
-                return data['data']
-        logger.warning(f"Failed to fetch daily load data: {response.status_code}")
-        return []
-    except Exception as e:
-        logger.error(f"Error fetching daily load data: {str(e)}")
-        return []
+    '''Fetch daily load data from MDMS API (all pages, streamed page by page)'''
+    return mdms_client.iter_records(DAILYLOAD_API_URL, [meter_srno])
 
 def fetch_profile_instant_data(meter_srno):
-    '''Fetch profile instant data from MDMS API'''
-    try:
-        payload = {
-            "badge_numbers": [meter_srno],
-            "page": 1,
-            "limit": 100
-        }
-        response = requests.post(PROFILE_INSTANT_API_URL, json=payload, headers={'accept': 'application/json', 'Content-Type': 'application/json'})
-        
-        if response.status_code == 200:
-            data = response.json()
-            if 'data' in data and data['data']:
-                return data['data']
-        logger.warning(f"Failed to fetch profile instant data: {response.status_code}")
-        return []
-    except Exception as e:
-        logger.error(f"Error fetching profile instant data: {str(e)}")
-        return []
+    '''Fetch profile instant data from MDMS API (all pages, streamed page by page)'''
+    return mdms_client.iter_records(PROFILE_INSTANT_API_URL, [meter_srno])
 
-def generate_excel_report(account_data):
+def generate_excel_report(account_data, excel_file=None):
     '''Step 5: Generate Excel report with all test data'''
     logger.info("=" * 60)
     logger.info("STEP 5: Generating Excel Report")
@@ -1171,18 +624,15 @@ def generate_excel_report(account_data):
     logger.info(f"Created/Verified folder: {result_folder}")
     
     # Excel file path - will be set dynamically
-    excel_file = os.path.join(result_folder, "Report_PE_124.xlsx")
+    if excel_file is None:
+        excel_file = os.path.join(result_folder, "Report_PE_124.xlsx")
     
     try:
-        # Create a new workbook
-        wb = Workbook()
-        
-        # Remove default sheet
-        if 'Sheet' in wb.sheetnames:
-            wb.remove(wb['Sheet'])
+        # Write-only workbook: rows stream to disk, widths are measured as they arrive
+        report = ReportWorkbook()
         
         # ===== SHEET 1: SUMMARY =====
-        ws_summary = wb.create_sheet("Summary", 0)
+        ws_summary = report.create_sheet("Summary")
         
         # Test case information - will be extracted from file
         test_case_id = "PE_124"
@@ -1194,191 +644,97 @@ def generate_excel_report(account_data):
         
         # Headers
         headers = ["Test Case ID", "Test Case Description", "Account ID", "Meter Number", "Badge Number", "Status"]
-        ws_summary.append(headers)
-        
-        # Style headers
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF")
-        for cell in ws_summary[1]:
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal="center", vertical="center")
+        ws_summary.append_header(headers)
         
         # Data row
         data_row = [test_case_id, test_case_description, account_id, meter_number, badge_number, status]
         ws_summary.append(data_row)
         
-        # Auto-adjust column widths
-        for column in ws_summary.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws_summary.column_dimensions[column_letter].width = adjusted_width
-        
         logger.info("Summary sheet created")
         
         # ===== SHEET 2: CONSUMER DETAILS =====
-        ws_consumer = wb.create_sheet("Consumer Details", 1)
+        ws_consumer = report.create_sheet("Consumer Details")
         
         payload = account_data['payload']
         
         # Write headers first
-        ws_consumer.append(["Parameter", "Value"])
+        ws_consumer.append_header(["Parameter", "Value"])
         
         # Convert payload to rows (key-value pairs) and write data
         for key, value in payload.items():
             ws_consumer.append([key, str(value)])
         
-        # Style headers
-        for cell in ws_consumer[1]:
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-        
-        # Auto-adjust column widths
-        for column in ws_consumer.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws_consumer.column_dimensions[column_letter].width = adjusted_width
-        
         logger.info("Consumer Details sheet created")
         
         # ===== SHEET 3: DAILY LOAD =====
-        ws_daily = wb.create_sheet("Daily Load", 2)
+        ws_daily = report.create_sheet("Daily Load")
         
-        # Fetch daily load data
+        # Fetch daily load data (all pages, streamed into the sheet)
         logger.info(f"Fetching daily load data for meter: {meter_number}")
-        daily_load_data = fetch_daily_load_data(meter_number)
-        
-        if daily_load_data:
+        daily_load_count = 0
+        for record in fetch_daily_load_data(meter_number):
             # Extract only required fields
-            daily_load_filtered = []
-            for record in daily_load_data:
-                filtered_record = {
-                    "dailyload_datetime": record.get("dailyload_datetime", ""),
-                    "badge_number": record.get("badge_number", ""),
-                    "meter_serial_number": record.get("meter_serial_number", ""),
-                    "data_source": record.get("data_source", ""),
-                    "data_type": record.get("data_type", ""),
-                    "export_Wh": record.get("export_Wh", ""),
-                    "import_Wh": record.get("import_Wh", ""),
-                    "export_VAh": record.get("export_VAh", ""),
-                    "import_VAh": record.get("import_VAh", "")
-                }
-                daily_load_filtered.append(filtered_record)
-            
-            df_daily = pd.DataFrame(daily_load_filtered)
-            
-            # Write headers first
-            headers = list(df_daily.columns)
-            ws_daily.append(headers)
-            
-            # Write data rows
-            for row in df_daily.itertuples(index=False):
-                ws_daily.append(list(row))
-            
-            # Style headers
-            for cell in ws_daily[1]:
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-            
-            logger.info(f"Added {len(daily_load_filtered)} daily load records")
+            filtered_record = {
+                "dailyload_datetime": record.get("dailyload_datetime", ""),
+                "badge_number": record.get("badge_number", ""),
+                "meter_serial_number": record.get("meter_serial_number", ""),
+                "data_source": record.get("data_source", ""),
+                "data_type": record.get("data_type", ""),
+                "export_Wh": record.get("export_Wh", ""),
+                "import_Wh": record.get("import_Wh", ""),
+                "export_VAh": record.get("export_VAh", ""),
+                "import_VAh": record.get("import_VAh", "")
+            }
+            if daily_load_count == 0:
+                # Write headers first
+                ws_daily.append_header(list(filtered_record.keys()))
+            ws_daily.append(list(filtered_record.values()))
+            daily_load_count += 1
+        
+        if daily_load_count:
+            logger.info(f"Added {daily_load_count} daily load records")
         else:
             ws_daily.append(["No data available"])
             logger.warning("No daily load data found")
         
-        # Auto-adjust column widths
-        for column in ws_daily.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws_daily.column_dimensions[column_letter].width = adjusted_width
-        
         logger.info("Daily Load sheet created")
         
         # ===== SHEET 4: PROFILE INSTANT =====
-        ws_profile = wb.create_sheet("Profile Instant", 3)
+        ws_profile = report.create_sheet("Profile Instant")
         
-        # Fetch profile instant data
+        # Fetch profile instant data (all pages, streamed into the sheet)
         logger.info(f"Fetching profile instant data for meter: {meter_number}")
-        profile_instant_data = fetch_profile_instant_data(meter_number)
-        
-        if profile_instant_data:
+        profile_count = 0
+        for record in fetch_profile_instant_data(meter_number):
             # Extract only required fields
-            profile_filtered = []
-            for record in profile_instant_data:
-                filtered_record = {
-                    "data_timestamp": record.get("data_timestamp", ""),
-                    "badge_number": record.get("badge_number", ""),
-                    "meter_serial_number": record.get("meter_serial_number", ""),
-                    "meter_type": record.get("meter_type", ""),
-                    "MD_W": record.get("MD_W", ""),
-                    "MD_VA": record.get("MD_VA", ""),
-                    "MD_W_datetime": record.get("MD_W_datetime", ""),
-                    "MD_VA_datetime": record.get("MD_VA_datetime", ""),
-                    "voltage": record.get("voltage", ""),
-                    "frequency": record.get("frequency", "")
-                }
-                profile_filtered.append(filtered_record)
-            
-            df_profile = pd.DataFrame(profile_filtered)
-            
-            # Write headers first
-            headers = list(df_profile.columns)
-            ws_profile.append(headers)
-            
-            # Write data rows
-            for row in df_profile.itertuples(index=False):
-                ws_profile.append(list(row))
-            
-            # Style headers
-            for cell in ws_profile[1]:
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-            
-            logger.info(f"Added {len(profile_filtered)} profile instant records")
+            filtered_record = {
+                "data_timestamp": record.get("data_timestamp", ""),
+                "badge_number": record.get("badge_number", ""),
+                "meter_serial_number": record.get("meter_serial_number", ""),
+                "meter_type": record.get("meter_type", ""),
+                "MD_W": record.get("MD_W", ""),
+                "MD_VA": record.get("MD_VA", ""),
+                "MD_W_datetime": record.get("MD_W_datetime", ""),
+                "MD_VA_datetime": record.get("MD_VA_datetime", ""),
+                "voltage": record.get("voltage", ""),
+                "frequency": record.get("frequency", "")
+            }
+            if profile_count == 0:
+                # Write headers first
+                ws_profile.append_header(list(filtered_record.keys()))
+            ws_profile.append(list(filtered_record.values()))
+            profile_count += 1
+        
+        if profile_count:
+            logger.info(f"Added {profile_count} profile instant records")
         else:
             ws_profile.append(["No data available"])
             logger.warning("No profile instant data found")
         
-        # Auto-adjust column widths
-        for column in ws_profile.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws_profile.column_dimensions[column_letter].width = adjusted_width
-        
         logger.info("Profile Instant sheet created")
         
         # Save workbook
-        wb.save(excel_file)
+        report.save(excel_file)
         logger.info(f"Excel report saved successfully: {excel_file}")
         return True
         
@@ -1405,21 +761,23 @@ def main():
     logger.info(f"Account ID: {account_data['accountId']}")
     logger.info(f"Meter Serial No: {account_data['meterSrno']}")
     
-    # Step 2: Fill daily load data
-    logger.info("Initiating Step 2: Daily Load Data Filling")
-    if not fill_daily_load_data(account_data):
-        logger.error("Step 2 failed: Daily load data filling failed.")
-        return
-    
-    logger.info("Step 2 completed successfully")
-    
-    # Step 3: Fill profile instant data
-    logger.info("Initiating Step 3: Profile Instant Data Filling")
-    if not fill_profile_instant_data(account_data):
-        logger.error("Step 3 failed: Profile instant data filling failed.")
-        return
-    
-    logger.info("Step 3 completed successfully")
+    # Steps 2 and 3 share one pooled database connection (and optionally one transaction)
+    with db_pool.account_scope(DB_CONFIG, single_transaction=SINGLE_DB_TRANSACTION):
+        # Step 2: Fill daily load data
+        logger.info("Initiating Step 2: Daily Load Data Filling")
+        if not fill_daily_load_data(account_data):
+            logger.error("Step 2 failed: Daily load data filling failed.")
+            return
+        
+        logger.info("Step 2 completed successfully")
+        
+        # Step 3: Fill profile instant data
+        logger.info("Initiating Step 3: Profile Instant Data Filling")
+        if not fill_profile_instant_data(account_data):
+            logger.error("Step 3 failed: Profile instant data filling failed.")
+            return
+        
+        logger.info("Step 3 completed successfully")
     
     # Step 4: Trigger prepaid ledger APIs
     logger.info("Initiating Step 4: Prepaid Ledger API Trigger")
@@ -4,17 +4,39 @@ account.py - Extract Consumer Details from Excel Reports
 Reads all Report_PE_*.xlsx files from Result_File folder,
 extracts Consumer Details sheet data with specified columns,
 and saves to Consumer_details.csv
+
+The workbooks are opened read-only on a process pool (--jobs), reading just
+the Parameter/Value cells of the Consumer Details sheet. Extracted rows are
+cached (Common/extraction_cache.py), so a later run only parses new or
+modified reports.
+
+With --columnar the Consumer Details rows are read from the columnar result
+store written by run_suite.py --columnar (Parquet) instead of the workbooks.
 """
 
+import argparse
+import math
 import pandas as pd
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from zipfile import BadZipFile
+
+from openpyxl.reader.excel import ExcelReader
+from openpyxl.styles.stylesheet import apply_stylesheet
+from openpyxl.utils.exceptions import InvalidFileException
+from openpyxl.worksheet._read_only import ReadOnlyWorksheet
+
+from Common import result_store
+from Common.extraction_cache import ExtractionCache, DEFAULT_CACHE_PATH
 
 # Configuration
 RESULT_FOLDER = "Result_File"
 SHEET_NAME = "Consumer Details"
 OUTPUT_CSV = "Consumer_details.csv"
+DEFAULT_JOBS = os.cpu_count() or 4
+CHUNKS_PER_WORKER = 4  # default chunk size spreads the reports over ~4 chunks per worker
 
 # Required columns to extract
 REQUIRED_COLUMNS = [
@@ -37,6 +59,61 @@ def get_report_identifier(filename: str) -> str:
     return os.path.splitext(filename)[0]
 
 
+def read_consumer_details(excel_file: str):
+    """
+    Parameter/Value pairs of a workbook's Consumer Details sheet.
+    
+    The workbook is opened read-only and only the Parameter and Value columns
+    of that sheet are read. load_workbook(read_only=True), which pd.read_excel
+    uses, scans every sheet of a report written in write-only mode to size it
+    (there is no dimension record), Profile Instant included, so the one sheet
+    is opened directly instead.
+    
+    That uses openpyxl's reader internals (ExcelReader, ReadOnlyWorksheet),
+    so requirements.txt pins the openpyxl minor version they were checked
+    against; check_consumer_details.py verifies the result after an upgrade.
+    
+    Args:
+        excel_file: Path to the Excel file
+        
+    Returns:
+        List of (parameter, value) tuples, or None when the sheet has no
+        Parameter/Value header
+        
+    Raises:
+        KeyError: The workbook has no Consumer Details sheet
+    """
+    reader = ExcelReader(excel_file, read_only=True, data_only=True, keep_links=False)
+    try:
+        reader.read_manifest()
+        reader.read_strings()
+        reader.read_workbook()
+        apply_stylesheet(reader.archive, reader.wb)  # date formats for the cell values
+        
+        sheet_path = next((rel.target for sheet, rel in reader.parser.find_sheets()
+                           if sheet.name == SHEET_NAME and rel.target in reader.valid_files), None)
+        if sheet_path is None:
+            raise KeyError(SHEET_NAME)
+        worksheet = ReadOnlyWorksheet(reader.wb, SHEET_NAME, sheet_path, reader.shared_strings)
+        header = next(worksheet.iter_rows(min_row=1, max_row=1, values_only=True), ())
+        if 'Parameter' not in header or 'Value' not in header:
+            return None
+        param_col = header.index('Parameter') + 1
+        value_col = header.index('Value') + 1
+        first_col = min(param_col, value_col)
+        
+        pairs = []
+        for row in worksheet.iter_rows(min_row=2, min_col=first_col, max_col=max(param_col, value_col),
+                                       values_only=True):
+            param, value = row[param_col - first_col], row[value_col - first_col]
+            if param is None and value is None:
+                continue  # blank row (pd.read_excel skips these too)
+            pairs.append((param, value))
+        return pairs
+    finally:
+        reader.archive.close()
+
+
 def extract_consumer_details(excel_file: str) -> pd.DataFrame:
     """
     Extract consumer details from a single Excel file.
@@ -49,75 +126,26 @@ def extract_consumer_details(excel_file: str) -> pd.DataFrame:
         DataFrame with consumer details including report identifier
     """
     try:
-        # Read the Consumer Details sheet
-        df = pd.read_excel(excel_file, sheet_name=SHEET_NAME)
+        # Read the Parameter/Value cells of the Consumer Details sheet
+        pairs = read_consumer_details(excel_file)
         
         # Get the report identifier from filename
         report_id = get_report_identifier(os.path.basename(excel_file))
         
-        # Check if the sheet has Parameter/Value structure
-        if 'Parameter' not in df.columns or 'Value' not in df.columns:
+        if pairs is None:
             print(f"Warning: {os.path.basename(excel_file)} - Unexpected sheet structure")
             return pd.DataFrame(columns=["Report_ID"] + REQUIRED_COLUMNS)
         
-        # Convert Parameter/Value pairs to a dictionary (case-insensitive key matching)
-        data_dict = {}
-        for _, row in df.iterrows():
-            param = str(row['Parameter']).strip()
-            value = row['Value']
-            # Use case-insensitive matching for parameter names
-            data_dict[param.lower()] = value
-        
-        # Create a single row dictionary with the report identifier and required fields
-        row_data = {"Report_ID": report_id}
-        
-        # Map of parameter names (case-insensitive) to output column names
-        param_mapping = {
-            'accountid': 'accountId',
-            'metersrno': 'meterSrno',
-            'supplytypecode': 'supplyTypecode',
-            'sanctionedload': 'sanctionedLoad',
-            'loadunit': 'loadUnit',
-            'meterinstalldate': 'meterInstalldate',
-            'greenenergyflag': 'greenEnergyflag',
-            'prepaidopeningbalance': 'prepaidOpeningbalance'
-        }
-        
-        missing_params = []
-        
-        # Extract required parameters (case-insensitive)
-        for param_lower, col_name in param_mapping.items():
-            if param_lower in data_dict:
-                row_data[col_name] = data_dict[param_lower]
-            else:
-                # Check for exact case matches as fallback
-                found = False
-                for key in data_dict.keys():
-                    if key.lower() == param_lower:
-                        row_data[col_name] = data_dict[key]
-                        found = True
-                        break
-                if not found:
-                    row_data[col_name] = None
-                    missing_params.append(col_name)
-        
-        # Create DataFrame with single row
-        result_df = pd.DataFrame([row_data])
-        
-        # Print info about missing parameters for this file
-        if missing_params:
-            print(f"Warning: {os.path.basename(excel_file)} - Missing parameters: {', '.join(missing_params)}")
-        
-        return result_df
+        return consumer_details_from_pairs(pairs, report_id, os.path.basename(excel_file))
         
     except FileNotFoundError:
         print(f"Error: File not found - {excel_file}")
         return pd.DataFrame(columns=["Report_ID"] + REQUIRED_COLUMNS)
-    except ValueError as e:
-        if "Worksheet named" in str(e):
-            print(f"Error: Sheet '{SHEET_NAME}' not found in {os.path.basename(excel_file)}")
-        else:
-            print(f"Error processing {os.path.basename(excel_file)}: {str(e)}")
+    except KeyError:
+        print(f"Error: Sheet '{SHEET_NAME}' not found in {os.path.basename(excel_file)}")
+        return pd.DataFrame(columns=["Report_ID"] + REQUIRED_COLUMNS)
+    except (BadZipFile, InvalidFileException) as e:
+        print(f"Error processing {os.path.basename(excel_file)}: {str(e)}")
         return pd.DataFrame(columns=["Report_ID"] + REQUIRED_COLUMNS)
     except Exception as e:
         print(f"Error processing {os.path.basename(excel_file)}: {str(e)}")
@@ -126,10 +154,96 @@ def extract_consumer_details(excel_file: str) -> pd.DataFrame:
         return pd.DataFrame(columns=["Report_ID"] + REQUIRED_COLUMNS)
 
 
-def process_all_reports() -> pd.DataFrame:
+def consumer_details_row(df: pd.DataFrame, report_id: str, source_name: str) -> pd.DataFrame:
+    """
+    Required consumer details from a Consumer Details sheet (Parameter/Value rows).
+    
+    Args:
+        df: The sheet's Parameter/Value rows (from Excel or the columnar store)
+        report_id: Report identifier, e.g. Report_PE_101
+        source_name: Workbook or report name used in warnings
+        
+    Returns:
+        DataFrame with one row: Report_ID plus REQUIRED_COLUMNS
+    """
+    # Check if the sheet has Parameter/Value structure
+    if 'Parameter' not in df.columns or 'Value' not in df.columns:
+        print(f"Warning: {source_name} - Unexpected sheet structure")
+        return pd.DataFrame(columns=["Report_ID"] + REQUIRED_COLUMNS)
+    
+    return consumer_details_from_pairs(zip(df['Parameter'], df['Value']), report_id, source_name)
+
+
+def consumer_details_from_pairs(pairs, report_id: str, source_name: str) -> pd.DataFrame:
+    """
+    Required consumer details from (parameter, value) pairs.
+    
+    Args:
+        pairs: Iterable of (parameter, value) tuples
+        report_id: Report identifier, e.g. Report_PE_101
+        source_name: Workbook or report name used in warnings
+        
+    Returns:
+        DataFrame with one row: Report_ID plus REQUIRED_COLUMNS
+    """
+    # Convert Parameter/Value pairs to a dictionary (case-insensitive key matching)
+    data_dict = {}
+    for param, value in pairs:
+        # Use case-insensitive matching for parameter names
+        data_dict[str(param).strip().lower()] = value
+    
+    # Create a single row dictionary with the report identifier and required fields
+    row_data = {"Report_ID": report_id}
+    
+    # Map of parameter names (case-insensitive) to output column names
+    param_mapping = {
+        'accountid': 'accountId',
+        'metersrno': 'meterSrno',
+        'supplytypecode': 'supplyTypecode',
+        'sanctionedload': 'sanctionedLoad',
+        'loadunit': 'loadUnit',
+        'meterinstalldate': 'meterInstalldate',
+        'greenenergyflag': 'greenEnergyflag',
+        'prepaidopeningbalance': 'prepaidOpeningbalance'
+    }
+    
+    missing_params = []
+    
+    # Extract required parameters (case-insensitive)
+    for param_lower, col_name in param_mapping.items():
+        if param_lower in data_dict:
+            row_data[col_name] = data_dict[param_lower]
+        else:
+            # Check for exact case matches as fallback
+            found = False
+            for key in data_dict.keys():
+                if key.lower() == param_lower:
+                    row_data[col_name] = data_dict[key]
+                    found = True
+                    break
+            if not found:
+                row_data[col_name] = None
+                missing_params.append(col_name)
+    
+    # Create DataFrame with single row
+    result_df = pd.DataFrame([row_data])
+    
+    # Print info about missing parameters for this file
+    if missing_params:
+        print(f"Warning: {source_name} - Missing parameters: {', '.join(missing_params)}")
+    
+    return result_df
+
+
+def process_all_reports(jobs: int = DEFAULT_JOBS, cache: ExtractionCache = None) -> pd.DataFrame:
     """
     Process all Excel report files in the Result_File folder.
     
+    Args:
+        jobs: Worker processes (1 = extract in this process)
+        cache: Extraction cache; only reports it does not hold (new or
+            modified) are parsed, and their rows are added to it
+        
     Returns:
         Combined DataFrame with all consumer details
     """
@@ -146,29 +260,96 @@ def process_all_reports() -> pd.DataFrame:
         print(f"No Excel files found in '{RESULT_FOLDER}' folder!")
         return pd.DataFrame()
     
-    print(f"Found {len(excel_files)} Excel file(s) to process...")
+    excel_files = [str(excel_file) for excel_file in sorted(excel_files)]
+    
+    # Rows of unchanged reports come from the cache (file path -> row)
+    records = {}
+    if cache is not None:
+        for excel_file in excel_files:
+            record = cache.lookup(excel_file)
+            if record is not None:
+                records[excel_file] = record
+        removed = cache.prune(excel_files)
+        if removed:
+            print(f"Dropped {removed} deleted report(s) from the cache")
+    to_parse = [excel_file for excel_file in excel_files if excel_file not in records]
+    
+    jobs = max(1, min(jobs, len(to_parse)))
+    print(f"Found {len(excel_files)} Excel file(s): {len(records)} cached, "
+          f"{len(to_parse)} to process on {jobs} process(es)...")
     sys.stdout.flush()
     
-    # Process each file and collect dataframes
-    all_dataframes = []
+    # Process each new or modified file (in file order)
+    extracted = []
+    
+    if jobs == 1:
+        results = map(extract_consumer_details, to_parse)
+        executor = None
+    else:
+        chunk_size = max(1, math.ceil(len(to_parse) / (jobs * CHUNKS_PER_WORKER)))
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        results = executor.map(extract_consumer_details, to_parse, chunksize=chunk_size)
+    
+    try:
+        for excel_file, df in zip(to_parse, results):
+            if not df.empty:
+                records[excel_file] = df.to_dict('records')[0]
+                extracted.append((excel_file, records[excel_file]))
+                print(f"Processed: {os.path.basename(excel_file)} - Extracted {len(df)} record(s)")
+                sys.stdout.flush()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    
+    # Failed extractions are not cached, so they are retried on the next run
+    if cache is not None and extracted:
+        cache.store_many(extracted)
+    
+    # Combine all rows
+    if records:
+        combined_df = pd.DataFrame([records[excel_file] for excel_file in excel_files if excel_file in records],
+                                   columns=["Report_ID"] + REQUIRED_COLUMNS)
+        print(f"\nTotal records extracted: {len(combined_df)} ({len(extracted)} newly parsed)")
+        return combined_df
+    else:
+        print("No data extracted from any files!")
+        return pd.DataFrame()
+
+
+def process_columnar_reports(root: str = result_store.RESULT_STORE_ROOT, run_id: str = None) -> pd.DataFrame:
+    """
+    Process the Consumer Details of every report in the columnar result store.
     
-    for excel_file in sorted(excel_files):
-        print(f"Processing: {excel_file.name}...")
-        sys.stdout.flush()
-        df = extract_consumer_details(str(excel_file))
+    Args:
+        root: Columnar result store folder
+        run_id: Run to read (default: the latest run)
         
+    Returns:
+        Combined DataFrame with all consumer details
+    """
+    store = result_store.ResultStore(root)
+    run_id = run_id or store.latest_run("consumer_details")
+    report_ids = store.report_ids("consumer_details", run_id)
+    
+    if not report_ids:
+        print(f"No consumer details found in the columnar store '{root}'!")
+        return pd.DataFrame()
+    
+    print(f"Found {len(report_ids)} report(s) in run {run_id} to process...")
+    sys.stdout.flush()
+    
+    all_dataframes = []
+    for report_id, details in store.iter_reports("consumer_details", run_id, columns=["Parameter", "Value"]):
+        df = consumer_details_row(details, report_id, report_id)
         if not df.empty:
             all_dataframes.append(df)
-            print(f"  - Extracted {len(df)} record(s)")
-            sys.stdout.flush()
     
-    # Combine all dataframes
     if all_dataframes:
         combined_df = pd.concat(all_dataframes, ignore_index=True)
         print(f"\nTotal records extracted: {len(combined_df)}")
         return combined_df
     else:
-        print("No data extracted from any files!")
+        print("No data extracted from the columnar store!")
         return pd.DataFrame()
 
 
@@ -193,12 +374,38 @@ def main():
     """
     Main function to extract and save consumer details.
     """
+    parser = argparse.ArgumentParser(description="Extract consumer details from the PE reports into Consumer_details.csv")
+    parser.add_argument("--columnar", action="store_true",
+                        help="Read the Consumer Details from the columnar result store instead of the Excel reports")
+    parser.add_argument("--columnar-root", default=result_store.RESULT_STORE_ROOT,
+                        help=f"Columnar result store folder (default: {result_store.RESULT_STORE_ROOT})")
+    parser.add_argument("--run-id", help="Columnar run to read (default: the latest run)")
+    parser.add_argument("--jobs", "-j", type=int, default=DEFAULT_JOBS,
+                        help=f"Worker processes reading the Excel reports (default: {DEFAULT_JOBS})")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH,
+                        help=f"Extraction cache of the reports already read (default: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Parse every report again and leave the cache untouched")
+    parser.add_argument("--verify-cache", action="store_true",
+                        help="Check the content hash of every cached report instead of trusting size and mtime")
+    args = parser.parse_args()
+    
     print("=" * 60)
     print("Consumer Details Extraction Tool")
     print("=" * 60)
     
-    # Process all Excel files
-    combined_df = process_all_reports()
+    if args.columnar and not result_store.available():
+        print("Error: --columnar needs pyarrow. Install it using: pip install pyarrow")
+        return
+    
+    # Process all Excel files (or the columnar store)
+    if args.columnar:
+        combined_df = process_columnar_reports(args.columnar_root, args.run_id)
+    elif args.no_cache:
+        combined_df = process_all_reports(args.jobs)
+    else:
+        with ExtractionCache(args.cache, verify=args.verify_cache) as cache:
+            combined_df = process_all_reports(args.jobs, cache)
     
     # Save to CSV
     if not combined_df.empty:
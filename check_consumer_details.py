@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+check_consumer_details.py - Regression check for account.py's workbook reader
+
+account.py reads the Consumer Details sheet through openpyxl's reader
+internals (see read_consumer_details), which requirements.txt pins to the
+openpyxl range they were checked against. This script builds two workbooks
+and checks that the extracted row matches the pd.read_excel path account.py
+used before:
+
+    write-only    a PE report as Common/excel_report.py writes it (no dimension
+                  record, a large Profile Instant sheet after Consumer Details)
+    standard      a workbook saved in normal mode, Consumer Details not the
+                  first sheet, Value before Parameter, an extra column, a blank
+                  row, numeric and date values
+
+Run it after upgrading openpyxl.
+
+Usage:
+    python check_consumer_details.py
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+import pandas as pd
+from openpyxl import Workbook
+
+import account
+from Common.excel_report import ReportWorkbook
+
+# ===== CONFIGURATION =====
+
+PROFILE_ROWS = 2000  # Profile Instant rows in the write-only report
+
+PAYLOAD = {
+    "accountId": "2222550011",
+    "meterSrno": "PO22550011",
+    "supplyTypecode": "10",
+    "sanctionedLoad": "1",
+    "loadUnit": "KW",
+    "meterInstalldate": "2025-10-01",
+    "greenEnergyflag": "N",
+    "prepaidOpeningbalance": "4000"
+}
+
+
+# ===== WORKBOOKS =====
+
+def write_only_report(path: str):
+    """A report laid out as the PE scenarios write it"""
+    report = ReportWorkbook()
+    summary = report.create_sheet("Summary")
+    summary.append_header(["Test Case ID", "Description", "Account ID", "Meter Number", "Status"])
+    summary.append(["PE_101", "Regression check", PAYLOAD["accountId"], PAYLOAD["meterSrno"], "PASS"])
+    consumer = report.create_sheet(account.SHEET_NAME)
+    consumer.append_header(["Parameter", "Value"])
+    for key, value in PAYLOAD.items():
+        consumer.append([key, str(value)])
+    profile = report.create_sheet("Profile Instant")
+    profile.append_header(["data_timestamp", "badge_number", "MD_W"])
+    for index in range(PROFILE_ROWS):
+        profile.append([f"2025-10-01 00:{index % 60:02d}:00", "GPM" + PAYLOAD["meterSrno"], index * 0.5])
+    report.save(path)
+
+
+def standard_workbook(path: str):
+    """A workbook saved in normal mode, with typed values and an irregular layout"""
+    workbook = Workbook()
+    workbook.active.title = "Summary"
+    workbook.active.append(["Status", "PASS"])
+    sheet = workbook.create_sheet(account.SHEET_NAME)
+    sheet.append(["Value", "Note", "Parameter"])
+    for key, value in PAYLOAD.items():
+        if key == "sanctionedLoad":
+            value = 1.5
+        elif key == "meterInstalldate":
+            value = datetime(2025, 10, 1)
+        elif key == "prepaidOpeningbalance":
+            value = 4000
+        sheet.append([value, "n/a", key])
+        if key == "loadUnit":
+            sheet.append([None, None, None])
+    workbook.save(path)
+
+
+# ===== CHECK =====
+
+def reference_row(path: str) -> pd.DataFrame:
+    """The row account.py extracted through pd.read_excel"""
+    df = pd.read_excel(path, sheet_name=account.SHEET_NAME)
+    return account.consumer_details_row(df, account.get_report_identifier(os.path.basename(path)),
+                                        os.path.basename(path))
+
+
+def check(name: str, path: str) -> bool:
+    expected = reference_row(path).to_csv(index=False)
+    actual = account.extract_consumer_details(path).to_csv(index=False)
+    if actual == expected:
+        print(f"{name:<12} OK")
+        return True
+    print(f"{name:<12} MISMATCH\n  expected:\n{expected}  actual:\n{actual}")
+    return False
+
+
+def main() -> int:
+    with tempfile.TemporaryDirectory() as folder:
+        cases = [("write-only", write_only_report), ("standard", standard_workbook)]
+        results = []
+        for name, build in cases:
+            path = os.path.join(folder, f"Report_PE_{name.replace('-', '_')}.xlsx")
+            build(path)
+            results.append(check(name, path))
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
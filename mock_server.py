@@ -0,0 +1,612 @@
+#!/usr/bin/env python3
+"""
+mock_server.py - Local stand-in for the Integration, MDMS and Engine APIs
+
+Serves the endpoints the scenarios and tools call on the stage services, so
+the HTTP side of the pipeline can run offline and be benchmarked reproducibly:
+
+    POST /initial_master_sync/                           Integration  account creation
+    POST /db-service/dailyloads                          MDMS         daily load readback (paged)
+    POST /db-service/profileinstant                      MDMS         profile instant readback (paged)
+    GET  /trigger_task/daily_ledger_task/<date>          Engine       daily ledger trigger
+    GET  /trigger_task/incremental_task/                 Engine       incremental trigger
+    GET  /daily_prepaid_ledger/<account_id>/             Engine       prepaid ledger
+
+All three services share one server (their paths do not overlap). Point the
+tools at it through Common/http_client.py, which rewrites the stage base URLs:
+
+    PE_API_BASE=http://127.0.0.1:8765 python run_suite.py --select PE_101..PE_110
+
+Responses come from one of three modes:
+    synthetic  deterministic generated data (default): accounts created through
+               initial_master_sync are remembered, MDMS readback returns
+               LEDGER_DAYS days per meter, ledgers are generated per account
+    record     every request is forwarded to the real stage service and the
+               response is saved to a cassette folder
+    replay     recorded responses are served from the cassette folder; requests
+               that were not recorded fall back to synthetic data (or 404 with
+               --strict)
+
+Latency (--latency) and errors (--error-rate, --error-status) can be injected
+for all endpoints or per endpoint, with a seeded random generator. GET /__stats
+returns the request and injected error counts per endpoint. The MDMS database
+inserts of the scenarios are not HTTP calls and are not covered.
+
+Usage:
+    python mock_server.py                                        # synthetic, 127.0.0.1:8765
+    python mock_server.py --record cassettes                     # proxy to stage and record
+    python mock_server.py --replay cassettes --strict
+    python mock_server.py --latency 20-80 --latency ledger=300 --error-rate dailyloads=0.05 --seed 7
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import signal
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+import requests
+
+from Common import http_client
+
+# ===== CONFIGURATION =====
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MODES = ("synthetic", "record", "replay")
+STATS_PATH = "/__stats"
+UPSTREAM_TIMEOUT = (10, 300)  # seconds, as http_client
+
+# Endpoints: name -> (method, path pattern, service)
+ENDPOINTS = {
+    'master_sync': ('POST', r'/initial_master_sync/?', 'integration'),
+    'dailyloads': ('POST', r'/db-service/dailyloads/?', 'mdms'),
+    'profileinstant': ('POST', r'/db-service/profileinstant/?', 'mdms'),
+    'daily_ledger_task': ('GET', r'/trigger_task/daily_ledger_task/(?P<date>[^/]+)/?', 'engine'),
+    'incremental_task': ('GET', r'/trigger_task/incremental_task/?', 'engine'),
+    'ledger': ('GET', r'/daily_prepaid_ledger/(?P<account_id>[^/]+)/?', 'engine')
+}
+_ROUTES = [(name, method, re.compile(f"^{pattern}$")) for name, (method, pattern, _) in ENDPOINTS.items()]
+
+# Request headers passed on to the real service when recording
+FORWARD_HEADERS = ('Content-Type', 'Accept', 'Authorization')
+
+# Synthetic data
+LEDGER_START = "2025-10-01"
+LEDGER_DAYS = 31
+PROFILE_PER_DAY = 1          # profile instant records per meter per day
+DEFAULT_SUPPLY_TYPE = "10"
+DEFAULT_LOAD_KW = 1.0
+EC_RATE = 6.5                # Rs. per kWh
+FC_RATE = 110.0              # Rs. per kW per month
+ED_RATE = 0.05               # electricity duty on EC + FC
+OPENING_BALANCE = 4000.0
+BADGE_PREFIX = "GPM"         # badge number = prefix + meter serial ("GPMPO..." for "PO...")
+
+# Logging Configuration
+os.makedirs("logs", exist_ok=True)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('logs/mock_server.log'),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def match_endpoint(method: str, path: str):
+    """(endpoint name, path parameters) of a request, or (None, None)"""
+    for name, endpoint_method, pattern in _ROUTES:
+        match = pattern.match(path)
+        if match and method == endpoint_method:
+            return name, {key: unquote(value) for key, value in match.groupdict().items()}
+    return None, None
+
+
+# ===== INJECTION =====
+
+def parse_latency(text: str):
+    """Command line latency "[ENDPOINT=]MS[-MS]" -> (endpoint or None, (low, high) in seconds)"""
+    endpoint, low, high = _parse_spec(text)
+    low = float(low)
+    high = float(high) if high else low
+    if low < 0 or high < low:
+        raise argparse.ArgumentTypeError(f"Invalid latency range: {text}")
+    return endpoint, (low / 1000, high / 1000)
+
+
+def parse_error_rate(text: str):
+    """Command line error rate "[ENDPOINT=]FRACTION" -> (endpoint or None, fraction)"""
+    endpoint, rate, _ = _parse_spec(text)
+    rate = float(rate)
+    if not 0 <= rate <= 1:
+        raise argparse.ArgumentTypeError(f"Error rate must be between 0 and 1: {text}")
+    return endpoint, rate
+
+
+def _parse_spec(text: str):
+    endpoint, separator, value = text.rpartition('=')
+    if separator and endpoint not in ENDPOINTS:
+        raise argparse.ArgumentTypeError(f"Unknown endpoint {endpoint!r} (expected one of {', '.join(ENDPOINTS)})")
+    low, _, high = value.partition('-')
+    try:
+        float(low)
+        if high:
+            float(high)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid value: {text}")
+    return endpoint or None, low, high
+
+
+class Injector:
+    """Per-endpoint latency and error injection (seeded, shared by the handler threads)"""
+
+    def __init__(self, latency=None, error_rates=None, error_status: int = 503, seed: int = None):
+        """
+        Args:
+            latency: (endpoint or None, (low, high) seconds) pairs; None applies to every endpoint
+            error_rates: (endpoint or None, fraction) pairs
+            error_status: HTTP status of injected errors (503 is retried by http_client for idempotent calls)
+            seed: Random seed, for reproducible runs
+        """
+        self.latency = dict(latency or [])
+        self.error_rates = dict(error_rates or [])
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def delay(self, endpoint: str) -> float:
+        low, high = self.latency.get(endpoint, self.latency.get(None, (0.0, 0.0)))
+        if high <= 0:
+            return 0.0
+        with self.lock:
+            return self.random.uniform(low, high)
+
+    def fails(self, endpoint: str) -> bool:
+        rate = self.error_rates.get(endpoint, self.error_rates.get(None, 0.0))
+        if rate <= 0:
+            return False
+        with self.lock:
+            return self.random.random() < rate
+
+
+# ===== RECORD / REPLAY =====
+
+class Cassettes:
+    """Recorded responses, one JSON file per request under <folder>/<endpoint>/"""
+
+    def __init__(self, folder: str):
+        self.folder = folder
+
+    @staticmethod
+    def key(method: str, path: str, query: str, body: bytes) -> str:
+        """Request fingerprint: method, path, sorted query and (canonical JSON) body"""
+        try:
+            body_text = json.dumps(json.loads(body), sort_keys=True) if body else ""
+        except ValueError:
+            body_text = body.decode('utf-8', errors='replace')
+        query_text = "&".join(f"{name}={value}" for name, value in sorted(parse_qsl(query, keep_blank_values=True)))
+        return hashlib.sha1(f"{method} {path}?{query_text}\n{body_text}".encode('utf-8')).hexdigest()
+
+    def path(self, endpoint: str, key: str) -> str:
+        return os.path.join(self.folder, endpoint, f"{key}.json")
+
+    def load(self, endpoint: str, key: str):
+        """Recorded response dict, or None"""
+        try:
+            with open(self.path(endpoint, key), encoding='utf-8') as source:
+                return json.load(source)
+        except FileNotFoundError:
+            return None
+
+    def save(self, endpoint: str, key: str, request: dict, status: int, content_type: str, body: bytes):
+        path = self.path(endpoint, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        recording = {
+            'request': request,
+            'status': status,
+            'content_type': content_type,
+            'body': body.decode('utf-8', errors='replace'),
+            'recorded_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+        temporary = f"{path}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as target:
+            json.dump(recording, target, indent=2)
+        os.replace(temporary, path)
+
+
+# ===== SYNTHETIC DATA =====
+
+def badge_number(meter: str) -> str:
+    """Badge number of a meter serial number, as the scenarios generate it (differs from the serial)"""
+    return f"{BADGE_PREFIX}{meter}"
+
+
+class SyntheticData:
+    """Deterministic generated responses (the same request always gets the same data)"""
+
+    def __init__(self, ledger_start: str = LEDGER_START, ledger_days: int = LEDGER_DAYS,
+                 profile_per_day: int = PROFILE_PER_DAY):
+        self.start = datetime.strptime(ledger_start, '%Y-%m-%d')
+        self.days = ledger_days
+        self.profile_per_day = profile_per_day
+        self.accounts = {}  # accountId -> master sync payload
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _random(*parts) -> random.Random:
+        return random.Random(zlib.crc32("|".join(str(part) for part in parts).encode('utf-8')))
+
+    def master_sync(self, payload: dict) -> dict:
+        account_id = str(payload.get('accountId', ''))
+        with self.lock:
+            self.accounts[account_id] = payload
+        return {"status": "success", "message": "Account synced successfully", "accountId": account_id}
+
+    def trigger(self, task: str, params: dict, query: dict) -> dict:
+        return {"status": "success", "message": f"{task} triggered", **params, **query}
+
+    # ----- MDMS -----
+
+    def daily_load_records(self, meter: str):
+        rng = self._random("dailyload", meter)
+        import_wh = export_wh = 0.0
+        for day in range(self.days + 1):
+            import_wh += round(rng.uniform(0, 8000), 1)
+            timestamp = self.start + timedelta(days=day)
+            yield {
+                "dailyload_datetime": timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+                "badge_number": badge_number(meter),
+                "meter_serial_number": meter,
+                "data_source": "HES",
+                "data_type": "DLP",
+                "export_Wh": export_wh,
+                "import_Wh": round(import_wh, 1),
+                "export_VAh": export_wh,
+                "import_VAh": round(import_wh * 1.02, 1)
+            }
+
+    def profile_instant_records(self, meter: str):
+        rng = self._random("profileinstant", meter)
+        step = timedelta(days=1) / max(1, self.profile_per_day)
+        for index in range(self.days * self.profile_per_day):
+            timestamp = self.start + step * index
+            md_w = round(rng.uniform(0, 1300), 1)
+            yield {
+                "data_timestamp": timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+                "badge_number": badge_number(meter),
+                "meter_serial_number": meter,
+                "meter_type": "1P",
+                "MD_W": md_w,
+                "MD_VA": round(md_w * 1.05, 1),
+                "MD_W_datetime": timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+                "MD_VA_datetime": timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+                "voltage": round(rng.uniform(225, 240), 1),
+                "frequency": 50.0
+            }
+
+    def mdms_page(self, endpoint: str, payload: dict) -> dict:
+        """One page of the meters' records, in meter order (as the MDMS db-service pages them)"""
+        meters = [str(meter) for meter in payload.get('badge_numbers') or []]
+        page = max(1, int(payload.get('page', 1)))
+        limit = max(1, int(payload.get('limit', 100)))
+        per_meter = self.days + 1 if endpoint == 'dailyloads' else self.days * self.profile_per_day
+        total = per_meter * len(meters)
+
+        records = []
+        first = (page - 1) * limit
+        for index, meter in enumerate(meters):
+            # Skip the meters before the page without generating their records
+            offset = index * per_meter
+            if offset + per_meter <= first or offset >= first + limit:
+                continue
+            generated = self.daily_load_records(meter) if endpoint == 'dailyloads' else self.profile_instant_records(meter)
+            for position, record in enumerate(generated, start=offset):
+                if first <= position < first + limit:
+                    records.append(record)
+        return {"data": records, "page": page, "limit": limit, "total": total}
+
+    # ----- Engine -----
+
+    def ledger(self, account_id: str, query: dict) -> list:
+        """Daily prepaid ledger of one account (from the start_date query parameter on, if given)"""
+        with self.lock:
+            account = self.accounts.get(account_id, {})
+        meter = query.get('meter_number') or account.get('meterSrno') or f"M{account_id}"
+        supply_type = str(account.get('supplyTypecode') or DEFAULT_SUPPLY_TYPE)
+        load = float(account.get('sanctionedLoad') or DEFAULT_LOAD_KW)
+        opening = float(account.get('prepaidOpeningbalance') or OPENING_BALANCE)
+        since = query.get('start_date')
+
+        rng = self._random("ledger", account_id, meter)
+        daily_fc = round(FC_RATE * load / self.days, 4)
+        totals = {'consumption': 0.0, 'ec': 0.0, 'fc': 0.0, 'ed': 0.0, 'final': 0.0}
+        rows = []
+        balance = opening
+        for day in range(self.days):
+            start = self.start + timedelta(days=day)
+            consumption = round(rng.uniform(0, 8), 3)
+            ec = round(consumption * EC_RATE, 4)
+            ed = round((ec + daily_fc) * ED_RATE, 4)
+            final = round(ec + daily_fc + ed, 4)
+            for name, value in (('consumption', consumption), ('ec', ec), ('fc', daily_fc), ('ed', ed), ('final', final)):
+                totals[name] = round(totals[name] + value, 4)
+            row = {
+                "start_date_time": start.strftime('%Y-%m-%dT%H:%M:%S'),
+                "end_date_time": (start + timedelta(days=1)).strftime('%Y-%m-%dT%H:%M:%S'),
+                "account_id": account_id,
+                "meter_number": meter,
+                "applied_supply_type_code": supply_type,
+                "daily_consumption": consumption,
+                "cumm_daily_consumption_mtd": totals['consumption'],
+                "daily_consumption_in_rupees": ec,
+                "cumm_daily_consumption_rupees_mtd": totals['ec'],
+                "max_demand": round(rng.uniform(0, load * 1.3), 3),
+                "daily_fixed_charges": daily_fc,
+                "cumm_daily_fixed_charges_mtd": totals['fc'],
+                "daily_ec_final_charge": ec,
+                "cumm_ec_final_charges_mtd": totals['ec'],
+                "daily_fc_final_charge": daily_fc,
+                "cumm_fc_final_charges_mtd": totals['fc'],
+                "daily_ec_plus_fc_charge": round(ec + daily_fc, 4),
+                "cumm_daily_ec_plus_fc_charge_mtd": round(totals['ec'] + totals['fc'], 4),
+                "daily_ed_charge": ed,
+                "cumm_ed_charges_mtd": totals['ed'],
+                "daily_final_charge": final,
+                "cumm_daily_final_charge_mtd": totals['final'],
+                "opening_balance": round(balance, 4),
+                "closing_balance": round(balance - final, 4)
+            }
+            balance -= final
+            if since is None or row["start_date_time"][:10] >= since:
+                rows.append(row)
+        return rows
+
+
+# ===== SERVER =====
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    """Routes a request to the injection, record/replay and synthetic layers"""
+
+    protocol_version = "HTTP/1.1"  # keep-alive, like the stage services behind http_client's pools
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def handle_request(self, method: str):
+        mock = self.server.mock
+        parts = urlsplit(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b""
+
+        if method == 'GET' and parts.path == STATS_PATH:
+            self.send_json(200, mock.stats())
+            return
+
+        endpoint, params = match_endpoint(method, parts.path)
+        if endpoint is None:
+            self.send_json(404, {"detail": f"Not found: {method} {parts.path}"})
+            return
+        mock.count(endpoint, 'requests')
+
+        delay = mock.injector.delay(endpoint)
+        if delay:
+            time.sleep(delay)
+        if mock.injector.fails(endpoint):
+            mock.count(endpoint, 'injected_errors')
+            self.send_json(mock.injector.error_status, {"detail": "Injected error"})
+            return
+
+        if mock.mode == 'record':
+            self.record(endpoint, method, parts, body)
+            return
+        if mock.mode == 'replay':
+            key = Cassettes.key(method, parts.path, parts.query, body)
+            recording = mock.cassettes.load(endpoint, key)
+            if recording is not None:
+                mock.count(endpoint, 'replayed')
+                self.send_body(recording['status'], recording['body'].encode('utf-8'), recording['content_type'])
+                return
+            mock.count(endpoint, 'replay_misses')
+            if mock.strict:
+                self.send_json(404, {"detail": f"No recorded response for {method} {self.path}"})
+                return
+
+        self.synthetic(endpoint, params, dict(parse_qsl(parts.query)), body)
+
+    def synthetic(self, endpoint: str, params: dict, query: dict, body: bytes):
+        data = self.server.mock.data
+        try:
+            payload = json.loads(body) if body else {}
+        except ValueError:
+            self.send_json(400, {"detail": "Request body is not JSON"})
+            return
+
+        if endpoint == 'master_sync':
+            self.send_json(200, data.master_sync(payload))
+        elif endpoint in ('dailyloads', 'profileinstant'):
+            self.send_json(200, data.mdms_page(endpoint, payload))
+        elif endpoint in ('daily_ledger_task', 'incremental_task'):
+            self.send_json(200, data.trigger(endpoint, params, query))
+        else:
+            self.send_json(200, data.ledger(params['account_id'], query))
+
+    def record(self, endpoint: str, method: str, parts, body: bytes):
+        """Forward the request to the real service, save and return its response"""
+        mock = self.server.mock
+        upstream = http_client.SERVICES[ENDPOINTS[endpoint][2]] + self.path
+        headers = {name: self.headers[name] for name in FORWARD_HEADERS if self.headers.get(name)}
+        try:
+            response = mock.upstream.request(method, upstream, data=body or None, headers=headers,
+                                             timeout=UPSTREAM_TIMEOUT)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Recording {method} {upstream} failed: {e}")
+            self.send_json(502, {"detail": f"Upstream request failed: {e}"})
+            return
+
+        content_type = response.headers.get('Content-Type', 'application/json')
+        request = {
+            'method': method,
+            'path': parts.path,
+            'query': parts.query,
+            'body': body.decode('utf-8', errors='replace')
+        }
+        key = Cassettes.key(method, parts.path, parts.query, body)
+        mock.cassettes.save(endpoint, key, request, response.status_code, content_type, response.content)
+        mock.count(endpoint, 'recorded')
+        self.send_body(response.status_code, response.content, content_type)
+
+    def send_json(self, status: int, data):
+        self.send_body(status, json.dumps(data).encode('utf-8'), 'application/json')
+
+    def send_body(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MockServer:
+    """Threaded mock of the three services; start() runs it in the background (for benchmarks)"""
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, mode: str = "synthetic",
+                 cassette_folder: str = None, strict: bool = False, injector: Injector = None,
+                 data: SyntheticData = None):
+        """
+        Args:
+            host: Interface to listen on
+            port: Port (0 picks a free one)
+            mode: "synthetic", "record" or "replay"
+            cassette_folder: Recorded responses (record / replay)
+            strict: In replay mode, answer 404 instead of synthetic data for unrecorded requests
+            injector: Latency / error injection (default: none)
+            data: Synthetic data generator (default: SyntheticData())
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode {mode!r} (expected one of {', '.join(MODES)})")
+        if mode != 'synthetic' and not cassette_folder:
+            raise ValueError(f"Mode {mode!r} needs a cassette folder")
+        self.mode = mode
+        self.strict = strict
+        self.cassettes = Cassettes(cassette_folder) if cassette_folder else None
+        self.injector = injector or Injector()
+        self.data = data or SyntheticData()
+        self.upstream = requests.Session() if mode == 'record' else None
+        self.counts = {}
+        self.counts_lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), MockRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.mock = self
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, endpoint: str, counter: str):
+        with self.counts_lock:
+            counts = self.counts.setdefault(endpoint, {})
+            counts[counter] = counts.get(counter, 0) + 1
+
+    def stats(self) -> dict:
+        with self.counts_lock:
+            return {endpoint: dict(counts) for endpoint, counts in self.counts.items()}
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def start(self) -> str:
+        """Serve on a background thread and return the base URL"""
+        self.thread = threading.Thread(target=self.serve_forever, name="mock-server", daemon=True)
+        self.thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.upstream is not None:
+            self.upstream.close()
+
+
+# ===== MAIN FUNCTION =====
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Local mock of the Integration, MDMS and Engine APIs")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"Interface to listen on (default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port (default: {DEFAULT_PORT})")
+    modes = parser.add_mutually_exclusive_group()
+    modes.add_argument("--record", metavar="FOLDER",
+                       help="Forward every request to the stage services and record the responses in FOLDER")
+    modes.add_argument("--replay", metavar="FOLDER", help="Serve the responses recorded in FOLDER")
+    parser.add_argument("--strict", action="store_true",
+                        help="With --replay, answer 404 for requests that were not recorded (default: synthetic data)")
+    parser.add_argument("--latency", action="append", type=parse_latency, default=[], metavar="[ENDPOINT=]MS[-MS]",
+                        help="Added response time, fixed or uniform in a range; repeat per endpoint "
+                             f"({', '.join(ENDPOINTS)})")
+    parser.add_argument("--error-rate", action="append", type=parse_error_rate, default=[],
+                        metavar="[ENDPOINT=]FRACTION", help="Share of requests answered with --error-status")
+    parser.add_argument("--error-status", type=int, default=503, help="Status of injected errors (default: 503)")
+    parser.add_argument("--seed", type=int, help="Random seed of the latency / error injection")
+    parser.add_argument("--ledger-start", default=LEDGER_START,
+                        help=f"First day of the synthetic ledgers and MDMS data (default: {LEDGER_START})")
+    parser.add_argument("--ledger-days", type=int, default=LEDGER_DAYS,
+                        help=f"Days of synthetic data per account / meter (default: {LEDGER_DAYS})")
+    parser.add_argument("--profile-per-day", type=int, default=PROFILE_PER_DAY,
+                        help=f"Synthetic profile instant records per meter per day (default: {PROFILE_PER_DAY})")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Main function to run the mock server until interrupted"""
+    args = parse_args(argv)
+    mode = "record" if args.record else "replay" if args.replay else "synthetic"
+    injector = Injector(args.latency, args.error_rate, args.error_status, args.seed)
+    data = SyntheticData(args.ledger_start, args.ledger_days, args.profile_per_day)
+    server = MockServer(args.host, args.port, mode, args.record or args.replay, args.strict, injector, data)
+
+    logger.info("=" * 80)
+    logger.info(f"Mock API server ({mode}) listening on {server.base_url}")
+    if server.cassettes is not None:
+        logger.info(f"Cassettes: {os.path.abspath(server.cassettes.folder)}")
+    for endpoint, (low, high) in sorted(injector.latency.items(), key=lambda item: str(item[0])):
+        logger.info(f"Latency {endpoint or 'all endpoints'}: {low * 1000:.0f}-{high * 1000:.0f} ms")
+    for endpoint, rate in sorted(injector.error_rates.items(), key=lambda item: str(item[0])):
+        logger.info(f"Errors {endpoint or 'all endpoints'}: {rate:.1%} answered {injector.error_status}")
+    logger.info(f"Point the tools at it with: {http_client.API_BASE_ENV}={server.base_url}")
+    logger.info("=" * 80)
+
+    def interrupt(signum, frame):
+        raise KeyboardInterrupt  # stop on SIGTERM (benchmark scripts) as on Ctrl+C
+
+    signal.signal(signal.SIGTERM, interrupt)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        logger.info(f"Requests served: {json.dumps(server.stats())}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+run_suite.py - Run Test_Plan/PE_*.py scenarios in-process on a worker pool
+
+Imports each PE scenario module once per worker and runs its steps
+(create account, fill daily load, fill profile instant, trigger ledger,
+generate report) concurrently, then reports how long each scenario took.
+
+With --mode async the asyncio pipeline is used instead: many accounts per
+scenario are kept in flight, with separate concurrency limits for the
+Integration, MDMS and Engine APIs and for the database.
+
+With --batch-readback the reports are generated after every scenario has been
+triggered: the meters of all accounts are read back from MDMS in large
+badge_numbers batches (--readback-chunk meters per query) and each report is
+then written from the prefetched records.
+
+Usage:
+    python run_suite.py                              # all scenarios, 4 workers
+    python run_suite.py --jobs 8 --select PE_101..PE_140
+    python run_suite.py --select PE_101,PE_106 --mode process
+    python run_suite.py --mode async --accounts 20 --db-limit 8 --select PE_101..PE_110
+    python run_suite.py --jobs 8 --batch-readback --readback-chunk 100
+    python run_suite.py --columnar                   # also write Parquet for account.py --columnar
+"""
+
+import argparse
+import csv
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+from Common import db_pool, http_client, mdms_client, result_store
+from Common.scenarios import select_scenarios, load_scenario, run_scenario, run_report, new_result
+from Common.async_pipeline import DEFAULT_LIMITS, run_async_pipeline
+
+# ===== CONFIGURATION =====
+
+DEFAULT_JOBS = 4
+SUMMARY_CSV = os.path.join("Result_File", "Suite_Summary.csv")
+STEP_NAMES = [
+    "load_scenario",
+    "create_account",
+    "fill_daily_load_data",
+    "fill_profile_instant_data",
+    "trigger_prepaid_ledger",
+    "generate_excel_report"
+]
+
+# Logging Configuration (configured before any PE module is imported so that
+# their module-level basicConfig calls do not take over the root logger)
+os.makedirs("logs", exist_ok=True)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('logs/run_suite.log'),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+# ===== SUITE EXECUTION =====
+
+def run_suite(scenario_ids, jobs: int = DEFAULT_JOBS, mode: str = "thread", verbose: bool = False,
+              report: bool = True):
+    """
+    Run the given scenarios on a thread or process pool.
+
+    Args:
+        scenario_ids: Scenario IDs to run (e.g. ["PE_101", "PE_102"])
+        jobs: Number of scenarios in flight at once
+        mode: "thread" (shared imports, best for I/O-bound runs) or "process"
+        verbose: Echo each scenario's log lines to the console
+        report: Generate each report right away; with False scenarios stop at
+            'Triggered' for run_batched_reports()
+
+    Returns:
+        List of result dicts, in scenario order
+    """
+    executor_class = ProcessPoolExecutor if mode == "process" else ThreadPoolExecutor
+    results = {}
+
+    logger.info("=" * 80)
+    logger.info(f"Running {len(scenario_ids)} scenario(s) with {jobs} {mode} worker(s)")
+    logger.info("=" * 80)
+
+    pool_options = {}
+    store = result_store.active()
+    if mode == "process" and store is not None:
+        # Process workers publish their reports into the same columnar run
+        pool_options = {'initializer': result_store.enable, 'initargs': (store.root, store.run_id)}
+
+    with executor_class(max_workers=jobs, **pool_options) as executor:
+        futures = {executor.submit(run_scenario, scenario_id, verbose, report): scenario_id
+                   for scenario_id in scenario_ids}
+        for future in as_completed(futures):
+            scenario_id = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = new_result(scenario_id)
+                result['failed_step'] = 'worker'
+                result['error'] = str(e)
+            results[scenario_id] = result
+
+            if result['status'] in ('Completed', 'Triggered'):
+                logger.info(f"[OK] {scenario_id} {result['status'].lower()} in {result['duration']:.2f}s (Account: {result['account_id']})")
+            else:
+                logger.error(f"[FAILED] {scenario_id} failed at {result['failed_step']} after {result['duration']:.2f}s")
+
+    return [results[scenario_id] for scenario_id in scenario_ids]
+
+
+def run_batched_reports(results, jobs: int = DEFAULT_JOBS, chunk_size: int = mdms_client.BATCH_SIZE,
+                        verbose: bool = False):
+    """
+    Read back the MDMS data of every triggered scenario in batches, then write the reports.
+
+    Daily load and profile instant records are fetched for all meters at once,
+    chunk_size meters per badge_numbers list, and split per meter, so the report
+    step no longer makes two MDMS queries per scenario.
+
+    Args:
+        results: Results from run_suite(..., report=False); updated in place
+        jobs: Reports written concurrently
+        chunk_size: Meters per batched MDMS query
+        verbose: Echo each scenario's log lines to the console
+
+    Returns:
+        The results list
+    """
+    triggered = [result for result in results if result['status'] == 'Triggered']
+    if not triggered:
+        return results
+
+    # Meters per MDMS endpoint (every scenario names its own API URLs)
+    meters_by_url = {}
+    for result in triggered:
+        module = load_scenario(result['scenario'], verbose=verbose)
+        for url in (module.DAILYLOAD_API_URL, module.PROFILE_INSTANT_API_URL):
+            meters_by_url.setdefault(url, []).append(result['meter_number'])
+
+    logger.info("=" * 80)
+    logger.info(f"Batched MDMS readback for {len(triggered)} meter(s), {chunk_size} meter(s) per query")
+    logger.info("=" * 80)
+    started = time.perf_counter()
+    for url, meters in meters_by_url.items():
+        records = mdms_client.prefetch(url, meters, chunk_size)
+        logger.info(f"Prefetched {records} record(s) from {url}")
+    logger.info(f"Batched readback finished in {time.perf_counter() - started:.2f}s")
+
+    try:
+        # Reports are written in this process, where the prefetched records live
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = {executor.submit(run_report, result, verbose): result for result in triggered}
+            for future in as_completed(futures):
+                result = future.result()
+                if result['status'] == 'Completed':
+                    logger.info(f"[OK] {result['scenario']} completed in {result['duration']:.2f}s (Account: {result['account_id']})")
+                else:
+                    logger.error(f"[FAILED] {result['scenario']} failed at {result['failed_step']} after {result['duration']:.2f}s")
+    finally:
+        mdms_client.clear_prefetched()
+
+    return results
+
+
+def save_summary(results, output_file: str = SUMMARY_CSV):
+    """Write one row per scenario with total and per-step durations"""
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    fieldnames = ["scenario", "status", "failed_step", "account_id", "meter_number", "report_file", "duration"] + STEP_NAMES + ["error"]
+
+    with open(output_file, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        for result in results:
+            row = {key: result.get(key) for key in fieldnames if key not in STEP_NAMES}
+            for step_name in STEP_NAMES:
+                row[step_name] = result['step_durations'].get(step_name)
+            writer.writerow(row)
+
+    logger.info(f"Suite summary saved: {output_file}")
+
+
+def log_pool_stats():
+    """Log the database connection pool statistics of this process"""
+    for name, stats in db_pool.all_stats().items():
+        logger.info(f"DB pool {name}: " + ", ".join(f"{key}={value}" for key, value in stats.items()))
+
+
+def log_summary(results, wall_clock: float):
+    """Log per-scenario durations and overall totals"""
+    completed = [r for r in results if r['status'] == 'Completed']
+    failed = [r for r in results if r['status'] != 'Completed']
+    scenario_time = sum(r['duration'] for r in results)
+
+    logger.info("=" * 80)
+    logger.info("Suite Summary")
+    logger.info("=" * 80)
+    for result in results:
+        status = result['status'] if result['status'] == 'Completed' else f"Failed at {result['failed_step']}"
+        logger.info(f"{result['scenario']:<8} {str(result['account_id']):<12} {result['duration']:>9.2f}s  {status}")
+    logger.info("-" * 80)
+    logger.info(f"Total scenarios: {len(results)}")
+    logger.info(f"Completed: {len(completed)}")
+    logger.info(f"Failed: {len(failed)}")
+    logger.info(f"Sum of scenario durations: {scenario_time:.2f}s")
+    logger.info(f"Wall clock: {wall_clock:.2f}s")
+    logger.info("=" * 80)
+
+
+# ===== MAIN FUNCTION =====
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run PE test plan scenarios in parallel")
+    parser.add_argument("--jobs", "-j", type=int, default=DEFAULT_JOBS,
+                        help=f"Number of scenarios to run concurrently (default: {DEFAULT_JOBS})")
+    parser.add_argument("--select", "-s", action="append",
+                        help="Scenarios to run: PE_101, PE_101..PE_140 or a comma separated list (repeatable)")
+    parser.add_argument("--mode", choices=["thread", "process", "async"], default="thread",
+                        help="Worker pool type (default: thread); async runs the asyncio account pipeline")
+    parser.add_argument("--accounts", type=int, default=1,
+                        help="Accounts to create per scenario (async mode only, default: 1)")
+    for backend, limit in DEFAULT_LIMITS.items():
+        parser.add_argument(f"--{backend}-limit", type=int, default=limit,
+                            help=f"Max concurrent {backend} calls (async mode only, default: {limit})")
+    parser.add_argument("--batch-readback", action="store_true",
+                        help="Read back MDMS data for all meters in batches before writing the reports "
+                             "(thread/process mode)")
+    parser.add_argument("--readback-chunk", type=int, default=mdms_client.BATCH_SIZE,
+                        help=f"Meters per batched MDMS query (default: {mdms_client.BATCH_SIZE})")
+    parser.add_argument("--verbose", "-v", action="store_true",
+                        help="Echo each scenario's log lines to the console")
+    parser.add_argument("--summary", default=SUMMARY_CSV,
+                        help=f"Per-scenario timing CSV (default: {SUMMARY_CSV})")
+    parser.add_argument("--columnar", action="store_true",
+                        help="Also write each report's consumer details, daily load and profile instant as Parquet")
+    parser.add_argument("--columnar-root", default=result_store.RESULT_STORE_ROOT,
+                        help=f"Columnar result store folder (default: {result_store.RESULT_STORE_ROOT})")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Main function to run the selected scenarios"""
+    args = parse_args(argv)
+
+    try:
+        scenario_ids = select_scenarios(args.select)
+    except ValueError as e:
+        logger.error(str(e))
+        return 2
+
+    if not scenario_ids:
+        logger.error("No scenarios selected")
+        return 2
+
+    if args.batch_readback and args.mode == "async":
+        logger.error("--batch-readback is not supported with --mode async")
+        return 2
+
+    if args.columnar:
+        if not result_store.available():
+            logger.error("--columnar needs pyarrow (pip install pyarrow)")
+            return 2
+        result_store.enable(args.columnar_root)
+
+    started = time.perf_counter()
+    if args.mode == "async":
+        limits = {backend: max(1, getattr(args, f"{backend}_limit")) for backend in DEFAULT_LIMITS}
+        db_pool.configure(limits['db'])
+        http_client.configure(pool_size=max(limits['integration'], limits['engine'], limits['mdms']))
+        logger.info(f"Running {len(scenario_ids)} scenario(s) x {args.accounts} account(s) with limits {limits}")
+        results = run_async_pipeline(scenario_ids, accounts_per_scenario=max(1, args.accounts),
+                                     limits=limits, verbose=args.verbose)
+    else:
+        # Process workers each build their own pool; the stats below cover thread/async runs
+        db_pool.configure(max(1, args.jobs))
+        http_client.configure(pool_size=max(1, args.jobs))
+        results = run_suite(scenario_ids, jobs=max(1, args.jobs), mode=args.mode, verbose=args.verbose,
+                            report=not args.batch_readback)
+        if args.batch_readback:
+            run_batched_reports(results, jobs=max(1, args.jobs), chunk_size=max(1, args.readback_chunk),
+                                verbose=args.verbose)
+    wall_clock = time.perf_counter() - started
+
+    log_summary(results, wall_clock)
+    log_pool_stats()
+    db_pool.close_all()
+    http_client.close_all()
+    save_summary(results, args.summary)
+
+    return 0 if all(r['status'] == 'Completed' for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,535 @@
+#!/usr/bin/env python3
+"""
+validate_fleet.py - Validate the prepaid ledger of every account in one run
+
+Reads the accounts from Consumer_details.csv (written by account.py), from
+the local ledger store (written by Download_Ledger.py --incremental) or from
+the columnar result store (written by Download_Ledger.py --columnar) and runs
+one Formula validator over each of them on a process pool. Each worker
+imports pandas/numpy and the validator once; accounts are handed out in
+chunks. The rule set of every account is picked from its ledger's
+applied_supply_type_code (see Common/tariff_catalog.py); an account whose
+supply type is not in the catalog is reported UNSUPPORTED, not validated.
+
+The validator is chosen per account: the scenario's own validator when its
+scenario follows a narrower rule set than its tariff (SCENARIO_FORMULAS),
+else the "formula" of the account's tariff in the catalog. --formula applies
+one validator to every account instead.
+
+The result is one consolidated PASS/FAIL summary (logged and saved to Excel
+with a Summary sheet and a Mismatches sheet listing every mismatching day),
+optionally plus the usual comparison workbook per account.
+
+Usage:
+    python validate_fleet.py                                    # Consumer_details.csv, ledgers from the API
+    python validate_fleet.py --source store --store ledger_store.sqlite
+    python validate_fleet.py --source columnar --columnar     # Parquet ledgers in, Parquet comparisons out
+    python validate_fleet.py --jobs 16 --start 2025-11-01 --end 2025-12-01 --reports
+    python validate_fleet.py --formula 101                      # one validator for every account
+    python validate_fleet.py --trace --trace-accounts 2222550013 --trace-days 1-10
+"""
+
+import argparse
+import importlib
+import logging
+import math
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from Common import calc_trace, result_store, tariff_catalog
+from Common.ledger_store import LedgerStore, DEFAULT_STORE_PATH
+from Common.tariff_catalog import UnsupportedTariffError
+
+# ===== CONFIGURATION =====
+
+DEFAULT_JOBS = os.cpu_count() or 4
+FORMULAS = ("101", "102", "103")
+
+# Validator per scenario, for scenarios that follow a narrower rule set than their
+# tariff (Formula_101 / Formula_102 are the validators of PE_101 / PE_102); every
+# other account uses the "formula" of its tariff in Common/tariff_catalog.json
+SCENARIO_FORMULAS = {
+    "PE_101": "101",
+    "PE_102": "102"
+}
+SCENARIO_PATTERN = re.compile(r"PE_\d+")
+CSV_FILE = "Consumer_details.csv"
+SUMMARY_FILE = os.path.join("Result_File", "Fleet_Validation.xlsx")
+REPORT_FOLDER = os.path.join("Result_File", "Fleet")
+CHUNKS_PER_WORKER = 4  # default chunk size spreads the accounts over ~4 chunks per worker
+IST_OFFSET = pd.Timedelta(hours=5, minutes=30)  # meter install dates are local (IST), ledger times UTC
+
+SUMMARY_COLUMNS = [
+    "Report_ID", "account_id", "meter_number", "supply_type_code", "tariff", "formula", "formula_source",
+    "opening_balance", "opening_balance_source", "status", "records", "matched", "mismatched",
+    "mismatch_columns", "report_file", "duration", "error"
+]
+
+# Logging Configuration (configured before any Formula module is imported so that
+# their module-level basicConfig calls do not take over the root logger)
+os.makedirs("logs", exist_ok=True)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('logs/validate_fleet.log'),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+_worker = {}  # per-process state set up by init_worker()
+
+
+# ===== ACCOUNTS =====
+
+def number_or_none(value):
+    """Float value of a CSV/ledger cell, or None when it is empty or not a number"""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+
+def read_accounts_csv(csv_file: str = CSV_FILE):
+    """
+    Accounts listed in Consumer_details.csv.
+
+    Returns:
+        List of dicts with Report_ID, account_id, meter_number and, when the CSV
+        has them, supply_type_code, sanctioned_load, load_unit, opening_balance and install_date
+    """
+    df = pd.read_csv(csv_file, dtype={'accountId': str, 'meterSrno': str, 'Report_ID': str, 'loadUnit': str,
+                                      'meterInstalldate': str, 'supplyTypecode': str})
+    if 'accountId' not in df.columns or 'meterSrno' not in df.columns:
+        raise ValueError(f"{csv_file} must contain 'accountId' and 'meterSrno' columns (found: {list(df.columns)})")
+
+    accounts = []
+    for _, row in df.dropna(subset=['accountId', 'meterSrno']).iterrows():
+        account_id, meter_number = row['accountId'].strip(), row['meterSrno'].strip()
+        if not account_id or not meter_number:
+            continue
+        load_unit = row.get('loadUnit')
+        accounts.append({
+            'Report_ID': str(row['Report_ID']).strip() if pd.notna(row.get('Report_ID')) else f"{account_id}_{meter_number}",
+            'account_id': account_id,
+            'meter_number': meter_number,
+            'supply_type_code': tariff_catalog.normalize_code(row.get('supplyTypecode')),
+            'sanctioned_load': number_or_none(row.get('sanctionedLoad')),
+            'load_unit': load_unit.strip() if isinstance(load_unit, str) and load_unit.strip() else None,
+            'opening_balance': number_or_none(row.get('prepaidOpeningbalance')),
+            'install_date': row.get('meterInstalldate') if pd.notna(row.get('meterInstalldate')) else None
+        })
+    return accounts
+
+
+def read_accounts_columnar(root: str = result_store.RESULT_STORE_ROOT, run_id: str = None):
+    """
+    Accounts whose ledgers are in the columnar result store.
+
+    The supply type, sanctioned load, load unit, opening balance and install
+    date come from the consumer details of the same report (run_suite.py --columnar), when they are stored.
+    """
+    store = result_store.ResultStore(root)
+    run_id = run_id or store.latest_run("ledger")
+    details_run = store.latest_run("consumer_details")
+    accounts = []
+    for report_id in store.report_ids("ledger", run_id):
+        ids = store.read("ledger", report_id, run_id, columns=['account_id', 'meter_number'])
+        if ids.empty:
+            continue
+        details = store.read("consumer_details", report_id, details_run, columns=['Parameter', 'Value']) \
+            if details_run else pd.DataFrame(columns=['Parameter', 'Value'])
+        values = {str(parameter).strip().lower(): value for parameter, value in zip(details['Parameter'], details['Value'])}
+        load_unit = values.get('loadunit')
+        accounts.append({
+            'Report_ID': report_id,
+            'account_id': str(ids['account_id'].iloc[0]),
+            'meter_number': str(ids['meter_number'].iloc[0]),
+            'ledger_run': run_id,
+            'supply_type_code': tariff_catalog.normalize_code(values.get('supplytypecode')),
+            'sanctioned_load': number_or_none(values.get('sanctionedload')),
+            'load_unit': load_unit.strip() if isinstance(load_unit, str) and load_unit.strip() else None,
+            'opening_balance': number_or_none(values.get('prepaidopeningbalance')),
+            'install_date': values.get('meterinstalldate')
+        })
+    return accounts
+
+
+def read_accounts_store(store_path: str = DEFAULT_STORE_PATH):
+    """Accounts synced into the local ledger store"""
+    with LedgerStore(store_path) as store:
+        return [{'Report_ID': f"{account_id}_{meter_number}", 'account_id': account_id, 'meter_number': meter_number}
+                for account_id, meter_number in store.accounts()]
+
+
+def scenario_id(report_id: str):
+    """Scenario of a report ("Report_PE_101" -> "PE_101"), or None"""
+    match = SCENARIO_PATTERN.search(str(report_id or ''))
+    return match.group(0) if match else None
+
+
+def formula_for(account: dict):
+    """
+    Validator of one account and why it was chosen.
+
+    Returns:
+        (formula, source): source is "scenario" (SCENARIO_FORMULAS), "tariff" (the
+        catalog rule set of the account's supply type) or "default" (supply type
+        unknown or not in the catalog: the catalog default's formula)
+    """
+    scenario = scenario_id(account.get('Report_ID'))
+    if scenario in SCENARIO_FORMULAS:
+        return SCENARIO_FORMULAS[scenario], "scenario"
+    code = account.get('supply_type_code')
+    if code:
+        try:
+            return tariff_catalog.lookup(code, account.get('load_unit') or "KW").formula, "tariff"
+        except tariff_catalog.UnsupportedTariffError:
+            pass  # reported UNSUPPORTED by validate_account()
+    return tariff_catalog.lookup(None).formula, "default"
+
+
+def assign_formulas(accounts, formula: str = None):
+    """Set every account's 'formula' and 'formula_source': the given formula ("option"), else formula_for()"""
+    for account in accounts:
+        account['formula'], account['formula_source'] = (formula, "option") if formula else formula_for(account)
+    return accounts
+
+
+# ===== WORKER =====
+
+def init_worker(source: str, store_path: str, options: dict, verbose: bool):
+    """Set up a worker process (and open the ledger store for --source store); validators are imported on first use"""
+    if options.get('trace'):
+        # One trace file per worker process, so that no two processes append to the same file
+        calc_trace.enable(os.path.join(options['trace'], f"validate_fleet_{os.getpid()}.jsonl"),
+                          accounts=options.get('trace_accounts'), days=options.get('trace_days'))
+    columnar_root = options.get('columnar_root', result_store.RESULT_STORE_ROOT)
+    _worker.update({
+        'modules': {},
+        'store': LedgerStore(store_path) if source == "store" else None,
+        'ledgers': result_store.ResultStore(columnar_root) if source == "columnar" else None,
+        'columnar': result_store.ResultStore(columnar_root, options['columnar_run']) if options.get('columnar_run') else None,
+        'options': options,
+        'verbose': verbose
+    })
+
+
+def validator(formula: str):
+    """Formula module of a validator, imported once per worker process"""
+    module = _worker['modules'].get(formula)
+    if module is None:
+        module = importlib.import_module(f"Formula.Formula_{formula}")
+        if not _worker['verbose']:
+            # Per-day formula breakdown and per-account banners stay out of the fleet log
+            module.logger.setLevel(logging.WARNING)
+        _worker['modules'][formula] = module
+    return module
+
+
+def load_ledger(comparator, account: dict) -> pd.DataFrame:
+    """Ledger rows of one account for the comparator's date range (API, local store or columnar store)"""
+    if _worker['ledgers'] is not None:
+        df = _worker['ledgers'].read("ledger", account['Report_ID'], account.get('ledger_run'))
+        return comparator.filter_ledger_data(df) if not df.empty else df
+    store = _worker['store']
+    if store is None:
+        return comparator.fetch_prepaid_ledger_data()
+    df = store.load(account['account_id'], account['meter_number'])
+    if df.empty:
+        return df
+    return comparator.filter_ledger_data(df)
+
+
+def starts_after_activation(df: pd.DataFrame, install_date) -> bool:
+    """True when the ledger period starts after the account's first day (its meter install date)"""
+    try:
+        installed = pd.Timestamp(install_date)
+    except (TypeError, ValueError):
+        return False
+    if pd.isna(installed):
+        return False
+    installed = installed.tz_localize(None) - IST_OFFSET if installed.tzinfo is None else installed.tz_convert(None)
+    first_day = pd.Timestamp(df['start_date_time'].iloc[0])
+    first_day = first_day.tz_convert(None) if first_day.tzinfo is not None else first_day
+    return first_day >= installed + pd.Timedelta(days=1)
+
+
+def opening_balance_for(df: pd.DataFrame, account: dict):
+    """
+    Balance before the first day of the period, and where it came from.
+
+    The consumer's prepaid opening balance is used whenever the period starts
+    at activation, so the engine's day-1 opening_balance is checked against
+    it. The ledger's own first opening_balance is used only for a period that
+    starts after the install date (the consumer balance no longer applies) or
+    when the consumer balance is not known.
+
+    Returns:
+        (balance, source): source is "consumer", "ledger" or "default" (balance None,
+        the validator's default is kept)
+    """
+    consumer = account.get('opening_balance')
+    ledger = number_or_none(df['opening_balance'].iloc[0]) if 'opening_balance' in df.columns else None
+    if consumer is not None and not starts_after_activation(df, account.get('install_date')):
+        return consumer, "consumer"
+    if ledger is not None:
+        return ledger, "ledger"
+    if consumer is not None:
+        return consumer, "consumer"
+    return None, "default"
+
+
+def validate_account(account: dict) -> dict:
+    """
+    Validate one account's ledger.
+
+    Returns:
+        Summary row (see SUMMARY_COLUMNS) plus 'mismatches', the date and Status of
+        every mismatching day
+    """
+    started = time.perf_counter()
+    options = _worker['options']
+    result = {column: None for column in SUMMARY_COLUMNS}
+    result.update({key: account[key] for key in ('Report_ID', 'account_id', 'meter_number', 'formula', 'formula_source')})
+    result['supply_type_code'] = account.get('supply_type_code')
+    result['mismatches'] = []
+
+    try:
+        comparator = validator(account['formula']).PrepaidLedgerComparison(
+            account_id=account['account_id'],
+            start_date=options.get('start_date'),
+            end_date=options.get('end_date'),
+            contracted_load=account.get('sanctioned_load'),
+            load_unit=account.get('load_unit') or "KW"
+        )
+        if hasattr(comparator, 'log_daily_details'):
+            comparator.log_daily_details = _worker['verbose']
+
+        df = load_ledger(comparator, account)
+        if df.empty:
+            result['status'] = 'NO DATA'
+            return result
+
+        opening_balance, source = opening_balance_for(df, account)
+        if opening_balance is not None:
+            comparator.opening_balance = opening_balance
+        result.update({'opening_balance': comparator.opening_balance, 'opening_balance_source': source})
+
+        try:
+            comparator.select_tariff(df)
+        except UnsupportedTariffError as e:
+            result.update({'supply_type_code': e.supply_type_code, 'status': 'UNSUPPORTED', 'records': len(df),
+                           'error': str(e)})
+            return result
+        df_comparison = comparator.compare_values(comparator.calculate_expected_values(df))
+
+        mismatched = df_comparison[df_comparison['Status'] != 'All Match']
+        columns = [column for column in comparator.comparison_columns
+                   if f"{column}_match" in df_comparison.columns and not df_comparison[f"{column}_match"].all()]
+        result.update({
+            'supply_type_code': comparator.tariff.supply_type_code,
+            'tariff': comparator.tariff.name,
+            'status': 'PASS' if mismatched.empty else 'FAIL',
+            'records': len(df_comparison),
+            'matched': len(df_comparison) - len(mismatched),
+            'mismatched': len(mismatched),
+            'mismatch_columns': ", ".join(columns)
+        })
+        result['mismatches'] = [
+            {'date': pd.Timestamp(start).strftime('%Y-%m-%d'), 'status': status}
+            for start, status in zip(mismatched['start_date_time'].tolist(), mismatched['Status'].tolist())
+        ]
+
+        if _worker['columnar'] is not None:
+            _worker['columnar'].write("comparison", account['Report_ID'], df_comparison)
+
+        if options.get('reports'):
+            os.makedirs(REPORT_FOLDER, exist_ok=True)
+            filename = os.path.join(REPORT_FOLDER, f"{account['Report_ID']}_Formula_{account['formula']}.xlsx")
+            comparator.generate_comparison_report(df_comparison, filename=filename)
+            result['report_file'] = filename
+
+    except Exception as e:
+        result['status'] = 'ERROR'
+        result['error'] = f"{type(e).__name__}: {e}"
+    finally:
+        result['duration'] = round(time.perf_counter() - started, 3)
+
+    return result
+
+
+# ===== FLEET EXECUTION =====
+
+def validate_fleet(accounts, formula: str = None, jobs: int = DEFAULT_JOBS, chunk_size: int = None,
+                   source: str = "csv", store_path: str = DEFAULT_STORE_PATH, options: dict = None,
+                   verbose: bool = False):
+    """
+    Validate every account on a process pool.
+
+    Args:
+        accounts: Account dicts from read_accounts_csv() / read_accounts_store()
+        formula: Validator to run for every account ("101", "102" or "103"); default:
+            chosen per account (see formula_for())
+        jobs: Worker processes
+        chunk_size: Accounts handed to a worker at a time (default: about
+            CHUNKS_PER_WORKER chunks per worker)
+        source: "csv" (ledgers from the Engine API), "store" (ledgers from the local store)
+            or "columnar" (ledgers from the columnar result store)
+        store_path: Ledger store for source "store"
+        options: start_date, end_date, reports, trace options, columnar_root and columnar_run
+            (comparison frames are written to the columnar store when columnar_run is set)
+        verbose: Keep each validator's per-day log lines
+
+    Returns:
+        List of result dicts, in account order
+    """
+    jobs = max(1, min(jobs, len(accounts)))
+    chunk_size = chunk_size or max(1, math.ceil(len(accounts) / (jobs * CHUNKS_PER_WORKER)))
+    assign_formulas(accounts, formula)
+    counts = {name: sum(1 for account in accounts if account['formula'] == name) for name in FORMULAS}
+    validators = ", ".join(f"Formula_{name} ({count})" for name, count in counts.items() if count)
+
+    logger.info("=" * 80)
+    logger.info(f"Validating {len(accounts)} account(s) with {validators} on {jobs} process(es), "
+                f"{chunk_size} account(s) per chunk")
+    logger.info("=" * 80)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                             initargs=(source, store_path, options or {}, verbose)) as executor:
+        for result in executor.map(validate_account, accounts, chunksize=chunk_size):
+            results.append(result)
+            if result['status'] in ('PASS', 'FAIL'):
+                logger.info(f"[{result['status']}] {result['account_id']} ({result['records']} day(s), "
+                            f"{result['mismatched']} mismatching) in {result['duration']:.2f}s")
+            else:
+                logger.error(f"[{result['status']}] {result['account_id']} {result['error'] or 'no ledger rows in range'}")
+    return results
+
+
+def save_summary(results, output_file: str = SUMMARY_FILE):
+    """Write the Summary sheet (one row per account) and the Mismatches sheet (one row per mismatching day)"""
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    summary = pd.DataFrame([{column: result[column] for column in SUMMARY_COLUMNS} for result in results],
+                           columns=SUMMARY_COLUMNS)
+    mismatches = pd.DataFrame(
+        [{'Report_ID': result['Report_ID'], 'account_id': result['account_id'], 'date': mismatch['date'],
+          'Status': mismatch['status']}
+         for result in results for mismatch in result['mismatches']],
+        columns=['Report_ID', 'account_id', 'date', 'Status']
+    )
+    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+        summary.to_excel(writer, sheet_name='Summary', index=False)
+        mismatches.to_excel(writer, sheet_name='Mismatches', index=False)
+    logger.info(f"Fleet validation summary saved: {output_file}")
+
+
+def log_summary(results, wall_clock: float):
+    """Log per-account status and overall PASS/FAIL totals"""
+    counts = {status: sum(1 for r in results if r['status'] == status)
+              for status in ('PASS', 'FAIL', 'UNSUPPORTED', 'NO DATA', 'ERROR')}
+
+    logger.info("=" * 80)
+    logger.info("Fleet Validation Summary")
+    logger.info("=" * 80)
+    for result in results:
+        detail = result['mismatch_columns'] if result['status'] == 'FAIL' else (result['error'] or '')
+        logger.info(f"{str(result['account_id']):<12} {str(result['supply_type_code'] or '-'):<6} "
+                    f"{result['formula']:<4} {result['status']:<11} {result['records'] or 0:>5} day(s)  {detail}")
+    logger.info("-" * 80)
+    logger.info(f"Total accounts: {len(results)}")
+    for status, count in counts.items():
+        logger.info(f"{status}: {count}")
+    logger.info(f"Wall clock: {wall_clock:.2f}s")
+    logger.info(f"Fleet result: {'PASS' if counts['PASS'] == len(results) else 'FAIL'}")
+    logger.info("=" * 80)
+
+
+# ===== MAIN FUNCTION =====
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Validate the prepaid ledger of every account on a process pool")
+    parser.add_argument("--source", choices=["csv", "store", "columnar"], default="csv",
+                        help=f"Accounts from {CSV_FILE} with ledgers from the API (default), from the ledger store "
+                             "or from the columnar result store")
+    parser.add_argument("--csv", default=CSV_FILE, help=f"Consumer details CSV (default: {CSV_FILE})")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH,
+                        help=f"Ledger store for --source store (default: {DEFAULT_STORE_PATH})")
+    parser.add_argument("--formula", choices=FORMULAS,
+                        help="Validator to run for every account (default: chosen per account from its "
+                             "scenario or tariff)")
+    parser.add_argument("--start", help="First day of the period (default: the validator's default)")
+    parser.add_argument("--end", help="Exclusive end of the period (default: the validator's default)")
+    parser.add_argument("--jobs", "-j", type=int, default=DEFAULT_JOBS,
+                        help=f"Worker processes (default: {DEFAULT_JOBS})")
+    parser.add_argument("--chunk-size", type=int,
+                        help=f"Accounts per task chunk (default: about {CHUNKS_PER_WORKER} chunks per worker)")
+    parser.add_argument("--reports", action="store_true",
+                        help=f"Also write each account's comparison workbook to {REPORT_FOLDER}")
+    parser.add_argument("--summary", default=SUMMARY_FILE, help=f"Summary workbook (default: {SUMMARY_FILE})")
+    parser.add_argument("--verbose", "-v", action="store_true",
+                        help="Keep the validators' per-day log lines")
+    parser.add_argument("--columnar", action="store_true",
+                        help="Also write every account's comparison frame to the columnar result store (Parquet)")
+    parser.add_argument("--columnar-root", default=result_store.RESULT_STORE_ROOT,
+                        help=f"Columnar result store folder (default: {result_store.RESULT_STORE_ROOT})")
+    parser.add_argument("--ledger-run", help="Columnar ledger run for --source columnar (default: the latest run)")
+    parser.add_argument("--trace", nargs="?", const=calc_trace.TRACE_FOLDER, metavar="FOLDER",
+                        help=f"Write the per-day calculation trace as JSON lines (default folder: {calc_trace.TRACE_FOLDER})")
+    parser.add_argument("--trace-accounts", nargs="+", metavar="ACCOUNT",
+                        help="Only trace these accounts (default: every account)")
+    parser.add_argument("--trace-days", type=calc_trace.parse_days, metavar="FIRST-LAST",
+                        help="Only trace these ledger days, e.g. 5, 1-10 or 20- (default: every day)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Main function to validate every account"""
+    args = parse_args(argv)
+
+    if (args.columnar or args.source == "columnar") and not result_store.available():
+        logger.error("The columnar result store needs pyarrow (pip install pyarrow)")
+        return 2
+
+    try:
+        if args.source == "columnar":
+            accounts = read_accounts_columnar(args.columnar_root, args.ledger_run)
+        elif args.source == "store":
+            accounts = read_accounts_store(args.store)
+        else:
+            accounts = read_accounts_csv(args.csv)
+    except Exception as e:
+        logger.error(f"Failed to read the accounts: {e}")
+        return 2
+
+    if not accounts:
+        logger.error("No accounts to validate")
+        return 2
+
+    started = time.perf_counter()
+    results = validate_fleet(accounts, formula=args.formula, jobs=args.jobs,
+                             chunk_size=max(1, args.chunk_size) if args.chunk_size else None,
+                             source=args.source, store_path=args.store,
+                             options={'start_date': args.start, 'end_date': args.end, 'reports': args.reports,
+                                      'trace': args.trace, 'trace_accounts': args.trace_accounts,
+                                      'trace_days': args.trace_days, 'columnar_root': args.columnar_root,
+                                      'columnar_run': result_store.new_run_id() if args.columnar else None},
+                             verbose=args.verbose)
+    wall_clock = time.perf_counter() - started
+
+    log_summary(results, wall_clock)
+    save_summary(results, args.summary)
+
+    return 0 if all(r['status'] == 'PASS' for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())